@@ -29,8 +29,15 @@ from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, System
 from FinSage.models.schemas import *
 from FinSage.prompts.system_prompts import get_financial_metrics_agent_prompt, FINANCIAL_METRICS_TOPIC_ADHERENCE_PROMPT
 from FinSage.tools.tools import financial_metrics_tools
-from FinSage.utils.llm.llm import llm
+from FinSage.utils.llm.llm import llm, get_llm
 from FinSage.models.personality import AgentPersonality
+from FinSage.utils.deadline import agent_time_budget, invoke_within_budget, ainvoke_within_budget, can_retry
+from FinSage.utils.context import agent_context
+from FinSage.utils.artifacts import offload_executor_output, load_executor_output
+from FinSage.utils.state import agent_update
+from FinSage.utils.evaluation import background_evaluator
+from FinSage.utils.topic_adherence import precheck_topic_adherence
+from FinSage.config.runtime import EVALUATION_MODE
 from FinSage.utils.callback_tools import CustomConsoleCallbackHandler
 from FinSage.config.settings import setup_environment
 
@@ -144,13 +151,8 @@ def get_tools_call_eval_stats(result: Dict):
 
 
 # Financial Metrics Agent Nodes
-def financial_metrics_node(state):
-    """
-    Handles fundamental analysis and financial metrics using tools from tools.py
-    """
-    # print("\n" + "-"*50)
-    # print("📊 FINANCIAL METRICS NODE")
-    
+def _build_financial_metrics_agent(state, max_execution_time: float = 120) -> AgentExecutor:
+    """Creates the Financial Metrics executor for the task assigned by the supervisor"""
     # Get task details from state
     task = state.get("current_task", {})
     
@@ -164,37 +166,65 @@ def financial_metrics_node(state):
         validation_criteria=task.get("validation_criteria", [])
     )
     
-    metrics_agent = create_agent(
-        llm,
+    return create_agent(
+        get_llm("financial_metrics_agent"),
         financial_metrics_tools,
-        agent_prompt
+        agent_prompt,
+        max_execution_time=max_execution_time
     )
+
+def _store_financial_metrics_output(state, metrics_agent: AgentExecutor, output: dict):
+    """State update with the agent answer; the executor output goes to side storage, the state keeps a reference"""
+    internal = dict(state["financial_metrics_agent_internal_state"])
+    internal["agent_executor_tools"] = {tool.name: 0 for tool in metrics_agent.tools}
+    internal["full_response"] = offload_executor_output(output)
+    return agent_update("FinancialMetrics", "financial_metrics_agent_internal_state", internal, output)
+
+def financial_metrics_node(state):
+    """
+    Handles fundamental analysis and financial metrics using tools from tools.py
+    """
+    # print("\n" + "-"*50)
+    # print("📊 FINANCIAL METRICS NODE")
+    budget = agent_time_budget(state, 120)
+    metrics_agent = _build_financial_metrics_agent(state, budget)
     
     state["callback"].write_agent_name("Financial Metrics Agent 📊")
-    output = metrics_agent.invoke(
-        {"messages": state["messages"]}, {"callbacks": [state["callback"]]}, return_intermediate_steps = True
+    output = invoke_within_budget(
+        lambda: metrics_agent.invoke(
+            {"messages": agent_context(state)}, {"callbacks": [state["callback"]]}, return_intermediate_steps = True
+        ),
+        budget, "Financial Metrics", has_deadline=state.get("deadline") is not None
     )
     # print(f"Analysis complete - Output length: {len(output.get('output', ''))}")
+    return _store_financial_metrics_output(state, metrics_agent, output)
+
+async def afinancial_metrics_node(state):
+    """
+    Async variant of financial_metrics_node: the executor runs with ainvoke so the
+    event loop is free while the LLM and the tools are waiting on the network.
+    """
+    budget = agent_time_budget(state, 120)
+    metrics_agent = _build_financial_metrics_agent(state, budget)
     
-    state["messages"].append(
-        AIMessage(content=output.get("output"), name="FinancialMetrics")
+    state["callback"].write_agent_name("Financial Metrics Agent 📊")
+    output = await ainvoke_within_budget(
+        metrics_agent.ainvoke(
+            {"messages": agent_context(state)}, {"callbacks": [state["callback"]]}, return_intermediate_steps = True
+        ),
+        budget, "Financial Metrics", has_deadline=state.get("deadline") is not None
     )
-    # ADDED: financial_metrics_agent tools:
-    available_tools = {tool.name: 0 for tool in metrics_agent.tools}                                           
-    state["financial_metrics_agent_internal_state"]["agent_executor_tools"] = available_tools
-    state["financial_metrics_agent_internal_state"]["full_response"] = output # output contains all the messages
-
-    # print("-"*50 + "\n")
-    return state
+    return _store_financial_metrics_output(state, metrics_agent, output)
 
 # Evaluate all tools called:
 def evaluate_all_tools_called(state):
     """Evaluates tool usage and stores statistics in state"""
     sample_response = state['financial_metrics_agent_internal_state']
+    full_response = load_executor_output(sample_response['full_response'])
     
     # This dictionary will be used for later evaluation statistics
     result = {
-        "answer": sample_response['full_response']["output"],
+        "answer": full_response["output"],
         "tools_used": [],
         "all_tools_used": False,
         "tool_usage": {
@@ -211,7 +241,7 @@ def evaluate_all_tools_called(state):
     }
 
     # Process intermediate steps
-    for action, observation in sample_response['full_response']["intermediate_steps"]:
+    for action, observation in full_response["intermediate_steps"]:
         # print( 'ACTION: ', action)
         # print(' OBSERVATION: ', observation)
         tool_name = action.tool
@@ -264,34 +294,55 @@ def evaluate_all_tools_called(state):
     # Store evaluation stats in state
     run_stats = get_tools_call_eval_stats(result)
     
-    # Initialize all_tools_eval if needed
-    if 'stats' not in state['financial_metrics_agent_internal_state']['all_tools_eval']:
-        state['financial_metrics_agent_internal_state']['all_tools_eval'] = {
-            'stats': [],
-            'passed': []
-        }
-    
     # Append new stats and pass/fail status
-    state['financial_metrics_agent_internal_state']['all_tools_eval']['stats'].append(run_stats)
-    state['financial_metrics_agent_internal_state']['all_tools_eval']['passed'].append(result["all_tools_used"])
-    
-    return state
+    all_tools_eval = sample_response.get('all_tools_eval') or {}
+    all_tools_eval = {
+        'stats': list(all_tools_eval.get('stats', [])) + [run_stats],
+        'passed': list(all_tools_eval.get('passed', [])) + [result["all_tools_used"]],
+    }
+    return {'financial_metrics_agent_internal_state': {**sample_response, 'all_tools_eval': all_tools_eval}}
 
-def evaluate_topic_adherence(state):
-    # print(' INSIDE evaluate_topic_adherence')
-    messages = [
+def _topic_adherence_messages(state) -> list:
+    return [
         SystemMessage(content=FINANCIAL_METRICS_TOPIC_ADHERENCE_PROMPT.format(
             question=state['user_input'],
             answer= state['financial_metrics_agent_internal_state']['full_response']['output']
         ))
     ]
-    llm_evaluator = llm.with_structured_output(LLM_TopicAdherenceEval)
-    response = llm_evaluator.invoke(messages)
-    
+
+def _precheck_topic_adherence(state):
+    """Local scoring; None means the answer is ambiguous and goes to the LLM judge"""
+    return precheck_topic_adherence(
+        "FinancialMetricsAgent",
+        state['user_input'],
+        state['financial_metrics_agent_internal_state']['full_response']['output']
+    )
+
+def _store_topic_adherence(state, response: LLM_TopicAdherenceEval):
     # Append to the internal state:
-    state['financial_metrics_agent_internal_state']['topic_adherence_eval']['passed'].append(response.passed)
-    state['financial_metrics_agent_internal_state']['topic_adherence_eval']['reason'].append(response.reason)
-    return state
+    internal = state['financial_metrics_agent_internal_state']
+    topic_adherence_eval = internal.get('topic_adherence_eval') or {}
+    topic_adherence_eval = {
+        'passed': list(topic_adherence_eval.get('passed', [])) + [response.passed],
+        'reason': list(topic_adherence_eval.get('reason', [])) + [response.reason],
+    }
+    return {'financial_metrics_agent_internal_state': {**internal, 'topic_adherence_eval': topic_adherence_eval}}
+
+def evaluate_topic_adherence(state):
+    # print(' INSIDE evaluate_topic_adherence')
+    response = _precheck_topic_adherence(state)
+    if response is None:
+        llm_evaluator = get_llm("financial_metrics_evaluator").with_structured_output(LLM_TopicAdherenceEval)
+        response = llm_evaluator.invoke(_topic_adherence_messages(state))
+    return _store_topic_adherence(state, response)
+
+async def aevaluate_topic_adherence(state):
+    """Async variant of evaluate_topic_adherence"""
+    response = _precheck_topic_adherence(state)
+    if response is None:
+        llm_evaluator = get_llm("financial_metrics_evaluator").with_structured_output(LLM_TopicAdherenceEval)
+        response = await llm_evaluator.ainvoke(_topic_adherence_messages(state))
+    return _store_topic_adherence(state, response)
 
 # Financial Metrics Agent Conditional Edges
 def execute_again_all_tools_called(state):
@@ -301,6 +352,10 @@ def execute_again_all_tools_called(state):
     # print("passed value:" ,passed )
     # print('iterations: ', iterations, 'values: ' , state['financial_metrics_agent_internal_state']['all_tools_eval']['passed'])
 
+    # Low on time budget (or the agent was cancelled): no evaluation, no retry
+    if not can_retry(state) or state['financial_metrics_agent_internal_state']['full_response'].get("deadline_exceeded"):
+        return "end"
+
     if passed or iterations >= 2:
         return "EvaluateTopicAdherence"
     else:
@@ -320,7 +375,7 @@ def execute_again_topic_adherence(state):
     # print("TOPIC ADHERENCE EVALUATION PASSED:", last_passed)
     # print("NUMBER OF ITERATIONS FOR TOPIC ADHERENCE:", iterations)
 
-    if last_passed == "true" or iterations >= 2: 
+    if last_passed == "true" or iterations >= 2 or not can_retry(state): 
         # print(f'ENDING! iterations {iterations}, value of topic_adherence: {last_passed}')
         return "end"
     else:
@@ -328,17 +383,43 @@ def execute_again_topic_adherence(state):
         return "FinancialMetricsAgent"
 
 
+def schedule_evaluation(state):
+    """
+    Sampled evaluation mode: hands the finished run to the background evaluator
+    instead of grading it on the request path
+    """
+    background_evaluator.submit("FinancialMetricsAgent", state, "financial_metrics_agent_internal_state", [evaluate_all_tools_called, evaluate_topic_adherence])
+    return {}
+
 # Build the graph
-def define_graph():
+def define_graph(use_async: bool = False, evaluation_mode: str = EVALUATION_MODE):
     """
     Defines and returns a graph representing the financial analysis workflow.
+
+    Args:
+        use_async (bool): Build the graph from the async node implementations.
+                          The resulting graph must be run with ainvoke/astream.
+        evaluation_mode (str): "inline" evaluates (and retries) inside the graph,
+                               "sampled" evaluates a sample in the background, "off" skips evaluation.
     """
-    workflow = StateGraph(AgentState)
+    workflow = StateGraph(AgentState, output_schema=FinancialMetricsOutput)
     
     # Add nodes
-    workflow.add_node("FinancialMetricsAgent", financial_metrics_node)
+    workflow.add_node("FinancialMetricsAgent", afinancial_metrics_node if use_async else financial_metrics_node)
+
+    # Sampled/off evaluation: the agent answer goes straight back to the supervisor
+    if evaluation_mode != "inline":
+        workflow.set_entry_point("FinancialMetricsAgent")
+        if evaluation_mode == "sampled":
+            workflow.add_node("ScheduleEvaluation", schedule_evaluation)
+            workflow.add_edge("FinancialMetricsAgent", "ScheduleEvaluation")
+            workflow.add_edge("ScheduleEvaluation", END)
+        else:
+            workflow.add_edge("FinancialMetricsAgent", END)
+        return workflow.compile()
+
     workflow.add_node("EvaluateAllToolsCalled", evaluate_all_tools_called)
-    workflow.add_node("EvaluateTopicAdherence", evaluate_topic_adherence)
+    workflow.add_node("EvaluateTopicAdherence", aevaluate_topic_adherence if use_async else evaluate_topic_adherence)
     
     # Set entry point
     workflow.set_entry_point("FinancialMetricsAgent")
@@ -349,6 +430,7 @@ def define_graph():
     workflow.add_conditional_edges("EvaluateAllToolsCalled", execute_again_all_tools_called, 
     {
         "EvaluateTopicAdherence": "EvaluateTopicAdherence", 
+        "end": END,
         "FinancialMetricsAgent": "FinancialMetricsAgent"
     }
       )
@@ -364,6 +446,7 @@ def define_graph():
 
 
 financial_metrics_agent = define_graph()
+financial_metrics_agent_async = define_graph(use_async=True)
 def __main__():
     """
     Main function to build and run the market intelligence agent graph.
@@ -21,103 +21,154 @@ from langgraph.graph import StateGraph, END
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage 
 
 # Local imports
-from FinSage.utils.llm.llm import llm, llm_syn
+from FinSage.utils.llm.llm import llm, llm_syn, get_llm
+from FinSage.utils.llm.cascade import synthesize_with_cascade, asynthesize_with_cascade
 from FinSage.config.settings import setup_environment
 from FinSage.models.schemas import *
 from FinSage.config.members import get_team_members_details
 from FinSage.utils.chains import get_supervisor_chain , get_finish_chain
 from FinSage.models.personality import AgentPersonality
 from FinSage.utils.callback_tools import CustomConsoleCallbackHandler
+from FinSage.utils.speculation import speculative_executor, speculative_supervisor, speculative_agent
+from FinSage.utils.deadline import ensure_deadline, synthesis_due, missing_section
+from FinSage.utils.context import supervisor_context, conversation_context
+from FinSage.utils.checkpoint import get_checkpointer
+from FinSage.utils.log import get_logger
 #   Import agents
-from FinSage.agents.market import market_intelligence_agent
-from FinSage.agents.financial import financial_metrics_agent
-from FinSage.agents.sentiment import news_sentiment_agent
-from FinSage.agents.sql import sql_agent
+from FinSage.agents.market import market_intelligence_agent, market_intelligence_agent_async
+from FinSage.agents.financial import financial_metrics_agent, financial_metrics_agent_async
+from FinSage.agents.sentiment import news_sentiment_agent, news_sentiment_agent_async
+from FinSage.agents.sql import sql_agent, sql_agent_async
+
+logger = get_logger(__name__)
+
 # FinSage Agent Nodes
 
 # Supervisor Node
-def supervisor_node(state):
-    """
-    The supervisor node coordinates task delegation and validation.
-    """
-    # print("\n" + "="*50)
-    # print("🎯 SUPERVISOR NODE")
-    # print(f"Current Input: {state['user_input']}")
-    # print(f"Analysis Date: {state['current_date']}")
-    # print(f"Personality in supervisor: {state.get('personality')}")
-    
+def _supervisor_chain_inputs(state):
+    """Builds the supervisor chain and its inputs for the current state"""
     # Add SQL data cutoff check
     sql_cutoff_date = datetime(2022, 12, 31)
     requires_historical = state['current_date'] > sql_cutoff_date
-    print(f"Requires historical pre-2023 data consideration: {requires_historical}")
+    logger.debug("Requires historical pre-2023 data consideration: %s", requires_historical)
 
-    chat_history = state.get("messages", [])
-    supervisor_chain = get_supervisor_chain(llm, current_date=state['current_date'])
+    chat_history = list(state.get("messages", []))
+    supervisor_chain = get_supervisor_chain(get_llm("supervisor"), current_date=state['current_date'])
     # print("="*50)
     # print("FULL CHAIN COMPONENTS:")
     # print(supervisor_chain)
 
+    seeded = []
     if not chat_history:
-        chat_history.append(HumanMessage(state["user_input"]))
-        print("Starting new conversation")
+        seeded = [HumanMessage(state["user_input"])]
+        chat_history += seeded
+        logger.debug("Starting new conversation")
     
     # Debug the chain invocation
     # print("\n=== Chain Invocation ===")
     # print("Messages:", len(chat_history))
     # print("Personality:", state.get("personality").get_prompt_context() if state.get("personality") else "None")
     
-    output = supervisor_chain.invoke({
-        "messages": chat_history,
+    inputs = {
+        "messages": supervisor_context({**state, "messages": chat_history}),
         "personality": state.get("personality").get_prompt_context() if state.get("personality") else ""
-    })
-    print(f"\nNext Action: {output.next_action}")
+    }
+    return supervisor_chain, inputs, seeded
+
+def _apply_routing_decision(state, output: RouteSchema, seeded: list) -> dict:
+    """Returns the supervisor's task assignment and routing decision as a state update"""
+    logger.info("Next action: %s", output.next_action)
     # print("Supervisor output:", output)
     
     # Store task details
-    state["current_task"] = {
-        "description": output.task_description,
-        "expected_output": output.expected_output,
-        "validation_criteria": output.validation_criteria,
-        "query_type": output.query_type
+    update = {
+        "deadline": state.get("deadline"),
+        "current_task": {
+            "description": output.task_description,
+            "expected_output": output.expected_output,
+            "validation_criteria": output.validation_criteria,
+            "query_type": output.query_type
+        },
+        "messages": seeded
     }
     
     # Handle routing based on query type
     if output.query_type == "non_financial_analysis":
-        state["next_step"] = "FINISH"  
-    elif output.next_action == "FINISH" and len(chat_history) > 0:
-        state["next_step"] = "Synthesizer"  
+        update["next_step"] = "FINISH"  
+    elif output.next_action == "FINISH" and (state.get("messages") or seeded):
+        update["next_step"] = "Synthesizer"  
     else:
-        state["next_step"] = output.next_action  
-    
-    state["messages"] = chat_history
+        update["next_step"] = output.next_action  
 
-
-    
     # print(f"\nNext Action: {output.next_action}")
     # print(f"Task Description: {output.task_description}")
     # print("="*50 + "\n")
     
-    return state
+    return update
+
+def _deadline_routing(state):
+    """
+    Starts the request deadline. Returns the update routing straight to the
+    Synthesizer when only its reserve is left, None otherwise.
+    """
+    ensure_deadline(state)
+    if not synthesis_due(state) or not state.get("messages"):
+        return None
+    logger.warning("Response deadline reached, skipping remaining agents")
+    return {"deadline": state.get("deadline"), "deadline_reached": True, "next_step": "Synthesizer"}
+
+def supervisor_node(state):
+    """
+    The supervisor node coordinates task delegation and validation.
+    """
+    # print("\n" + "="*50)
+    # print("🎯 SUPERVISOR NODE")
+    # print(f"Current Input: {state['user_input']}")
+    # print(f"Analysis Date: {state['current_date']}")
+    # print(f"Personality in supervisor: {state.get('personality')}")
+    routed = _deadline_routing(state)
+    if routed is not None:
+        return routed
+    supervisor_chain, inputs, seeded = _supervisor_chain_inputs(state)
+    output = supervisor_chain.invoke(inputs)
+    return _apply_routing_decision(state, output, seeded)
+
+async def asupervisor_node(state):
+    """
+    Async variant of supervisor_node.
+    """
+    routed = _deadline_routing(state)
+    if routed is not None:
+        return routed
+    supervisor_chain, inputs, seeded = _supervisor_chain_inputs(state)
+    output = await supervisor_chain.ainvoke(inputs)
+    return _apply_routing_decision(state, output, seeded)
 
 # Synthesizer Node
-def synthesize_responses(state):
+def _agent_result(state, name: str) -> str:
+    """This request's answer of an agent, from agent_results (latest named message for states without it)"""
+    results = state.get("agent_results")
+    if results:
+        return (results.get(name) or {}).get("output") or ''
+    return next((msg.content for msg in reversed(state["messages"]) if getattr(msg, 'name', '') == name), '')
+
+def _synthesis_messages(state) -> list:
     """
-    Final node that synthesizes all agent responses into a comprehensive recommendation
+    Builds the synthesis prompt from the outputs of all agents
     """
-    state["callback"].write_agent_name("Investment Analysis Synthesis 🎯")
     # print("\n" + "-"*50)
     # print(" SYNTHESIS NODE")
     
-    messages = state["messages"]
-    # print(f"Synthesizing {len(messages)} messages")
-    
-    messages = state["messages"]
+    financial_metrics = _agent_result(state, 'FinancialMetrics')
+    news_sentiment = _agent_result(state, 'NewsSentiment')
+    market_intelligence = _agent_result(state, 'MarketIntelligence')
+    sql_data = _agent_result(state, 'SQLAgent')
 
-    # These may bring some issues
-    financial_metrics = next((msg.content for msg in messages if getattr(msg, 'name', '') == 'FinancialMetrics'), '')
-    news_sentiment = next((msg.content for msg in messages if getattr(msg, 'name', '') == 'NewsSentiment'), '')
-    market_intelligence = next((msg.content for msg in messages if getattr(msg, 'name', '') == 'MarketIntelligence'), '')
-    sql_data = next((msg.content for msg in messages if getattr(msg, 'name', '') == 'SQLAgent'), '')
+    # Sections skipped to meet the response deadline are flagged instead of left empty
+    financial_metrics = financial_metrics or missing_section(state)
+    news_sentiment = news_sentiment or missing_section(state)
+    market_intelligence = market_intelligence or missing_section(state)
+    sql_data = sql_data or missing_section(state)
     
     synthesis_prompt = """You are an elite Wall Street analyst with 20+ years of experience, known for synthesizing complex financial data into actionable insights while maintaining strict objectivity. Your responses should be meticulous, data-driven, and tailored to each query type through careful step-by-step reasoning.
    
@@ -312,6 +363,9 @@ ANALYSIS FRAMEWORK:
     - Include forward-looking implications when appropriate"""
     
     personality = state.get("personality")
+    instruction = "Synthesize the analyses into a focused response that directly addresses the query in a best format supported by evidence and data(SHOULD BE IN TABLE FORMAT for all numerical data) and investment profile and urls from news_sentiment source data"
+    if state.get("deadline_reached"):
+        instruction += ". Some analyses were skipped to meet the response deadline (marked NOT AVAILABLE): say which ones are missing and do not invent their data"
     messages = [
         SystemMessage(content=synthesis_prompt.format(
             current_date=state.get("current_date", "Not specified"),
@@ -322,14 +376,30 @@ ANALYSIS FRAMEWORK:
             news_sentiment=news_sentiment,
             sql_data=sql_data
         )),
-        HumanMessage(content="Synthesize the analyses into a focused response that directly addresses the query in a best format supported by evidence and data(SHOULD BE IN TABLE FORMAT for all numerical data) and investment profile and urls from news_sentiment source data")
+        HumanMessage(content=instruction)
     ]
     # print(messages)
-    
-    final_response = llm_syn.invoke(messages)
+    return messages
+
+def _store_synthesis(state, final_response):
     state["callback"].on_tool_end(final_response.content)
-    state["messages"].append(AIMessage(content=final_response.content, name="FinalSynthesis"))
-    return state
+    return {"messages": [AIMessage(content=final_response.content, name="FinalSynthesis")]}
+
+def synthesize_responses(state):
+    """
+    Final node that synthesizes all agent responses into a comprehensive recommendation
+    """
+    state["callback"].write_agent_name("Investment Analysis Synthesis 🎯")
+    final_response = synthesize_with_cascade(state, _synthesis_messages(state))
+    return _store_synthesis(state, final_response)
+
+async def asynthesize_responses(state):
+    """
+    Async variant of synthesize_responses
+    """
+    state["callback"].write_agent_name("Investment Analysis Synthesis 🎯")
+    final_response = await asynthesize_with_cascade(state, _synthesis_messages(state))
+    return _store_synthesis(state, final_response)
 
 
 # Add this after the synthesize_responses function in finsage.py
@@ -342,10 +412,10 @@ def finish_node(state):
     state["callback"].write_agent_name("Conversation Handler 💬")
     
     # Get the finish chain
-    finish_chain = get_finish_chain(llm)
+    finish_chain = get_finish_chain(get_llm("finish"))
     
     # Create messages for the chain
-    messages = state["messages"]
+    messages = conversation_context(state)
     
     # Execute the chain
     response = finish_chain.invoke({
@@ -354,28 +424,59 @@ def finish_node(state):
     
     # Add response to state
     state["callback"].on_tool_end(response.content)
-    state["messages"].append(AIMessage(content=response.content, name="Finish"))
     
     # print("-"*50 + "\n")
-    return state
+    return {"messages": [AIMessage(content=response.content, name="Finish")]}
+
+async def afinish_node(state):
+    """
+    Async variant of finish_node
+    """
+    state["callback"].write_agent_name("Conversation Handler 💬")
+    finish_chain = get_finish_chain(get_llm("finish"))
+    response = await finish_chain.ainvoke({
+        "messages": conversation_context(state)
+    })
+    state["callback"].on_tool_end(response.content)
+    return {"messages": [AIMessage(content=response.content, name="Finish")]}
 
 # Build the graph
-def define_graph():
+def define_graph(use_async: bool = False, checkpointer=None):
     """
     Defines and returns a graph representing the financial analysis workflow.
+
+    Args:
+        use_async (bool): Build the graph from the async nodes and async agent subgraphs.
+                          The resulting graph must be run with ainvoke/astream.
+        checkpointer: LangGraph checkpoint saver persisting the state after every node.
+                      The agent subgraphs inherit it. Run a checkpointed graph with
+                      checkpointed_invoke, which supplies the thread id and the callback.
     """
     workflow = StateGraph(AgentState)
+
+    agents = {
+        "FinancialMetricsAgent": financial_metrics_agent_async if use_async else financial_metrics_agent,
+        "NewsSentimentAgent": news_sentiment_agent_async if use_async else news_sentiment_agent,
+        "MarketIntelligenceAgent": market_intelligence_agent_async if use_async else market_intelligence_agent,
+        "SQLAgent": sql_agent_async if use_async else sql_agent,
+    }
+    supervisor = asupervisor_node if use_async else supervisor_node
+
+    # Speculative mode: likely agents start while the supervisor deliberates
+    if speculative_executor.enabled:
+        supervisor = speculative_supervisor(supervisor)
+        agents = {name: speculative_agent(name, graph, use_async) for name, graph in agents.items()}
     
     # Add nodes
-    workflow.add_node("FinancialMetricsAgent", financial_metrics_agent)
-    workflow.add_node("NewsSentimentAgent", news_sentiment_agent)
-    workflow.add_node("Supervisor", supervisor_node)
-    workflow.add_node("MarketIntelligenceAgent", market_intelligence_agent)
+    workflow.add_node("FinancialMetricsAgent", agents["FinancialMetricsAgent"])
+    workflow.add_node("NewsSentimentAgent", agents["NewsSentimentAgent"])
+    workflow.add_node("Supervisor", supervisor)
+    workflow.add_node("MarketIntelligenceAgent", agents["MarketIntelligenceAgent"])
     
-    workflow.add_node("SQLAgent", sql_agent)
+    workflow.add_node("SQLAgent", agents["SQLAgent"])
     
-    workflow.add_node("Synthesizer", synthesize_responses)
-    workflow.add_node("FINISH", finish_node)  # Add the finish node
+    workflow.add_node("Synthesizer", asynthesize_responses if use_async else synthesize_responses)
+    workflow.add_node("FINISH", afinish_node if use_async else finish_node)  # Add the finish node
 
      # Add Reflection node with retry policy
     # workflow.add_node(
@@ -422,9 +523,10 @@ def define_graph():
     workflow.add_edge("FINISH", END)  # Add edge from FINISH to END
 
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
 
-FinSage_agent = define_graph()
+FinSage_agent = define_graph(checkpointer=get_checkpointer())
+FinSage_agent_async = define_graph(use_async=True, checkpointer=get_checkpointer())
 
 def __main__():
     """
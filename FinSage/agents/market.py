@@ -16,9 +16,16 @@ from langgraph.graph import StateGraph, END
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage 
 
 # Local imports
-from FinSage.utils.llm.llm import llm
+from FinSage.utils.llm.llm import llm, get_llm
 from FinSage.config.settings import setup_environment
 from FinSage.models.personality import AgentPersonality
+from FinSage.utils.deadline import agent_time_budget, invoke_within_budget, ainvoke_within_budget, can_retry
+from FinSage.utils.context import agent_context
+from FinSage.utils.artifacts import offload_executor_output, load_executor_output
+from FinSage.utils.state import agent_update
+from FinSage.utils.evaluation import background_evaluator
+from FinSage.utils.topic_adherence import precheck_topic_adherence
+from FinSage.config.runtime import EVALUATION_MODE
 from FinSage.tools.tools import market_intelligence_tools
 from FinSage.prompts.system_prompts import get_market_intelligence_agent_prompt, MARKET_INTELLIGENCE_TOPIC_ADHERENCE_PROMPT 
 from FinSage.utils.callback_tools import CustomConsoleCallbackHandler
@@ -132,13 +139,8 @@ def get_tools_call_eval_stats(result: Dict):
     return run_stats
 
 # Market Intelligence Agent Nodes
-def market_intelligence_node(state):
-    """
-    Handles market data analysis using tools from tools.py
-    """
-    # print("\n" + "-"*50)
-    # print("📈 MARKET INTELLIGENCE NODE")
-    
+def _build_market_intelligence_agent(state, max_execution_time: float = 120) -> AgentExecutor:
+    """Creates the Market Intelligence executor for the task assigned by the supervisor"""
     # Get task details from state with defaults
     task = state.get("current_task", {})
     task_description = task.get("description", "No task description provided")
@@ -149,8 +151,8 @@ def market_intelligence_node(state):
     # print(f"Expected Output: {expected_output}")
     # print(f"Validation Criteria: {', '.join(validation_criteria)}")
     
-    market_agent = create_agent(
-        llm,
+    return create_agent(
+        get_llm("market_intelligence_agent"),
         market_intelligence_tools,
         get_market_intelligence_agent_prompt(
             current_date=state.get("current_date"),
@@ -159,35 +161,62 @@ def market_intelligence_node(state):
             task_description=task_description,
             expected_output=expected_output,
             validation_criteria=validation_criteria
-        )
+        ),
+        max_execution_time=max_execution_time
     )
+
+def _store_market_intelligence_output(state, market_agent: AgentExecutor, output: dict):
+    """State update with the agent answer; the executor output goes to side storage, the state keeps a reference"""
+    internal = dict(state["market_intelligence_agent_internal_state"])
+    internal["agent_executor_tools"] = {tool.name: 0 for tool in market_agent.tools}
+    internal["full_response"] = offload_executor_output(output)
+    return agent_update("MarketIntelligence", "market_intelligence_agent_internal_state", internal, output)
+
+def market_intelligence_node(state):
+    """
+    Handles market data analysis using tools from tools.py
+    """
+    # print("\n" + "-"*50)
+    # print("📈 MARKET INTELLIGENCE NODE")
+    budget = agent_time_budget(state, 120)
+    market_agent = _build_market_intelligence_agent(state, budget)
     
     state["callback"].write_agent_name("Market Intelligence Agent 📈")
-    output = market_agent.invoke(
-        {"messages": state["messages"]}, {"callbacks": [state["callback"]]}, return_intermediate_steps = True
+    output = invoke_within_budget(
+        lambda: market_agent.invoke(
+            {"messages": agent_context(state)}, {"callbacks": [state["callback"]]}, return_intermediate_steps = True
+        ),
+        budget, "Market Intelligence", has_deadline=state.get("deadline") is not None
     )
+    return _store_market_intelligence_output(state, market_agent, output)
+
+async def amarket_intelligence_node(state):
+    """
+    Async variant of market_intelligence_node: the executor runs with ainvoke so the
+    event loop is free while the LLM and the tools are waiting on the network.
+    """
+    budget = agent_time_budget(state, 120)
+    market_agent = _build_market_intelligence_agent(state, budget)
     
-    state["messages"].append(
-        AIMessage(content=output.get("output"), name="MarketIntelligence")
+    state["callback"].write_agent_name("Market Intelligence Agent 📈")
+    output = await ainvoke_within_budget(
+        market_agent.ainvoke(
+            {"messages": agent_context(state)}, {"callbacks": [state["callback"]]}, return_intermediate_steps = True
+        ),
+        budget, "Market Intelligence", has_deadline=state.get("deadline") is not None
     )
-
-    # ADDED: financial_metrics_agent tools:
-    available_tools = {tool.name: 0 for tool in market_agent.tools}                                           
-    state["market_intelligence_agent_internal_state"]["agent_executor_tools"] = available_tools
-    state["market_intelligence_agent_internal_state"]["full_response"] = output # output contains all the messages
-
-    # print("-"*50 + "\n")
-    return state
+    return _store_market_intelligence_output(state, market_agent, output)
 
 # Evaluate all tools called:
 def evaluate_all_tools_called(state):
     """Evaluates tool usage and stores statistics in state"""
     sample_response = state['market_intelligence_agent_internal_state']
+    full_response = load_executor_output(sample_response['full_response'])
     # print("INSIDE EVALUATE ALL TOOLS CALLED: ", sample_response)
     
     # This dictionary will be used for later evaluation statistics
     result = {
-        "answer": sample_response['full_response']["output"],
+        "answer": full_response["output"],
         "tools_used": [],
         "all_tools_used": False,
         "tool_usage": {
@@ -204,7 +233,7 @@ def evaluate_all_tools_called(state):
     }
 
     # Process intermediate steps
-    for action, observation in sample_response['full_response']["intermediate_steps"]:
+    for action, observation in full_response["intermediate_steps"]:
  
         tool_name = action.tool
         tool_input = action.tool_input
@@ -256,34 +285,55 @@ def evaluate_all_tools_called(state):
     # Store evaluation stats in state
     run_stats = get_tools_call_eval_stats(result)
     
-    # Initialize all_tools_eval if needed
-    if 'stats' not in state['market_intelligence_agent_internal_state']['all_tools_eval']:
-        state['market_intelligence_agent_internal_state']['all_tools_eval'] = {
-            'stats': [],
-            'passed': []
-        }
-    
     # Append new stats and pass/fail status
-    state['market_intelligence_agent_internal_state']['all_tools_eval']['stats'].append(run_stats)
-    state['market_intelligence_agent_internal_state']['all_tools_eval']['passed'].append(result["all_tools_used"])
-    
-    return state
+    all_tools_eval = sample_response.get('all_tools_eval') or {}
+    all_tools_eval = {
+        'stats': list(all_tools_eval.get('stats', [])) + [run_stats],
+        'passed': list(all_tools_eval.get('passed', [])) + [result["all_tools_used"]],
+    }
+    return {'market_intelligence_agent_internal_state': {**sample_response, 'all_tools_eval': all_tools_eval}}
 # Evaluate Topic Adherence
-def evaluate_topic_adherence(state):
-    # print(' INSIDE evaluate_topic_adherence')
-    messages = [
+def _topic_adherence_messages(state) -> list:
+    return [
         SystemMessage(content=MARKET_INTELLIGENCE_TOPIC_ADHERENCE_PROMPT.format(
             question=state['user_input'],
             answer= state['market_intelligence_agent_internal_state']['full_response']['output']
         ))
     ]
-    llm_evaluator = llm.with_structured_output(LLM_TopicAdherenceEval)
-    response = llm_evaluator.invoke(messages)
-    
+
+def _precheck_topic_adherence(state):
+    """Local scoring; None means the answer is ambiguous and goes to the LLM judge"""
+    return precheck_topic_adherence(
+        "MarketIntelligenceAgent",
+        state['user_input'],
+        state['market_intelligence_agent_internal_state']['full_response']['output']
+    )
+
+def _store_topic_adherence(state, response: LLM_TopicAdherenceEval):
     # Append to the internal state:
-    state['market_intelligence_agent_internal_state']['topic_adherence_eval']['passed'].append(response.passed)
-    state['market_intelligence_agent_internal_state']['topic_adherence_eval']['reason'].append(response.reason)
-    return state
+    internal = state['market_intelligence_agent_internal_state']
+    topic_adherence_eval = internal.get('topic_adherence_eval') or {}
+    topic_adherence_eval = {
+        'passed': list(topic_adherence_eval.get('passed', [])) + [response.passed],
+        'reason': list(topic_adherence_eval.get('reason', [])) + [response.reason],
+    }
+    return {'market_intelligence_agent_internal_state': {**internal, 'topic_adherence_eval': topic_adherence_eval}}
+
+def evaluate_topic_adherence(state):
+    # print(' INSIDE evaluate_topic_adherence')
+    response = _precheck_topic_adherence(state)
+    if response is None:
+        llm_evaluator = get_llm("market_intelligence_evaluator").with_structured_output(LLM_TopicAdherenceEval)
+        response = llm_evaluator.invoke(_topic_adherence_messages(state))
+    return _store_topic_adherence(state, response)
+
+async def aevaluate_topic_adherence(state):
+    """Async variant of evaluate_topic_adherence"""
+    response = _precheck_topic_adherence(state)
+    if response is None:
+        llm_evaluator = get_llm("market_intelligence_evaluator").with_structured_output(LLM_TopicAdherenceEval)
+        response = await llm_evaluator.ainvoke(_topic_adherence_messages(state))
+    return _store_topic_adherence(state, response)
 
 # Market Intelligence Conditional Edges
 def execute_again_all_tools_called(state):
@@ -293,6 +343,10 @@ def execute_again_all_tools_called(state):
     # print("passed value:" ,passed )
     # print('iterations: ', iterations, 'values: ' , state['market_intelligence_agent_internal_state']['all_tools_eval']['passed'])
 
+    # Low on time budget (or the agent was cancelled): no evaluation, no retry
+    if not can_retry(state) or state['market_intelligence_agent_internal_state']['full_response'].get("deadline_exceeded"):
+        return "end"
+
     if passed or iterations >= 2:
         return "EvaluateTopicAdherence"
     else:
@@ -313,24 +367,50 @@ def execute_again_topic_adherence(state):
     # print("TOPIC ADHERENCE EVALUATION PASSED:", last_passed)
     # print("NUMBER OF ITERATIONS FOR TOPIC ADHERENCE:", iterations)
 
-    if last_passed == "true" or iterations >= 2: 
+    if last_passed == "true" or iterations >= 2 or not can_retry(state): 
         # print(f'ENDING! iterations {iterations}, value of topic_adherence: {last_passed}')
         return "end"
     else:
         # print(f'RETURN TO AGENT, adherence failed! iterations {iterations}, value of topic_adherence: {last_passed}')
         return "MarketIntelligenceAgent"
 
+def schedule_evaluation(state):
+    """
+    Sampled evaluation mode: hands the finished run to the background evaluator
+    instead of grading it on the request path
+    """
+    background_evaluator.submit("MarketIntelligenceAgent", state, "market_intelligence_agent_internal_state", [evaluate_all_tools_called, evaluate_topic_adherence])
+    return {}
+
 # Build the Market Intelligence Agent
-def define_graph():
+def define_graph(use_async: bool = False, evaluation_mode: str = EVALUATION_MODE):
     """
     Defines and returns a graph representing the financial analysis workflow.
+
+    Args:
+        use_async (bool): Build the graph from the async node implementations.
+                          The resulting graph must be run with ainvoke/astream.
+        evaluation_mode (str): "inline" evaluates (and retries) inside the graph,
+                               "sampled" evaluates a sample in the background, "off" skips evaluation.
     """
-    workflow = StateGraph(AgentState)
+    workflow = StateGraph(AgentState, output_schema=MarketIntelligenceOutput)
     
     # Add nodes
-    workflow.add_node("MarketIntelligenceAgent", market_intelligence_node)
+    workflow.add_node("MarketIntelligenceAgent", amarket_intelligence_node if use_async else market_intelligence_node)
+
+    # Sampled/off evaluation: the agent answer goes straight back to the supervisor
+    if evaluation_mode != "inline":
+        workflow.set_entry_point("MarketIntelligenceAgent")
+        if evaluation_mode == "sampled":
+            workflow.add_node("ScheduleEvaluation", schedule_evaluation)
+            workflow.add_edge("MarketIntelligenceAgent", "ScheduleEvaluation")
+            workflow.add_edge("ScheduleEvaluation", END)
+        else:
+            workflow.add_edge("MarketIntelligenceAgent", END)
+        return workflow.compile()
+
     workflow.add_node("EvaluateAllToolsCalled", evaluate_all_tools_called)
-    workflow.add_node("EvaluateTopicAdherence", evaluate_topic_adherence)
+    workflow.add_node("EvaluateTopicAdherence", aevaluate_topic_adherence if use_async else evaluate_topic_adherence)
     
     # Set entry point
     workflow.set_entry_point("MarketIntelligenceAgent")
@@ -341,6 +421,7 @@ def define_graph():
     workflow.add_conditional_edges("EvaluateAllToolsCalled", execute_again_all_tools_called, 
     {
         "EvaluateTopicAdherence": "EvaluateTopicAdherence", 
+        "end": END,
         "MarketIntelligenceAgent": "MarketIntelligenceAgent"
     }
       )
@@ -357,6 +438,7 @@ def define_graph():
 
 
 market_intelligence_agent = define_graph()
+market_intelligence_agent_async = define_graph(use_async=True)
 
 def __main__():
     """
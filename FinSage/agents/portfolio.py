@@ -0,0 +1,370 @@
+"""
+Portfolio batch analysis.
+
+Reviews N weighted holdings in one run instead of one FinSage conversation per
+ticker:
+
+1. data: the per-symbol tools of the specialist agents are fetched up front,
+   quotes and company profiles with one batched request for all symbols, the
+   rest concurrently. Results are stored in the tool result cache, so the
+   agents find them there,
+2. analysis: the specialist agent subgraphs (PORTFOLIO_AGENTS) run for every
+   holding concurrently, at most PORTFOLIO_MAX_CONCURRENCY agent runs at once,
+3. synthesis: portfolio-level aggregates (weighted beta, P/E, day change,
+   sector allocation, concentration) are computed from the fetched data and
+   one LLM synthesis reviews the whole portfolio.
+
+    python -m FinSage.agents.portfolio AAPL:40 MSFT:35 JNJ:25
+"""
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from FinSage.config.runtime import (
+    ASYNC_BLOCKING_IO_THREADS,
+    PORTFOLIO_AGENTS,
+    PORTFOLIO_FETCH_WORKERS,
+    PORTFOLIO_MAX_CONCURRENCY,
+    PORTFOLIO_MAX_HOLDINGS,
+    PORTFOLIO_SECTION_TOKEN_BUDGET,
+    PORTFOLIO_SNAPSHOT_TTL,
+    TOOL_BACKEND,
+)
+from FinSage.models.personality import AgentPersonality
+from FinSage.models.schemas import PortfolioHolding
+from FinSage.prompts.system_prompts import PORTFOLIO_SYNTHESIS_PROMPT
+from FinSage.tools.tool_cache import tool_result_cache
+from FinSage.tools.tools import BATCH_TOOLS
+from FinSage.utils.callback_tools import NullCallbackHandler
+from FinSage.utils.context import summarize_text
+from FinSage.utils.deadline import AGENT_MESSAGE_NAMES, DEADLINE_EXCEEDED_MARKER
+from FinSage.utils.llm.llm import get_llm
+from FinSage.utils.log import get_logger
+from FinSage.utils.speculation import PREFETCH_TOOLS, _tools_by_name
+from FinSage.utils.state import build_initial_state
+
+logger = get_logger(__name__)
+
+# Tools the aggregates are computed from, fetched whatever the agents
+AGGREGATE_TOOLS = ["get_stock_price", "get_company_financials"]
+
+HoldingsInput = Union[Dict[str, float], List[Union[PortfolioHolding, Dict[str, Any], tuple]]]
+
+
+def normalize_holdings(holdings: HoldingsInput, max_holdings: int = PORTFOLIO_MAX_HOLDINGS) -> List[PortfolioHolding]:
+    """
+    Holdings with upper-case symbols, duplicates merged and weights summing to 1.
+    Accepts {symbol: weight}, PortfolioHolding objects, dicts or (symbol, weight) pairs.
+    """
+    items = holdings.items() if isinstance(holdings, dict) else holdings
+    weights: Dict[str, float] = defaultdict(float)
+    for item in items:
+        if isinstance(item, PortfolioHolding):
+            holding = item
+        elif isinstance(item, dict):
+            holding = PortfolioHolding(**item)
+        else:
+            holding = PortfolioHolding(symbol=item[0], weight=item[1])
+        weights[holding.symbol.strip().upper()] += holding.weight
+
+    total = sum(weights.values())
+    if not weights or total <= 0:
+        raise ValueError("A portfolio needs at least one holding with a positive weight")
+    if len(weights) > max_holdings:
+        raise ValueError(f"A portfolio is limited to {max_holdings} holdings, got {len(weights)}")
+    return [PortfolioHolding(symbol=symbol, weight=weight / total) for symbol, weight in weights.items()]
+
+
+def parse_holdings(specs: List[str]) -> List[PortfolioHolding]:
+    """Holdings from "SYMBOL:WEIGHT" strings (a missing weight counts as 1)"""
+    pairs = []
+    for spec in specs:
+        symbol, _, weight = spec.partition(":")
+        pairs.append((symbol, float(weight) if weight else 1.0))
+    return normalize_holdings(pairs)
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Data fetching __________________________________________ #
+# __________________________________________________________________________________________ #
+def _portfolio_tools(agents: List[str]) -> List[str]:
+    names = list(AGGREGATE_TOOLS)
+    for agent in agents:
+        names += [name for name in PREFETCH_TOOLS.get(agent, []) if name not in names]
+    return names
+
+
+def fetch_portfolio_data(symbols: List[str], agents: List[str] = PORTFOLIO_AGENTS, workers: int = PORTFOLIO_FETCH_WORKERS) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch every per-symbol tool of `agents` for all symbols; returns tool name ->
+    symbol -> result. Results are cached for PORTFOLIO_SNAPSHOT_TTL seconds.
+    """
+    tool_names = _portfolio_tools(agents)
+    data: Dict[str, Dict[str, Any]] = {name: {} for name in tool_names}
+
+    # One request for all symbols where the provider has a batch endpoint
+    if TOOL_BACKEND != "fixtures":
+        for name, batch in BATCH_TOOLS.items():
+            if name in data:
+                data[name].update(batch(symbols))
+
+    # The rest concurrently, through the cached tools (in-flight calls are shared with the agents)
+    tools = _tools_by_name()
+    pending = [(name, symbol) for name in tool_names for symbol in symbols if symbol not in data[name] and name in tools]
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="finsage-portfolio") as pool:
+        futures = {(name, symbol): pool.submit(tools[name].invoke, {"symbol": symbol}) for name, symbol in pending}
+        for (name, symbol), future in futures.items():
+            try:
+                data[name][symbol] = future.result()
+            except Exception as e:
+                data[name][symbol] = {"error": str(e)}
+
+    for name, results in data.items():
+        for symbol, result in results.items():
+            tool_result_cache.put(name, {"symbol": symbol}, result, ttl=PORTFOLIO_SNAPSHOT_TTL)
+    return data
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Aggregates _____________________________________________ #
+# __________________________________________________________________________________________ #
+def _valid(result: Any) -> Dict[str, Any]:
+    return result if isinstance(result, dict) and "error" not in result else {}
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _weighted(rows: List[Dict[str, Any]], key: str) -> Optional[float]:
+    """Weighted mean of `key` over the holdings that have it (their weights renormalized)"""
+    pairs = [(row["weight"], row[key]) for row in rows if row[key] is not None]
+    total = sum(weight for weight, _ in pairs)
+    return sum(weight * value for weight, value in pairs) / total if total else None
+
+
+def holding_rows(holdings: List[PortfolioHolding], data: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One row of market data per holding"""
+    rows = []
+    for holding in holdings:
+        quote = _valid(data.get("get_stock_price", {}).get(holding.symbol))
+        profile = _valid(data.get("get_company_financials", {}).get(holding.symbol))
+        price, low, high = _number(quote.get("price")), _number(quote.get("yearLow")), _number(quote.get("yearHigh"))
+        rows.append({
+            "symbol": holding.symbol,
+            "weight": holding.weight,
+            "name": quote.get("name") or profile.get("companyName") or holding.symbol,
+            "sector": profile.get("sector") or "Unknown",
+            "price": price,
+            "day_change_pct": _number(quote.get("changesPercentage")),
+            "beta": _number(profile.get("beta")),
+            "pe": _number(quote.get("pe")),
+            "market_cap": _number(profile.get("marketCap")),
+            # 0 at the 52-week low, 1 at the 52-week high
+            "range_position_52w": (price - low) / (high - low) if None not in (price, low, high) and high > low else None,
+            "has_data": bool(quote),
+        })
+    return rows
+
+
+def portfolio_aggregates(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Portfolio-level metrics from the holding rows"""
+    sectors: Dict[str, float] = defaultdict(float)
+    for row in rows:
+        sectors[row["sector"]] += row["weight"]
+    # P/E of the portfolio: weighted earnings yield of the profitable holdings, inverted
+    earnings_yield = _weighted([{**row, "pe": 1 / row["pe"] if row["pe"] and row["pe"] > 0 else None} for row in rows], "pe")
+    herfindahl = sum(row["weight"] ** 2 for row in rows)
+    top = max(rows, key=lambda row: row["weight"])
+    return {
+        "holdings": len(rows),
+        "weighted_day_change_pct": _weighted(rows, "day_change_pct"),
+        "weighted_beta": _weighted(rows, "beta"),
+        "weighted_pe": 1 / earnings_yield if earnings_yield else None,
+        "weighted_market_cap": _weighted(rows, "market_cap"),
+        "weighted_range_position_52w": _weighted(rows, "range_position_52w"),
+        "sector_allocation": dict(sorted(sectors.items(), key=lambda item: -item[1])),
+        "top_holding": {"symbol": top["symbol"], "weight": top["weight"]},
+        "herfindahl_index": herfindahl,
+        "effective_holdings": 1 / herfindahl if herfindahl else 0.0,
+        "data_coverage": sum(row["weight"] for row in rows if row["has_data"]),
+    }
+
+
+def _format(value: Any, pattern: str = "{:.2f}") -> str:
+    return "N/A" if value is None else pattern.format(value)
+
+
+def _aggregates_text(aggregates: Dict[str, Any]) -> str:
+    sectors = ", ".join(f"{sector} {weight:.1%}" for sector, weight in aggregates["sector_allocation"].items())
+    return "\n".join([
+        f"- Holdings: {aggregates['holdings']} (effective holdings {aggregates['effective_holdings']:.1f}, Herfindahl index {aggregates['herfindahl_index']:.3f})",
+        f"- Largest holding: {aggregates['top_holding']['symbol']} {aggregates['top_holding']['weight']:.1%}",
+        f"- Weighted day change: {_format(aggregates['weighted_day_change_pct'], '{:.2f}%')}",
+        f"- Weighted beta: {_format(aggregates['weighted_beta'])}",
+        f"- Portfolio P/E (weighted earnings yield): {_format(aggregates['weighted_pe'], '{:.1f}')}",
+        f"- Weighted market cap: {_format(aggregates['weighted_market_cap'], '${:,.0f}')}",
+        f"- Weighted position in the 52-week range: {_format(aggregates['weighted_range_position_52w'], '{:.0%}')}",
+        f"- Sector allocation: {sectors}",
+        f"- Market data coverage: {aggregates['data_coverage']:.0%} of the portfolio weight",
+    ])
+
+
+def _holdings_table(rows: List[Dict[str, Any]]) -> str:
+    lines = [
+        "| Symbol | Name | Weight | Sector | Price | Day % | Beta | P/E |",
+        "|--------|------|--------|--------|-------|-------|------|-----|",
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['symbol']} | {row['name']} | {row['weight']:.1%} | {row['sector']} | {_format(row['price'])} "
+            f"| {_format(row['day_change_pct'])} | {_format(row['beta'])} | {_format(row['pe'], '{:.1f}')} |"
+        )
+    return "\n".join(lines)
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Per-holding analysis ___________________________________ #
+# __________________________________________________________________________________________ #
+def _agent_graphs() -> Dict[str, Any]:
+    # Imported lazily: the agent modules build their executors and LLM clients
+    from FinSage.agents.financial import financial_metrics_agent_async
+    from FinSage.agents.market import market_intelligence_agent_async
+    from FinSage.agents.sentiment import news_sentiment_agent_async
+    return {
+        "FinancialMetricsAgent": financial_metrics_agent_async,
+        "NewsSentimentAgent": news_sentiment_agent_async,
+        "MarketIntelligenceAgent": market_intelligence_agent_async,
+    }
+
+
+def _holding_state(holding: PortfolioHolding, agent_name: str, count: int, personality, current_date) -> Dict[str, Any]:
+    question = f"Analyze {holding.symbol} as a holding of {holding.weight:.1%} in a portfolio of {count} stocks."
+    state = build_initial_state(question, NullCallbackHandler(), personality=personality, current_date=current_date)
+    state["current_task"] = {
+        "description": f"Assess {holding.symbol} from the {agent_name} perspective for a portfolio review: {question}",
+        "expected_output": f"A concise, data-backed assessment of {holding.symbol}: key figures, risks and outlook",
+        "validation_criteria": [],
+        "query_type": "financial_analysis",
+    }
+    return state
+
+
+async def _analyze_holding(graph, agent_name: str, state: Dict[str, Any], semaphore: asyncio.Semaphore) -> str:
+    async with semaphore:
+        try:
+            output = await graph.ainvoke(state)
+        except Exception as e:
+            logger.error("Portfolio analysis of %s by %s failed: %s", state['user_input'], agent_name, e)
+            return f"{DEADLINE_EXCEEDED_MARKER}: the {agent_name} analysis failed ({type(e).__name__})."
+    result = (output.get("agent_results") or {}).get(AGENT_MESSAGE_NAMES[agent_name], {})
+    return result.get("output") or f"{DEADLINE_EXCEEDED_MARKER}: the {agent_name} analysis returned no answer."
+
+
+def _analyses_text(analyses: Dict[str, Dict[str, str]]) -> str:
+    sections = []
+    for symbol, answers in analyses.items():
+        sections.append(f"### {symbol}")
+        for agent_name, answer in answers.items():
+            sections.append(f"- {AGENT_MESSAGE_NAMES[agent_name]}: {summarize_text(answer, PORTFOLIO_SECTION_TOKEN_BUDGET)}")
+    return "\n".join(sections)
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Entry points ___________________________________________ #
+# __________________________________________________________________________________________ #
+async def aanalyze_portfolio(
+    holdings: HoldingsInput,
+    question: Optional[str] = None,
+    personality: Optional[AgentPersonality] = None,
+    callback: Any = None,
+    current_date: Optional[datetime] = None,
+    agents: List[str] = PORTFOLIO_AGENTS,
+    max_concurrency: int = PORTFOLIO_MAX_CONCURRENCY,
+) -> Dict[str, Any]:
+    """
+    Review a portfolio: returns the normalized holdings, their market data rows,
+    the portfolio aggregates, the agent answers per holding and the synthesis.
+    """
+    holdings = normalize_holdings(holdings)
+    personality = personality or AgentPersonality()
+    current_date = current_date or datetime.now()
+    callback = callback or NullCallbackHandler()
+    question = question or "Review my portfolio: overall health, risks and rebalancing recommendations."
+    symbols = [holding.symbol for holding in holdings]
+
+    callback.write_agent_name("Portfolio Data 🧺")
+    data = await asyncio.to_thread(fetch_portfolio_data, symbols, agents)
+    rows = holding_rows(holdings, data)
+    aggregates = portfolio_aggregates(rows)
+
+    callback.write_agent_name("Portfolio Holdings Analysis 🧺")
+    graphs = _agent_graphs()
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    runs = [
+        (holding.symbol, agent_name, _analyze_holding(graphs[agent_name], agent_name, _holding_state(holding, agent_name, len(holdings), personality, current_date), semaphore))
+        for holding in holdings for agent_name in agents if agent_name in graphs
+    ]
+    answers = await asyncio.gather(*(run for _, _, run in runs))
+    analyses: Dict[str, Dict[str, str]] = defaultdict(dict)
+    for (symbol, agent_name, _), answer in zip(runs, answers):
+        analyses[symbol][agent_name] = answer
+
+    callback.write_agent_name("Portfolio Synthesis 🧺")
+    synthesis = await get_llm("synthesizer").ainvoke([
+        SystemMessage(content=PORTFOLIO_SYNTHESIS_PROMPT.format(
+            current_date=current_date,
+            question=question,
+            personality=personality.get_prompt_context(),
+            aggregates=_aggregates_text(aggregates),
+            holdings=_holdings_table(rows),
+            analyses=_analyses_text(analyses),
+        )),
+        HumanMessage(content=question),
+    ])
+    callback.on_tool_end(synthesis.content)
+    return {
+        "holdings": [holding.model_dump() for holding in holdings],
+        "rows": rows,
+        "aggregates": aggregates,
+        "analyses": dict(analyses),
+        "synthesis": synthesis.content,
+    }
+
+
+def analyze_portfolio(holdings: HoldingsInput, **kwargs) -> Dict[str, Any]:
+    """Synchronous entry point of aanalyze_portfolio: runs it on a new event loop."""
+
+    async def _main():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_IO_THREADS, thread_name_prefix="finsage-io"))
+        return await aanalyze_portfolio(holdings, **kwargs)
+
+    return asyncio.run(_main())
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="FinSage portfolio review")
+    parser.add_argument("holdings", nargs="+", help="Holdings as SYMBOL:WEIGHT, e.g. AAPL:40 MSFT:35 JNJ:25")
+    parser.add_argument("--question", default=None, help="What to focus the review on")
+    parser.add_argument("--output", default=None, help="Write the full result as JSON to this file")
+    args = parser.parse_args(argv)
+
+    result = analyze_portfolio(parse_holdings(args.holdings), question=args.question)
+    print(result["synthesis"])
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
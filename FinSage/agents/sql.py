@@ -1,3 +1,5 @@
+import asyncio
+import time
 from dotenv import load_dotenv
 
 
@@ -23,19 +25,30 @@ from langgraph.graph.message import AnyMessage, add_messages
 
 
 # local modules
-from FinSage.utils.llm.llm import llm
+from FinSage.utils.llm.llm import llm, get_llm
 from FinSage.models.schemas import *
 from FinSage.utils.callback_tools import CustomConsoleCallbackHandler
+from FinSage.utils.deadline import DEADLINE_EXCEEDED_MARKER, agent_time_budget, ainvoke_within_budget, can_retry, invoke_within_budget
+from FinSage.utils.log import get_logger
+from FinSage.utils.resources import get_sql_database
+from FinSage.utils.sql_cache import get_result_cache, get_schema_cache
+from FinSage.utils.sql_indexes import record_query
+from FinSage.utils.state import agent_update
 from FinSage.prompts.system_prompts import SQL_AGENT_QUERY_PROMPT, SQL_AGENT_ANALYZE_PROMPT
 
 # Load environment variables
 load_dotenv()
 
+logger = get_logger(__name__)
+
 
 # from sql_agent.py (modified):
-db_loc = "stock_db.db"
-db = SQLDatabase.from_uri(f"sqlite:///{db_loc}")
-database_schema = db.get_table_info()
+db = get_sql_database()
+# Schema text, table names and statistics are reflected once and served from memory
+schema_cache = get_schema_cache()
+database_schema = schema_cache.table_info()
+# Rows of the read-only queries, until the database file changes
+result_cache = get_result_cache()
 
 # Create SQL toolkit and tools
 toolkit = SQLDatabaseToolkit(db=db, llm=llm)
@@ -48,6 +61,9 @@ get_schema_tool = next(tool for tool in tools if tool.name == "sql_db_schema")
 # Latest date in the db
 db_latest_date = "2022-09-30" 
 
+# Time the SQL agent may spend without a request deadline share, like the other agents' max_execution_time
+SQL_AGENT_MAX_SECONDS = 120
+
 # ########## HELPER FUNCTIONS ############### #
 def clean_sql_query(query: str) -> str:
     """Remove markdown formatting and clean the SQL query"""
@@ -58,54 +74,109 @@ def clean_sql_query(query: str) -> str:
     return query
 
 
+# ########## TIME BUDGET ############### #
+def _with_budget(state: AgentState) -> AgentState:
+    """
+    Fixes the SQL agent's share of the request budget when it starts: every
+    LLM and query step then runs within what is left of it (see _run_step).
+    """
+    budget_deadline = None
+    if state.get("deadline") is not None:
+        budget_deadline = time.time() + agent_time_budget(state, SQL_AGENT_MAX_SECONDS)
+    return {**state, "sql_agent_internal_state": {**state["sql_agent_internal_state"], "budget_deadline": budget_deadline}}
+
+def _budget_left(state: AgentState) -> float:
+    budget_deadline = state["sql_agent_internal_state"].get("budget_deadline")
+    return SQL_AGENT_MAX_SECONDS if budget_deadline is None else max(0.0, budget_deadline - time.time())
+
+def _run_step(state: AgentState, fn) -> dict:
+    """Runs a blocking step with the agents' timeout wrapper; its result is in "output" unless "deadline_exceeded" """
+    return invoke_within_budget(lambda: {"output": fn()}, _budget_left(state), "SQL", has_deadline=state.get("deadline") is not None)
+
+async def _arun_step(state: AgentState, make_coro) -> dict:
+    """Async variant of _run_step; `make_coro` is only called when the step is not skipped"""
+    async def step():
+        return {"output": await make_coro()}
+    return await ainvoke_within_budget(step(), _budget_left(state), "SQL", has_deadline=state.get("deadline") is not None)
+
+def _deadline_update(state: AgentState, output: dict) -> dict:
+    """The SQL agent's answer when a step was skipped or cancelled to meet the deadline"""
+    return agent_update("SQLAgent", "sql_agent_internal_state", state["sql_agent_internal_state"], output)
+
+def _deadline_stopped(state: AgentState) -> bool:
+    last_message = state["messages"][-1] if state["messages"] else None
+    return isinstance(last_message, AIMessage) and last_message.name == "SQLAgent" and str(last_message.content).startswith(DEADLINE_EXCEEDED_MARKER)
+
+
 # ########## NODES ############### #
+def _analyze_question_messages(state: AgentState) -> list:
+    """Build the table-selection prompt for the question"""
+    question = state["user_input"]
+    
+    # Get task details from supervisor
+    task = state.get("current_task", {})
+    logger.debug("SQL agent task: %s", task)
+    
+    tables = schema_cache.list_tables()
+    schema = schema_cache.table_info()
+    # Include task details in the analysis prompt
+    analysis_prompt = SQL_AGENT_ANALYZE_PROMPT.format(
+        question=question,
+        schema=schema,
+        tables=tables,
+        db_latest_date = db_latest_date,
+        task_description=task.get("description", ""),
+        expected_output=task.get("expected_output", ""),
+        validation_criteria=task.get("validation_criteria", [])
+    )
+    
+    return [
+        SystemMessage(content=analysis_prompt),
+        HumanMessage(content=question)
+    ]
+
+def _internal_update(state: AgentState, **changes) -> dict:
+    """Update of the SQL agent internal state channel"""
+    return {"sql_agent_internal_state": {**state["sql_agent_internal_state"], **changes}}
+
+def _store_analysis(state: AgentState, analysis: AnalyzedQuestion) -> dict:
+    logger.debug("Set date_available to: %s", analysis.date_available)
+    logger.debug("Set relevant tables to: %s", analysis.relevant_tables['tables'])
+
+    return {
+        **_internal_update(state, agent_tools=tools_names, date_available=analysis.date_available, relevant_tables=analysis.relevant_tables),
+        "messages": [AIMessage(content=str(analysis.response))]
+    }
+
 def analyze_question(state: AgentState) -> dict:
     """Analyze the question to determine relevant tables"""
+    state = _with_budget(state)
     try:
-        messages = state["messages"]
-        question = state["user_input"]
-        
-        # Get task details from supervisor
-        task = state.get("current_task", {})
-        print(task)
-        
-        state["sql_agent_internal_state"]["agent_tools"] = tools_names
-        
-        tables = list_tables_tool.invoke("")
-        schema = db.get_table_info()
-        # Include task details in the analysis prompt
-        analysis_prompt = SQL_AGENT_ANALYZE_PROMPT.format(
-            question=question,
-            schema=schema,
-            tables=tables,
-            db_latest_date = db_latest_date,
-            task_description=task.get("description", ""),
-            expected_output=task.get("expected_output", ""),
-            validation_criteria=task.get("validation_criteria", [])
-        )
-        
-    
-        
-        messages = [
-            SystemMessage(content=analysis_prompt),
-            HumanMessage(content=question)
-        ]
-        sllm = llm.with_structured_output(AnalyzedQuestion)
-        analysis = sllm.invoke(messages)
+        messages = _analyze_question_messages(state)
+        sllm = get_llm("sql_analyze").with_structured_output(AnalyzedQuestion)
+        step = _run_step(state, lambda: sllm.invoke(messages))
+        if step.get("deadline_exceeded"):
+            return _deadline_update(state, step)
+        return _store_analysis(state, step["output"])
+    except Exception as e:
+        logger.error("Error in analyze_question: %s", e)
         
-        state['sql_agent_internal_state']['date_available'] = analysis.date_available
-        state['sql_agent_internal_state']['relevant_tables'] = analysis.relevant_tables
-        print("Set date_available to:", state['sql_agent_internal_state']['date_available'])
-        print('Set state[\'relevant_tables\'][\'tables\'] to: ' , state['sql_agent_internal_state']['relevant_tables']['tables'], ' type: ', type(state['sql_agent_internal_state']['relevant_tables']['tables']))
+        return {"messages": [AIMessage(content=f"Error in analysis: {str(e)}")]}
 
-        state['messages'] = state["messages"] + [AIMessage(content=str(analysis.response))]
-        
-        return state
+async def aanalyze_question(state: AgentState) -> dict:
+    """Async variant of analyze_question"""
+    state = _with_budget(state)
+    try:
+        messages = await asyncio.to_thread(_analyze_question_messages, state)
+        sllm = get_llm("sql_analyze").with_structured_output(AnalyzedQuestion)
+        step = await _arun_step(state, lambda: sllm.ainvoke(messages))
+        if step.get("deadline_exceeded"):
+            return _deadline_update(state, step)
+        return _store_analysis(state, step["output"])
     except Exception as e:
-        print(f"Error in analyze_question: {str(e)}")
+        logger.error("Error in analyze_question: %s", e)
         
-        state['messages'] = state["messages"] + [AIMessage(content=f"Error in analysis: {str(e)}")]
-        return state
+        return {"messages": [AIMessage(content=f"Error in analysis: {str(e)}")]}
 
 def get_schemas(state: AgentState) -> dict:
     """Get schemas for relevant tables"""
@@ -115,150 +186,250 @@ def get_schemas(state: AgentState) -> dict:
         schemas = []
         for table in tables:
             table = table.strip()
-            schema = get_schema_tool.invoke(table)
+            schema = schema_cache.table_schema(table)
             schemas.append(schema)
         
         return {
-            "messages": state["messages"] + [AIMessage(content="\n".join(schemas))]
+            "messages": [AIMessage(content="\n".join(schemas))]
         }
     except Exception as e:
-        print(f"Error in get_schemas: {str(e)}")
+        logger.error("Error in get_schemas: %s", e)
         return {
-            "messages": state["messages"] + [AIMessage(content=f"Error getting schemas: {str(e)}")]
+            "messages": [AIMessage(content=f"Error getting schemas: {str(e)}")]
         }
 
+async def aget_schemas(state: AgentState) -> dict:
+    """Async variant of get_schemas (schema reflection runs in a worker thread)"""
+    return await asyncio.to_thread(get_schemas, state)
+
+def _generate_query_messages(state: AgentState) -> list:
+    question = state["user_input"]   # state["messages"][0].content
+    schemas = state["messages"][-1].content
+    
+    return [
+        SystemMessage(content=SQL_AGENT_QUERY_PROMPT.format(schema=schemas)),
+        HumanMessage(content=question)
+    ]
+
 def generate_query(state: AgentState) -> dict:
     """Generate SQL query based on schemas and question"""
     try:
-        question = state["user_input"]   # state["messages"][0].content
-        schemas = state["messages"][-1].content
-        
-        messages = [
-            SystemMessage(content=SQL_AGENT_QUERY_PROMPT.format(schema=schemas)),
-            HumanMessage(content=question)
-        ]
-        
-        query = llm.invoke(messages)
+        step = _run_step(state, lambda: get_llm("sql_generate").invoke(_generate_query_messages(state)))
+        if step.get("deadline_exceeded"):
+            return _deadline_update(state, step)
         # Clean the query before returning
-        cleaned_query = clean_sql_query(query.content)
+        cleaned_query = clean_sql_query(step["output"].content)
+        
+        return {
+            "messages": [AIMessage(content=cleaned_query)]
+        }
+    except Exception as e:
+        logger.error("Error in generate_query: %s", e)
+        return {
+            "messages": [AIMessage(content=f"Error generating query: {str(e)}")]
+        }
+
+async def agenerate_query(state: AgentState) -> dict:
+    """Async variant of generate_query"""
+    try:
+        step = await _arun_step(state, lambda: get_llm("sql_generate").ainvoke(_generate_query_messages(state)))
+        if step.get("deadline_exceeded"):
+            return _deadline_update(state, step)
+        cleaned_query = clean_sql_query(step["output"].content)
         
         return {
-            "messages": state["messages"] + [AIMessage(content=cleaned_query)]
+            "messages": [AIMessage(content=cleaned_query)]
         }
     except Exception as e:
-        print(f"Error in generate_query: {str(e)}")
+        logger.error("Error in generate_query: %s", e)
         return {
-            "messages": state["messages"] + [AIMessage(content=f"Error generating query: {str(e)}")]
+            "messages": [AIMessage(content=f"Error generating query: {str(e)}")]
         }
 
+def _validate_query_messages(query: str) -> list:
+    schema = schema_cache.table_info()
+    
+    return [
+        SystemMessage(content="""Validate this SQL query and return ONLY the corrected query with NO additional text or explanation:
+        {query}
+
+        Schema:
+        {schema}
+
+        Check for:
+        - Proper table joins
+        - Correct column names
+        - Appropriate WHERE clauses
+        - Proper data type handling
+        - SQL injection prevention
+        - DO NOT modify any ticker symbols in WHERE clauses""".format(query=query, schema=schema)), HumanMessage(content=query)
+    ]
+
+def _validated_query_update(state: AgentState, query: str, validated) -> dict:
+    # Clean the validated query before returning
+    cleaned_query = clean_sql_query(validated.content)
+    
+    # Verify the ticker hasn't been changed
+    if "WHERE" in query and "WHERE" in cleaned_query:
+        original_ticker = query.split("WHERE")[1].strip().split("=")[1].strip()
+        validated_ticker = cleaned_query.split("WHERE")[1].strip().split("=")[1].strip()
+        if original_ticker != validated_ticker:
+            return {
+                "messages": [AIMessage(content=query)]  # Return original query
+            }
+    
+    return {
+        "messages": [AIMessage(content=cleaned_query)]
+    }
+
 def validate_query(state: AgentState) -> dict:
     """Validate and potentially correct the SQL query"""
     try:
         query =  state["messages"][-1].content
-        schema = db.get_table_info()
-        
-        messages = [
-            SystemMessage(content="""Validate this SQL query and return ONLY the corrected query with NO additional text or explanation:
-            {query}
-
-            Schema:
-            {schema}
-
-            Check for:
-            - Proper table joins
-            - Correct column names
-            - Appropriate WHERE clauses
-            - Proper data type handling
-            - SQL injection prevention
-            - DO NOT modify any ticker symbols in WHERE clauses""".format(query=query, schema=schema)), HumanMessage(content=query)
-        ]
-        
-        validated = llm.invoke(messages)
-        # Clean the validated query before returning
-        cleaned_query = clean_sql_query(validated.content)
-        
-        # Verify the ticker hasn't been changed
-        if "WHERE" in query and "WHERE" in cleaned_query:
-            original_ticker = query.split("WHERE")[1].strip().split("=")[1].strip()
-            validated_ticker = cleaned_query.split("WHERE")[1].strip().split("=")[1].strip()
-            if original_ticker != validated_ticker:
-                return {
-                    "messages": state["messages"] + [AIMessage(content=query)]  # Return original query
-                }
-        
+        step = _run_step(state, lambda: get_llm("sql_validate").invoke(_validate_query_messages(query)))
+        if step.get("deadline_exceeded"):
+            return _deadline_update(state, step)
+        return _validated_query_update(state, query, step["output"])
+    except Exception as e:
+        logger.error("Error in validate_query: %s", e)
         return {
-            "messages": state["messages"] + [AIMessage(content=cleaned_query)]
+            "messages": [AIMessage(content=f"Error validating query: {str(e)}")]
         }
+
+async def avalidate_query(state: AgentState) -> dict:
+    """Async variant of validate_query"""
+    try:
+        query =  state["messages"][-1].content
+        messages = await asyncio.to_thread(_validate_query_messages, query)
+        step = await _arun_step(state, lambda: get_llm("sql_validate").ainvoke(messages))
+        if step.get("deadline_exceeded"):
+            return _deadline_update(state, step)
+        return _validated_query_update(state, query, step["output"])
     except Exception as e:
-        print(f"Error in validate_query: {str(e)}")
+        logger.error("Error in validate_query: %s", e)
         return {
-            "messages": state["messages"] + [AIMessage(content=f"Error validating query: {str(e)}")]
+            "messages": [AIMessage(content=f"Error validating query: {str(e)}")]
         }
 
 def execute_query(state: AgentState) -> dict:
     """Execute the SQL query"""
+    clean_query = None
     try:
         query = state["messages"][-1].content
         # Make sure the query is clean before execution
         clean_query = clean_sql_query(query)
-        result = db.run(clean_query)
+        started = time.perf_counter()
+        # The cache status is per thread: read it on the thread that ran the query
+        step = _run_step(state, lambda: (result_cache.execute(clean_query), result_cache.last_status()))
+        if step.get("deadline_exceeded"):
+            return _deadline_update(state, step)
+        result, cache_status = step["output"]
+        # Workload of the index advisor (python -m FinSage.utils.sql_indexes)
+        record_query(clean_query, time.perf_counter() - started, cache_status)
+        logger.debug("SQL query result cache: %s", cache_status)
         return {
-            "messages": state["messages"] + [AIMessage(content=str(result))]
+            "messages": [AIMessage(content=result_cache.to_text(result))]
         }
     except Exception as e:
-        print(f"Error in execute_query: {str(e)}")
+        logger.error("Error in execute_query: %s", e)
         
         # Add to state the details about the wrong query 
-        state["sql_agent_internal_state"]["wrong_generated_queries"].append({"Wrong query": clean_query, "Error message": f"Error executing query: {str(e)}"})
-        state["messages"] = state["messages"] + [AIMessage(content=f"Error executing query: {str(e)}")]
-        return state
+        wrong_query = {"Wrong query": clean_query, "Error message": f"Error executing query: {str(e)}"}
+        return {
+            **_internal_update(state, wrong_generated_queries=state["sql_agent_internal_state"]["wrong_generated_queries"] + [wrong_query]),
+            "messages": [AIMessage(content=f"Error executing query: {str(e)}")]
+        }
+
+async def aexecute_query(state: AgentState) -> dict:
+    """Async variant of execute_query (the SQLite call runs in a worker thread)"""
+    return await asyncio.to_thread(execute_query, state)
+
+def _format_results_messages(state: AgentState):
+    """Returns (raw result, prompt messages) for formatting the query results"""
+    # Find the SQL query from previous messages
+    sql_query = None
+    for message in state["messages"]:
+        if isinstance(message, AIMessage) and "SELECT" in message.content:
+            sql_query = message.content
+            break
+    
+    result = state["messages"][-1].content
+    logger.debug("SQL query result: %s", result)
+    messages = [
+        SystemMessage(content="""Format these SQL results into a clear, readable response.
+        Include both the SQL query used and the results in your response.
+        Format as:
+        SQL Query:
+        <query>
+        
+        Results:
+        <formatted results>"""),
+        HumanMessage(content=f"Query: {sql_query}\nResults: {result}")
+    ]
+    return result, messages
+
+def _wrong_formatted_result(state: AgentState, content: str, error: str) -> dict:
+    wrong_result = {"Formatted content": content, "Error message": error}
+    return _internal_update(state, wrong_formatted_results=state["sql_agent_internal_state"]["wrong_formatted_results"] + [wrong_result])
+
+def _formatted_update(content: str) -> dict:
+    """The formatted answer is the SQL agent's result for the synthesizer"""
+    return {
+        "messages": [AIMessage(content=content, name="SQLAgent")],
+        "agent_results": {"SQLAgent": {"output": content, "completed_at": time.time()}}
+    }
 
 def format_results(state: AgentState) -> dict:
     """Format the query results into a readable response"""
-    print(" INSIDE FORMAT RESULTS")
+    logger.debug("Formatting the SQL query results")
+    formatted = None
     try:
-        # Find the SQL query from previous messages
-        sql_query = None
-        for message in state["messages"]:
-            if isinstance(message, AIMessage) and "SELECT" in message.content:
-                sql_query = message.content
-                break
-        
-        result = state["messages"][-1].content
-        print("THIS IS THE RESULT: ", result)
+        result, messages = _format_results_messages(state)
         if result.startswith("Error:"):
-            state["sql_agent_internal_state"]["wrong_formatted_results"].append({"Formatted content": result, "Error message": result})
-            return state
+            return _wrong_formatted_result(state, result, result)
             
             #return state # {"messages": state["messages"]}
-        ##################
-        messages = [
-            SystemMessage(content="""Format these SQL results into a clear, readable response.
-            Include both the SQL query used and the results in your response.
-            Format as:
-            SQL Query:
-            <query>
-            
-            Results:
-            <formatted results>"""),
-            HumanMessage(content=f"Query: {sql_query}\nResults: {result}")
-        ]
         
-        formatted = llm.invoke(messages)
-        state["messages"] = state["messages"] + [AIMessage(content=formatted.content)]
-        return state
+        step = _run_step(state, lambda: get_llm("sql_format").invoke(messages))
+        if step.get("deadline_exceeded"):
+            return _deadline_update(state, step)
+        formatted = step["output"]
+        return _formatted_update(formatted.content)
     except Exception as e:
-        print(f"Error in format_results: {str(e)}")
-        state["sql_agent_internal_state"]["wrong_formatted_results"].append({"Formatted content": formatted.content, "Error message": f"Error in format_results: {str(e)}"})
-        state["messages"] = state["messages"] + [AIMessage(content=f"Error formatting results: {str(e)}")]
-        return state
+        logger.error("Error in format_results: %s", e)
+        return {
+            **_wrong_formatted_result(state, formatted.content if formatted else "", f"Error in format_results: {str(e)}"),
+            "messages": [AIMessage(content=f"Error formatting results: {str(e)}")]
+        }
+
+async def aformat_results(state: AgentState) -> dict:
+    """Async variant of format_results"""
+    formatted = None
+    try:
+        result, messages = _format_results_messages(state)
+        if result.startswith("Error:"):
+            return _wrong_formatted_result(state, result, result)
+        
+        step = await _arun_step(state, lambda: get_llm("sql_format").ainvoke(messages))
+        if step.get("deadline_exceeded"):
+            return _deadline_update(state, step)
+        formatted = step["output"]
+        return _formatted_update(formatted.content)
+    except Exception as e:
+        logger.error("Error in format_results: %s", e)
+        return {
+            **_wrong_formatted_result(state, formatted.content if formatted else "", f"Error in format_results: {str(e)}"),
+            "messages": [AIMessage(content=f"Error formatting results: {str(e)}")]
+        }
 
 # ########## CONDITIONAL EDGES ############### #
 def check_date_availability_and_tables(state: AgentState) -> Literal["get_schemas", "end"]:
     """ Check whether the date enter by the user if after the latest date available in the Database"""
-    print("DATE AVAILABILITY: ", state["sql_agent_internal_state"]["date_available"])
-    print(" RELEVANT TABLES FOUND : ", state['sql_agent_internal_state']['relevant_tables']['tables'])
+    logger.debug("Date availability: %s", state["sql_agent_internal_state"]["date_available"])
+    logger.debug("Relevant tables found: %s", state['sql_agent_internal_state']['relevant_tables']['tables'])
 
+    if _deadline_stopped(state):
+        return "end"
     date_unavailable = state["sql_agent_internal_state"]["date_available"].lower() == "false"
     no_relevant_tables = len(state['sql_agent_internal_state']['relevant_tables']['tables']) == 0
     
@@ -271,39 +442,51 @@ def should_continue(state: AgentState) -> Literal["retry_schema", "end"]:
     last_message = state["messages"][-1]
     content = last_message.content if isinstance(last_message, AIMessage) else ""
     
-    if "Error: no such table" in content and len(state["sql_agent_internal_state"]["wrong_formatted_results"]) < 3:
+    if "Error: no such table" in content and len(state["sql_agent_internal_state"]["wrong_formatted_results"]) < 3 and can_retry(state):
         return "retry_schema"
   
     return "end"
 
-def generate_again(state: AgentState) -> Literal["generate_again" , "format_results"]:
+def generate_again(state: AgentState) -> Literal["generate_again" , "format_results", "end"]:
     """Decide whether to generate the query again (generte_again), or go to format_results (format_results)"""
+    if _deadline_stopped(state):
+        return "end"
     last_message = state["messages"][-1]
     content = last_message.content if isinstance(last_message, AIMessage) else ""
-    if "Error" in content and len(state["sql_agent_internal_state"]["wrong_generated_queries"]) < 3:
+    if "Error" in content and len(state["sql_agent_internal_state"]["wrong_generated_queries"]) < 3 and can_retry(state):
         return "generate_again"
     else: 
         return "format_results"
 
 # ########## COMPILE GRAPH ############### #
 
-def define_graph():
+def unless_deadline_stopped(next_node: str):
+    """Edge to `next_node`, or to the end once a step stopped the agent to meet the deadline"""
+    def route(state: AgentState) -> str:
+        return "end" if _deadline_stopped(state) else next_node
+    return route
+
+def define_graph(use_async: bool = False):
+    """
+    Builds the SQL agent workflow. With use_async=True the graph uses the async
+    node implementations and must be run with ainvoke/astream.
+    """
     # Create and configure the workflow
-    workflow = StateGraph(AgentState)
+    workflow = StateGraph(AgentState, output_schema=SQLAgentOutput)
 
     # Add nodes
-    workflow.add_node("analyze_question", analyze_question)
-    workflow.add_node("get_schemas", get_schemas)
-    workflow.add_node("generate_query", generate_query)
-    workflow.add_node("validate_query", validate_query)
-    workflow.add_node("execute_query", execute_query)
-    workflow.add_node("format_results", format_results)
+    workflow.add_node("analyze_question", aanalyze_question if use_async else analyze_question)
+    workflow.add_node("get_schemas", aget_schemas if use_async else get_schemas)
+    workflow.add_node("generate_query", agenerate_query if use_async else generate_query)
+    workflow.add_node("validate_query", avalidate_query if use_async else validate_query)
+    workflow.add_node("execute_query", aexecute_query if use_async else execute_query)
+    workflow.add_node("format_results", aformat_results if use_async else format_results)
 
     # Add edges
     workflow.add_edge(START, "analyze_question")
     workflow.add_edge("get_schemas", "generate_query")
-    workflow.add_edge("generate_query", "validate_query")
-    workflow.add_edge("validate_query", "execute_query")
+    workflow.add_conditional_edges("generate_query", unless_deadline_stopped("validate_query"), {"validate_query": "validate_query", "end": END})
+    workflow.add_conditional_edges("validate_query", unless_deadline_stopped("execute_query"), {"execute_query": "execute_query", "end": END})
 
     # Add conditional edges
     workflow.add_conditional_edges("analyze_question" , check_date_availability_and_tables, {
@@ -316,7 +499,8 @@ def define_graph():
         generate_again,
         {
             "format_results" : "format_results",
-            "generate_again" : "generate_query"
+            "generate_again" : "generate_query",
+            "end": END
         }
 
     )
@@ -333,6 +517,7 @@ def define_graph():
     return workflow.compile()
 
 sql_agent = define_graph()
+sql_agent_async = define_graph(use_async=True)
 
 def __main__():
     """
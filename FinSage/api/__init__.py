@@ -0,0 +1,5 @@
+"""
+Headless HTTP API of FinSage, for programmatic access without Streamlit.
+
+Run with `python -m FinSage.api --help`.
+"""
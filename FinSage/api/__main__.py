@@ -0,0 +1,3 @@
+from FinSage.api.server import main
+
+main()
@@ -0,0 +1,321 @@
+"""
+Headless HTTP API for FinSage.
+
+Serves the async FinSage graph without the Streamlit rerun model:
+
+    POST /analyze          run an analysis and return its answer
+                           ({"wait": false} returns the run id right away, 202)
+    POST /analyze/stream   same, streamed as server-sent events: status, agent,
+                           tool_start, tool_end, tool_error, then result or error
+    GET  /runs/{id}        status, timings and answer of a run
+    GET  /health           running and queued analyses, shared resources, caches and
+                           admission queues
+
+At most API_MAX_CONCURRENT_RUNS analyses run at once on the event loop and
+API_MAX_QUEUED_RUNS more wait for a slot; beyond that requests get a 503.
+Blocking tool calls run on a thread pool of ASYNC_BLOCKING_IO_THREADS. API keys
+and knobs come from the environment or from FINSAGE_CONFIG_FILE:
+
+    FINSAGE_CONFIG_FILE=finsage.toml python -m FinSage.api --port 8080
+
+Runs are kept in process memory, so serve with a single worker process.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import uvicorn
+from pydantic import ValidationError
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from FinSage.config.runtime import (
+    API_EVENT_PREVIEW_CHARS,
+    API_HOST,
+    API_MAX_CONCURRENT_RUNS,
+    API_MAX_QUEUED_RUNS,
+    API_MAX_STORED_RUNS,
+    API_PORT,
+    ASYNC_BLOCKING_IO_THREADS,
+)
+from FinSage.models.schemas import AnalyzeRequest
+from FinSage.utils.admission import AdmissionRejected, admission_stats
+from FinSage.utils.async_runner import arun_analysis
+from FinSage.utils.callback_tools import EventCallbackHandler
+from FinSage.utils.log import get_logger
+from FinSage.utils.resources import resource_health, warm_up
+from FinSage.utils.response_cache import get_final_answer
+from FinSage.utils.state import build_initial_state
+
+logger = get_logger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when API_MAX_QUEUED_RUNS analyses already wait for a slot"""
+
+
+class Run:
+    """One analysis: status, timings, answer and the events streamed to clients"""
+
+    def __init__(self, request: AnalyzeRequest):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.output: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.rejected = False  # Refused by the per-user admission limits
+        self.events: List[Dict[str, Any]] = []
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        """Record an event and wake the clients following the run (event loop thread only)"""
+        self.events.append({"event": event, "data": data})
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self) -> AsyncIterator[Dict[str, Any]]:
+        """Every event of the run, past and future, until it is done"""
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+    async def wait(self):
+        async for _ in self.follow():
+            pass
+
+    def to_dict(self) -> Dict[str, Any]:
+        usage = self.output.get("usage") or {}
+        return {
+            "id": self.id,
+            "status": self.status,
+            "question": self.request.question,
+            "session_id": self.request.session_id,
+            "created_at": self.created_at,
+            "queue_seconds": round((self.started_at or time.time()) - self.created_at, 3),
+            "run_seconds": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+            "answer": get_final_answer(self.output) if self.status == "succeeded" else None,
+            "cache_hit": self.output.get("cache_hit"),
+            "usage": {key: usage[key] for key in ("llm_calls", "prompt_tokens", "completion_tokens", "cost_usd") if key in usage},
+            "error": self.error,
+        }
+
+
+class RunRegistry:
+    """Runs by id, dropping the oldest finished runs beyond `max_runs`"""
+
+    def __init__(self, max_runs: int = API_MAX_STORED_RUNS):
+        self.max_runs = max_runs
+        self._runs: "OrderedDict[str, Run]" = OrderedDict()
+
+    def add(self, run: Run):
+        self._runs[run.id] = run
+        for run_id in [run_id for run_id, stored in self._runs.items() if stored.done][: max(0, len(self._runs) - self.max_runs)]:
+            del self._runs[run_id]
+
+    def get(self, run_id: str) -> Optional[Run]:
+        return self._runs.get(run_id)
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+
+class AnalysisService:
+    """Runs analyses on the async FinSage graph, at most `max_concurrent` at once"""
+
+    def __init__(self, max_concurrent: int = API_MAX_CONCURRENT_RUNS, max_queued: int = API_MAX_QUEUED_RUNS, max_stored: int = API_MAX_STORED_RUNS, graph=None):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.graph = graph
+        self.registry = RunRegistry(max_stored)
+        self.stats = {"submitted": 0, "rejected": 0, "running": 0, "queued": 0, "succeeded": 0, "failed": 0}
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._tasks = set()
+
+    def submit(self, request: AnalyzeRequest) -> Run:
+        if self.stats["queued"] >= self.max_queued:
+            self.stats["rejected"] += 1
+            raise QueueFullError(f"{self.stats['queued']} analyses are already waiting")
+        run = Run(request)
+        self.registry.add(run)
+        self.stats["submitted"] += 1
+        self.stats["queued"] += 1
+        run.publish("status", {"id": run.id, "status": run.status})
+        task = asyncio.create_task(self._execute(run))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return run
+
+    def _state(self, run: Run) -> Dict[str, Any]:
+        request = run.request
+        loop = asyncio.get_running_loop()
+        # Tool events can come from the executor threads; runs are only touched on the loop
+        callback = EventCallbackHandler(lambda event, data: loop.call_soon_threadsafe(run.publish, event, data), API_EVENT_PREVIEW_CHARS)
+        return build_initial_state(
+            request.question,
+            callback,
+            personality=request.personality,
+            messages=request.history_messages(),
+            # Runs without a session must not share a checkpoint thread
+            session_id=request.session_id or run.id,
+            user_id=request.user_id,
+        )
+
+    async def _execute(self, run: Run):
+        async with self._slots:
+            self.stats["queued"] -= 1
+            self.stats["running"] += 1
+            run.status, run.started_at = "running", time.time()
+            run.publish("status", {"id": run.id, "status": run.status})
+            status = "failed"
+            try:
+                run.output = await arun_analysis(self._state(run), graph=self.graph)
+                status = "succeeded"
+            except AdmissionRejected as e:
+                logger.warning("Analysis %s rejected: %s", run.id, e)
+                run.error, run.rejected = f"{type(e).__name__}: {str(e)}", True
+            except Exception as e:
+                logger.error("Analysis %s failed: %s", run.id, e)
+                run.error = f"{type(e).__name__}: {str(e)}"
+            finally:
+                self.stats["running"] -= 1
+                run.finished_at = time.time()
+        # Queued behind the events the tool threads already scheduled, so the result comes last
+        asyncio.get_running_loop().call_soon(self._finish, run, status)
+
+    def _finish(self, run: Run, status: str):
+        run.status = status
+        self.stats[status] += 1
+        run.publish("result" if status == "succeeded" else "error", run.to_dict())
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ HTTP endpoints _________________________________________ #
+# __________________________________________________________________________________________ #
+async def _analyze_request(request: Request) -> AnalyzeRequest:
+    try:
+        body = AnalyzeRequest.model_validate(await request.json())
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON body: {str(e)}")
+    if body.user_id is None:
+        # The per-user limits apply to the X-User-Id header, else to the client address
+        body.user_id = request.headers.get("x-user-id") or (request.client.host if request.client else None)
+    return body
+
+
+def _submit(service: AnalysisService, body: AnalyzeRequest):
+    try:
+        return service.submit(body), None
+    except QueueFullError as e:
+        return None, JSONResponse({"error": f"Too many analyses in progress, retry later ({str(e)})"}, status_code=503, headers={"Retry-After": "5"})
+
+
+def _sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+def create_app(service: Optional[AnalysisService] = None) -> Starlette:
+    """The ASGI application; one AnalysisService per event loop"""
+    holder: Dict[str, AnalysisService] = {}
+
+    @asynccontextmanager
+    async def lifespan(app):
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_IO_THREADS, thread_name_prefix="finsage-io"))
+        holder["service"] = service or AnalysisService()
+        if holder["service"].graph is None:
+            # Built at startup rather than by the first request
+            holder["service"].graph = warm_up()["async"]
+        yield
+
+    async def analyze(request: Request):
+        try:
+            body = await _analyze_request(request)
+        except (ValueError, ValidationError) as e:
+            return JSONResponse({"error": str(e)}, status_code=422)
+        run, rejected = _submit(holder["service"], body)
+        if rejected:
+            return rejected
+        if not body.wait:
+            return JSONResponse(run.to_dict(), status_code=202, headers={"Location": f"/runs/{run.id}"})
+        await run.wait()
+        status_code = 200 if run.status == "succeeded" else 429 if run.rejected else 500
+        return JSONResponse(run.to_dict(), status_code=status_code)
+
+    async def analyze_stream(request: Request):
+        try:
+            body = await _analyze_request(request)
+        except (ValueError, ValidationError) as e:
+            return JSONResponse({"error": str(e)}, status_code=422)
+        run, rejected = _submit(holder["service"], body)
+        if rejected:
+            return rejected
+
+        async def events():
+            async for event in run.follow():
+                yield _sse(event)
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def get_run(request: Request):
+        run = holder["service"].registry.get(request.path_params["run_id"])
+        if run is None:
+            return JSONResponse({"error": "run not found"}, status_code=404)
+        return JSONResponse(run.to_dict())
+
+    async def health(request: Request):
+        service = holder["service"]
+        resources = await asyncio.to_thread(resource_health)
+        return JSONResponse({
+            "status": "ok" if all(check.get("ok", True) for check in resources.values()) else "degraded",
+            "max_concurrent": service.max_concurrent,
+            "max_queued": service.max_queued,
+            "stored_runs": len(service.registry),
+            **service.stats,
+            "resources": resources,
+            "admission": admission_stats(),
+        })
+
+    return Starlette(
+        routes=[
+            Route("/analyze", analyze, methods=["POST"]),
+            Route("/analyze/stream", analyze_stream, methods=["POST"]),
+            Route("/runs/{run_id}", get_run, methods=["GET"]),
+            Route("/health", health, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="FinSage HTTP API")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args(argv)
+
+    print(f"Serving FinSage on http://{args.host}:{args.port} ({API_MAX_CONCURRENT_RUNS} concurrent analyses)")
+    uvicorn.run(create_app(), host=args.host, port=args.port, workers=1)
+
+
+if __name__ == "__main__":
+    main()
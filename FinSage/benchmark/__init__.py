@@ -0,0 +1,6 @@
+"""
+End-to-end benchmarks of the FinSage graph.
+
+Run with `python -m FinSage.benchmark --help`. Combine with LLM_BACKEND=fake
+and TOOL_BACKEND=fixtures to measure orchestration overhead offline.
+"""
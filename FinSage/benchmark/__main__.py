@@ -0,0 +1,5 @@
+import sys
+
+from FinSage.benchmark.runner import main
+
+sys.exit(main())
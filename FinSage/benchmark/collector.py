@@ -0,0 +1,137 @@
+"""
+Callback handler collecting per-node benchmark metrics of one graph run.
+
+LangGraph tags every run inside a node with `langgraph_node` and
+`langgraph_checkpoint_ns` metadata. The handler uses them to attribute node
+wall time, LLM calls and tokens to a node path such as
+"FinancialMetricsAgent/EvaluateTopicAdherence". The agent executors are
+invoked with the state callback instead of the graph callbacks, so the same
+handler must be installed both in the graph config and as `state["callback"]`.
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from FinSage.tools.providers import tool_provider
+from FinSage.utils.callback_tools import node_path, token_usage
+
+
+def _new_node_stats() -> Dict[str, Any]:
+    return {"runs": 0, "wall_seconds": 0.0, "llm_calls": 0, "llm_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "errors": 0}
+
+
+class BenchmarkCallbackHandler(BaseCallbackHandler):
+    """Thread-safe collector of node timings, LLM usage and tool calls."""
+
+    def __init__(self):
+        super().__init__()
+        self.current_agent_name = None
+        self.nodes: Dict[str, Dict[str, Any]] = defaultdict(_new_node_stats)
+        self.providers: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "errors": 0})
+        self.tools: Dict[str, int] = defaultdict(int)
+        self._open: Dict[UUID, Any] = {}
+        self._lock = threading.Lock()
+
+    # FinSage nodes call this on the state callback
+    def write_agent_name(self, name: str):
+        self.current_agent_name = name
+
+    # ---------------------------------------------------------------- graph nodes
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, metadata=None, name=None, **kwargs):
+        metadata = metadata or {}
+        node = metadata.get("langgraph_node")
+        if node and name == node:
+            with self._lock:
+                self._open[run_id] = ("node", node_path(metadata), time.perf_counter())
+
+    def _close_node(self, run_id: UUID, error: bool):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+            if not opened or opened[0] != "node":
+                return
+            stats = self.nodes[opened[1]]
+            stats["runs"] += 1
+            stats["wall_seconds"] += time.perf_counter() - opened[2]
+            stats["errors"] += int(error)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        self._close_node(run_id, error=False)
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs):
+        self._close_node(run_id, error=True)
+
+    # ---------------------------------------------------------------- LLM calls
+    def _open_llm(self, run_id: UUID, metadata):
+        with self._lock:
+            self._open[run_id] = ("llm", node_path(metadata), time.perf_counter())
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata=None, **kwargs):
+        self._open_llm(run_id, metadata)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs):
+        self._open_llm(run_id, metadata)
+
+    def _close_llm(self, run_id: UUID, response: Any = None):
+        usage = token_usage(response) if response is not None else {"prompt_tokens": 0, "completion_tokens": 0}
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+            if not opened or opened[0] != "llm":
+                return
+            stats = self.nodes[opened[1]]
+            stats["llm_calls"] += 1
+            stats["llm_seconds"] += time.perf_counter() - opened[2]
+            stats["prompt_tokens"] += usage["prompt_tokens"]
+            stats["completion_tokens"] += usage["completion_tokens"]
+            stats["errors"] += int(response is None)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        self._close_llm(run_id, response)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        self._close_llm(run_id)
+
+    # ---------------------------------------------------------------- tool calls
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, name=None, **kwargs):
+        tool_name = name or (serialized or {}).get("name", "unknown")
+        with self._lock:
+            self._open[run_id] = ("tool", tool_name, time.perf_counter())
+            self.tools[tool_name] += 1
+
+    def _close_tool(self, run_id: UUID, error: bool):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+            if not opened or opened[0] != "tool":
+                return
+            stats = self.providers[tool_provider(opened[1])]
+            stats["calls"] += 1
+            stats["seconds"] += time.perf_counter() - opened[2]
+            stats["errors"] += int(error)
+
+    def on_tool_end(self, output, *, run_id: UUID = None, **kwargs):
+        # FinSage nodes also call on_tool_end(text) to display results; those carry no run id
+        if run_id is not None:
+            self._close_tool(run_id, error=False)
+
+    def on_tool_error(self, error, *, run_id: UUID = None, **kwargs):
+        if run_id is not None:
+            self._close_tool(run_id, error=True)
+
+    # ---------------------------------------------------------------- results
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            nodes = {path: dict(stats) for path, stats in self.nodes.items()}
+            providers = {name: dict(stats) for name, stats in self.providers.items()}
+            tools = dict(self.tools)
+        return {
+            "nodes": nodes,
+            "providers": providers,
+            "tools": tools,
+            "llm_calls": sum(s["llm_calls"] for s in nodes.values()),
+            "prompt_tokens": sum(s["prompt_tokens"] for s in nodes.values()),
+            "completion_tokens": sum(s["completion_tokens"] for s in nodes.values()),
+            "tool_calls": sum(tools.values()),
+        }
@@ -0,0 +1,244 @@
+"""
+Benchmark runner: runs a query corpus through the FinSage graph and reports
+wall time, per-node latency, LLM calls and tokens, tool calls per provider,
+evaluator retries and peak RSS. Reports are written as JSON (full detail) and
+CSV (one row per query and node) and can be compared against a baseline.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from FinSage.benchmark.collector import BenchmarkCallbackHandler
+from FinSage.config.runtime import EVALUATION_MODE, LLM_BACKEND, SPECULATION_MODE, TOOL_BACKEND
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "queries.json")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+AGENT_INTERNAL_STATES = [
+    "financial_metrics_agent_internal_state",
+    "market_intelligence_agent_internal_state",
+    "news_sentiment_agent_internal_state",
+]
+
+# Summary metrics compared against the baseline (lower is better for all of them)
+COMPARED_METRICS = ["wall_seconds_mean", "wall_seconds_p50", "wall_seconds_p95", "llm_calls_mean", "tokens_mean", "tool_calls_mean", "retries_mean", "peak_rss_mb"]
+
+
+def load_corpus(path: str = DEFAULT_CORPUS, categories: Optional[List[str]] = None) -> List[Dict[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        corpus = json.load(f)
+    return [q for q in corpus if not categories or q["category"] in categories]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def evaluator_retries(output: Dict[str, Any]) -> Dict[str, int]:
+    """Agent re-runs triggered by the evaluators, and SQL regenerations, from the final state."""
+    retries = {}
+    for key in AGENT_INTERNAL_STATES:
+        runs = len(output.get(key, {}).get("all_tools_eval", {}).get("passed", []))
+        retries[key.replace("_internal_state", "")] = max(0, runs - 1)
+    sql_state = output.get("sql_agent_internal_state", {})
+    retries["sql_agent"] = len(sql_state.get("wrong_generated_queries", [])) + len(sql_state.get("wrong_formatted_results", []))
+    return retries
+
+
+def run_query(graph, query: Dict[str, str], recursion_limit: int = 30) -> Dict[str, Any]:
+    """Run one corpus query and collect its metrics."""
+    from FinSage.utils.checkpoint import checkpointed_invoke
+    from FinSage.utils.state import build_initial_state
+
+    collector = BenchmarkCallbackHandler()
+    state = build_initial_state(query["query"], collector)
+    config = {"recursion_limit": recursion_limit, "callbacks": [collector]}
+
+    error, output = None, {}
+    started = time.perf_counter()
+    try:
+        output = checkpointed_invoke(graph, state, config)
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+    wall_seconds = time.perf_counter() - started
+
+    collected = collector.snapshot()
+    retries = evaluator_retries(output) if output else {}
+    return {
+        **query,
+        "wall_seconds": round(wall_seconds, 4),
+        "next_step": output.get("next_step") if output else None,
+        "error": error,
+        "retries": retries,
+        "total_retries": sum(retries.values()),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        **collected,
+    }
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in results if not r["error"]]
+    walls = [r["wall_seconds"] for r in ok]
+
+    def mean(key):
+        return round(statistics.mean(r[key] for r in ok), 4) if ok else 0.0
+
+    per_category = {}
+    for category in sorted({r["category"] for r in results}):
+        category_walls = [r["wall_seconds"] for r in ok if r["category"] == category]
+        per_category[category] = {
+            "queries": len(category_walls),
+            "wall_seconds_mean": round(statistics.mean(category_walls), 4) if category_walls else 0.0,
+        }
+
+    node_totals: Dict[str, Dict[str, float]] = {}
+    for r in ok:
+        for path, stats in r["nodes"].items():
+            totals = node_totals.setdefault(path, {"wall_seconds": 0.0, "llm_calls": 0, "tokens": 0})
+            totals["wall_seconds"] += stats["wall_seconds"]
+            totals["llm_calls"] += stats["llm_calls"]
+            totals["tokens"] += stats["prompt_tokens"] + stats["completion_tokens"]
+
+    return {
+        "queries": len(results),
+        "errors": len(results) - len(ok),
+        "wall_seconds_mean": round(statistics.mean(walls), 4) if walls else 0.0,
+        "wall_seconds_p50": round(_percentile(walls, 50), 4),
+        "wall_seconds_p95": round(_percentile(walls, 95), 4),
+        "llm_calls_mean": mean("llm_calls"),
+        "tokens_mean": round(statistics.mean(r["prompt_tokens"] + r["completion_tokens"] for r in ok), 1) if ok else 0.0,
+        "tool_calls_mean": mean("tool_calls"),
+        "retries_mean": mean("total_retries"),
+        "peak_rss_mb": max((r["peak_rss_mb"] for r in results), default=0.0),
+        "per_category": per_category,
+        "nodes": dict(sorted(node_totals.items(), key=lambda item: -item[1]["wall_seconds"])),
+    }
+
+
+def run_benchmark(queries: List[Dict[str, str]], repeat: int = 1, graph=None) -> Dict[str, Any]:
+    """Run every query `repeat` times, sequentially, and build the report."""
+    if graph is None:
+        from FinSage.agents.finsage import FinSage_agent as graph
+
+    results = []
+    for iteration in range(repeat):
+        for query in queries:
+            print(f"[{iteration + 1}/{repeat}] {query['id']}: {query['query']}")
+            result = run_query(graph, query)
+            result["iteration"] = iteration
+            print(f"    {result['wall_seconds']:.2f}s, {result['llm_calls']} LLM calls, {result['tool_calls']} tool calls{', ERROR ' + result['error'] if result['error'] else ''}")
+            results.append(result)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "llm_backend": LLM_BACKEND,
+            "tool_backend": TOOL_BACKEND,
+            "evaluation_mode": EVALUATION_MODE,
+            "speculation_mode": SPECULATION_MODE,
+            "repeat": repeat,
+        },
+        "summary": summarize(results),
+        "results": results,
+    }
+
+
+def write_report(report: Dict[str, Any], output_prefix: str):
+    """Write <prefix>.json (full report) and <prefix>.csv (one row per query and node)."""
+    with open(f"{output_prefix}.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+
+    fields = ["iteration", "id", "category", "node", "wall_seconds", "llm_calls", "prompt_tokens", "completion_tokens", "tool_calls", "retries", "peak_rss_mb", "error"]
+    with open(f"{output_prefix}.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for r in report["results"]:
+            base = {"iteration": r["iteration"], "id": r["id"], "category": r["category"]}
+            writer.writerow({
+                **base, "node": "__total__", "wall_seconds": r["wall_seconds"], "llm_calls": r["llm_calls"],
+                "prompt_tokens": r["prompt_tokens"], "completion_tokens": r["completion_tokens"],
+                "tool_calls": r["tool_calls"], "retries": r["total_retries"], "peak_rss_mb": r["peak_rss_mb"], "error": r["error"] or "",
+            })
+            for path, stats in r["nodes"].items():
+                writer.writerow({
+                    **base, "node": path, "wall_seconds": round(stats["wall_seconds"], 4), "llm_calls": stats["llm_calls"],
+                    "prompt_tokens": stats["prompt_tokens"], "completion_tokens": stats["completion_tokens"],
+                })
+
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.10) -> Dict[str, Any]:
+    """
+    Relative change of every compared summary metric against the baseline.
+    A metric regresses when it grows by more than `threshold` (10% by default).
+    """
+    current, previous = report["summary"], baseline["summary"]
+    metrics, regressions = {}, []
+    for name in COMPARED_METRICS:
+        before, after = previous.get(name), current.get(name)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        metrics[name] = {"baseline": before, "current": after, "change": round(change, 4)}
+        if change > threshold:
+            regressions.append(name)
+    return {"threshold": threshold, "metrics": metrics, "regressions": regressions}
+
+
+def print_comparison(comparison: Dict[str, Any]):
+    print(f"\n{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, values in comparison["metrics"].items():
+        flag = "  REGRESSION" if name in comparison["regressions"] else ""
+        print(f"{name:<22}{values['baseline']:>12}{values['current']:>12}{values['change'] * 100:>9.1f}%{flag}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the FinSage graph over a query corpus")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON list of {id, category, query}")
+    parser.add_argument("--category", action="append", help="Only run this category (repeatable)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per query")
+    parser.add_argument("--output", default="finsage_benchmark", help="Report path prefix (.json and .csv are added)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline report to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this report as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative growth counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(load_corpus(args.corpus, args.category), repeat=args.repeat)
+
+    comparison = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            comparison = compare_to_baseline(report, json.load(f), args.threshold)
+        report["comparison"] = comparison
+        print_comparison(comparison)
+
+    write_report(report, args.output)
+    print(f"\nReport written to {args.output}.json and {args.output}.csv")
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Baseline saved to {args.baseline}")
+
+    if comparison and comparison["regressions"] and args.fail_on_regression:
+        return 1
+    return 0
@@ -0,0 +1,428 @@
+"""
+Runtime (non-secret) configuration for FinSage.
+
+API keys live in `FinSage.config.settings`. This module holds the tunable knobs
+of the orchestration layer (caching, evaluation, execution limits, ...). Every
+value can be overridden through an environment variable of the same name, or
+in the TOML/JSON/.env file named by FINSAGE_CONFIG_FILE (which may also hold
+the API keys).
+"""
+import json
+import os
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def load_config_file(path: str) -> dict:
+    """Top-level scalar settings of a TOML, JSON or .env (KEY=value lines) file"""
+    if path.endswith(".toml"):
+        import tomllib
+        with open(path, "rb") as f:
+            values = tomllib.load(f)
+    elif path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            values = json.load(f)
+    else:
+        from dotenv import dotenv_values
+        values = dotenv_values(path)
+    return {key: str(value) for key, value in values.items() if value is not None and not isinstance(value, (dict, list))}
+
+
+def apply_config_file(path: str):
+    """Export the settings of a config file to the environment; variables already set win"""
+    for key, value in load_config_file(path).items():
+        os.environ.setdefault(key, value)
+
+
+# Secrets and knobs can also come from a file, for deployments without Streamlit secrets
+if os.getenv("FINSAGE_CONFIG_FILE"):
+    apply_config_file(os.environ["FINSAGE_CONFIG_FILE"])
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Response Cache _________________________________________ #
+# __________________________________________________________________________________________ #
+RESPONSE_CACHE_ENABLED = _env_bool("RESPONSE_CACHE_ENABLED", True)
+# Minimum cosine similarity between two questions sharing the same cache key
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = _env_float("RESPONSE_CACHE_SIMILARITY_THRESHOLD", 0.72)
+# Maximum number of cached answers kept in memory
+RESPONSE_CACHE_MAX_ENTRIES = _env_int("RESPONSE_CACHE_MAX_ENTRIES", 512)
+# Freshness window (seconds) per intent. Live market data goes stale quickly,
+# statements change quarterly and the SQL database is a static snapshot.
+RESPONSE_CACHE_TTL = {
+    "investment_decision": _env_int("RESPONSE_CACHE_TTL_DECISION", 15 * 60),
+    "technical": _env_int("RESPONSE_CACHE_TTL_TECHNICAL", 15 * 60),
+    "sentiment": _env_int("RESPONSE_CACHE_TTL_SENTIMENT", 30 * 60),
+    "comparison": _env_int("RESPONSE_CACHE_TTL_COMPARISON", 30 * 60),
+    "fundamentals": _env_int("RESPONSE_CACHE_TTL_FUNDAMENTALS", 6 * 60 * 60),
+    "historical": _env_int("RESPONSE_CACHE_TTL_HISTORICAL", 7 * 24 * 60 * 60),
+    "general": _env_int("RESPONSE_CACHE_TTL_GENERAL", 30 * 60),
+}
+# Drop the cached answers about a symbol as soon as a data tool returns new data for it
+RESPONSE_CACHE_INVALIDATE_ON_REFRESH = _env_bool("RESPONSE_CACHE_INVALIDATE_ON_REFRESH", True)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Async Execution ________________________________________ #
+# __________________________________________________________________________________________ #
+# Maximum number of graph runs driven concurrently by one event loop
+ASYNC_MAX_CONCURRENT_RUNS = _env_int("ASYNC_MAX_CONCURRENT_RUNS", 32)
+# Worker threads used by the event loop for blocking work (sync HTTP tools, SQLite)
+ASYNC_BLOCKING_IO_THREADS = _env_int("ASYNC_BLOCKING_IO_THREADS", 64)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Tool Result Cache ______________________________________ #
+# __________________________________________________________________________________________ #
+TOOL_CACHE_ENABLED = _env_bool("TOOL_CACHE_ENABLED", True)
+TOOL_CACHE_DEFAULT_TTL = _env_int("TOOL_CACHE_DEFAULT_TTL", 5 * 60)
+# Cached tool results kept at most; the least recently used ones are dropped beyond it
+TOOL_CACHE_MAX_ENTRIES = _env_int("TOOL_CACHE_MAX_ENTRIES", 5000)
+# Freshness window (seconds) per tool
+TOOL_CACHE_TTL = {
+    "get_stock_price": 60,
+    "get_stock_aggregates": 5 * 60,
+    "get_company_financials": 60 * 60,
+    "get_income_statement": 6 * 60 * 60,
+    "get_balance_sheet": 6 * 60 * 60,
+    "get_cash_flow": 6 * 60 * 60,
+    "get_earnings_history": 6 * 60 * 60,
+    "get_insider_transactions": 60 * 60,
+    "get_news_sentiment": 15 * 60,
+    "company_news": 15 * 60,
+    "industry_news": 15 * 60,
+    "polygon_ticker_news": 15 * 60,
+}
+
+# __________________________________________________________________________________________ #
+# _________________________________ Speculative Execution __________________________________ #
+# __________________________________________________________________________________________ #
+# "off": disabled
+# "prefetch": warm the tool cache for the agents the supervisor is likely to pick
+# "full": run the likely agents end-to-end while the supervisor deliberates
+SPECULATION_MODE = os.getenv("SPECULATION_MODE", "off")
+SPECULATION_MAX_WORKERS = _env_int("SPECULATION_MAX_WORKERS", 8)
+# Speculative work not claimed within this many seconds is discarded
+SPECULATION_RUN_TTL = _env_int("SPECULATION_RUN_TTL", 10 * 60)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Request Deadline _______________________________________ #
+# __________________________________________________________________________________________ #
+# End-to-end latency budget of one analysis (seconds). 0 disables the deadline.
+REQUEST_DEADLINE_SECONDS = _env_float("REQUEST_DEADLINE_SECONDS", 180)
+# Time always kept for the final synthesis
+DEADLINE_SYNTHESIS_RESERVE_SECONDS = _env_float("DEADLINE_SYNTHESIS_RESERVE_SECONDS", 40)
+# Evaluation retries are only attempted when at least this much budget is left
+DEADLINE_RETRY_MIN_SECONDS = _env_float("DEADLINE_RETRY_MIN_SECONDS", 60)
+# Agents are not started with less than this much time
+DEADLINE_MIN_AGENT_SECONDS = _env_float("DEADLINE_MIN_AGENT_SECONDS", 15)
+# Timed-out sync agent calls still running in the process (they hold their LLM and provider slots);
+# beyond this many, new agents are skipped rather than started behind them
+DEADLINE_MAX_ABANDONED_CALLS = _env_int("DEADLINE_MAX_ABANDONED_CALLS", 16)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Agent Evaluation _______________________________________ #
+# __________________________________________________________________________________________ #
+# "inline": tool-usage and topic-adherence evaluation run inside the agent subgraphs
+#           and a failed evaluation re-runs the agent (original behaviour)
+# "sampled": a fraction of the runs is evaluated by a background worker, off the request path
+# "off": no evaluation
+EVALUATION_MODE = os.getenv("EVALUATION_MODE", "inline")
+# Fraction of agent runs evaluated in "sampled" mode
+EVALUATION_SAMPLE_RATE = _env_float("EVALUATION_SAMPLE_RATE", 0.1)
+# JSONL file the background evaluator appends its results to
+EVALUATION_RESULTS_PATH = os.getenv("EVALUATION_RESULTS_PATH", "evaluation_results.jsonl")
+# Runs waiting for the background evaluator; new runs are dropped when the queue is full
+EVALUATION_QUEUE_SIZE = _env_int("EVALUATION_QUEUE_SIZE", 1000)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Topic Adherence Pre-check ______________________________ #
+# __________________________________________________________________________________________ #
+# Score answers locally first; the LLM judge only runs when the score is ambiguous
+TOPIC_ADHERENCE_PRECHECK_ENABLED = _env_bool("TOPIC_ADHERENCE_PRECHECK_ENABLED", True)
+# At or above: passed without the LLM judge
+TOPIC_ADHERENCE_PASS_SCORE = _env_float("TOPIC_ADHERENCE_PASS_SCORE", 0.7)
+# At or below: failed without the LLM judge
+TOPIC_ADHERENCE_FAIL_SCORE = _env_float("TOPIC_ADHERENCE_FAIL_SCORE", 0.3)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Model Routing __________________________________________ #
+# __________________________________________________________________________________________ #
+_SMALL_MODEL = {"model": os.getenv("SMALL_MODEL", "gpt-4o-mini"), "temperature": 0.2, "max_tokens": None}
+_LARGE_MODEL = {"model": os.getenv("LARGE_MODEL", "gpt-4o"), "temperature": 0.3, "max_tokens": None}
+
+# Graph node -> model, temperature and max output tokens
+MODEL_ROUTING = {
+    "default": dict(_SMALL_MODEL),
+    "supervisor": dict(_SMALL_MODEL),
+    "financial_metrics_agent": dict(_SMALL_MODEL),
+    "market_intelligence_agent": dict(_SMALL_MODEL),
+    "news_sentiment_agent": dict(_SMALL_MODEL),
+    "financial_metrics_evaluator": dict(_SMALL_MODEL),
+    "market_intelligence_evaluator": dict(_SMALL_MODEL),
+    "news_sentiment_evaluator": dict(_SMALL_MODEL),
+    "sql_analyze": dict(_SMALL_MODEL),
+    "sql_generate": dict(_SMALL_MODEL),
+    "sql_validate": dict(_SMALL_MODEL),
+    "sql_format": dict(_SMALL_MODEL),
+    "synthesizer": dict(_LARGE_MODEL),
+    "synthesizer_small": dict(_SMALL_MODEL, temperature=0.3),
+    "finish": dict(_SMALL_MODEL),
+    "context_summarizer": dict(_SMALL_MODEL, temperature=0.0, max_tokens=300),
+}
+# Optional JSON file overriding entries of MODEL_ROUTING, e.g.
+# {"sql_generate": {"model": "gpt-4o", "temperature": 0}, "finish": {"max_tokens": 300}}
+MODEL_ROUTING_FILE = os.getenv("MODEL_ROUTING_FILE")
+if MODEL_ROUTING_FILE:
+    with open(MODEL_ROUTING_FILE, encoding="utf-8") as _f:
+        for _node, _overrides in json.load(_f).items():
+            MODEL_ROUTING[_node] = {**MODEL_ROUTING.get(_node, MODEL_ROUTING["default"]), **_overrides}
+
+# Synthesizer cascade: answer with "synthesizer_small" and escalate to "synthesizer"
+# only when the query looks complex or the small model's answer looks weak
+SYNTHESIS_CASCADE_ENABLED = _env_bool("SYNTHESIS_CASCADE_ENABLED", False)
+# Complexity score (0-1) at or above which the large model is used directly
+SYNTHESIS_CASCADE_COMPLEXITY_THRESHOLD = _env_float("SYNTHESIS_CASCADE_COMPLEXITY_THRESHOLD", 0.6)
+# Confidence score (0-1) of the small model's answer below which it is escalated
+SYNTHESIS_CASCADE_CONFIDENCE_THRESHOLD = _env_float("SYNTHESIS_CASCADE_CONFIDENCE_THRESHOLD", 0.6)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Offline Backends _______________________________________ #
+# __________________________________________________________________________________________ #
+# "openai": real models as routed by MODEL_ROUTING
+# "fake": deterministic scripted models (see FinSage/utils/llm/fake.py), no network
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+# Simulated fake-model latency: base + per output token, with deterministic jitter
+FAKE_LLM_LATENCY_MS = _env_float("FAKE_LLM_LATENCY_MS", 300)
+FAKE_LLM_LATENCY_JITTER_MS = _env_float("FAKE_LLM_LATENCY_JITTER_MS", 100)
+FAKE_LLM_MS_PER_OUTPUT_TOKEN = _env_float("FAKE_LLM_MS_PER_OUTPUT_TOKEN", 0)
+# Multiplier applied to the estimated (chars / 4) token counts
+FAKE_LLM_TOKEN_SCALE = _env_float("FAKE_LLM_TOKEN_SCALE", 1.0)
+# Optional JSON file of scripted responses per node: {"synthesizer": ["...", "..."], "supervisor": [{...}]}
+FAKE_LLM_SCRIPT_FILE = os.getenv("FAKE_LLM_SCRIPT_FILE")
+FAKE_LLM_SEED = _env_int("FAKE_LLM_SEED", 0)
+
+# "live": tools call the data providers
+# "fixtures": tools answer from recorded/synthetic fixtures (see FinSage/tools/fixtures.py)
+TOOL_BACKEND = os.getenv("TOOL_BACKEND", "live")
+# Optional directory of recorded responses, one <tool_name>.json file per tool mapping symbol -> response
+TOOL_FIXTURES_DIR = os.getenv("TOOL_FIXTURES_DIR")
+# Simulated provider latency of a fixture response
+TOOL_FIXTURE_LATENCY_MS = _env_float("TOOL_FIXTURE_LATENCY_MS", 150)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Tracing ________________________________________________ #
+# __________________________________________________________________________________________ #
+TRACING_ENABLED = _env_bool("TRACING_ENABLED", False)
+# Local JSONL span export ("" disables it)
+TRACING_JSONL_PATH = os.getenv("TRACING_JSONL_PATH", "finsage_traces.jsonl")
+# OTLP/HTTP traces endpoint, e.g. http://localhost:4318/v1/traces (unset disables it)
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "finsage")
+
+# __________________________________________________________________________________________ #
+# _________________________________ Usage Accounting _______________________________________ #
+# __________________________________________________________________________________________ #
+USAGE_ACCOUNTING_ENABLED = _env_bool("USAGE_ACCOUNTING_ENABLED", True)
+# USD per 1M tokens: prompt ("input"), cached prompt ("cached_input") and completion ("output").
+# Models match on the longest prefix, so dated snapshots (gpt-4o-2024-08-06) share a price.
+MODEL_PRICING = {
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gemini-2.0-flash": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+    "fake": {"input": 0.0, "cached_input": 0.0, "output": 0.0},
+}
+# Optional JSON file overriding or adding prices, e.g. {"gpt-4.1": {"input": 2.0, "cached_input": 0.5, "output": 8.0}}
+MODEL_PRICING_FILE = os.getenv("MODEL_PRICING_FILE")
+if MODEL_PRICING_FILE:
+    with open(MODEL_PRICING_FILE, encoding="utf-8") as _f:
+        MODEL_PRICING.update(json.load(_f))
+# Number of most expensive prompts (by prompt tokens) kept for inspection
+USAGE_TOP_PROMPTS = _env_int("USAGE_TOP_PROMPTS", 20)
+# Maximum sessions with per-session totals kept in memory (least recently active dropped first)
+USAGE_MAX_SESSIONS = _env_int("USAGE_MAX_SESSIONS", 10000)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Conversation Context ___________________________________ #
+# __________________________________________________________________________________________ #
+# Nodes receive a token-budgeted slice of the conversation instead of every message
+CONTEXT_MANAGER_ENABLED = _env_bool("CONTEXT_MANAGER_ENABLED", True)
+# Budget (estimated tokens) of the recent prior turns kept verbatim; older turns are summarized
+CONTEXT_HISTORY_TOKEN_BUDGET = _env_int("CONTEXT_HISTORY_TOKEN_BUDGET", 1500)
+# Budget of the running summary of older turns
+CONTEXT_SUMMARY_TOKEN_BUDGET = _env_int("CONTEXT_SUMMARY_TOKEN_BUDGET", 400)
+# Budget of the status summary of each agent output shown to the supervisor
+CONTEXT_STATUS_TOKEN_BUDGET = _env_int("CONTEXT_STATUS_TOKEN_BUDGET", 120)
+# "extractive": leading sentences of each message, no LLM call
+# "llm": older turns are summarized by the "context_summarizer" model (cached per turn)
+CONTEXT_SUMMARY_MODE = os.getenv("CONTEXT_SUMMARY_MODE", "extractive")
+
+# __________________________________________________________________________________________ #
+# _________________________________ Artifact Store _________________________________________ #
+# __________________________________________________________________________________________ #
+# Large intermediate results (agent executor outputs with every tool observation) are kept
+# out of the graph state and referenced by id. Oldest artifacts are evicted beyond this count.
+ARTIFACT_STORE_MAX_ENTRIES = _env_int("ARTIFACT_STORE_MAX_ENTRIES", 2000)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Checkpointing __________________________________________ #
+# __________________________________________________________________________________________ #
+# The graph state is persisted after every completed node, per chat session (LangGraph thread),
+# so a failed or interrupted run resumes from its last completed node.
+# "sqlite" (local file), "memory" (this process only), "off", or "package.module:factory" for a
+# shared store: a callable returning a LangGraph checkpoint saver (e.g. a Postgres saver).
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite")
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "finsage_checkpoints.sqlite")
+# An unfinished run is resumed when the same question is asked again within this many seconds
+CHECKPOINT_RESUME_MAX_AGE = _env_int("CHECKPOINT_RESUME_MAX_AGE", 30 * 60)
+# Keep the checkpoints of completed runs (only unfinished runs are needed to resume)
+CHECKPOINT_KEEP_COMPLETED = _env_bool("CHECKPOINT_KEEP_COMPLETED", False)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Portfolio Analysis _____________________________________ #
+# __________________________________________________________________________________________ #
+# Specialist agents run for every holding
+PORTFOLIO_AGENTS = [a.strip() for a in os.getenv("PORTFOLIO_AGENTS", "FinancialMetricsAgent,MarketIntelligenceAgent,NewsSentimentAgent").split(",") if a.strip()]
+# Agent runs (holding x agent) in flight at once
+PORTFOLIO_MAX_CONCURRENCY = _env_int("PORTFOLIO_MAX_CONCURRENCY", 6)
+# Threads fetching the per-symbol tool data before the agents start
+PORTFOLIO_FETCH_WORKERS = _env_int("PORTFOLIO_FETCH_WORKERS", 16)
+# Freshness window of the data fetched up front, so the holdings analyzed last still find it cached
+PORTFOLIO_SNAPSHOT_TTL = _env_int("PORTFOLIO_SNAPSHOT_TTL", 15 * 60)
+PORTFOLIO_MAX_HOLDINGS = _env_int("PORTFOLIO_MAX_HOLDINGS", 50)
+# Budget (estimated tokens) of each agent answer per holding in the synthesis prompt
+PORTFOLIO_SECTION_TOKEN_BUDGET = _env_int("PORTFOLIO_SECTION_TOKEN_BUDGET", 250)
+
+# __________________________________________________________________________________________ #
+# _________________________________ HTTP API _______________________________________________ #
+# __________________________________________________________________________________________ #
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = _env_int("API_PORT", 8080)
+# Analyses running at once; further requests wait for a free slot
+API_MAX_CONCURRENT_RUNS = _env_int("API_MAX_CONCURRENT_RUNS", 8)
+# Runs waiting for a slot before new requests are rejected with 503
+API_MAX_QUEUED_RUNS = _env_int("API_MAX_QUEUED_RUNS", 64)
+# Finished runs kept for GET /runs/{id} (the oldest are dropped first)
+API_MAX_STORED_RUNS = _env_int("API_MAX_STORED_RUNS", 1000)
+# Characters of each tool output included in streamed events
+API_EVENT_PREVIEW_CHARS = _env_int("API_EVENT_PREVIEW_CHARS", 500)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Job Queue ______________________________________________ #
+# __________________________________________________________________________________________ #
+# "sqlite" or "module:factory" returning a FinSage.jobs.job_queue.JobQueue
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "sqlite")
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "finsage_jobs.sqlite")
+# Worker processes started by `python -m FinSage.jobs work`, and jobs run at once by each
+JOB_WORKERS = _env_int("JOB_WORKERS", 2)
+JOB_WORKER_CONCURRENCY = _env_int("JOB_WORKER_CONCURRENCY", 4)
+# A claimed job whose worker stops renewing its lease for this long is handed to another worker
+JOB_VISIBILITY_TIMEOUT = _env_int("JOB_VISIBILITY_TIMEOUT", 5 * 60)
+# Attempts per job (a lost lease counts as an attempt), and the delay before the first retry (doubled after each)
+JOB_MAX_ATTEMPTS = _env_int("JOB_MAX_ATTEMPTS", 3)
+JOB_RETRY_BACKOFF_SECONDS = _env_float("JOB_RETRY_BACKOFF_SECONDS", 10)
+# Seconds between two claims of an idle worker
+JOB_POLL_INTERVAL = _env_float("JOB_POLL_INTERVAL", 1.0)
+# Finished jobs and their events are purged after this many seconds
+JOB_RETENTION_SECONDS = _env_int("JOB_RETENTION_SECONDS", 7 * 24 * 60 * 60)
+# Characters of each tool output stored with the progress events
+JOB_EVENT_PREVIEW_CHARS = _env_int("JOB_EVENT_PREVIEW_CHARS", 500)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Logging ________________________________________________ #
+# __________________________________________________________________________________________ #
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" or "json" (one object per line, with the extra fields of each record)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Log file; empty writes to stderr
+LOG_FILE = os.getenv("LOG_FILE", "")
+# Longer messages (tool outputs, LLM generations, query results) are cut to this many characters
+LOG_MAX_CHARS = _env_int("LOG_MAX_CHARS", 2000)
+# Records waiting for the writer thread; further records are dropped rather than blocking the request
+LOG_QUEUE_SIZE = _env_int("LOG_QUEUE_SIZE", 10000)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Streamlit Rendering ____________________________________ #
+# __________________________________________________________________________________________ #
+# Agent and tool steps are buffered and drawn at most once per interval; 0 draws on every event
+UI_RENDER_INTERVAL = _env_float("UI_RENDER_INTERVAL", 0.5)
+# Characters of a tool output or LLM response shown in the chat; the full text is offered as a download
+UI_PREVIEW_CHARS = _env_int("UI_PREVIEW_CHARS", 1500)
+# Rows of a tabular tool output shown as a dataframe; the full table is offered as a CSV download
+UI_TABLE_PAGE_ROWS = _env_int("UI_TABLE_PAGE_ROWS", 50)
+# Run analyses on a background executor and poll their progress, so the session stays responsive
+UI_BACKGROUND_RUNS = _env_bool("UI_BACKGROUND_RUNS", True)
+# Seconds between two refreshes of the progress of a background run
+UI_POLL_INTERVAL = _env_float("UI_POLL_INTERVAL", 1.0)
+# Background analyses running at once in the process (all sessions); further ones wait
+UI_BACKGROUND_WORKERS = _env_int("UI_BACKGROUND_WORKERS", 8)
+
+# __________________________________________________________________________________________ #
+# _________________________________ Shared Resources _______________________________________ #
+# __________________________________________________________________________________________ #
+# Connections kept open per data provider host by the process-wide HTTP session
+HTTP_POOL_SIZE = _env_int("HTTP_POOL_SIZE", 32)
+# Seconds before a data provider request is abandoned (the tools then fall back to yfinance)
+HTTP_TIMEOUT = _env_float("HTTP_TIMEOUT", 30)
+# SQLite database of the SQL agent, and connections pooled on it
+SQL_DB_PATH = os.getenv("SQL_DB_PATH", "stock_db.db")
+SQL_POOL_SIZE = _env_int("SQL_POOL_SIZE", 5)
+
+# __________________________________________________________________________________________ #
+# _________________________________ SQL Agent Caches _______________________________________ #
+# __________________________________________________________________________________________ #
+# Keep the reflected schema text, table names, row counts and column stats of the SQL database in memory
+SQL_SCHEMA_CACHE_ENABLED = _env_bool("SQL_SCHEMA_CACHE_ENABLED", True)
+# Seconds between two checks of the database file and schema version; a change drops the cached schema and results
+SQL_SCHEMA_CHECK_INTERVAL = _env_float("SQL_SCHEMA_CHECK_INTERVAL", 2.0)
+# Keep the rows of the SQL agent's read-only queries, keyed on their normalized SQL, until the database file changes
+SQL_RESULT_CACHE_ENABLED = _env_bool("SQL_RESULT_CACHE_ENABLED", True)
+# Cached query results (least recently used ones are dropped), and rows beyond which a result is not cached
+SQL_RESULT_CACHE_MAX_ENTRIES = _env_int("SQL_RESULT_CACHE_MAX_ENTRIES", 1000)
+SQL_RESULT_CACHE_MAX_ROWS = _env_int("SQL_RESULT_CACHE_MAX_ROWS", 10000)
+# JSONL file receiving every query run by the SQL agent, the workload of the index advisor; empty (default) disables it
+SQL_WORKLOAD_LOG = os.getenv("SQL_WORKLOAD_LOG", "")
+# Workload queries a filter or join pattern must appear in before `python -m FinSage.utils.sql_indexes` indexes it
+SQL_INDEX_MIN_QUERIES = _env_int("SQL_INDEX_MIN_QUERIES", 2)
+# Columns of a covering index; queries reading more columns get an index on their filter columns only
+SQL_INDEX_MAX_COLUMNS = _env_int("SQL_INDEX_MAX_COLUMNS", 6)
+# Columns indexed (ticker first, then date) in every table having them, whatever the workload
+SQL_INDEX_KEY_COLUMNS = [c.strip() for c in os.getenv("SQL_INDEX_KEY_COLUMNS", "ticker,symbol,date").split(",") if c.strip()]
+
+# __________________________________________________________________________________________ #
+# _________________________________ Admission & Fair Scheduling ____________________________ #
+# __________________________________________________________________________________________ #
+ADMISSION_ENABLED = _env_bool("ADMISSION_ENABLED", True)
+# Analyses running at once in the process, all users together
+ADMISSION_MAX_CONCURRENT_RUNS = _env_int("ADMISSION_MAX_CONCURRENT_RUNS", 16)
+# Analyses of one user running at once, and waiting behind them before the user's requests are rejected
+ADMISSION_PER_USER_INFLIGHT = _env_int("ADMISSION_PER_USER_INFLIGHT", 2)
+ADMISSION_PER_USER_QUEUED = _env_int("ADMISSION_PER_USER_QUEUED", 4)
+# Analyses waiting for a slot, all users together, before new ones are rejected
+ADMISSION_MAX_QUEUED = _env_int("ADMISSION_MAX_QUEUED", 200)
+# Seconds an analysis may wait for a slot before it is rejected
+ADMISSION_QUEUE_TIMEOUT = _env_float("ADMISSION_QUEUE_TIMEOUT", 120)
+# Share of the slots per user when several wait, as a JSON object, e.g. {"research-team": 3}; others weigh 1
+ADMISSION_USER_WEIGHTS = json.loads(os.getenv("ADMISSION_USER_WEIGHTS") or "{}")
+# LLM calls in flight at once in the process (0: unlimited); further calls wait
+LLM_MAX_CONCURRENT_CALLS = _env_int("LLM_MAX_CONCURRENT_CALLS", 24)
+# Data provider calls in flight at once in the process, per provider (0: unlimited), to stay within their quotas
+PROVIDER_MAX_CONCURRENT_CALLS = {
+    "financialmodelingprep": _env_int("PROVIDER_MAX_CONCURRENT_CALLS_FMP", 8),
+    "alphavantage": _env_int("PROVIDER_MAX_CONCURRENT_CALLS_ALPHAVANTAGE", 2),
+    "eventregistry": _env_int("PROVIDER_MAX_CONCURRENT_CALLS_EVENTREGISTRY", 4),
+    "polygon": _env_int("PROVIDER_MAX_CONCURRENT_CALLS_POLYGON", 4),
+}
@@ -43,44 +43,77 @@
 
 ##------###
 # """
-# For Deployment on Streamlit Cloud St.secrets are used.
+# For Deployment on Streamlit Cloud St.secrets are used. Headless deployments
+# (python -m FinSage.api) read the same keys from the environment or from the
+# file named by FINSAGE_CONFIG_FILE (see FinSage.config.runtime).
 # """
 ##-----##
 
 import os
-import streamlit as st
+
+# Importing runtime applies FINSAGE_CONFIG_FILE to the environment
+from FinSage.config.runtime import TOOL_BACKEND
+
+try:
+    import streamlit as st
+except ImportError:
+    st = None
+
+
+def _secret(name: str, default=None):
+    """A secret from the environment, else from Streamlit secrets when running under Streamlit"""
+    value = os.getenv(name)
+    if value:
+        return value
+    if st is not None:
+        try:
+            return st.secrets[name]
+        except Exception:
+            # No secrets.toml (headless run) or key missing from it
+            pass
+    return default
 
 
-# Streamlit Secrets Configuration
 # OpenAI Configuration
-OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
+OPENAI_API_KEY = _secret("OPENAI_API_KEY")
 
 # LangChain Configuration 
 LANGCHAIN_TRACING_V2 = "true"
 LANGCHAIN_ENDPOINT = "https://api.smith.langchain.com"
 LANGCHAIN_PROJECT = "Fin-agent_Streamlit"
-LANGCHAIN_API_KEY = st.secrets["LANGCHAIN_API_KEY"]
+LANGCHAIN_API_KEY = _secret("LANGCHAIN_API_KEY")
 
 # Financial Modeling Prep Configuration
-FINANCIAL_MODELING_PREP_API_KEY = st.secrets["FINANCIAL_MODELING_PREP_API_KEY"]
-if FINANCIAL_MODELING_PREP_API_KEY is None:
-    raise ValueError("FINANCIAL_MODELING_PREP_API_KEY not found in secrets")
+FINANCIAL_MODELING_PREP_API_KEY = _secret("FINANCIAL_MODELING_PREP_API_KEY")
+# Only the live tool backend calls the providers; offline runs (TOOL_BACKEND=fixtures) need no key
+if FINANCIAL_MODELING_PREP_API_KEY is None and TOOL_BACKEND == "live":
+    raise ValueError("FINANCIAL_MODELING_PREP_API_KEY not found in the environment, FINSAGE_CONFIG_FILE or secrets")
 
 # Polygon Configuration
-POLYGON_API_KEY = st.secrets["POLYGON_API_KEY"]
+POLYGON_API_KEY = _secret("POLYGON_API_KEY")
 
 # News API Configuration
-news_client_id = st.secrets["news_client_id"]
-apha_api_key = st.secrets["apha_api_key"]
+news_client_id = _secret("news_client_id")
+apha_api_key = _secret("apha_api_key")
 
 # Set environment variables
 def setup_environment():
-    os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
-    os.environ["LANGCHAIN_TRACING_V2"] = LANGCHAIN_TRACING_V2
-    os.environ["LANGCHAIN_ENDPOINT"] = LANGCHAIN_ENDPOINT 
-    os.environ["LANGCHAIN_PROJECT"] = LANGCHAIN_PROJECT
-    os.environ["LANGCHAIN_API_KEY"] = LANGCHAIN_API_KEY
-    os.environ["FINANCIAL_MODELING_PREP_API_KEY"] = FINANCIAL_MODELING_PREP_API_KEY
-    os.environ["POLYGON_API_KEY"] = POLYGON_API_KEY
-    os.environ["news_client_id"] = news_client_id
-    os.environ["apha_api_key"] = apha_api_key
\ No newline at end of file
+    values = {
+        "OPENAI_API_KEY": OPENAI_API_KEY,
+        "LANGCHAIN_TRACING_V2": LANGCHAIN_TRACING_V2,
+        "LANGCHAIN_ENDPOINT": LANGCHAIN_ENDPOINT,
+        "LANGCHAIN_PROJECT": LANGCHAIN_PROJECT,
+        "LANGCHAIN_API_KEY": LANGCHAIN_API_KEY,
+        "FINANCIAL_MODELING_PREP_API_KEY": FINANCIAL_MODELING_PREP_API_KEY,
+        "POLYGON_API_KEY": POLYGON_API_KEY,
+        "news_client_id": news_client_id,
+        "apha_api_key": apha_api_key,
+    }
+    if LANGCHAIN_API_KEY is None:
+        # No LangSmith key (offline or headless run): leave tracing off
+        for name in ("LANGCHAIN_TRACING_V2", "LANGCHAIN_ENDPOINT", "LANGCHAIN_PROJECT"):
+            values.pop(name)
+    for name, value in values.items():
+        # Optional keys missing from a headless configuration stay unset
+        if value is not None:
+            os.environ[name] = value
@@ -0,0 +1,5 @@
+"""
+Durable job queue for long-running analyses, executed by worker processes.
+
+Run with `python -m FinSage.jobs --help`.
+"""
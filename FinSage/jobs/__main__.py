@@ -0,0 +1,5 @@
+import sys
+
+from FinSage.jobs.worker import main
+
+sys.exit(main())
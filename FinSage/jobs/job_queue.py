@@ -0,0 +1,284 @@
+"""
+Durable queue of analysis jobs.
+
+A job is an AnalyzeRequest payload with a priority. Workers claim the highest
+priority job that is due, which leases it for a visibility timeout; a worker
+renews the lease while the job runs, and a job whose lease expires (its worker
+died or hung) becomes claimable again. Failed attempts are retried with an
+exponential backoff until max_attempts, then the job fails for good. Progress
+events and the result are stored with the job, for the UI to poll or stream.
+
+The default backend is one SQLite file shared by every process (WAL mode);
+JOB_QUEUE_BACKEND can name another JobQueue implementation.
+"""
+import importlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from FinSage.config.runtime import (
+    JOB_DB_PATH,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    JOB_QUEUE_BACKEND,
+    JOB_RETRY_BACKOFF_SECONDS,
+    JOB_VISIBILITY_TIMEOUT,
+)
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class JobQueue:
+    """Interface of a job queue backend; jobs and events are plain dicts"""
+
+    def submit(self, payload: Dict[str, Any], priority: int = 0, max_attempts: int = JOB_MAX_ATTEMPTS) -> str:
+        """Enqueue a job; higher priorities are claimed first. Returns the job id."""
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT) -> Optional[Dict[str, Any]]:
+        """Lease the next due job to `worker_id`, None when there is none"""
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: str, worker_id: str, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT) -> bool:
+        """Renew the lease of a running job; False when the worker no longer holds it"""
+        raise NotImplementedError
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> str:
+        """Record a failed attempt; returns the new status ("queued" for a retry, or "failed")"""
+        raise NotImplementedError
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet"""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def add_event(self, job_id: str, event: str, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Events of a job with a sequence number above `after`, oldest first"""
+        raise NotImplementedError
+
+    def purge(self, older_than: float) -> int:
+        """Delete the jobs finished more than `older_than` seconds ago; returns their number"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        raise NotImplementedError
+
+    def follow(self, job_id: str, poll_interval: float = JOB_POLL_INTERVAL, timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Events of a job as they are stored, until it is finished (or `timeout` seconds passed)"""
+        seen, started = 0, time.time()
+        while True:
+            for event in self.events(job_id, after=seen):
+                seen = event["seq"]
+                yield event
+            job = self.get(job_id)
+            if job is None or job["status"] in FINISHED_STATUSES:
+                # Events stored between the last read and the final status
+                yield from self.events(job_id, after=seen)
+                return
+            if timeout is not None and time.time() - started > timeout:
+                return
+            time.sleep(poll_interval)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_expires_at REAL,
+    worker_id TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, available_at, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    event TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq);
+"""
+
+
+class SQLiteJobQueue(JobQueue):
+    """Job queue in one SQLite file, safe across threads and processes"""
+
+    def __init__(self, path: str = JOB_DB_PATH, retry_backoff: float = JOB_RETRY_BACKOFF_SECONDS):
+        self.path = path
+        self.retry_backoff = retry_backoff
+        self._lock = threading.Lock()
+        # Autocommit: transactions are opened explicitly where several statements must be atomic
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _transaction(self, statements):
+        """Run `statements(cursor)` in an immediate (write-locked) transaction"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(cursor)
+                cursor.execute("COMMIT")
+                return result
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def _execute(self, sql: str, params=()) -> int:
+        """Run one write; returns the number of rows changed"""
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def _query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _job(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(self, payload: Dict[str, Any], priority: int = 0, max_attempts: int = JOB_MAX_ATTEMPTS) -> str:
+        job_id, now = uuid.uuid4().hex, time.time()
+        self._execute(
+            "INSERT INTO jobs (id, payload, priority, status, max_attempts, available_at, created_at) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, json.dumps(payload, default=str), priority, max(1, max_attempts), now, now),
+        )
+        return job_id
+
+    def claim(self, worker_id: str, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT) -> Optional[Dict[str, Any]]:
+        def statements(cursor):
+            now = time.time()
+            # Expired leases of jobs without attempts left: their last worker died with them
+            cursor.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, error = COALESCE(error, 'visibility timeout expired') "
+                "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = cursor.execute(
+                "SELECT id FROM jobs WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires_at < ?) "
+                "ORDER BY priority DESC, available_at, created_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                return None
+            cursor.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker_id = ?, lease_expires_at = ?, "
+                "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (worker_id, now + visibility_timeout, now, row["id"]),
+            )
+            return self._job(cursor.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+        return self._transaction(statements)
+
+    def heartbeat(self, job_id: str, worker_id: str, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT) -> bool:
+        return self._execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (time.time() + visibility_timeout, job_id, worker_id),
+        ) == 1
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        return self._execute(
+            "UPDATE jobs SET status = 'succeeded', finished_at = ?, result = ?, error = NULL, lease_expires_at = NULL "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (time.time(), json.dumps(result, default=str), job_id, worker_id),
+        ) == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> str:
+        def statements(cursor):
+            row = cursor.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker_id = ? AND status = 'running'", (job_id, worker_id)).fetchone()
+            if row is None:
+                # The lease was lost meanwhile; the job belongs to another worker now
+                return "lost"
+            now = time.time()
+            if row["attempts"] < row["max_attempts"]:
+                delay = self.retry_backoff * 2 ** (row["attempts"] - 1)
+                cursor.execute(
+                    "UPDATE jobs SET status = 'queued', available_at = ?, lease_expires_at = NULL, worker_id = NULL, error = ? WHERE id = ?",
+                    (now + delay, error, job_id),
+                )
+                return "queued"
+            cursor.execute("UPDATE jobs SET status = 'failed', finished_at = ?, lease_expires_at = NULL, error = ? WHERE id = ?", (now, error, job_id))
+            return "failed"
+
+        return self._transaction(statements)
+
+    def cancel(self, job_id: str) -> bool:
+        return self._execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'", (time.time(), job_id)) == 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._job(rows[0] if rows else None)
+
+    def add_event(self, job_id: str, event: str, data: Dict[str, Any]):
+        self._execute(
+            "INSERT INTO job_events (job_id, created_at, event, data) VALUES (?, ?, ?, ?)",
+            (job_id, time.time(), event, json.dumps(data, default=str)),
+        )
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after))
+        return [{**dict(row), "data": json.loads(row["data"])} for row in rows]
+
+    def purge(self, older_than: float) -> int:
+        def statements(cursor):
+            cutoff = time.time() - older_than
+            finished = f"SELECT id FROM jobs WHERE status IN {FINISHED_STATUSES} AND finished_at < ?"
+            cursor.execute(f"DELETE FROM job_events WHERE job_id IN ({finished})", (cutoff,))
+            return cursor.execute(f"DELETE FROM jobs WHERE id IN ({finished})", (cutoff,)).rowcount
+
+        return self._transaction(statements)
+
+    def stats(self) -> Dict[str, int]:
+        counts = {row[0]: row[1] for row in self._query("SELECT status, COUNT(*) FROM jobs GROUP BY status")}
+        return {status: counts.get(status, 0) for status in JOB_STATUSES}
+
+
+JOB_QUEUE_BACKENDS = {
+    "sqlite": SQLiteJobQueue,
+}
+
+
+@lru_cache(maxsize=None)
+def get_job_queue(backend: str = JOB_QUEUE_BACKEND) -> JobQueue:
+    """The job queue of this process for `backend` ("sqlite" or "module:factory")"""
+    if backend in JOB_QUEUE_BACKENDS:
+        return JOB_QUEUE_BACKENDS[backend]()
+    module_name, _, factory = backend.partition(":")
+    return getattr(importlib.import_module(module_name), factory)()
+
+
+def submit_analysis(request, priority: int = 0, queue: Optional[JobQueue] = None) -> str:
+    """Enqueue an AnalyzeRequest (or its dict); returns the job id"""
+    payload = request if isinstance(request, dict) else request.model_dump(mode="json", exclude={"wait"})
+    return (queue or get_job_queue()).submit(payload, priority=priority)
@@ -0,0 +1,253 @@
+"""
+Worker processes of the job queue.
+
+`python -m FinSage.jobs work --workers 4` starts a pool of worker processes
+(restarted if they die). Each process builds the FinSage graph once and keeps
+it, its LLM clients and the in-process caches warm across jobs; it claims jobs
+from the queue and runs up to JOB_WORKER_CONCURRENCY of them at once on its
+event loop. Agent and tool steps are stored as progress events while a job
+runs (written in order by a dedicated thread, off the event loop), and its
+lease is renewed every third of the visibility timeout.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from FinSage.config.runtime import (
+    ASYNC_BLOCKING_IO_THREADS,
+    JOB_EVENT_PREVIEW_CHARS,
+    JOB_POLL_INTERVAL,
+    JOB_RETENTION_SECONDS,
+    JOB_VISIBILITY_TIMEOUT,
+    JOB_WORKER_CONCURRENCY,
+    JOB_WORKERS,
+)
+from FinSage.jobs.job_queue import JobQueue, get_job_queue, submit_analysis
+from FinSage.models.personality import AgentPersonality, InvestmentStyle, RiskTolerance, TimeHorizon
+from FinSage.models.schemas import AnalyzeRequest
+from FinSage.utils.async_runner import arun_analysis
+from FinSage.utils.callback_tools import EventCallbackHandler
+from FinSage.utils.log import get_logger
+from FinSage.utils.resources import warm_up
+from FinSage.utils.response_cache import get_final_answer
+from FinSage.utils.state import build_initial_state
+
+logger = get_logger(__name__)
+
+# Seconds between two liveness checks of the worker processes, and between two purges of old jobs
+SUPERVISOR_INTERVAL = 5
+PURGE_INTERVAL = 10 * 60
+
+
+def job_result(output: Dict[str, Any]) -> Dict[str, Any]:
+    """What is stored of a graph output: the answer and its cost"""
+    usage = output.get("usage") or {}
+    return {
+        "answer": get_final_answer(output),
+        "cache_hit": output.get("cache_hit"),
+        "usage": {key: usage[key] for key in ("llm_calls", "prompt_tokens", "completion_tokens", "cost_usd") if key in usage},
+    }
+
+
+class Worker:
+    """Claims and runs jobs in the current event loop, at most `concurrency` at once"""
+
+    def __init__(
+        self,
+        worker_id: str,
+        queue: Optional[JobQueue] = None,
+        graph=None,
+        concurrency: int = JOB_WORKER_CONCURRENCY,
+        visibility_timeout: float = JOB_VISIBILITY_TIMEOUT,
+        poll_interval: float = JOB_POLL_INTERVAL,
+    ):
+        self.worker_id = worker_id
+        self.queue = queue or get_job_queue()
+        self.graph = graph
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.stats = {"claimed": 0, "succeeded": 0, "retried": 0, "failed": 0}
+        # A single thread keeps the events of a job in the order they were emitted
+        self._event_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="finsage-events")
+
+    async def run(self, stop: asyncio.Event, max_jobs: Optional[int] = None):
+        """Claim jobs until `stop` is set (or `max_jobs` were claimed), then wait for the running ones"""
+        slots = asyncio.Semaphore(self.concurrency)
+        running = set()
+        while not stop.is_set() and (max_jobs is None or self.stats["claimed"] < max_jobs):
+            await slots.acquire()
+            job = await asyncio.to_thread(self.queue.claim, self.worker_id, self.visibility_timeout)
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.stats["claimed"] += 1
+            task = asyncio.create_task(self._run_job(job))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+        await asyncio.gather(*running, return_exceptions=True)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            if not await asyncio.to_thread(self.queue.heartbeat, job_id, self.worker_id, self.visibility_timeout):
+                logger.warning("Worker %s lost the lease of job %s", self.worker_id, job_id)
+                return
+
+    def _add_event(self, job_id: str, event: str, data: Dict[str, Any]) -> Future:
+        """Queues an event for the writer thread without blocking the caller"""
+        def log_failure(future: Future):
+            if future.exception() is not None:
+                logger.error("Failed to store the %s event of job %s: %s", event, job_id, future.exception())
+
+        future = self._event_writer.submit(self.queue.add_event, job_id, event, data)
+        future.add_done_callback(log_failure)
+        return future
+
+    def _state(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        request = AnalyzeRequest.model_validate(job["payload"])
+        callback = EventCallbackHandler(lambda event, data: self._add_event(job["id"], event, data), JOB_EVENT_PREVIEW_CHARS)
+        return build_initial_state(
+            request.question,
+            callback,
+            personality=request.personality,
+            messages=request.history_messages(),
+            session_id=request.session_id or job["id"],
+            user_id=request.user_id,
+        )
+
+    async def _run_job(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        self._add_event(job_id, "status", {"status": "running", "attempt": job["attempts"], "worker": self.worker_id})
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        started = time.time()
+        try:
+            output = await arun_analysis(self._state(job), graph=self.graph)
+        except Exception as e:
+            logger.error("Job %s failed on attempt %s: %s", job_id, job['attempts'], e)
+            error = f"{type(e).__name__}: {str(e)}"
+            status = await asyncio.to_thread(self.queue.fail, job_id, self.worker_id, error)
+            self.stats["retried" if status == "queued" else "failed"] += 1
+            await asyncio.wrap_future(self._add_event(job_id, "retry" if status == "queued" else "error", {"status": status, "attempt": job["attempts"], "error": error}))
+            return
+        finally:
+            heartbeat.cancel()
+        result = {**job_result(output), "run_seconds": round(time.time() - started, 3)}
+        # Waiting for the last event also waits for every event emitted before it
+        await asyncio.wrap_future(self._add_event(job_id, "result", result))
+        await asyncio.to_thread(self.queue.complete, job_id, self.worker_id, result)
+        self.stats["succeeded"] += 1
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Worker processes _______________________________________ #
+# __________________________________________________________________________________________ #
+async def _serve(worker_id: str, concurrency: int):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_IO_THREADS, thread_name_prefix="finsage-io"))
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        # Stop claiming and let the running jobs finish
+        loop.add_signal_handler(signum, stop.set)
+    # Built once per process and reused by every job
+    worker = Worker(worker_id, graph=warm_up()["async"], concurrency=concurrency)
+    logger.info("Worker %s ready (%s concurrent jobs)", worker_id, concurrency)
+    await worker.run(stop)
+    logger.info("Worker %s stopped: %s", worker_id, worker.stats)
+
+
+def _worker_process(concurrency: int):
+    asyncio.run(_serve(f"{socket.gethostname()}-{os.getpid()}", concurrency))
+
+
+def run_workers(workers: int = JOB_WORKERS, concurrency: int = JOB_WORKER_CONCURRENCY):
+    """Run `workers` worker processes until interrupted, restarting the ones that exit"""
+    context = multiprocessing.get_context("spawn")
+    processes: Dict[int, Any] = {}
+    last_purge = 0.0
+    try:
+        while True:
+            for index in range(workers):
+                process = processes.get(index)
+                if process is not None and process.is_alive():
+                    continue
+                if process is not None:
+                    logger.warning("Worker process %s exited with code %s, restarting it", process.pid, process.exitcode)
+                processes[index] = context.Process(target=_worker_process, args=(concurrency,), name=f"finsage-worker-{index}")
+                processes[index].start()
+            if time.time() - last_purge > PURGE_INTERVAL:
+                purged = get_job_queue().purge(JOB_RETENTION_SECONDS)
+                if purged:
+                    logger.info("Purged %s finished jobs", purged)
+                last_purge = time.time()
+            time.sleep(SUPERVISOR_INTERVAL)
+    except KeyboardInterrupt:
+        logger.info("Stopping workers, waiting for the running jobs")
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="FinSage analysis job queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    work = commands.add_parser("work", help="Run worker processes")
+    work.add_argument("--workers", type=int, default=JOB_WORKERS)
+    work.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY, help="Jobs run at once by each worker process")
+
+    submit = commands.add_parser("submit", help="Enqueue an analysis")
+    submit.add_argument("question")
+    submit.add_argument("--priority", type=int, default=0, help="Higher runs first")
+    submit.add_argument("--session-id", default=None)
+    submit.add_argument("--risk-tolerance", choices=[r.value for r in RiskTolerance], default=RiskTolerance.MODERATE.value)
+    submit.add_argument("--time-horizon", choices=[t.value for t in TimeHorizon], default=TimeHorizon.MEDIUM_TERM.value)
+    submit.add_argument("--investment-style", choices=[s.value for s in InvestmentStyle], default=InvestmentStyle.BLEND.value)
+
+    status = commands.add_parser("status", help="Show a job")
+    status.add_argument("job_id")
+    status.add_argument("--follow", action="store_true", help="Print its events until it finishes")
+
+    commands.add_parser("stats", help="Jobs per status")
+    args = parser.parse_args(argv)
+
+    if args.command == "work":
+        run_workers(args.workers, args.concurrency)
+    elif args.command == "submit":
+        personality = AgentPersonality(
+            risk_tolerance=RiskTolerance(args.risk_tolerance),
+            time_horizon=TimeHorizon(args.time_horizon),
+            investment_style=InvestmentStyle(args.investment_style),
+        )
+        print(submit_analysis(AnalyzeRequest(question=args.question, personality=personality, session_id=args.session_id), priority=args.priority))
+    elif args.command == "status":
+        queue = get_job_queue()
+        if args.follow:
+            for event in queue.follow(args.job_id):
+                print(f"[{event['event']}] {json.dumps(event['data'], default=str)}")
+        job = queue.get(args.job_id)
+        if job is None:
+            print(f"Job {args.job_id} not found")
+            return 1
+        print(json.dumps(job, indent=2, default=str))
+    else:
+        print(json.dumps(get_job_queue().stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,8 +4,9 @@ from pydantic import BaseModel, Field
 from operator import add
 from pydantic import BaseModel, Field
 from operator import add
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from langgraph.graph import MessagesState
+from langgraph.graph.message import add_messages
 # local imports
 from FinSage.models.personality import AgentPersonality
 
@@ -39,6 +40,31 @@ class RouteSchema(BaseModel):
         description="Classification of the query type"
     )
 
+# __________________________________________________________________________________________ #
+# ___________________________________ Portfolio Schema _____________________________________ #
+# __________________________________________________________________________________________ #
+class PortfolioHolding(BaseModel):
+    symbol: str = Field(description="Ticker symbol of the holding")
+    weight: float = Field(ge=0, description="Portfolio weight; weights are normalized to sum to 1")
+
+# __________________________________________________________________________________________ #
+# ___________________________________ Analysis Request Schema ______________________________ #
+# __________________________________________________________________________________________ #
+class ChatTurn(BaseModel):
+    role: Literal["user", "assistant"]
+    content: str
+
+class AnalyzeRequest(BaseModel):
+    question: str = Field(min_length=1, description="Question to analyze")
+    personality: AgentPersonality = Field(default_factory=AgentPersonality, description="Investor profile of the analysis")
+    session_id: Optional[str] = Field(default=None, description="Conversation id; turns of one session share usage totals and checkpoints")
+    user_id: Optional[str] = Field(default=None, description="User the analysis counts against for the per-user limits; defaults to the session")
+    history: List[ChatTurn] = Field(default_factory=list, description="Prior conversation, oldest first")
+    wait: bool = Field(default=True, description="Wait for the result; otherwise return the run id right away")
+
+    def history_messages(self) -> List[BaseMessage]:
+        return [HumanMessage(content=turn.content) if turn.role == "user" else AIMessage(content=turn.content) for turn in self.history]
+
 # __________________________________________________________________________________________ #
 # __________________________ Pydantic Structures for Agent Evaluation ______________________ #
 # __________________________________________________________________________________________ #
@@ -101,13 +127,32 @@ class SQLAgentState(BaseModel):
     response: str  # Will contain table names or error message
     wrong_generated_queries : Annotated[List[Dict[str, Any]], add] # This will track details about wrong queries generated in the generate_query node
     wrong_formatted_results : Annotated[List[Dict[str, Any]], add] 
+    budget_deadline: Optional[float] = None  # Epoch time the agent must finish by: its share of the request deadline
+
+
+# __________________________________________________________________________________________ #
+# ____________________________________ STATE REDUCERS ______________________________________ #
+# __________________________________________________________________________________________ #
+# Nodes return only the channels they change. A None update clears the channel,
+# which is how a new question resets the results of the previous one.
+def merge_results(left: Optional[Dict[str, Any]], right: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Keyed result channel: entries of the update replace the entries with the same key"""
+    if right is None:
+        return {}
+    return {**(left or {}), **right}
+
+def any_flag(left: Optional[bool], right: Optional[bool]) -> bool:
+    """Flag channel: set once any node sets it, so parallel writers never conflict"""
+    if right is None:
+        return False
+    return bool(left) or bool(right)
 
 
 # Overall Agent state
 class AgentState(TypedDict):
     current_date: datetime
     user_input: str
-    messages: list[BaseMessage]
+    messages: Annotated[list[BaseMessage], add_messages]
     next_step: str
     config: dict
     callback: Any
@@ -116,4 +161,37 @@ class AgentState(TypedDict):
     financial_metrics_agent_internal_state: FinancialMetricsState
     market_intelligence_agent_internal_state: MarketIntelligenceState
     sql_agent_internal_state: SQLAgentState
-    current_task: dict
\ No newline at end of file
+    agent_results: Annotated[Dict[str, Dict[str, Any]], merge_results]  # Message name -> latest answer of each agent
+    current_task: dict
+    run_id: str  # Identifies one graph run
+    deadline: float  # Absolute epoch time by which the final answer is due
+    deadline_reached: Annotated[bool, any_flag]  # Set when an agent was skipped or cancelled to meet the deadline
+    session_id: str  # Chat session the request belongs to
+    user_id: str  # User the request is admitted for (see FinSage/utils/admission.py)
+    usage: dict  # Token usage and cost of the request (see FinSage/utils/usage.py)
+
+
+# Channels each agent subgraph hands back to the FinSage graph (its output schema)
+class FinancialMetricsOutput(TypedDict):
+    messages: Annotated[list[BaseMessage], add_messages]
+    financial_metrics_agent_internal_state: FinancialMetricsState
+    agent_results: Annotated[Dict[str, Dict[str, Any]], merge_results]
+    deadline_reached: Annotated[bool, any_flag]
+
+class NewsSentimentOutput(TypedDict):
+    messages: Annotated[list[BaseMessage], add_messages]
+    news_sentiment_agent_internal_state: SentimentNewsState
+    agent_results: Annotated[Dict[str, Dict[str, Any]], merge_results]
+    deadline_reached: Annotated[bool, any_flag]
+
+class MarketIntelligenceOutput(TypedDict):
+    messages: Annotated[list[BaseMessage], add_messages]
+    market_intelligence_agent_internal_state: MarketIntelligenceState
+    agent_results: Annotated[Dict[str, Dict[str, Any]], merge_results]
+    deadline_reached: Annotated[bool, any_flag]
+
+class SQLAgentOutput(TypedDict):
+    messages: Annotated[list[BaseMessage], add_messages]
+    sql_agent_internal_state: SQLAgentState
+    agent_results: Annotated[Dict[str, Dict[str, Any]], merge_results]
+    deadline_reached: Annotated[bool, any_flag]
@@ -0,0 +1,204 @@
+"""
+Offline tool responses.
+
+With TOOL_BACKEND=fixtures the data tools never reach the providers. They
+answer from recorded responses in TOOL_FIXTURES_DIR (one `<tool_name>.json`
+file per tool, mapping a symbol -- or "*" -- to the response) and otherwise
+from synthetic data derived deterministically from the symbol, after a
+simulated provider latency. Combined with the fake LLM backend this runs the
+whole graph on a disconnected machine.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from FinSage.config.runtime import TOOL_FIXTURE_LATENCY_MS, TOOL_FIXTURES_DIR
+
+_recorded: Dict[str, Dict[str, Any]] = {}
+_recorded_lock = threading.Lock()
+
+
+def _rng(*parts: Any) -> random.Random:
+    seed = hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+
+def _symbol(tool_input: Dict[str, Any]) -> str:
+    for key in ("symbol", "ticker", "company_name", "query"):
+        if tool_input.get(key):
+            return str(tool_input[key]).upper()
+    keywords = tool_input.get("industry_keywords")
+    if keywords:
+        return str(keywords[0]).upper()
+    return "AAPL"
+
+
+def _load_recorded(tool_name: str) -> Dict[str, Any]:
+    with _recorded_lock:
+        if tool_name not in _recorded:
+            path = os.path.join(TOOL_FIXTURES_DIR, f"{tool_name}.json") if TOOL_FIXTURES_DIR else None
+            if path and os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    _recorded[tool_name] = json.load(f)
+            else:
+                _recorded[tool_name] = {}
+        return _recorded[tool_name]
+
+
+# ____________________________________ synthetic data ______________________________________ #
+def _price(symbol: str) -> Dict[str, Any]:
+    r = _rng("price", symbol)
+    price = round(r.uniform(20, 600), 2)
+    change = round(price * r.uniform(-0.04, 0.04), 2)
+    return {
+        "symbol": symbol,
+        "name": f"{symbol} Inc.",
+        "price": price,
+        "change": change,
+        "changesPercentage": round(change / price * 100, 2),
+        "dayLow": round(price * 0.98, 2),
+        "dayHigh": round(price * 1.02, 2),
+        "yearLow": round(price * 0.7, 2),
+        "yearHigh": round(price * 1.25, 2),
+        "volume": r.randint(2_000_000, 90_000_000),
+        "avgVolume": r.randint(2_000_000, 90_000_000),
+        "priceAvg50": round(price * r.uniform(0.92, 1.05), 2),
+        "priceAvg200": round(price * r.uniform(0.85, 1.1), 2),
+        "eps": round(r.uniform(0.5, 12), 2),
+        "pe": round(r.uniform(8, 60), 2),
+    }
+
+
+def _statement(kind: str, symbol: str) -> Dict[str, Any]:
+    r = _rng(kind, symbol)
+    revenue = r.uniform(5e9, 4e11)
+    periods = []
+    for i in range(4):
+        scale = 1 - 0.05 * i
+        periods.append({
+            "date": (datetime(2024, 12, 31) - timedelta(days=365 * i)).strftime("%Y-%m-%d"),
+            "revenue": round(revenue * scale),
+            "grossProfit": round(revenue * scale * 0.42),
+            "operatingIncome": round(revenue * scale * 0.28),
+            "netIncome": round(revenue * scale * 0.21),
+            "eps": round(r.uniform(1, 10), 2),
+            "totalAssets": round(revenue * 1.3),
+            "totalLiabilities": round(revenue * 0.8),
+            "totalDebt": round(revenue * 0.3),
+            "operatingCashFlow": round(revenue * scale * 0.3),
+            "capitalExpenditure": round(-revenue * scale * 0.05),
+            "freeCashFlow": round(revenue * scale * 0.25),
+        })
+    return {"symbol": symbol, "statement": kind, "periods": periods}
+
+
+def _company(symbol: str) -> Dict[str, Any]:
+    r = _rng("company", symbol)
+    return {
+        "symbol": symbol,
+        "companyName": f"{symbol} Inc.",
+        "industry": r.choice(["Consumer Electronics", "Software", "Semiconductors", "Auto Manufacturers", "Banks"]),
+        "sector": r.choice(["Technology", "Consumer Cyclical", "Financial Services"]),
+        "marketCap": r.randint(10, 3000) * 1_000_000_000,
+        "beta": round(r.uniform(0.6, 1.8), 2),
+        "pe_ratio": round(r.uniform(8, 60), 2),
+    }
+
+
+def _earnings(symbol: str) -> Dict[str, Any]:
+    r = _rng("earnings", symbol)
+    quarters = []
+    for i in range(4):
+        estimate = round(r.uniform(0.5, 3), 2)
+        quarters.append({
+            "date": (datetime(2024, 10, 30) - timedelta(days=91 * i)).strftime("%Y-%m-%d"),
+            "epsEstimated": estimate,
+            "eps": round(estimate * r.uniform(0.9, 1.15), 2),
+            "revenue": r.randint(10, 120) * 1_000_000_000,
+        })
+    return {"symbol": symbol, "earnings": quarters}
+
+
+def _news(symbol: str) -> Dict[str, Any]:
+    r = _rng("news", symbol)
+    articles = []
+    for i in range(5):
+        score = round(r.uniform(-1, 1), 2)
+        label = "positive" if score > 0.2 else "negative" if score < -0.2 else "neutral"
+        articles.append({
+            "title": f"{symbol} headline {i + 1}",
+            "url": f"https://news.example.com/{symbol.lower()}/{i + 1}",
+            "source": r.choice(["Reuters", "Bloomberg", "CNBC", "WSJ"]),
+            "sentiment_score": score,
+            "sentiment_label": label,
+        })
+    average = round(sum(a["sentiment_score"] for a in articles) / len(articles), 2)
+    return {"symbol": symbol, "average_sentiment": average, "article_count": len(articles), "articles": articles}
+
+
+def _insiders(symbol: str) -> Dict[str, Any]:
+    r = _rng("insider", symbol)
+    transactions = [{
+        "name": f"Insider {i + 1}",
+        "transaction_type": r.choice(["Buy", "Sell"]),
+        "shares": r.randint(1_000, 200_000),
+        "price": round(r.uniform(20, 600), 2),
+        "date": (datetime(2024, 11, 1) - timedelta(days=7 * i)).strftime("%Y-%m-%d"),
+    } for i in range(5)]
+    return {"symbol": symbol, "transactions": transactions}
+
+
+def _aggregates(symbol: str) -> Dict[str, Any]:
+    r = _rng("aggregates", symbol)
+    close = r.uniform(20, 600)
+    bars = []
+    start = datetime(2024, 10, 1)
+    for i in range(30):
+        close *= 1 + r.uniform(-0.02, 0.02)
+        bars.append({
+            "timestamp": int((start + timedelta(days=i)).timestamp() * 1000),
+            "open": round(close * 0.995, 2),
+            "high": round(close * 1.01, 2),
+            "low": round(close * 0.99, 2),
+            "close": round(close, 2),
+            "volume": r.randint(2_000_000, 90_000_000),
+        })
+    return {"ticker": symbol, "adjusted": True, "results_count": len(bars), "aggregates": bars}
+
+
+SYNTHETIC_RESPONSES: Dict[str, Callable[[str], Any]] = {
+    "get_stock_price": _price,
+    "get_company_financials": _company,
+    "get_income_statement": lambda s: _statement("income_statement", s),
+    "get_balance_sheet": lambda s: _statement("balance_sheet", s),
+    "get_cash_flow": lambda s: _statement("cash_flow", s),
+    "get_earnings_history": _earnings,
+    "get_news_sentiment": _news,
+    "company_news": lambda s: _news(s)["articles"],
+    "industry_news": lambda s: _news(s)["articles"],
+    "polygon_ticker_news": lambda s: json.dumps(_news(s)["articles"]),
+    "get_insider_transactions": _insiders,
+    "get_stock_aggregates": _aggregates,
+}
+
+
+def fixture_response(tool_name: str, tool_input: Dict[str, Any], latency_ms: Optional[float] = None) -> Any:
+    """Recorded or synthetic response of a tool call, after the simulated provider latency."""
+    latency_ms = TOOL_FIXTURE_LATENCY_MS if latency_ms is None else latency_ms
+    symbol = _symbol(tool_input)
+    if latency_ms > 0:
+        jitter = _rng("latency", tool_name, symbol).uniform(0.75, 1.25)
+        time.sleep(latency_ms * jitter / 1000)
+
+    recorded = _load_recorded(tool_name)
+    if symbol in recorded or "*" in recorded:
+        return recorded.get(symbol, recorded.get("*"))
+    synthetic = SYNTHETIC_RESPONSES.get(tool_name)
+    if synthetic is None:
+        return {"error": f"No fixture for tool {tool_name}"}
+    return synthetic(symbol)
@@ -4,6 +4,10 @@ import numpy as np
 import pandas as pd
 from textwrap import wrap
 
+from FinSage.utils.log import get_logger
+
+logger = get_logger(__name__)
+
 # _______________________________________________________________________________________________________ #
 # ________________________ Plotting Tool Calling and Topic Adherence Evaluations ________________________ #
 # _______________________________________________________________________________________________________ #
@@ -39,7 +43,7 @@ def plot_all_tools_called_eval(response: dict, agent_internal_state: str):
      # Check if agent's internal state is empty
     all_tools_eval_results = response[agent_internal_state]['all_tools_eval']
     if not all_tools_eval_results['stats']:
-        print(f"\n⚠️ No tool evaluation data available for {agent_internal_state}")
+        logger.warning("⚠️ No tool evaluation data available for %s", agent_internal_state)
         return
     
      # response contains the output state of te Fin agent after a run
@@ -188,7 +192,7 @@ def plot_topic_adhrence_eval( response: dict , agent_internal_state = str) :
      # Check if agent's internal state is empty
     topic_adherence_eval_results = response[agent_internal_state]['topic_adherence_eval']
     if not topic_adherence_eval_results['passed']:
-        print(f"\n⚠️ No topic adherence evaluation data available for {agent_internal_state}")
+        logger.warning("⚠️ No topic adherence evaluation data available for %s", agent_internal_state)
         return
     
      # response contains the output state of te Fin agent after a run
@@ -263,7 +267,7 @@ def get_all_tools_called_eval_df(response: dict, agent_internal_state: str) -> p
     """
     all_tools_eval_results = response[agent_internal_state]['all_tools_eval']
     if not all_tools_eval_results['stats']:
-        print(f"\n⚠️ No tool evaluation data available for {agent_internal_state}")
+        logger.warning("⚠️ No tool evaluation data available for %s", agent_internal_state)
         return pd.DataFrame()  # Return empty DataFrame if no data
 
     # Collect data for each iteration
@@ -299,7 +303,7 @@ def get_topic_adherence_eval_df(response: dict, agent_internal_state: str) -> pd
     """
     topic_adherence_eval_results = response[agent_internal_state]['topic_adherence_eval']
     if not topic_adherence_eval_results['passed']:
-        print(f"\n⚠️ No topic adherence evaluation data available for {agent_internal_state}")
+        logger.warning("⚠️ No topic adherence evaluation data available for %s", agent_internal_state)
         return pd.DataFrame()  # Return empty DataFrame if no data
 
     # Collect data for each iteration
@@ -0,0 +1,30 @@
+"""
+Data provider behind each tool.
+
+Tools try their primary provider first and most fall back to yfinance; the
+primary provider is the one that matters for quotas and latency.
+"""
+
+TOOL_PROVIDERS = {
+    "get_stock_price": "financialmodelingprep",
+    "get_company_financials": "financialmodelingprep",
+    "get_income_statement": "financialmodelingprep",
+    "get_balance_sheet": "financialmodelingprep",
+    "get_cash_flow": "financialmodelingprep",
+    "get_earnings_history": "alphavantage",
+    "get_news_sentiment": "alphavantage",
+    "get_insider_transactions": "alphavantage",
+    "company_news": "eventregistry",
+    "industry_news": "eventregistry",
+    "polygon_ticker_news": "polygon",
+    "polygon_aggregates": "polygon",
+    "get_stock_aggregates": "polygon",
+    "sql_db_query": "sqlite",
+    "sql_db_schema": "sqlite",
+    "sql_db_list_tables": "sqlite",
+}
+
+
+def tool_provider(tool_name: str) -> str:
+    """Primary provider of a tool ("unknown" for tools not listed)."""
+    return TOOL_PROVIDERS.get(tool_name, "unknown")
@@ -0,0 +1,210 @@
+"""
+Short-lived result cache for the data tools.
+
+Every tool call is keyed on (tool name, arguments). Results are kept for a
+per-tool freshness window, and concurrent callers asking for the same key
+share one in-flight request. Speculative prefetching relies on the second
+property: when an agent calls a tool that is already being prefetched, it
+waits for that request instead of issuing a new one.
+
+When a stored result differs from the previous result of the same call (the
+provider has new data), the refresh listeners are notified; the response
+cache uses this to drop the answers built on the old data.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+from FinSage.config.runtime import TOOL_BACKEND, TOOL_CACHE_DEFAULT_TTL, TOOL_CACHE_ENABLED, TOOL_CACHE_MAX_ENTRIES, TOOL_CACHE_TTL
+from FinSage.tools.fixtures import fixture_response
+from FinSage.tools.providers import tool_provider
+from FinSage.utils.admission import provider_calls
+from FinSage.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+# Seconds between two sweeps of the expired results
+_PRUNE_INTERVAL = 30
+
+
+def _is_error(result: Any) -> bool:
+    return isinstance(result, dict) and "error" in result
+
+
+def _fingerprint(result: Any) -> str:
+    return hashlib.md5(json.dumps(result, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ToolResultCache:
+    """Thread-safe TTL cache, bounded to `max_entries` (LRU), with in-flight de-duplication of tool calls."""
+
+    def __init__(self, ttl: Optional[Dict[str, int]] = None, default_ttl: int = TOOL_CACHE_DEFAULT_TTL, max_entries: int = TOOL_CACHE_MAX_ENTRIES):
+        self.ttl = dict(TOOL_CACHE_TTL if ttl is None else ttl)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._results: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        # Fingerprint of the last result of each call, kept after the result expires to detect data changes
+        self._fingerprints: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._refresh_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+        self._pruned_at = time.time()
+        self.stats = {"hits": 0, "misses": 0, "shared_inflight": 0, "evictions": 0, "refreshes": 0}
+        self._local = threading.local()
+
+    def add_refresh_listener(self, listener: Callable[[str, Dict[str, Any]], None]):
+        """Register a callable notified with (tool name, tool input) when a call returns data different from its previous result"""
+        self._refresh_listeners.append(listener)
+
+    def _notify_refresh(self, tool_name: str, tool_input: Dict[str, Any]):
+        for listener in self._refresh_listeners:
+            try:
+                listener(tool_name, tool_input)
+            except Exception as e:
+                logger.error("Error in tool cache refresh listener: %s", e)
+
+    def _store(self, key: Tuple[str, str], expires_at: float, result: Any) -> bool:
+        """
+        Keep a result, dropping expired ones now and then and the least recently
+        used beyond max_entries (lock held). Returns True when the result differs
+        from the previous result of the same call.
+        """
+        now = time.time()
+        fingerprint = _fingerprint(result)
+        previous = self._fingerprints.pop(key, None)
+        self._fingerprints[key] = fingerprint
+        while len(self._fingerprints) > self.max_entries:
+            self._fingerprints.popitem(last=False)
+        self._results[key] = (expires_at, result)
+        self._results.move_to_end(key)
+        if now - self._pruned_at > _PRUNE_INTERVAL or len(self._results) > self.max_entries:
+            self._pruned_at = now
+            for expired in [k for k, (expiry, _) in self._results.items() if expiry <= now]:
+                del self._results[expired]
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+            self.stats["evictions"] += 1
+        refreshed = previous is not None and previous != fingerprint
+        if refreshed:
+            self.stats["refreshes"] += 1
+        return refreshed
+
+    @staticmethod
+    def make_key(tool_name: str, tool_input: Dict[str, Any]) -> Tuple[str, str]:
+        return tool_name, json.dumps(tool_input, sort_keys=True, default=str)
+
+    def get(self, tool_name: str, tool_input: Dict[str, Any]) -> Optional[Any]:
+        key = self.make_key(tool_name, tool_input)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached and cached[0] > time.time():
+                return cached[1]
+        return None
+
+    def get_or_call(self, tool_name: str, tool_input: Dict[str, Any], fetch: Callable[[], Any]) -> Any:
+        """Return a fresh cached result, join an in-flight call, or run `fetch` and cache its result."""
+        key = self.make_key(tool_name, tool_input)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached and cached[0] > time.time():
+                self._results.move_to_end(key)
+                self.stats["hits"] += 1
+                self._local.last_status = "hit"
+                return cached[1]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.stats["misses"] += 1
+            else:
+                self.stats["shared_inflight"] += 1
+            self._local.last_status = "miss" if owner else "shared_inflight"
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = fetch()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        refreshed = False
+        with self._lock:
+            # Provider errors are returned as {"error": ...}; never keep those around
+            if not _is_error(result):
+                refreshed = self._store(key, time.time() + self.ttl.get(tool_name, self.default_ttl), result)
+            self._inflight.pop(key, None)
+        future.set_result(result)
+        if refreshed:
+            self._notify_refresh(tool_name, tool_input)
+        return result
+
+    def put(self, tool_name: str, tool_input: Dict[str, Any], result: Any, ttl: Optional[int] = None):
+        """Store a result fetched outside the tool (e.g. by a batched request), fresh for `ttl` seconds (default: the tool's)."""
+        if _is_error(result):
+            return
+        with self._lock:
+            expires_at = time.time() + (ttl if ttl is not None else self.ttl.get(tool_name, self.default_ttl))
+            refreshed = self._store(self.make_key(tool_name, tool_input), expires_at, result)
+        if refreshed:
+            self._notify_refresh(tool_name, tool_input)
+
+    def last_status(self) -> Optional[str]:
+        """Outcome of this thread's last lookup: "hit", "miss" or "shared_inflight"."""
+        return getattr(self._local, "last_status", None)
+
+    def invalidate(self, tool_name: Optional[str] = None):
+        """Drop cached results of one tool, or of every tool."""
+        with self._lock:
+            if tool_name is None:
+                self._results.clear()
+            else:
+                for key in [k for k in self._results if k[0] == tool_name]:
+                    del self._results[key]
+
+
+# Process-wide cache shared by all agents
+tool_result_cache = ToolResultCache()
+
+
+def cached_tool(tool: BaseTool, cache: ToolResultCache = tool_result_cache) -> BaseTool:
+    """
+    Wrap a tool so its calls go through the result cache. The wrapper keeps the
+    name, description and argument schema, so agents see the exact same tool.
+    With TOOL_BACKEND=fixtures the provider call is replaced by an offline fixture.
+    Provider calls hold a slot of the provider's concurrency cap (cache hits do not).
+    """
+    offline = TOOL_BACKEND == "fixtures"
+    cap = provider_calls(tool_provider(tool.name))
+    if not TOOL_CACHE_ENABLED and not offline and cap is None:
+        return tool
+
+    def _fetch(kwargs):
+        with cap.slot() if cap else nullcontext():
+            if offline:
+                return fixture_response(tool.name, kwargs)
+            return tool.invoke(kwargs)
+
+    def _run(**kwargs):
+        if not TOOL_CACHE_ENABLED:
+            return _fetch(kwargs)
+        return cache.get_or_call(tool.name, kwargs, lambda: _fetch(kwargs))
+
+    return StructuredTool.from_function(
+        func=_run,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+    )
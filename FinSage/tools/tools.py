@@ -7,8 +7,8 @@ from langchain_core.tools import tool
 from langchain_community.agent_toolkits.polygon.toolkit import PolygonToolkit
 from langchain_community.utilities.polygon import PolygonAPIWrapper
 from eventregistry import *
-import requests
 import os
+from contextlib import nullcontext
 #from config import setup_environment, news_client_id, FINANCIAL_MODELING_PREP_API_KEY, apha_api_key,POLYGON_API_KEY
 from FinSage.config.settings import (
     setup_environment,
@@ -19,12 +19,46 @@ from FinSage.config.settings import (
 )
 import yfinance as yf
 from datetime import datetime
+from FinSage.config.runtime import TOOL_BACKEND
+from FinSage.tools.tool_cache import cached_tool
+from FinSage.utils.admission import provider_calls
+from FinSage.utils.log import get_logger
+from FinSage.utils.resources import get_event_registry, get_http_session
 
 setup_environment()
+logger = get_logger(__name__)
 
 
-er = EventRegistry(apiKey = news_client_id, allowUseOfArchive=False)
+def _fmp_quote(result):
+    return {
+        "symbol": result["symbol"],
+        "name": result["name"],
+        "price": result["price"],
+        "change": result["change"],
+        "changesPercentage": result["changesPercentage"],
+        "dayLow": result["dayLow"],
+        "dayHigh": result["dayHigh"],
+        "yearLow": result["yearLow"],
+        "yearHigh": result["yearHigh"],
+        "volume": result["volume"],
+        "avgVolume": result["avgVolume"],
+        "priceAvg50": result["priceAvg50"],
+        "priceAvg200": result["priceAvg200"],
+        "eps": result["eps"],
+        "pe": result["pe"],
+    }
 
+def _fmp_profile(results):
+    return {
+        "symbol": results["symbol"],
+        "companyName": results["companyName"],
+        "marketCap": results["mktCap"],
+        "industry": results["industry"],
+        "sector": results["sector"],
+        "website": results["website"],
+        "beta": results["beta"],
+        "price": results["price"],
+    }
 
 @tool
 def get_stock_price(symbol):
@@ -34,26 +68,10 @@ def get_stock_price(symbol):
     try:
         # Primary source: Financial Modeling Prep
         url = f"https://financialmodelingprep.com/api/v3/quote/{symbol}?apikey={FINANCIAL_MODELING_PREP_API_KEY}"
-        response = requests.get(url)
+        response = get_http_session().get(url)
         data = response.json()
         result = data[0]
-        return {
-            "symbol": result["symbol"],
-            "name": result["name"],
-            "price": result["price"],
-            "change": result["change"],
-            "changesPercentage": result["changesPercentage"],
-            "dayLow": result["dayLow"],
-            "dayHigh": result["dayHigh"],
-            "yearLow": result["yearLow"],
-            "yearHigh": result["yearHigh"],
-            "volume": result["volume"],
-            "avgVolume": result["avgVolume"],
-            "priceAvg50": result["priceAvg50"],
-            "priceAvg200": result["priceAvg200"],
-            "eps": result["eps"],
-            "pe": result["pe"],
-        }
+        return _fmp_quote(result)
     except Exception as e:
         try:
             # Fallback: yfinance
@@ -89,19 +107,10 @@ def get_company_financials(symbol):
     try:
         # Primary source: Financial Modeling Prep
         url = f"https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={FINANCIAL_MODELING_PREP_API_KEY}"
-        response = requests.get(url)
+        response = get_http_session().get(url)
         data = response.json()
         results = data[0]
-        return {
-            "symbol": results["symbol"],
-            "companyName": results["companyName"],
-            "marketCap": results["mktCap"],
-            "industry": results["industry"],
-            "sector": results["sector"],
-            "website": results["website"],
-            "beta": results["beta"],
-            "price": results["price"],
-        }
+        return _fmp_profile(results)
     except Exception as e:
         try:
             # Fallback: yfinance
@@ -130,7 +139,7 @@ def get_income_statement(symbol):
     try:
         # Primary source: Financial Modeling Prep
         url = f"https://financialmodelingprep.com/api/v3/income-statement/{symbol}?period=annual&apikey={FINANCIAL_MODELING_PREP_API_KEY}"
-        response = requests.get(url)
+        response = get_http_session().get(url)
         data = response.json()
         results = data[0]
         financials = {
@@ -183,7 +192,7 @@ def get_balance_sheet(symbol):
     try:
         # Primary source: Financial Modeling Prep
         url = f"https://financialmodelingprep.com/api/v3/balance-sheet-statement/{symbol}?period=annual&apikey={FINANCIAL_MODELING_PREP_API_KEY}"
-        response = requests.get(url)
+        response = get_http_session().get(url)
         data = response.json()
         latest = data[0]
         
@@ -293,7 +302,7 @@ def get_cash_flow(symbol):
     try:
         # Primary source: Financial Modeling Prep
         url = f"https://financialmodelingprep.com/api/v3/cash-flow-statement/{symbol}?period=annual&apikey={FINANCIAL_MODELING_PREP_API_KEY}"
-        response = requests.get(url)
+        response = get_http_session().get(url)
         data = response.json()
         
         # Get most recent statement
@@ -400,7 +409,11 @@ def get_cash_flow(symbol):
         except Exception as yf_error:
             return {"error": f"Could not fetch cash flow statement for {symbol}. Primary error: {str(e)}, Fallback error: {str(yf_error)}"}
 
-polygon = PolygonAPIWrapper()
+if TOOL_BACKEND == "live":
+    polygon = PolygonAPIWrapper()
+else:
+    # Offline tools answer from fixtures: the Polygon tools only lend their schemas, no key is needed
+    polygon = PolygonAPIWrapper.model_construct(polygon_api_key=POLYGON_API_KEY)
 ptoolkit = PolygonToolkit.from_polygon_api_wrapper(polygon)
 
 tools = ptoolkit.get_tools()
@@ -425,6 +438,7 @@ def company_news(company_name: str) -> list:
         list: A list of dictionaries containing the news articles.
     """
     news = []
+    er = get_event_registry()
 
     # Get most relevant news articles based on the company name
     q_pos = QueryArticlesIter(
@@ -448,6 +462,7 @@ def industry_news(industry_keywords: list) -> list:
 
     """
     news = []
+    er = get_event_registry()
 
     q_pos = QueryArticlesIter(
         conceptUri=QueryItems.OR([er.getConceptUri(i) for i in industry_keywords]),
@@ -479,7 +494,7 @@ def get_news_sentiment(symbol: str) -> dict:
     try:
         # First attempt with Alpha Vantage
         url = f'https://www.alphavantage.co/query?function=NEWS_SENTIMENT&tickers={symbol}&apikey={apha_api_key}'
-        response = requests.get(url)
+        response = get_http_session().get(url)
         data = response.json()
         
         if "Error Message" in data:
@@ -633,7 +648,7 @@ def get_insider_transactions(symbol: str) -> dict:
     try:
         # First attempt with Alpha Vantage
         url = f'https://www.alphavantage.co/query?function=INSIDER_TRANSACTIONS&symbol={symbol}&apikey={apha_api_key}'
-        response = requests.get(url)
+        response = get_http_session().get(url)
         data = response.json()
         
         if "Error Message" in data:
@@ -699,7 +714,7 @@ def get_insider_transactions(symbol: str) -> dict:
                 return {"error": "No insider transaction data available"}
             
             # Debug print to see the actual structure
-            print("Column names:", insider_df.columns.tolist())
+            logger.debug("Column names: %s", insider_df.columns.tolist())
             
             transactions = []
             total_buys = 0
@@ -741,7 +756,7 @@ def get_insider_transactions(symbol: str) -> dict:
                         'value': value
                     })
                 except (ValueError, TypeError, AttributeError) as err:
-                    print(f"Error processing row: {err}")
+                    logger.warning("Error processing row: %s", err)
                     continue
             
             if not transactions:
@@ -788,7 +803,7 @@ def get_earnings_history(symbol: str) -> dict:
     try:
         # First attempt with Alpha Vantage
         url = f'https://www.alphavantage.co/query?function=EARNINGS&symbol={symbol}&apikey={apha_api_key}'
-        response = requests.get(url)
+        response = get_http_session().get(url)
         data = response.json()
         
         if "Error Message" in data:
@@ -917,7 +932,7 @@ def get_stock_aggregates(
             "apiKey": POLYGON_API_KEY
         }
         
-        response = requests.get(url, params=params)
+        response = get_http_session().get(url, params=params)
         data = response.json()
         
         if data.get("status") != "OK":
@@ -987,27 +1002,55 @@ def get_stock_aggregates(
         except Exception as yf_error:
             return {"error": f"Failed to fetch aggregate data from both sources. Primary error: {str(e)}, Fallback error: {str(yf_error)}"}
 
+# Batched variants for portfolio analysis: one Financial Modeling Prep request for many
+# symbols, returning the same per-symbol results as get_stock_price/get_company_financials.
+# Symbols missing from the batch response are left out; callers fetch them one by one.
+def _fmp_batch(endpoint, symbols, parse):
+    url = f"https://financialmodelingprep.com/api/v3/{endpoint}/{','.join(symbols)}?apikey={FINANCIAL_MODELING_PREP_API_KEY}"
+    cap = provider_calls("financialmodelingprep")
+    try:
+        with cap.slot() if cap else nullcontext():
+            data = get_http_session().get(url).json()
+        return {item["symbol"]: parse(item) for item in data}
+    except Exception as e:
+        logger.warning("Batched %s request failed, falling back to per-symbol calls: %s", endpoint, e)
+        return {}
+
+def get_stock_prices_batch(symbols):
+    """Quotes of many symbols in one request (get_stock_price results keyed by symbol)."""
+    return _fmp_batch("quote", symbols, _fmp_quote)
+
+def get_company_financials_batch(symbols):
+    """Company profiles of many symbols in one request (get_company_financials results keyed by symbol)."""
+    return _fmp_batch("profile", symbols, _fmp_profile)
+
+# Tool name -> batched variant
+BATCH_TOOLS = {
+    "get_stock_price": get_stock_prices_batch,
+    "get_company_financials": get_company_financials_batch,
+}
+
+# All agent tools go through the shared result cache (see tool_cache.py)
 # 1. Financial Metrics Agent - focuses on core financial data
-financial_metrics_tools = [
+financial_metrics_tools = [cached_tool(t) for t in [
     get_stock_price,
     get_company_financials,
     get_income_statement,
     get_balance_sheet,
     get_cash_flow,
     get_earnings_history,
-]
+]]
 
 # 2. News & Sentiment Agent - focuses on news analysis
-news_sentiment_tools = [
+news_sentiment_tools = [cached_tool(t) for t in [
     company_news,
     industry_news,
     get_news_sentiment,
     polygon_ticker_news_tool
-]
+]]
 
 # 3. Market Intelligence Agent - focuses on market data and insider activity
-market_intelligence_tools = [
+market_intelligence_tools = [cached_tool(t) for t in [
     get_insider_transactions,
     get_stock_aggregates
-]
-
+]]
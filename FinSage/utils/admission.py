@@ -0,0 +1,373 @@
+"""
+Admission control and fair scheduling of analyses.
+
+One user firing many analyses must neither starve the other users nor use up
+the LLM and data provider quotas shared by the process.
+
+- `admitted_invoke` / `aadmitted_invoke` wrap a graph invocation like the other
+  invoke wrappers. An analysis waits for one of ADMISSION_MAX_CONCURRENT_RUNS
+  slots, and at most ADMISSION_PER_USER_INFLIGHT analyses of one user run at
+  once. Waiting analyses are served by weighted fair queuing across users
+  (start-time fair queuing, ADMISSION_USER_WEIGHTS), so a user with a long
+  backlog is interleaved with the others instead of being served first.
+  Analyses beyond ADMISSION_PER_USER_QUEUED waiting per user or
+  ADMISSION_MAX_QUEUED in total, or waiting longer than ADMISSION_QUEUE_TIMEOUT,
+  are rejected with AdmissionRejected.
+- `llm_calls` caps the LLM calls in flight in the process (see
+  CappedChatModelMixin), and `provider_calls(provider)` the calls to each data
+  provider (see FinSage/tools/tool_cache.py).
+
+The users are identified by state["user_id"], else the session id.
+`admission_stats()` reports the queue depths, wait times and rejections.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Deque, Dict, Optional
+
+from FinSage.config.runtime import (
+    ADMISSION_ENABLED,
+    ADMISSION_MAX_CONCURRENT_RUNS,
+    ADMISSION_MAX_QUEUED,
+    ADMISSION_PER_USER_INFLIGHT,
+    ADMISSION_PER_USER_QUEUED,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_USER_WEIGHTS,
+    LLM_MAX_CONCURRENT_CALLS,
+    PROVIDER_MAX_CONCURRENT_CALLS,
+)
+from FinSage.utils.checkpoint import acheckpointed_invoke, checkpointed_invoke
+from FinSage.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Wait times kept for the percentiles of the stats
+_WAIT_SAMPLES = 1000
+
+
+class AdmissionRejected(Exception):
+    """Raised when an analysis is refused or waited too long for a slot"""
+
+
+class _Waiter:
+    """A thread or coroutine waiting for a slot"""
+
+    __slots__ = ("key", "tag", "enqueued_at", "granted", "_event", "_loop", "_future")
+
+    def __init__(self, key: Any, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.key = key
+        self.tag: Any = None
+        self.enqueued_at = time.time()
+        self.granted = False
+        self._loop = loop
+        self._event = threading.Event() if loop is None else None
+        self._future = loop.create_future() if loop is not None else None
+
+    def grant(self):
+        self.granted = True
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(_resolve, self._future)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Slots:
+    """
+    Slots shared by threads and coroutines. Subclasses decide which waiter gets
+    the next free slot (_enqueue, _next, _remove, _release), always under the lock.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self.stats = {"admitted": 0, "rejected": 0, "timeouts": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    def _enqueue(self, waiter: _Waiter):
+        raise NotImplementedError
+
+    def _next(self) -> Optional[_Waiter]:
+        raise NotImplementedError
+
+    def _remove(self, waiter: _Waiter):
+        raise NotImplementedError
+
+    def _release(self, waiter: _Waiter):
+        raise NotImplementedError
+
+    def _dispatch(self):
+        while True:
+            waiter = self._next()
+            if waiter is None:
+                return
+            waited = time.time() - waiter.enqueued_at
+            self._waits.append(waited)
+            self.stats["admitted"] += 1
+            self.stats["wait_seconds_total"] += waited
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+            waiter.grant()
+
+    def _submit(self, waiter: _Waiter):
+        with self._lock:
+            try:
+                self._enqueue(waiter)
+            except AdmissionRejected:
+                self.stats["rejected"] += 1
+                raise
+            self._dispatch()
+
+    def _give_up(self, waiter: _Waiter) -> bool:
+        """Withdraw a waiter that timed out; False when it was granted meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._remove(waiter)
+            self.stats["timeouts"] += 1
+            return True
+
+    def acquire(self, key: Any = None, timeout: Optional[float] = None) -> _Waiter:
+        """Wait for a slot (blocking); pass the result to release()"""
+        waiter = _Waiter(key)
+        self._submit(waiter)
+        if not waiter._event.wait(timeout) and self._give_up(waiter):
+            raise AdmissionRejected(f"No {self.name} slot within {timeout:g}s")
+        return waiter
+
+    async def aacquire(self, key: Any = None, timeout: Optional[float] = None) -> _Waiter:
+        """Wait for a slot without blocking the event loop; pass the result to release()"""
+        waiter = _Waiter(key, asyncio.get_running_loop())
+        self._submit(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter._future), timeout)
+        except asyncio.TimeoutError:
+            if self._give_up(waiter):
+                raise AdmissionRejected(f"No {self.name} slot within {timeout:g}s")
+        except asyncio.CancelledError:
+            if not self._give_up(waiter):
+                self.release(waiter)
+            raise
+        return waiter
+
+    def release(self, waiter: _Waiter):
+        with self._lock:
+            self._release(waiter)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, key: Any = None, timeout: Optional[float] = None):
+        waiter = self.acquire(key, timeout)
+        try:
+            yield
+        finally:
+            self.release(waiter)
+
+    @asynccontextmanager
+    async def aslot(self, key: Any = None, timeout: Optional[float] = None):
+        waiter = await self.aacquire(key, timeout)
+        try:
+            yield
+        finally:
+            self.release(waiter)
+
+    def _wait_stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        percentile = lambda q: round(waits[min(len(waits) - 1, int(q * len(waits)))], 3) if waits else 0.0
+        return {
+            **self.stats,
+            "wait_seconds_total": round(self.stats["wait_seconds_total"], 3),
+            "wait_seconds_max": round(self.stats["wait_seconds_max"], 3),
+            "wait_seconds_p50": percentile(0.5),
+            "wait_seconds_p95": percentile(0.95),
+        }
+
+
+class ConcurrencyCap(_Slots):
+    """At most `limit` holders at once (0: unlimited), the others wait first come, first served"""
+
+    def __init__(self, name: str, limit: int):
+        super().__init__(name)
+        self.limit = limit
+        self.in_use = 0
+        self._queue: Deque[_Waiter] = deque()
+
+    def _enqueue(self, waiter: _Waiter):
+        self._queue.append(waiter)
+
+    def _next(self) -> Optional[_Waiter]:
+        if not self._queue or (self.limit > 0 and self.in_use >= self.limit):
+            return None
+        self.in_use += 1
+        return self._queue.popleft()
+
+    def _remove(self, waiter: _Waiter):
+        self._queue.remove(waiter)
+
+    def _release(self, waiter: _Waiter):
+        self.in_use -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"limit": self.limit, "in_use": self.in_use, "queued": len(self._queue), **self._wait_stats()}
+
+
+class FairScheduler(_Slots):
+    """
+    Admission of analyses: `max_concurrent` slots, `per_user_inflight` per user,
+    and weighted fair queuing across the users waiting for a slot. Each request
+    gets a start tag max(virtual time, finish tag of the user's previous request)
+    and advances the user's finish tag by 1 / weight; the free slot goes to the
+    smallest start tag among users below their in-flight limit.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = ADMISSION_MAX_CONCURRENT_RUNS,
+        per_user_inflight: int = ADMISSION_PER_USER_INFLIGHT,
+        per_user_queued: int = ADMISSION_PER_USER_QUEUED,
+        max_queued: int = ADMISSION_MAX_QUEUED,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        super().__init__("analysis")
+        self.max_concurrent = max_concurrent
+        self.per_user_inflight = per_user_inflight
+        self.per_user_queued = per_user_queued
+        self.max_queued = max_queued
+        self.weights = dict(ADMISSION_USER_WEIGHTS if weights is None else weights)
+        self.running = 0
+        self._in_flight: Dict[Any, int] = {}
+        self._queues: Dict[Any, Deque[_Waiter]] = {}
+        self._finish_tags: Dict[Any, float] = {}
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+
+    def _queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _enqueue(self, waiter: _Waiter):
+        user = waiter.key
+        if len(self._queues.get(user, ())) >= self.per_user_queued:
+            raise AdmissionRejected(f"User {user} already has {self.per_user_queued} analyses waiting")
+        if self._queued() >= self.max_queued:
+            raise AdmissionRejected(f"{self.max_queued} analyses are already waiting")
+        start = max(self._virtual_time, self._finish_tags.get(user, 0.0))
+        self._finish_tags[user] = start + 1.0 / max(float(self.weights.get(user, 1)), 1e-6)
+        waiter.tag = (start, next(self._sequence))
+        self._queues.setdefault(user, deque()).append(waiter)
+
+    def _next(self) -> Optional[_Waiter]:
+        if self.running >= self.max_concurrent:
+            return None
+        eligible = [queue[0] for user, queue in self._queues.items() if self._in_flight.get(user, 0) < self.per_user_inflight]
+        if not eligible:
+            return None
+        waiter = min(eligible, key=lambda w: w.tag)
+        self._pop(waiter)
+        self._virtual_time = max(self._virtual_time, waiter.tag[0])
+        self._in_flight[waiter.key] = self._in_flight.get(waiter.key, 0) + 1
+        self.running += 1
+        return waiter
+
+    def _pop(self, waiter: _Waiter):
+        queue = self._queues[waiter.key]
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[waiter.key]
+
+    def _forget(self, user: Any):
+        # Idle users whose tags fell behind the virtual time carry no history
+        if user not in self._queues and not self._in_flight.get(user) and self._finish_tags.get(user, 0.0) <= self._virtual_time:
+            self._finish_tags.pop(user, None)
+            self._in_flight.pop(user, None)
+
+    def _remove(self, waiter: _Waiter):
+        self._pop(waiter)
+        self._forget(waiter.key)
+
+    def _release(self, waiter: _Waiter):
+        self._in_flight[waiter.key] -= 1
+        self.running -= 1
+        self._forget(waiter.key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "running": self.running,
+                "queued": self._queued(),
+                "queued_by_user": {str(user): len(queue) for user, queue in self._queues.items()},
+                "running_by_user": {str(user): count for user, count in self._in_flight.items() if count},
+                **self._wait_stats(),
+            }
+
+
+# Process-wide instances
+analysis_scheduler = FairScheduler()
+llm_calls = ConcurrencyCap("llm", LLM_MAX_CONCURRENT_CALLS)
+_provider_caps = {provider: ConcurrencyCap(f"provider:{provider}", limit) for provider, limit in PROVIDER_MAX_CONCURRENT_CALLS.items() if limit > 0}
+
+
+def provider_calls(provider: str) -> Optional[ConcurrencyCap]:
+    """Cap of the calls to a data provider, None when it is not capped"""
+    return _provider_caps.get(provider)
+
+
+def admission_stats() -> Dict[str, Any]:
+    return {
+        "analyses": analysis_scheduler.snapshot(),
+        "llm_calls": llm_calls.snapshot(),
+        "providers": {provider: cap.snapshot() for provider, cap in _provider_caps.items()},
+    }
+
+
+class CappedChatModelMixin:
+    """Chat model mixin holding an `llm_calls` slot for the duration of each generation"""
+
+    def _generate(self, *args, **kwargs):
+        with llm_calls.slot():
+            return super()._generate(*args, **kwargs)
+
+    async def _agenerate(self, *args, **kwargs):
+        async with llm_calls.aslot():
+            return await super()._agenerate(*args, **kwargs)
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Admitted invocation ____________________________________ #
+# __________________________________________________________________________________________ #
+def _user(state: Dict[str, Any]) -> str:
+    return state.get("user_id") or state.get("session_id") or "anonymous"
+
+
+def admitted_invoke(graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None, invoke: Optional[Callable] = None, scheduler: Optional[FairScheduler] = None) -> Dict[str, Any]:
+    """
+    Run `invoke(graph, state, config)` (default: checkpointed_invoke) once the
+    scheduler admits the analysis. Raises AdmissionRejected when it does not.
+    """
+    invoke = invoke or checkpointed_invoke
+    if not ADMISSION_ENABLED:
+        return invoke(graph, state, config)
+    user = _user(state)
+    started = time.time()
+    with (scheduler or analysis_scheduler).slot(user, ADMISSION_QUEUE_TIMEOUT):
+        logger.debug("Admitted analysis of %s after %.2fs", user, time.time() - started)
+        return invoke(graph, state, config)
+
+
+async def aadmitted_invoke(graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None, invoke: Optional[Callable] = None, scheduler: Optional[FairScheduler] = None) -> Dict[str, Any]:
+    """Async variant of admitted_invoke (default: acheckpointed_invoke)"""
+    invoke = invoke or acheckpointed_invoke
+    if not ADMISSION_ENABLED:
+        return await invoke(graph, state, config)
+    user = _user(state)
+    started = time.time()
+    async with (scheduler or analysis_scheduler).aslot(user, ADMISSION_QUEUE_TIMEOUT):
+        logger.debug("Admitted analysis of %s after %.2fs", user, time.time() - started)
+        return await invoke(graph, state, config)
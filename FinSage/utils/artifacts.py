@@ -0,0 +1,79 @@
+"""
+Side storage for large intermediate results.
+
+Agent executor outputs carry every tool observation (`intermediate_steps`),
+often tens of kilobytes per agent. Keeping them in the graph state means they
+are copied on every step and written to every checkpoint, although only the
+tool-usage evaluator reads them. They are stored here instead and the state
+keeps a small reference: the answer, the deadline flag and the artifact id.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from FinSage.config.runtime import ARTIFACT_STORE_MAX_ENTRIES
+from FinSage.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class ArtifactStore:
+    """Thread-safe in-memory store of artifacts by id, evicting the oldest beyond `max_entries`."""
+
+    def __init__(self, max_entries: int = ARTIFACT_STORE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._artifacts: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"stored": 0, "hits": 0, "misses": 0, "evicted": 0}
+
+    def put(self, value: Any, artifact_id: Optional[str] = None) -> str:
+        artifact_id = artifact_id or uuid.uuid4().hex
+        with self._lock:
+            self._artifacts[artifact_id] = value
+            self._artifacts.move_to_end(artifact_id)
+            self.stats["stored"] += 1
+            while len(self._artifacts) > self.max_entries:
+                self._artifacts.popitem(last=False)
+                self.stats["evicted"] += 1
+        return artifact_id
+
+    def get(self, artifact_id: Optional[str], default: Any = None) -> Any:
+        with self._lock:
+            if artifact_id not in self._artifacts:
+                self.stats["misses"] += 1
+                return default
+            self.stats["hits"] += 1
+            return self._artifacts[artifact_id]
+
+    def delete(self, artifact_id: str):
+        with self._lock:
+            self._artifacts.pop(artifact_id, None)
+
+    def __len__(self) -> int:
+        return len(self._artifacts)
+
+
+# Process-wide artifact store
+artifact_store = ArtifactStore()
+
+
+def offload_executor_output(output: Dict[str, Any], store: Optional[ArtifactStore] = None) -> Dict[str, Any]:
+    """Stores an agent executor output; returns the reference kept as `full_response` in the state"""
+    artifact_id = (store or artifact_store).put(output)
+    return {
+        "output": output.get("output"),
+        "deadline_exceeded": bool(output.get("deadline_exceeded")),
+        "artifact_id": artifact_id,
+    }
+
+
+def load_executor_output(full_response: Dict[str, Any], store: Optional[ArtifactStore] = None) -> Dict[str, Any]:
+    """The complete executor output behind a `full_response` reference"""
+    if "intermediate_steps" in full_response:
+        return full_response
+    stored = (store or artifact_store).get(full_response.get("artifact_id"))
+    if stored is None:
+        logger.warning("Executor output %s is no longer stored, evaluating without its tool steps", full_response.get('artifact_id'))
+        return {**full_response, "intermediate_steps": []}
+    return stored
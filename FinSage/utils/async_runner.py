@@ -0,0 +1,65 @@
+"""
+Helpers to drive many FinSage graph runs from a single event loop.
+
+The async graph (`FinSage_agent_async`) awaits every LLM call, so one process can
+keep dozens of I/O-bound analyses in flight. Tools that are still synchronous
+(requests/yfinance/SQLite) are offloaded by LangChain to the loop's default
+executor, which is sized here for that workload.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional
+
+from FinSage.config.runtime import ASYNC_BLOCKING_IO_THREADS, ASYNC_MAX_CONCURRENT_RUNS
+from FinSage.utils.admission import aadmitted_invoke
+from FinSage.utils.response_cache import acached_invoke
+from FinSage.utils.tracing import atraced_invoke
+from FinSage.utils.usage import ametered_invoke
+
+DEFAULT_GRAPH_CONFIG = {"recursion_limit": 30}
+
+
+async def arun_analysis(state: Dict[str, Any], config: Optional[Dict[str, Any]] = None, graph=None) -> Dict[str, Any]:
+    """Run one analysis on the async FinSage graph."""
+    if graph is None:
+        from FinSage.agents.finsage import FinSage_agent_async as graph
+    # Cache hits skip the admission queue
+    invoke = partial(ametered_invoke, invoke=partial(acached_invoke, invoke=aadmitted_invoke))
+    return await atraced_invoke(graph, state, config or DEFAULT_GRAPH_CONFIG, invoke=invoke)
+
+
+async def arun_many(
+    states: List[Dict[str, Any]],
+    config: Optional[Dict[str, Any]] = None,
+    max_concurrency: int = ASYNC_MAX_CONCURRENT_RUNS,
+    graph=None,
+) -> List[Any]:
+    """
+    Run many analyses concurrently on the current event loop.
+
+    Returns one entry per input state, in order: the final graph state, or the
+    exception raised by that run (one failing run does not cancel the others).
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(state):
+        async with semaphore:
+            return await arun_analysis(state, config, graph)
+
+    return await asyncio.gather(*(_run(state) for state in states), return_exceptions=True)
+
+
+def run_many(
+    states: List[Dict[str, Any]],
+    config: Optional[Dict[str, Any]] = None,
+    max_concurrency: int = ASYNC_MAX_CONCURRENT_RUNS,
+) -> List[Any]:
+    """Synchronous entry point: start an event loop and run all analyses on it."""
+
+    async def _main():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_IO_THREADS, thread_name_prefix="finsage-io"))
+        return await arun_many(states, config, max_concurrency)
+
+    return asyncio.run(_main())
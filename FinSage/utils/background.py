@@ -0,0 +1,76 @@
+"""
+Analyses running in the background of a Streamlit session.
+
+`start_background_run` submits the graph run to the process-wide background
+executor and returns at once. The run records its progress as events: the
+graph nodes starting and finishing (with the answers of the agents) and the
+agent and tool steps. The session keeps the BackgroundRun in st.session_state
+and polls it, so reruns and sidebar interactions neither wait for nor
+interrupt the analysis.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, List, Optional
+
+from FinSage.config.runtime import UI_PREVIEW_CHARS
+from FinSage.utils.callback_tools import EventCallbackHandler, ProgressCallbackHandler
+from FinSage.utils.log import get_logger
+from FinSage.utils.resources import get_background_executor
+
+logger = get_logger(__name__)
+
+
+class BackgroundRun:
+    """One analysis on the background executor, with the events it reported so far"""
+
+    def __init__(self, question: str):
+        self.id = uuid.uuid4().hex
+        self.question = question
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.future: Optional[Future] = None
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        """Record an event (any thread)"""
+        with self._lock:
+            self._events.append({"event": event, "data": data, "time": time.time()})
+
+    def events_since(self, index: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._events[index:]
+
+    @property
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def result(self) -> Dict[str, Any]:
+        """The graph output; raises the error of a failed run"""
+        return self.future.result()
+
+
+def start_background_run(graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None, invoke: Optional[Callable] = None, executor: Optional[Executor] = None) -> BackgroundRun:
+    """
+    Run `invoke(graph, state, config)` (default: graph.invoke) on the background
+    executor. The state callback is replaced by one reporting to the run.
+    """
+    invoke = invoke or (lambda graph, state, config: graph.invoke(state, config))
+    run = BackgroundRun(state["user_input"])
+    state["callback"] = EventCallbackHandler(run.publish, UI_PREVIEW_CHARS)
+    config = dict(config or {})
+    config["callbacks"] = list(config.get("callbacks") or []) + [ProgressCallbackHandler(run.publish)]
+
+    def target():
+        try:
+            return invoke(graph, state, config)
+        except Exception as e:
+            logger.error("Background analysis %s failed: %s", run.id, e)
+            raise
+        finally:
+            run.finished_at = time.time()
+
+    run.future = (executor or get_background_executor()).submit(target)
+    return run
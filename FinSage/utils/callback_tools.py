@@ -1,9 +1,21 @@
-from typing import Dict, Any
+import json
+import threading
+import uuid
+from typing import Callable, Dict, Any, Optional
+
+import pandas as pd
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.schema import AgentAction
+from langchain_core.messages import get_buffer_string
+
+from FinSage.config.runtime import UI_PREVIEW_CHARS, UI_RENDER_INTERVAL, UI_TABLE_PAGE_ROWS
+from FinSage.utils.log import get_logger
+
+logger = get_logger(__name__)
 
 
 class CustomConsoleCallbackHandler(BaseCallbackHandler):
+    """Logs the run: agents and tools at INFO, tool outputs and LLM responses (truncated) at DEBUG"""
 
     def __init__(self):
         """Initialize the handler"""
@@ -13,109 +25,438 @@ class CustomConsoleCallbackHandler(BaseCallbackHandler):
     def write_agent_name(self, name: str):
         """Display agent name"""
         self.current_agent_name = name
-        print(f"\n=== Agent: {name} ===")
+        logger.info("=== Agent: %s ===", name)
 
     def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs):
         """Display tool execution start"""
-        print(f"\n🔧 Using tool: {serialized['name']}")
+        logger.info("🔧 Using tool: %s", serialized['name'])
 
     def on_tool_end(self, output: str, **kwargs):
         """Display tool execution result"""
-        print("\n📤 Tool output:")
-        print("-" * 50)
-        print(output)
-        print("-" * 50)
+        logger.debug("📤 Tool output:\n%s", output)
 
     def on_agent_action(self, action: AgentAction, **kwargs):
         """Display agent action"""
-        print(f"\n🎯 Action: {action.tool}")
-        print("Input:")
-        print("-" * 50)
-        print(action.tool_input)
-        print("-" * 50)
+        logger.info("🎯 Action: %s", action.tool)
+        logger.debug("Input:\n%s", action.tool_input)
 
     def on_llm_start(self, serialized: Dict[str, Any], prompts: list[str], **kwargs):
         """Display when LLM starts processing"""
-        print("\n🤔 Processing...")
+        logger.debug("🤔 Processing...")
 
     def on_llm_end(self, response, **kwargs):
         """Display final LLM response"""
         if hasattr(response, 'generations') and response.generations:
-            print("\n Final LLM Response:")
-            print("-" * 50)
-            print(response.generations[0][0].text)
-            print("-" * 50)
+            logger.debug("Final LLM Response:\n%s", response.generations[0][0].text)
 
     def on_tool_error(self, error: str, **kwargs):
         """Display tool errors"""
-        print(f"\n❌ Error: {error}")
+        logger.error("❌ Error: %s", error)
 
 
 
 class CustomStreamlitCallbackHandler(BaseCallbackHandler):
-    def __init__(self, parent_container):
+    """
+    Renders the run in the chat, one expander per agent. Events are buffered and
+    drawn at most once per `render_interval` seconds: the steps of an agent
+    (tools used, actions, LLM status) update a single element in place, tool
+    outputs and LLM responses are cut to `preview_chars` with the full text as a
+    download, and tabular outputs show their first `page_rows` rows as a
+    dataframe with the full table as a CSV download. Call `flush()` once the run
+    is over to draw what is still buffered.
+    """
+
+    def __init__(self, parent_container, render_interval: float = UI_RENDER_INTERVAL, preview_chars: int = UI_PREVIEW_CHARS, page_rows: int = UI_TABLE_PAGE_ROWS):
         """Initialize the handler with a parent container"""
         self._parent_container = parent_container
         self.current_agent_container = None
         self.is_finish_node = False
+        self.render_interval = render_interval
+        self.preview_chars = preview_chars
+        self.page_rows = page_rows
+        self.stats = {"events": 0, "renders": 0}
+        self._sections: list = []
+        self._tool_names: Dict[Any, str] = {}
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+        # Flushes run on a timer thread, which needs the Streamlit script context to draw
+        try:
+            from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+            self._script_ctx = get_script_run_ctx()
+            self._add_script_ctx = add_script_run_ctx
+        except ImportError:
+            self._script_ctx, self._add_script_ctx = None, None
         super().__init__()
 
     def write_agent_name(self, name: str):
         """Create a new expander for each agent"""
-        self.is_finish_node = (name == "Conversation Handler 💬")
-        if not self.is_finish_node:
-            self.current_agent_container = self._parent_container.expander(name, expanded=True)
+        self.flush()
+        with self._lock:
+            self.is_finish_node = (name == "Conversation Handler 💬")
+            if not self.is_finish_node:
+                self.current_agent_container = self._parent_container.expander(name, expanded=True)
+            else:
+                self.current_agent_container = self._parent_container
+            self._sections.append({
+                "container": self.current_agent_container,
+                "finish": self.is_finish_node,
+                "steps": [],
+                "steps_element": None,
+                "steps_drawn": 0,
+                "pending": [],
+            })
+
+    # ______________________________ buffering ______________________________ #
+    def _add(self, step: Optional[str] = None, item: Optional[tuple] = None):
+        if self.current_agent_container is None:
+            return
+        with self._lock:
+            section = self._sections[-1]
+            if step is not None:
+                section["steps"].append(step)
+            if item is not None:
+                section["pending"].append(item)
+            self.stats["events"] += 1
+            if self.render_interval <= 0:
+                self._render()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.render_interval, self.flush)
+                self._timer.daemon = True
+                if self._add_script_ctx and self._script_ctx:
+                    self._add_script_ctx(self._timer, self._script_ctx)
+                self._timer.start()
+
+    def flush(self):
+        """Draw the buffered events now"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._render()
+
+    def _render(self):
+        rendered = False
+        for section in self._sections:
+            container = section["container"]
+            if len(section["steps"]) > section["steps_drawn"]:
+                if section["steps_element"] is None:
+                    section["steps_element"] = container.empty()
+                section["steps_element"].markdown("  \n".join(section["steps"]))
+                section["steps_drawn"] = len(section["steps"])
+                rendered = True
+            for item in section["pending"]:
+                self._render_item(container, section["finish"], item)
+                rendered = True
+            section["pending"] = []
+        if rendered:
+            self.stats["renders"] += 1
+
+    # ______________________________ drawing ______________________________ #
+    def _render_item(self, container, finish: bool, item: tuple):
+        kind = item[0]
+        if kind == "markdown":
+            if finish:
+                # The answer of the finish node is shown whole
+                container.markdown(item[1])
+            else:
+                self._render_text(container, item[1], "response.md", code=False)
+        elif kind == "sql":
+            _, query, results = item
+            container.markdown("📝 **SQL Query:**")
+            container.code(query, language="sql")
+            container.markdown("📊 **Results:**")
+            self._render_text(container, results, "results.md", code=False)
+        elif kind == "output":
+            _, tool_name, output = item
+            container.markdown(f"📤 Tool output{f' ({tool_name})' if tool_name else ''}:")
+            table = _as_table(output)
+            if table is not None:
+                self._render_table(container, table, tool_name)
+            else:
+                self._render_text(container, output if isinstance(output, str) else str(output), f"{tool_name or 'tool'}_output.txt", code=True)
+        elif kind == "error":
+            container.error(f"Error: {item[1]}")
+
+    def _render_text(self, container, text: str, file_name: str, code: bool):
+        """The first `preview_chars` of `text`, with the whole text as a download"""
+        preview = text if len(text) <= self.preview_chars else f"{text[:self.preview_chars]}\n… [{len(text) - self.preview_chars:,} more characters]"
+        if code:
+            container.code(preview)
         else:
-            self.current_agent_container = self._parent_container
+            container.markdown(preview)
+        if len(text) > self.preview_chars:
+            container.download_button(
+                f"⬇️ Full text ({len(text):,} characters)",
+                text,
+                file_name=file_name,
+                key=f"finsage-download-{uuid.uuid4().hex}",
+                on_click="ignore",
+            )
+
+    def _render_table(self, container, table, tool_name: Optional[str]):
+        container.dataframe(table.head(self.page_rows))
+        if len(table) > self.page_rows:
+            container.caption(f"First {self.page_rows} of {len(table):,} rows")
+            container.download_button(
+                f"⬇️ All {len(table):,} rows (CSV)",
+                table.to_csv(index=False),
+                file_name=f"{tool_name or 'tool'}_output.csv",
+                mime="text/csv",
+                key=f"finsage-download-{uuid.uuid4().hex}",
+                on_click="ignore",
+            )
 
+    # ______________________________ callbacks ______________________________ #
     def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs):
         """Display tool execution start"""
-        if self.current_agent_container:
-            self.current_agent_container.markdown(f"🔧 Using tool: **{serialized['name']}**")
+        name = (serialized or {}).get("name")
+        self._tool_names[kwargs.get("run_id")] = name
+        self._add(step=f"🔧 Using tool: **{name}**")
 
     def on_tool_end(self, output: str, **kwargs):
         """Display tool execution result"""
-        if self.current_agent_container:
-            if self.is_finish_node:
-                # Direct output for finish node
-                self.current_agent_container.markdown(output)
-            else:
-                # Regular tool output handling with formatting
-                if isinstance(output, str) and "SQL Query:" in output:
-                    # Split SQL results into query and results sections
-                    parts = output.split("Results:", 1)
-                    if len(parts) == 2:
-                        query = parts[0].replace("SQL Query:", "").strip()
-                        results = parts[1].strip()
-                        
-                        self.current_agent_container.markdown("📝 **SQL Query:**")
-                        self.current_agent_container.code(query, language="sql")
-                        self.current_agent_container.markdown("📊 **Results:**")
-                        self.current_agent_container.markdown(results)
-                    else:
-                        self.current_agent_container.code(output)
-                else:
-                    self.current_agent_container.markdown("📤 Tool output:")
-                    self.current_agent_container.code(output)
+        tool_name = self._tool_names.pop(kwargs.get("run_id"), None)
+        if self.is_finish_node:
+            # Direct output for finish node
+            self._add(item=("markdown", output if isinstance(output, str) else str(output)))
+        elif isinstance(output, str) and "SQL Query:" in output and "Results:" in output:
+            # Split SQL results into query and results sections
+            query, results = output.split("Results:", 1)
+            self._add(item=("sql", query.replace("SQL Query:", "").strip(), results.strip()))
+        else:
+            self._add(item=("output", tool_name, output))
 
     def on_agent_action(self, action: AgentAction, **kwargs):
         """Display agent action"""
-        if self.current_agent_container:
-            self.current_agent_container.markdown(f"🎯 Action: **{action.tool}**")
-            self.current_agent_container.markdown("Input:")
-            self.current_agent_container.code(action.tool_input)
+        tool_input = action.tool_input if isinstance(action.tool_input, str) else str(action.tool_input)
+        if len(tool_input) > 200:
+            tool_input = tool_input[:200] + " …"
+        self._add(step=f"🎯 Action: **{action.tool}** `{tool_input}`")
 
     def on_llm_start(self, serialized: Dict[str, Any], prompts: list[str], **kwargs):
         """Display when LLM starts processing"""
-        if self.current_agent_container:
-            self.current_agent_container.markdown("🤔 Processing...")
+        self._add(step="🤔 Processing...")
 
     def on_llm_end(self, response, **kwargs):
         """Display final LLM response"""
-        if self.current_agent_container and hasattr(response, 'generations') and response.generations:
-            self.current_agent_container.markdown(response.generations[0][0].text)
+        if hasattr(response, 'generations') and response.generations and response.generations[0][0].text:
+            self._add(item=("markdown", response.generations[0][0].text))
 
     def on_tool_error(self, error: str, **kwargs):
         """Display tool errors"""
-        if self.current_agent_container:
-            self.current_agent_container.error(f"Error: {error}")
\ No newline at end of file
+        self._tool_names.pop(kwargs.get("run_id"), None)
+        self._add(item=("error", error))
+
+
+def _as_table(output: Any):
+    """A DataFrame of a tabular tool output (DataFrame, list of records, or JSON of one), else None"""
+    if isinstance(output, pd.DataFrame):
+        return output
+    if isinstance(output, str):
+        text = output.strip()
+        if not text.startswith(("[", "{")):
+            return None
+        try:
+            output = json.loads(text)
+        except ValueError:
+            return None
+    if isinstance(output, dict):
+        # {"data": [...]} style payloads
+        records = [value for value in output.values() if isinstance(value, list)]
+        output = records[0] if len(records) == 1 else None
+    if isinstance(output, list) and len(output) > 1 and all(isinstance(row, dict) for row in output):
+        return pd.DataFrame(output)
+    return None
+
+class NullCallbackHandler(BaseCallbackHandler):
+    """Callback handler that renders nothing; used for background/speculative runs"""
+
+    def __init__(self):
+        self.current_agent_name = None
+        super().__init__()
+
+    def write_agent_name(self, name: str):
+        self.current_agent_name = name
+
+    def on_tool_end(self, output: Any, **kwargs):
+        # Nodes report their own output with callback.on_tool_end(text), without a run id
+        pass
+
+
+class EventCallbackHandler(BaseCallbackHandler):
+    """
+    Reports the agent and tool events of a run as (event, data) pairs to `emit`,
+    for runs observed from outside the process that executes them (HTTP API,
+    job queue). Tool inputs and outputs are cut to `preview_chars`.
+    """
+
+    def __init__(self, emit: Callable[[str, Dict[str, Any]], None], preview_chars: int = 500):
+        self.current_agent_name = None
+        self._emit = emit
+        self.preview_chars = preview_chars
+        super().__init__()
+
+    def _preview(self, value: Any) -> str:
+        text = value if isinstance(value, str) else str(value)
+        return text if len(text) <= self.preview_chars else text[:self.preview_chars] + " …"
+
+    def write_agent_name(self, name: str):
+        self.current_agent_name = name
+        self._emit("agent", {"name": name})
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs):
+        self._emit("tool_start", {"agent": self.current_agent_name, "tool": (serialized or {}).get("name"), "input": self._preview(input_str)})
+
+    def on_tool_end(self, output: Any, **kwargs):
+        self._emit("tool_end", {"agent": self.current_agent_name, "output": self._preview(output)})
+
+    def on_tool_error(self, error: BaseException, **kwargs):
+        self._emit("tool_error", {"agent": self.current_agent_name, "error": str(error)})
+
+
+class ProgressCallbackHandler(BaseCallbackHandler):
+    """
+    Reports the top-level graph nodes starting and finishing to `emit`:
+    node_start, node_end (with the agent_results the node wrote) and
+    node_error. Pass it in the config callbacks of the graph run.
+    """
+
+    def __init__(self, emit: Callable[[str, Dict[str, Any]], None]):
+        self._emit = emit
+        self._nodes: Dict[Any, str] = {}
+        super().__init__()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, name=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Nodes inside the agent subgraphs have a longer path
+        if node and name == node and node_path(metadata) == node:
+            self._nodes[run_id] = node
+            self._emit("node_start", {"node": node})
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        node = self._nodes.pop(run_id, None)
+        if node:
+            results = outputs.get("agent_results") if isinstance(outputs, dict) else None
+            self._emit("node_end", {"node": node, "results": results or {}})
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        node = self._nodes.pop(run_id, None)
+        if node:
+            self._emit("node_error", {"node": node, "error": str(error)})
+
+
+class CallbackFanout(BaseCallbackHandler):
+    """
+    Forwards callback events to several handlers. Used as state["callback"] when a
+    run is observed (tracing, benchmarks) on top of the UI handler: the agent
+    executors only report to the state callback.
+    """
+
+    def __init__(self, *handlers: BaseCallbackHandler):
+        self.handlers = [h for h in handlers if h is not None]
+        self.current_agent_name = None
+        super().__init__()
+
+    @property
+    def primary(self) -> Optional[BaseCallbackHandler]:
+        """The handler the fan-out was built around (the UI handler)"""
+        return self.handlers[0] if self.handlers else None
+
+    def write_agent_name(self, name: str):
+        self.current_agent_name = name
+        for handler in self.handlers:
+            if hasattr(handler, "write_agent_name"):
+                handler.write_agent_name(name)
+
+    def _forward(self, event: str, *args, **kwargs):
+        for handler in self.handlers:
+            try:
+                getattr(handler, event)(*args, **kwargs)
+            except Exception as e:
+                logger.error("Error in callback handler %s.%s: %s", type(handler).__name__, event, e)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        for handler in self.handlers:
+            try:
+                handler.on_chat_model_start(serialized, messages, **kwargs)
+            except NotImplementedError:
+                # Same fallback LangChain applies to handlers without chat-model support
+                handler.on_llm_start(serialized, [get_buffer_string(m) for m in messages], **kwargs)
+            except Exception as e:
+                logger.error("Error in callback handler %s.on_chat_model_start: %s", type(handler).__name__, e)
+
+    def on_llm_start(self, *args, **kwargs):
+        self._forward("on_llm_start", *args, **kwargs)
+
+    def on_llm_new_token(self, *args, **kwargs):
+        self._forward("on_llm_new_token", *args, **kwargs)
+
+    def on_llm_end(self, *args, **kwargs):
+        self._forward("on_llm_end", *args, **kwargs)
+
+    def on_llm_error(self, *args, **kwargs):
+        self._forward("on_llm_error", *args, **kwargs)
+
+    def on_chain_start(self, *args, **kwargs):
+        self._forward("on_chain_start", *args, **kwargs)
+
+    def on_chain_end(self, *args, **kwargs):
+        self._forward("on_chain_end", *args, **kwargs)
+
+    def on_chain_error(self, *args, **kwargs):
+        self._forward("on_chain_error", *args, **kwargs)
+
+    def on_tool_start(self, *args, **kwargs):
+        self._forward("on_tool_start", *args, **kwargs)
+
+    def on_tool_end(self, *args, **kwargs):
+        self._forward("on_tool_end", *args, **kwargs)
+
+    def on_tool_error(self, *args, **kwargs):
+        self._forward("on_tool_error", *args, **kwargs)
+
+    def on_agent_action(self, *args, **kwargs):
+        self._forward("on_agent_action", *args, **kwargs)
+
+    def on_agent_finish(self, *args, **kwargs):
+        self._forward("on_agent_finish", *args, **kwargs)
+
+
+# Metadata key prefixing the node paths of a graph invoked outside its parent graph (speculative agent runs)
+PARENT_NODE_PATH = "finsage_parent_node_path"
+
+
+def node_path(metadata: Optional[Dict[str, Any]]) -> str:
+    """Node path of a run from its LangGraph metadata, e.g. "FinancialMetricsAgent/EvaluateTopicAdherence" ("graph" outside any node)"""
+    metadata = metadata or {}
+    namespace = metadata.get("langgraph_checkpoint_ns") or metadata.get("checkpoint_ns") or ""
+    segments = [segment.split(":")[0] for segment in namespace.split("|") if segment]
+    path = "/".join(segments) if segments else metadata.get("langgraph_node") or "graph"
+    parent = metadata.get(PARENT_NODE_PATH)
+    return f"{parent}/{path}" if parent else path
+
+
+def token_usage(response: Any) -> Dict[str, int]:
+    """Prompt/completion/cached token counts of an LLM result, from llm_output or usage_metadata"""
+    usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    prompt, completion = usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+    if not (prompt or completion):
+        for generations in getattr(response, "generations", []) or []:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt += metadata.get("input_tokens", 0)
+                completion += metadata.get("output_tokens", 0)
+                cached += (metadata.get("input_token_details") or {}).get("cache_read", 0) or 0
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "cached_tokens": cached}
+
+
+def model_name(response: Any = None, metadata: Optional[Dict[str, Any]] = None, invocation_params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Best-effort model name of an LLM call"""
+    llm_output = getattr(response, "llm_output", None) or {}
+    return (
+        llm_output.get("model_name")
+        or (metadata or {}).get("ls_model_name")
+        or (invocation_params or {}).get("model_name")
+        or (invocation_params or {}).get("model")
+    )
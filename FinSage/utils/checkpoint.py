@@ -0,0 +1,313 @@
+"""
+Persistent, resumable FinSage graph runs.
+
+The FinSage graph is compiled with a checkpointer (CHECKPOINT_BACKEND) and each
+chat session is a LangGraph thread, so the state is saved after every completed
+node, including the nodes of the agent subgraphs (they inherit the checkpointer
+under their own namespace). `checkpointed_invoke` resumes the unfinished run of
+a thread when the same question is asked again, instead of redoing the agents
+that already answered. Runs of one thread are serialized: a second run of the
+same session waits for the first instead of deleting its checkpoints.
+
+The UI callback handler cannot be serialized. The persisted state carries a
+`CallbackRef` naming the thread; the live handler of the current run is looked
+up in a process-local registry.
+"""
+import asyncio
+import dataclasses
+import importlib
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.types import Command
+
+from FinSage.config.runtime import (
+    CHECKPOINT_BACKEND,
+    CHECKPOINT_DB_PATH,
+    CHECKPOINT_KEEP_COMPLETED,
+    CHECKPOINT_RESUME_MAX_AGE,
+)
+from FinSage.utils.callback_tools import NullCallbackHandler
+from FinSage.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Repo types found in checkpointed states, allowed explicitly where deserialization is restricted
+CHECKPOINT_TYPES = [
+    ("FinSage.utils.checkpoint", "CallbackRef"),
+    ("FinSage.models.personality", "AgentPersonality"),
+    ("FinSage.models.personality", "RiskTolerance"),
+    ("FinSage.models.personality", "TimeHorizon"),
+    ("FinSage.models.personality", "InvestmentStyle"),
+]
+
+# Handler attributes forwarded by CallbackRef, besides the on_* events and ignore_* flags
+_HANDLER_ATTRIBUTES = {"write_agent_name", "current_agent_name", "raise_error", "run_inline"}
+
+checkpoint_stats = {"runs": 0, "resumed": 0, "completed": 0, "waited": 0}
+_stats_lock = threading.Lock()
+
+# Seconds between two attempts of an async run to take the lock of its thread
+_ASYNC_LOCK_POLL = 0.05
+
+
+class CallbackRegistry:
+    """Live callback handler of each running thread"""
+
+    def __init__(self):
+        self._handlers: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._null = NullCallbackHandler()
+
+    def bind(self, key: str, handler: Any):
+        with self._lock:
+            self._handlers[key] = handler
+
+    def release(self, key: str):
+        with self._lock:
+            self._handlers.pop(key, None)
+
+    def resolve(self, key: str) -> Any:
+        """The handler bound to `key`, a silent handler once its run is over"""
+        with self._lock:
+            return self._handlers.get(key) or self._null
+
+
+# Process-wide registry
+callback_registry = CallbackRegistry()
+
+
+class ThreadLocks:
+    """One lock per running thread id, shared by the sync and async runs of the process"""
+
+    def __init__(self):
+        self._locks: Dict[str, Tuple[threading.Lock, int]] = {}
+        self._lock = threading.Lock()
+
+    def _take(self, thread_id: str) -> threading.Lock:
+        with self._lock:
+            lock, users = self._locks.get(thread_id) or (threading.Lock(), 0)
+            self._locks[thread_id] = (lock, users + 1)
+            return lock
+
+    def _drop(self, thread_id: str):
+        with self._lock:
+            lock, users = self._locks[thread_id]
+            if users <= 1:
+                del self._locks[thread_id]
+            else:
+                self._locks[thread_id] = (lock, users - 1)
+
+    @contextmanager
+    def hold(self, thread_id: str):
+        lock = self._take(thread_id)
+        try:
+            if not lock.acquire(blocking=False):
+                _count("waited")
+                lock.acquire()
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            self._drop(thread_id)
+
+    @asynccontextmanager
+    async def ahold(self, thread_id: str):
+        lock = self._take(thread_id)
+        try:
+            if not lock.acquire(blocking=False):
+                _count("waited")
+                # Polled rather than awaited in a worker thread, so a cancelled run never takes the lock
+                while not lock.acquire(blocking=False):
+                    await asyncio.sleep(_ASYNC_LOCK_POLL)
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            self._drop(thread_id)
+
+
+thread_locks = ThreadLocks()
+
+
+@dataclasses.dataclass
+class CallbackRef:
+    """Serializable stand-in for state["callback"]: forwards to the handler bound to `key`"""
+    key: str
+
+    def __getattr__(self, name: str):
+        if name.startswith(("on_", "ignore_")) or name in _HANDLER_ATTRIBUTES:
+            return getattr(callback_registry.resolve(self.key), name)
+        raise AttributeError(name)
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Checkpoint backends ____________________________________ #
+# __________________________________________________________________________________________ #
+def _serde() -> JsonPlusSerializer:
+    try:
+        return JsonPlusSerializer(allowed_msgpack_modules=CHECKPOINT_TYPES)
+    except TypeError:
+        # Releases without a deserialization allowlist accept every type
+        return JsonPlusSerializer()
+
+
+def _memory_saver():
+    return MemorySaver(serde=_serde())
+
+
+def _sqlite_saver():
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        logger.warning("langgraph-checkpoint-sqlite is not installed, keeping checkpoints in memory")
+        return _memory_saver()
+
+    class ThreadedSqliteSaver(SqliteSaver):
+        """SqliteSaver usable by the async graph: the SQLite calls run in a worker thread"""
+
+        async def aget_tuple(self, config):
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config, *, filter=None, before=None, limit=None):
+            for item in await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+                yield item
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config, writes, task_id, task_path=""):
+            return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id):
+            return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # One connection shared by the sync and async graphs; SqliteSaver serializes access to it
+    return ThreadedSqliteSaver(sqlite3.connect(CHECKPOINT_DB_PATH, check_same_thread=False), serde=_serde())
+
+
+CHECKPOINT_BACKENDS = {
+    "sqlite": _sqlite_saver,
+    "memory": _memory_saver,
+}
+
+
+@lru_cache(maxsize=None)
+def get_checkpointer(backend: str = CHECKPOINT_BACKEND):
+    """The process-wide checkpoint saver of `backend`, None when checkpointing is off"""
+    if backend in ("", "off"):
+        return None
+    if backend in CHECKPOINT_BACKENDS:
+        return CHECKPOINT_BACKENDS[backend]()
+    module_name, _, factory = backend.partition(":")
+    return getattr(importlib.import_module(module_name), factory)()
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Checkpointed invocation ________________________________ #
+# __________________________________________________________________________________________ #
+def _thread_config(state: Dict[str, Any], config: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    config = dict(config or {})
+    configurable = dict(config.get("configurable") or {})
+    thread_id = configurable.get("thread_id") or state.get("session_id") or str(uuid.uuid4())
+    configurable["thread_id"] = thread_id
+    config["configurable"] = configurable
+    return thread_id, config
+
+
+def _resumable(snapshot, state: Dict[str, Any]) -> bool:
+    """True when the thread has an unfinished, recent run of the same question"""
+    if snapshot is None or not snapshot.next or snapshot.values.get("user_input") != state.get("user_input"):
+        return False
+    if not snapshot.created_at:
+        return True
+    age = time.time() - datetime.fromisoformat(snapshot.created_at).timestamp()
+    return age <= CHECKPOINT_RESUME_MAX_AGE
+
+
+def _count(outcome: str):
+    with _stats_lock:
+        checkpoint_stats[outcome] += 1
+
+
+def _resume_input(snapshot, thread_id: str):
+    logger.info("Resuming the unfinished run of thread %s before %s", thread_id, ", ".join(snapshot.next))
+    _count("resumed")
+    # The interrupted run's deadline has passed meanwhile; the supervisor starts a new one
+    return Command(update={"deadline": None})
+
+
+def checkpointed_invoke(graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Drop-in replacement for `graph.invoke(state, config)` on a checkpointed graph:
+    runs on the thread of the chat session (config thread_id, else state["session_id"])
+    and resumes its unfinished run of the same question. A concurrent run of the
+    same thread waits for this one to finish.
+    """
+    if getattr(graph, "checkpointer", None) is None:
+        return graph.invoke(state, config)
+    thread_id, config = _thread_config(state, config)
+    callback = state.get("callback")
+    with thread_locks.hold(thread_id):
+        output = _run_thread(graph, state, config, thread_id, callback)
+    output["callback"] = callback
+    return output
+
+
+def _run_thread(graph, state: Dict[str, Any], config: Dict[str, Any], thread_id: str, callback) -> Dict[str, Any]:
+    callback_registry.bind(thread_id, callback)
+    _count("runs")
+    try:
+        snapshot = graph.get_state(config)
+        if _resumable(snapshot, state):
+            output = graph.invoke(_resume_input(snapshot, thread_id), config)
+        else:
+            # A new question starts a new run; the caller's conversation is authoritative
+            graph.checkpointer.delete_thread(thread_id)
+            output = graph.invoke({**state, "callback": CallbackRef(thread_id)}, config)
+        _count("completed")
+        if not CHECKPOINT_KEEP_COMPLETED:
+            graph.checkpointer.delete_thread(thread_id)
+    finally:
+        callback_registry.release(thread_id)
+    return output
+
+
+async def acheckpointed_invoke(graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Async variant of `checkpointed_invoke` for the async graph."""
+    if getattr(graph, "checkpointer", None) is None:
+        return await graph.ainvoke(state, config)
+    thread_id, config = _thread_config(state, config)
+    callback = state.get("callback")
+    async with thread_locks.ahold(thread_id):
+        output = await _arun_thread(graph, state, config, thread_id, callback)
+    output["callback"] = callback
+    return output
+
+
+async def _arun_thread(graph, state: Dict[str, Any], config: Dict[str, Any], thread_id: str, callback) -> Dict[str, Any]:
+    callback_registry.bind(thread_id, callback)
+    _count("runs")
+    try:
+        snapshot = await graph.aget_state(config)
+        if _resumable(snapshot, state):
+            output = await graph.ainvoke(_resume_input(snapshot, thread_id), config)
+        else:
+            await graph.checkpointer.adelete_thread(thread_id)
+            output = await graph.ainvoke({**state, "callback": CallbackRef(thread_id)}, config)
+        _count("completed")
+        if not CHECKPOINT_KEEP_COMPLETED:
+            await graph.checkpointer.adelete_thread(thread_id)
+    finally:
+        callback_registry.release(thread_id)
+    return output
@@ -0,0 +1,243 @@
+"""
+Bounded conversation context for the graph nodes.
+
+`state["messages"]` keeps the whole conversation: prior turns, the current
+question and every agent output of this request. Sending all of it to every
+LLM call makes prompts grow with each agent hop and each turn, so nodes get a
+token-budgeted slice instead:
+
+- supervisor: summary of older turns, recent turns, the question and one short
+  status line per agent that already answered,
+- agents: summary of the prior conversation and the question (their task is in
+  their system prompt),
+- finish: summary of older turns, recent turns and the question.
+
+Older turns are summarized in fixed chunks of messages, so the running summary
+only grows by the chunk that just left the window and every chunk summary is
+computed once (extractive by default, or with the "context_summarizer" model).
+Token counts are estimated at 4 characters per token.
+"""
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from FinSage.config.runtime import (
+    CONTEXT_HISTORY_TOKEN_BUDGET,
+    CONTEXT_MANAGER_ENABLED,
+    CONTEXT_STATUS_TOKEN_BUDGET,
+    CONTEXT_SUMMARY_MODE,
+    CONTEXT_SUMMARY_TOKEN_BUDGET,
+)
+from FinSage.utils.deadline import AGENT_MESSAGE_NAMES, DEADLINE_EXCEEDED_MARKER
+from FinSage.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Messages per summarized chunk of older conversation (two question/answer turns)
+SUMMARY_CHUNK_SIZE = 4
+_MARKDOWN_NOISE = re.compile(r"[#*_`>|]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+context_stats = {"builds": 0, "tokens_full": 0, "tokens_sent": 0}
+_stats_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4 if text else 0
+
+
+def message_text(message: Any) -> str:
+    if isinstance(message, str):
+        return message
+    content = getattr(message, "content", "")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+
+def _is_human(message: Any) -> bool:
+    return isinstance(message, str) or getattr(message, "type", None) == "human"
+
+
+def _speaker(message: Any) -> str:
+    if _is_human(message):
+        return "User"
+    return getattr(message, "name", None) or "Assistant"
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut a text to about `budget` tokens, at a word boundary"""
+    if estimate_tokens(text) <= budget:
+        return text
+    cut = text[: budget * 4].rsplit(" ", 1)[0]
+    return cut.rstrip() + " …"
+
+
+def summarize_text(text: str, budget: int) -> str:
+    """Extractive summary: the leading sentences of a message, markdown stripped, within `budget` tokens"""
+    plain = " ".join(_MARKDOWN_NOISE.sub(" ", text).split())
+    summary = ""
+    for sentence in _SENTENCE_END.split(plain):
+        candidate = f"{summary} {sentence}".strip()
+        if estimate_tokens(candidate) > budget:
+            break
+        summary = candidate
+    return summary or truncate_to_tokens(plain, budget)
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Conversation window ____________________________________ #
+# __________________________________________________________________________________________ #
+def split_turn(messages: List[Any], question: str) -> Tuple[List[Any], List[Any]]:
+    """(prior conversation, current turn): the current turn starts at the last message asking `question`"""
+    for index in range(len(messages) - 1, -1, -1):
+        if _is_human(messages[index]) and message_text(messages[index]) == question:
+            return messages[:index], messages[index:]
+    for index in range(len(messages) - 1, -1, -1):
+        if _is_human(messages[index]):
+            return messages[:index], messages[index:]
+    return [], list(messages)
+
+
+def history_window(history: List[Any], budget: int) -> Tuple[List[Any], List[Any]]:
+    """(older, recent): the most recent messages fitting `budget` tokens are kept verbatim"""
+    used, start = 0, len(history)
+    while start > 0:
+        tokens = min(estimate_tokens(message_text(history[start - 1])), budget // 2)
+        if used + tokens > budget:
+            break
+        used += tokens
+        start -= 1
+    # Never split a question from its answer
+    if 0 < start < len(history) and not _is_human(history[start]):
+        start += 1
+    return history[:start], history[start:]
+
+
+@lru_cache(maxsize=1024)
+def _summarize_chunk(transcript: str, budget: int, use_llm: bool) -> str:
+    if use_llm:
+        # Imported lazily: extractive summaries need no model
+        from FinSage.utils.llm.llm import get_llm
+        try:
+            response = get_llm("context_summarizer").invoke([
+                SystemMessage(content=(
+                    "Summarize this excerpt of a conversation with a financial analysis assistant in at most "
+                    f"{budget * 3 // 4} words. Keep tickers, company names, figures and the user's stated goals."
+                )),
+                HumanMessage(content=transcript),
+            ])
+            return truncate_to_tokens(message_text(response), budget)
+        except Exception as e:
+            logger.error("Error summarizing conversation, using an extractive summary: %s", e)
+    lines = transcript.split("\n")
+    per_line = max(20, budget // max(1, len(lines)))
+    return "\n".join(f"{speaker}: {summarize_text(text, per_line)}" for speaker, _, text in (line.partition(": ") for line in lines))
+
+
+def conversation_summary(messages: List[Any], budget: int = CONTEXT_SUMMARY_TOKEN_BUDGET) -> str:
+    """Running summary of `messages`, the most recent chunks first to survive the budget"""
+    if not messages:
+        return ""
+    chunks = []
+    for start in range(0, len(messages), SUMMARY_CHUNK_SIZE):
+        chunk = messages[start:start + SUMMARY_CHUNK_SIZE]
+        transcript = "\n".join(f"{_speaker(m)}: {' '.join(message_text(m).split())}" for m in chunk)
+        # Only complete chunks are worth an LLM call: they never change again
+        use_llm = CONTEXT_SUMMARY_MODE == "llm" and len(chunk) == SUMMARY_CHUNK_SIZE
+        chunks.append(_summarize_chunk(transcript, budget // 2, use_llm))
+
+    kept, used = [], 0
+    for summary in reversed(chunks):
+        tokens = estimate_tokens(summary)
+        if kept and used + tokens > budget:
+            break
+        kept.insert(0, truncate_to_tokens(summary, budget))
+        used += tokens
+    return "\n".join(kept)
+
+
+def _summary_message(summary: str) -> List[BaseMessage]:
+    if not summary:
+        return []
+    return [AIMessage(content=f"Summary of the earlier conversation:\n{summary}", name="ConversationSummary")]
+
+
+def _as_message(message: Any, budget: int) -> BaseMessage:
+    text = truncate_to_tokens(message_text(message), budget)
+    if _is_human(message):
+        return HumanMessage(content=text)
+    return AIMessage(content=text, name=getattr(message, "name", None))
+
+
+def agent_status(current_turn: List[Any]) -> List[BaseMessage]:
+    """One short status message per agent that answered in the current turn"""
+    known_names = set(AGENT_MESSAGE_NAMES.values())
+    statuses: Dict[str, str] = {}
+    for message in current_turn:
+        if _is_human(message):
+            continue
+        name = getattr(message, "name", None)
+        # The SQL agent steps append unnamed messages, the last one is its formatted answer
+        name = name if name in known_names else ("SQLAgent" if not name else None)
+        if name is None:
+            continue
+        text = message_text(message)
+        if text.startswith(DEADLINE_EXCEEDED_MARKER):
+            statuses[name] = "[skipped to meet the response deadline]"
+        else:
+            statuses[name] = f"[completed] {summarize_text(text, CONTEXT_STATUS_TOKEN_BUDGET)}"
+    return [AIMessage(content=status, name=name) for name, status in statuses.items()]
+
+
+def _record(full: List[Any], sent: List[BaseMessage]):
+    with _stats_lock:
+        context_stats["builds"] += 1
+        context_stats["tokens_full"] += sum(estimate_tokens(message_text(m)) for m in full)
+        context_stats["tokens_sent"] += sum(estimate_tokens(message_text(m)) for m in sent)
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Per-node slices ________________________________________ #
+# __________________________________________________________________________________________ #
+def _windowed_conversation(state: Dict[str, Any]) -> Tuple[List[BaseMessage], List[Any]]:
+    question = state.get("user_input", "")
+    history, current = split_turn(state.get("messages", []), question)
+    older, recent = history_window(history, CONTEXT_HISTORY_TOKEN_BUDGET)
+    context = _summary_message(conversation_summary(older))
+    context += [_as_message(m, CONTEXT_HISTORY_TOKEN_BUDGET // 2) for m in recent]
+    context.append(HumanMessage(content=question or (message_text(current[0]) if current else "")))
+    return context, current[1:]
+
+
+def supervisor_context(state: Dict[str, Any]) -> List[Any]:
+    """Messages for the supervisor: windowed conversation, the question and the agents' status"""
+    if not CONTEXT_MANAGER_ENABLED:
+        return state.get("messages", [])
+    context, current = _windowed_conversation(state)
+    context += agent_status(current)
+    _record(state.get("messages", []), context)
+    return context
+
+
+def agent_context(state: Dict[str, Any]) -> List[Any]:
+    """Messages for an agent executor: summary of the prior conversation and the question"""
+    if not CONTEXT_MANAGER_ENABLED:
+        return state.get("messages", [])
+    question = state.get("user_input", "")
+    history, _ = split_turn(state.get("messages", []), question)
+    context = _summary_message(conversation_summary(history)) + [HumanMessage(content=question)]
+    _record(state.get("messages", []), context)
+    return context
+
+
+def conversation_context(state: Dict[str, Any]) -> List[Any]:
+    """Messages for the conversational (finish) node: windowed conversation and the question"""
+    if not CONTEXT_MANAGER_ENABLED:
+        return state.get("messages", [])
+    context, _ = _windowed_conversation(state)
+    _record(state.get("messages", []), context)
+    return context
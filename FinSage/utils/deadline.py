@@ -0,0 +1,180 @@
+"""
+Per-request deadline propagated through the FinSage graph.
+
+The deadline is stored in the state as an absolute epoch timestamp
+(`state["deadline"]`), so it survives copies and checkpoints. Every node reads
+its share of the remaining budget from it:
+
+- the supervisor stops dispatching and routes to the Synthesizer once only
+  the synthesis reserve is left,
+- agents get a time share (remaining budget split across the agents still
+  expected to run) and are cancelled when they exceed it,
+- evaluation retries are skipped when the budget is low,
+- the Synthesizer marks sections that were skipped.
+"""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+from FinSage.config.runtime import (
+    DEADLINE_MAX_ABANDONED_CALLS,
+    DEADLINE_MIN_AGENT_SECONDS,
+    DEADLINE_RETRY_MIN_SECONDS,
+    DEADLINE_SYNTHESIS_RESERVE_SECONDS,
+    REQUEST_DEADLINE_SECONDS,
+)
+from FinSage.utils.log import get_logger
+from FinSage.utils.query_analysis import classify_intent
+
+logger = get_logger(__name__)
+
+DEADLINE_EXCEEDED_MARKER = "NOT AVAILABLE"
+
+# Agent node -> name of the AIMessage it produces
+AGENT_MESSAGE_NAMES = {
+    "FinancialMetricsAgent": "FinancialMetrics",
+    "NewsSentimentAgent": "NewsSentiment",
+    "MarketIntelligenceAgent": "MarketIntelligence",
+    "SQLAgent": "SQLAgent",
+}
+
+# Rough number of agents the supervisor dispatches per intent
+_EXPECTED_AGENTS = {
+    "investment_decision": 3,
+    "comparison": 2,
+}
+
+# Sync agent calls that blew their budget and are still running in their thread
+_abandoned_lock = threading.Lock()
+deadline_stats = {"abandoned_running": 0, "abandoned_total": 0, "skipped_saturated": 0}
+
+
+def ensure_deadline(state: Dict[str, Any], budget_seconds: float = REQUEST_DEADLINE_SECONDS) -> Optional[float]:
+    """Start the request deadline on first use. Returns the absolute deadline, or None when disabled."""
+    if state.get("deadline") is None and budget_seconds and budget_seconds > 0:
+        state["deadline"] = time.time() + budget_seconds
+    return state.get("deadline")
+
+
+def remaining(state: Dict[str, Any]) -> float:
+    """Seconds left before the deadline (infinite when no deadline is set)."""
+    deadline = state.get("deadline")
+    return math.inf if deadline is None else deadline - time.time()
+
+
+def synthesis_due(state: Dict[str, Any]) -> bool:
+    """True when only the synthesis reserve (or less) is left."""
+    return remaining(state) <= DEADLINE_SYNTHESIS_RESERVE_SECONDS
+
+
+def can_retry(state: Dict[str, Any]) -> bool:
+    """Evaluation-driven retries are only worth it with enough budget left."""
+    return remaining(state) >= DEADLINE_RETRY_MIN_SECONDS + DEADLINE_SYNTHESIS_RESERVE_SECONDS
+
+
+def _completed_agents(state: Dict[str, Any]) -> int:
+    names = set(state.get("agent_results") or {}) or {getattr(msg, "name", None) for msg in state.get("messages", [])}
+    return sum(1 for name in AGENT_MESSAGE_NAMES.values() if name in names)
+
+
+def agent_time_budget(state: Dict[str, Any], default_seconds: float) -> float:
+    """
+    Time an agent may spend: its remaining share of the request budget, capped by
+    the agent's own default `max_execution_time`. Returns 0 when the agent should
+    not start at all.
+    """
+    left = remaining(state)
+    if math.isinf(left):
+        return default_seconds
+    expected = _EXPECTED_AGENTS.get(classify_intent(state.get("user_input", "")), 1)
+    pending = max(1, expected - _completed_agents(state))
+    share = (left - DEADLINE_SYNTHESIS_RESERVE_SECONDS) / pending
+    if share < DEADLINE_MIN_AGENT_SECONDS:
+        return 0
+    return min(default_seconds, share)
+
+
+def deadline_exceeded_output(agent_label: str) -> Dict[str, Any]:
+    """AgentExecutor-shaped output used when an agent is skipped or cancelled."""
+    return {
+        "output": f"{DEADLINE_EXCEEDED_MARKER}: the {agent_label} analysis was skipped to meet the response deadline.",
+        "intermediate_steps": [],
+        "deadline_exceeded": True,
+    }
+
+
+def invoke_within_budget(fn: Callable[[], Dict[str, Any]], budget_seconds: float, agent_label: str, has_deadline: bool = True) -> Dict[str, Any]:
+    """
+    Run a blocking agent call with a hard timeout. The executor's own
+    max_execution_time stops it between steps; this also bounds a single slow
+    LLM or tool call. Each call runs on its own daemon thread, so a timed-out
+    call is abandoned without holding a worker other agents would queue for;
+    while DEADLINE_MAX_ABANDONED_CALLS of them are still running, new agents
+    are skipped.
+    """
+    if budget_seconds <= 0:
+        return deadline_exceeded_output(agent_label)
+    if not has_deadline:
+        return fn()
+    if deadline_stats["abandoned_running"] >= DEADLINE_MAX_ABANDONED_CALLS:
+        logger.warning("%s skipped: %s timed-out agent calls are still running", agent_label, deadline_stats["abandoned_running"])
+        with _abandoned_lock:
+            deadline_stats["skipped_saturated"] += 1
+        return deadline_exceeded_output(agent_label)
+
+    future: Future = Future()
+    call = {"finished": False, "abandoned": False}
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            future.set_result(context.run(fn))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with _abandoned_lock:
+                call["finished"] = True
+                if call["abandoned"]:
+                    deadline_stats["abandoned_running"] -= 1
+
+    threading.Thread(target=run, name=f"finsage-deadline-{agent_label}", daemon=True).start()
+    try:
+        # Small grace period so the executor can return its own early-stopped answer first
+        return future.result(timeout=budget_seconds + 5)
+    except FutureTimeoutError:
+        with _abandoned_lock:
+            if not call["finished"]:
+                call["abandoned"] = True
+                deadline_stats["abandoned_running"] += 1
+                deadline_stats["abandoned_total"] += 1
+        if not call["abandoned"]:
+            # Finished right at the timeout
+            return future.result()
+        logger.warning("%s exceeded its %.0fs budget and was cancelled", agent_label, budget_seconds)
+        return deadline_exceeded_output(agent_label)
+
+
+async def ainvoke_within_budget(coro, budget_seconds: float, agent_label: str, has_deadline: bool = True) -> Dict[str, Any]:
+    """Async variant of `invoke_within_budget`; the agent task is actually cancelled on timeout."""
+    if budget_seconds <= 0:
+        coro.close()
+        return deadline_exceeded_output(agent_label)
+    if not has_deadline:
+        return await coro
+    try:
+        return await asyncio.wait_for(coro, timeout=budget_seconds + 5)
+    except asyncio.TimeoutError:
+        logger.warning("%s exceeded its %.0fs budget and was cancelled", agent_label, budget_seconds)
+        return deadline_exceeded_output(agent_label)
+
+
+def missing_section(state: Dict[str, Any]) -> str:
+    """Placeholder for a synthesis source that has no agent output."""
+    if state.get("deadline_reached"):
+        return f"{DEADLINE_EXCEEDED_MARKER} (skipped to meet the response deadline)"
+    return ""
@@ -0,0 +1,172 @@
+"""
+Agent self-evaluation modes.
+
+The specialist subgraphs grade every answer with a tool-usage check and an LLM
+topic-adherence judge, and re-run the agent when a check fails. That costs one
+LLM round trip per run and sometimes a full re-run, all on the user's latency.
+`EVALUATION_MODE` decides where that work happens:
+
+- "inline": inside the subgraph, as before,
+- "sampled": the agent answers right away and `EVALUATION_SAMPLE_RATE` of the
+  runs is graded by a background worker that appends the results to
+  `EVALUATION_RESULTS_PATH` (JSONL),
+- "off": no evaluation.
+"""
+import copy
+import json
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from FinSage.config.runtime import (
+    EVALUATION_MODE,
+    EVALUATION_QUEUE_SIZE,
+    EVALUATION_RESULTS_PATH,
+    EVALUATION_SAMPLE_RATE,
+)
+from FinSage.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+EVALUATION_MODES = ("inline", "sampled", "off")
+
+
+def _last(values: List[Any]) -> Any:
+    return values[-1] if values else None
+
+
+def _snapshot(state: Dict[str, Any], internal_key: str) -> Dict[str, Any]:
+    """The part of the state the evaluators read, detached from the live run."""
+    return {
+        "user_input": state.get("user_input"),
+        "current_date": state.get("current_date"),
+        "run_id": state.get("run_id"),
+        internal_key: copy.deepcopy(state[internal_key]),
+    }
+
+
+class BackgroundEvaluator:
+    """Samples agent runs and evaluates them on a daemon worker thread."""
+
+    def __init__(
+        self,
+        mode: str = EVALUATION_MODE,
+        sample_rate: float = EVALUATION_SAMPLE_RATE,
+        results_path: str = EVALUATION_RESULTS_PATH,
+        queue_size: int = EVALUATION_QUEUE_SIZE,
+    ):
+        if mode not in EVALUATION_MODES:
+            raise ValueError(f"Unknown evaluation mode {mode!r}, expected one of {EVALUATION_MODES}")
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.results_path = results_path
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {"seen": 0, "sampled": 0, "evaluated": 0, "failed": 0, "dropped": 0}
+
+    def submit(self, agent_name: str, state: Dict[str, Any], internal_key: str, evaluators: List[Callable]) -> bool:
+        """
+        Queue a finished agent run for evaluation if it is sampled. `evaluators` are
+        the subgraph's own evaluation nodes, applied in order to a copy of the state.
+        Returns True when the run was queued.
+        """
+        with self._lock:
+            self.stats["seen"] += 1
+        if self.mode != "sampled" or random.random() >= self.sample_rate:
+            return False
+        if state.get(internal_key, {}).get("full_response", {}).get("deadline_exceeded"):
+            return False
+
+        job = (agent_name, internal_key, evaluators, _snapshot(state, internal_key), time.time())
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+            return False
+        with self._lock:
+            self.stats["sampled"] += 1
+        self._ensure_worker()
+        return True
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="finsage-evaluator", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._evaluate(*job)
+            finally:
+                self._queue.task_done()
+
+    def _evaluate(self, agent_name: str, internal_key: str, evaluators: List[Callable], snapshot: Dict[str, Any], queued_at: float):
+        started = time.time()
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "agent": agent_name,
+            "run_id": snapshot.get("run_id"),
+            "user_input": snapshot.get("user_input"),
+            "queue_wait_seconds": round(started - queued_at, 3),
+        }
+        try:
+            for evaluator in evaluators:
+                # Evaluators are graph nodes: they return the channels they update
+                snapshot = {**snapshot, **evaluator(snapshot)}
+            internal = snapshot[internal_key]
+            tools_eval = internal.get("all_tools_eval", {})
+            adherence_eval = internal.get("topic_adherence_eval", {})
+            last_stats = _last(tools_eval.get("stats", [])) or {}
+            record.update({
+                "all_tools_used": _last(tools_eval.get("passed", [])),
+                "tool_counts": last_stats.get("tool_counts"),
+                "tool_errors": last_stats.get("errors"),
+                "topic_adherence_passed": _last(adherence_eval.get("passed", [])),
+                "topic_adherence_reason": _last(adherence_eval.get("reason", [])),
+            })
+            status = "evaluated"
+        except Exception as e:
+            logger.error("Background evaluation of %s failed: %s", agent_name, e)
+            record["error"] = str(e)
+            status = "failed"
+        record["evaluation_seconds"] = round(time.time() - started, 3)
+
+        self._persist(record)
+        with self._lock:
+            self.stats[status] += 1
+
+    def _persist(self, record: Dict[str, Any]):
+        try:
+            with open(self.results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            logger.error("Could not persist evaluation result: %s", e)
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued run is evaluated. Returns False on timeout."""
+        deadline = None if timeout is None else time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+
+def load_evaluation_results(path: str = EVALUATION_RESULTS_PATH) -> List[Dict[str, Any]]:
+    """Read back the persisted evaluation results."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+# Process-wide evaluator shared by the agent subgraphs
+background_evaluator = BackgroundEvaluator()
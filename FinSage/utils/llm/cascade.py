@@ -0,0 +1,126 @@
+"""
+Small-to-large model cascade for the synthesizer.
+
+With SYNTHESIS_CASCADE_ENABLED the synthesis is first attempted with the
+"synthesizer_small" route. The "synthesizer" (large) route is used directly
+when the query looks complex, and as a second attempt when the small model's
+answer looks weak. Both checks are local heuristics, no extra LLM call.
+"""
+import re
+import threading
+from typing import Any, Dict, List
+
+from langchain_core.messages import BaseMessage
+
+from FinSage.config.runtime import (
+    SYNTHESIS_CASCADE_COMPLEXITY_THRESHOLD,
+    SYNTHESIS_CASCADE_CONFIDENCE_THRESHOLD,
+    SYNTHESIS_CASCADE_ENABLED,
+)
+from FinSage.utils.deadline import AGENT_MESSAGE_NAMES, DEADLINE_EXCEEDED_MARKER, synthesis_due
+from FinSage.utils.llm.llm import get_llm
+from FinSage.utils.log import get_logger
+from FinSage.utils.query_analysis import classify_intent, extract_symbols
+
+logger = get_logger(__name__)
+
+_HEDGING_PATTERNS = [
+    r"\binsufficient (data|information)\b",
+    r"\bnot enough (data|information)\b",
+    r"\bi (cannot|can't|am unable to)\b",
+    r"\bunable to (determine|provide|assess)\b",
+    r"\bno data (is )?available\b",
+]
+_TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$", re.MULTILINE)
+
+cascade_stats = {"small": 0, "escalated": 0, "direct_large": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(outcome: str):
+    with _stats_lock:
+        cascade_stats[outcome] += 1
+
+
+def _agent_sections(state: Dict[str, Any]) -> List[str]:
+    results = state.get("agent_results")
+    if results:
+        return [
+            result["output"] for result in results.values()
+            if result.get("output") and not result.get("deadline_exceeded") and not result["output"].startswith(DEADLINE_EXCEEDED_MARKER)
+        ]
+    names = set(AGENT_MESSAGE_NAMES.values())
+    return [
+        msg.content for msg in state.get("messages", [])
+        if getattr(msg, "name", None) in names and msg.content and not msg.content.startswith(DEADLINE_EXCEEDED_MARKER)
+    ]
+
+
+def query_complexity(state: Dict[str, Any]) -> float:
+    """0-1 estimate of how demanding the synthesis is: intent, tickers, number and size of the agent sections."""
+    question = state.get("user_input", "")
+    sections = _agent_sections(state)
+    score = 0.0
+    if classify_intent(question) in ("investment_decision", "comparison"):
+        score += 0.35
+    if len(extract_symbols(question)) >= 2:
+        score += 0.2
+    if len(sections) >= 3:
+        score += 0.25
+    elif len(sections) == 2:
+        score += 0.1
+    if sum(len(section) for section in sections) > 12000:
+        score += 0.2
+    return min(1.0, score)
+
+
+def answer_confidence(state: Dict[str, Any], answer: str) -> float:
+    """0-1 estimate of the quality of a synthesis: length, tables, ticker coverage, no hedging."""
+    answer = answer or ""
+    lowered = answer.lower()
+    score = 0.25 * min(1.0, len(answer) / 800)
+    if len(_TABLE_ROW.findall(answer)) >= 2:
+        score += 0.25
+    wanted = set(extract_symbols(state.get("user_input", "")))
+    if not wanted or wanted <= set(extract_symbols(answer)):
+        score += 0.25
+    if not any(re.search(pattern, lowered) for pattern in _HEDGING_PATTERNS):
+        score += 0.25
+    return score
+
+
+def _start_large(state: Dict[str, Any]) -> bool:
+    if query_complexity(state) >= SYNTHESIS_CASCADE_COMPLEXITY_THRESHOLD:
+        _count("direct_large")
+        return True
+    return False
+
+
+def _keep_small(state: Dict[str, Any], response: BaseMessage) -> bool:
+    # Close to the deadline a second synthesis is not affordable
+    if synthesis_due(state) or answer_confidence(state, response.content) >= SYNTHESIS_CASCADE_CONFIDENCE_THRESHOLD:
+        _count("small")
+        return True
+    logger.info("Escalating synthesis to the large model")
+    _count("escalated")
+    return False
+
+
+def synthesize_with_cascade(state: Dict[str, Any], messages: List[BaseMessage]) -> BaseMessage:
+    """Run the synthesis prompt through the cascade (or straight on the large model when disabled)."""
+    if not SYNTHESIS_CASCADE_ENABLED or _start_large(state):
+        return get_llm("synthesizer").invoke(messages)
+    response = get_llm("synthesizer_small").invoke(messages)
+    if _keep_small(state, response):
+        return response
+    return get_llm("synthesizer").invoke(messages)
+
+
+async def asynthesize_with_cascade(state: Dict[str, Any], messages: List[BaseMessage]) -> BaseMessage:
+    """Async variant of synthesize_with_cascade"""
+    if not SYNTHESIS_CASCADE_ENABLED or _start_large(state):
+        return await get_llm("synthesizer").ainvoke(messages)
+    response = await get_llm("synthesizer_small").ainvoke(messages)
+    if _keep_small(state, response):
+        return response
+    return await get_llm("synthesizer").ainvoke(messages)
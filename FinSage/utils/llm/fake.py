@@ -0,0 +1,417 @@
+"""
+Deterministic fake chat model for offline runs and benchmarks.
+
+Selected with LLM_BACKEND=fake: `get_llm(node)` then returns a `FakeChatModel`
+for the node instead of a provider client. It answers every call the graph
+makes, with no network:
+
+- structured outputs (`with_structured_output`) for RouteSchema,
+  AnalyzedQuestion and LLM_TopicAdherenceEval, plus a typed default for
+  any other schema,
+- tool calls for the agent executors (first step calls every bound tool for
+  the question's tickers, second step answers from the tool observations),
+- templated text for the SQL steps, the synthesizer and the finish node,
+- scripted responses per node from FAKE_LLM_SCRIPT_FILE, which take precedence.
+
+Latency and token counts are simulated (FAKE_LLM_* settings) and reported
+like a provider would: `usage_metadata` on the message and `token_usage` in
+the LLM output, so callbacks and metrics see realistic numbers.
+"""
+import asyncio
+import ast
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field, PrivateAttr
+
+from FinSage.config.runtime import (
+    FAKE_LLM_LATENCY_JITTER_MS,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_LLM_MS_PER_OUTPUT_TOKEN,
+    FAKE_LLM_SCRIPT_FILE,
+    FAKE_LLM_SEED,
+    FAKE_LLM_TOKEN_SCALE,
+)
+from FinSage.utils.query_analysis import classify_intent, extract_symbols
+
+# Schema name -> class, filled by with_structured_output so responses can be parsed back
+_STRUCTURED_SCHEMAS: Dict[str, Any] = {}
+
+# Intent -> agents the scripted supervisor dispatches, in order
+_ROUTES = {
+    "investment_decision": ["FinancialMetricsAgent", "NewsSentimentAgent", "MarketIntelligenceAgent"],
+    "comparison": ["FinancialMetricsAgent", "MarketIntelligenceAgent"],
+    "fundamentals": ["FinancialMetricsAgent"],
+    "technical": ["MarketIntelligenceAgent"],
+    "sentiment": ["NewsSentimentAgent"],
+    "historical": ["SQLAgent"],
+}
+_AGENT_MESSAGE_NAMES = {
+    "FinancialMetricsAgent": "FinancialMetrics",
+    "NewsSentimentAgent": "NewsSentiment",
+    "MarketIntelligenceAgent": "MarketIntelligence",
+}
+
+# Question keywords -> SQL tables (see SQL_AGENT_ANALYZE_PROMPT)
+_SQL_TABLES = [
+    (("price", "close", "stock price"), "Price"),
+    (("revenue", "profit", "income"), "revenue_profit"),
+    (("ratio", "roe", "margin"), "ratios"),
+    (("asset", "liabilit", "debt"), "Assets Liabilities"),
+    (("pe", "p/e", "industry"), "industry_pe_ratios"),
+    (("technical", "rsi", "moving average"), "technicals"),
+]
+
+# Agent node -> opening sentence of its scripted answer
+_AGENT_SUMMARIES = {
+    "financial_metrics_agent": "Financial metrics: revenue, net income, EPS, P/E valuation, margins, cash flow and debt for {symbols}.",
+    "market_intelligence_agent": "Market intelligence: price trend, volume, moving averages, support/resistance and insider activity for {symbols}.",
+    "news_sentiment_agent": "News sentiment: headline sentiment (positive/negative/neutral), sources and investor perception for {symbols}.",
+}
+
+
+def _load_script(node: str) -> List[Any]:
+    if not FAKE_LLM_SCRIPT_FILE:
+        return []
+    with open(FAKE_LLM_SCRIPT_FILE, encoding="utf-8") as f:
+        return list(json.load(f).get(node, []))
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return str(content)
+
+
+def _question(messages: Sequence[BaseMessage]) -> str:
+    humans = [_text(m) for m in messages if isinstance(m, HumanMessage)]
+    return humans[-1] if humans else " ".join(_text(m) for m in messages)
+
+
+def _symbols(messages: Sequence[BaseMessage]) -> List[str]:
+    return extract_symbols(_question(messages)) or ["AAPL"]
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) * FAKE_LLM_TOKEN_SCALE / 4))
+
+
+def _parse_observation(content: str) -> Any:
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            return parse(content)
+        except (ValueError, SyntaxError, TypeError):
+            continue
+    return content
+
+
+def _numeric_leaves(value: Any, path: str = "", limit: int = 8) -> List[Tuple[str, Any]]:
+    leaves: List[Tuple[str, Any]] = []
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = ((str(i), v) for i, v in enumerate(value[:2]))
+    else:
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and "timestamp" not in path:
+            leaves.append((path, value))
+        return leaves
+    for key, child in items:
+        leaves.extend(_numeric_leaves(child, f"{path}.{key}" if path else str(key), limit))
+        if len(leaves) >= limit:
+            break
+    return leaves[:limit]
+
+
+def _urls(value: Any) -> List[str]:
+    return re.findall(r"https?://[^\s'\"\]},]+", json.dumps(value, default=str))
+
+
+# ____________________________________ structured outputs __________________________________ #
+def _supervisor_conversation(messages: Sequence[BaseMessage]) -> Sequence[BaseMessage]:
+    """
+    The conversation part (MessagesPlaceholder) of the supervisor prompt: the
+    prompt wraps it in its system prompt and a trailing routing instruction,
+    itself a human message, which must not be read as the question.
+    """
+    start = next((i for i, m in enumerate(messages) if not isinstance(m, SystemMessage)), len(messages))
+    conversation = messages[start:]
+    humans = [i for i, m in enumerate(conversation) if isinstance(m, HumanMessage)]
+    if len(humans) > 1 and humans[-1] == len(conversation) - 1:
+        conversation = conversation[:-1]
+    return conversation
+
+
+def _route(messages: Sequence[BaseMessage]) -> Dict[str, Any]:
+    conversation = _supervisor_conversation(messages)
+    question = _question(conversation)
+    intent = classify_intent(question)
+    symbols = extract_symbols(question)
+    plan = _ROUTES.get(intent) or (["FinancialMetricsAgent"] if symbols else [])
+    if not plan:
+        return {
+            "next_action": "FINISH",
+            "task_description": "The question is not a financial analysis request",
+            "expected_output": "A short reply explaining what FinSage can help with",
+            "validation_criteria": [],
+            "query_type": "non_financial_analysis",
+        }
+
+    # Agents that already answered since the question was asked. The supervisor context names the
+    # SQL agent status "SQLAgent"; full histories (CONTEXT_MANAGER_ENABLED off) carry its unnamed steps
+    last_question = max((i for i, m in enumerate(conversation) if isinstance(m, HumanMessage)), default=-1)
+    answered = {getattr(m, "name", None) or "SQLAgent" for m in conversation[last_question + 1:] if isinstance(m, AIMessage)}
+    pending = [agent for agent in plan if _AGENT_MESSAGE_NAMES.get(agent, agent) not in answered]
+    next_action = pending[0] if pending else "FINISH"
+    return {
+        "next_action": next_action,
+        "task_description": f"Analyze {', '.join(symbols) or 'the company'} for: {question}",
+        "expected_output": "Data-backed analysis with the key figures in a table",
+        "validation_criteria": ["Covers every ticker in the question", "Includes numerical data"],
+        "query_type": "financial_analysis",
+    }
+
+
+def _analyze_question(messages: Sequence[BaseMessage]) -> Dict[str, Any]:
+    question = _question(messages).lower()
+    tables = [table for keywords, table in _SQL_TABLES if any(k in question for k in keywords)] or ["Fundamentals"]
+    return {
+        "relevant_tables": {"tables": tables, "explanation": "Tables matched on the question keywords"},
+        "response": ", ".join(tables),
+        "date_available": "true",
+    }
+
+
+def _default_for(annotation: Any) -> Any:
+    origin = getattr(annotation, "__origin__", None) or annotation
+    for kind, default in ((str, ""), (bool, False), (int, 0), (float, 0.0), (list, []), (dict, {})):
+        if origin is kind:
+            return default
+    return None
+
+
+def structured_response(schema_name: str, messages: Sequence[BaseMessage]) -> Dict[str, Any]:
+    """Valid field values for a structured-output schema."""
+    if schema_name == "RouteSchema":
+        return _route(messages)
+    if schema_name == "AnalyzedQuestion":
+        return _analyze_question(messages)
+    if schema_name == "LLM_TopicAdherenceEval":
+        return {"passed": "true", "reason": "Scripted evaluation: the answer addresses the question"}
+    schema = _STRUCTURED_SCHEMAS.get(schema_name)
+    fields = getattr(schema, "model_fields", None) or getattr(schema, "__fields__", {})
+    return {name: _default_for(getattr(field, "annotation", None)) for name, field in fields.items()}
+
+
+# ____________________________________ tool calls __________________________________________ #
+def _tool_arguments(tool: Dict[str, Any], symbol: str) -> Dict[str, Any]:
+    parameters = tool["function"].get("parameters", {})
+    properties = parameters.get("properties", {})
+    arguments = {}
+    for name in parameters.get("required", list(properties)):
+        kind = properties.get(name, {}).get("type", "string")
+        if name == "industry_keywords":
+            arguments[name] = ["technology"]
+        elif kind == "array":
+            arguments[name] = [symbol]
+        elif kind == "integer":
+            arguments[name] = 1
+        elif kind == "number":
+            arguments[name] = 1.0
+        elif kind == "boolean":
+            arguments[name] = True
+        else:
+            arguments[name] = symbol
+    return arguments
+
+
+def _tool_calls_message(messages: Sequence[BaseMessage], tools: List[Dict[str, Any]]) -> AIMessage:
+    tool_calls, raw_calls = [], []
+    for symbol in _symbols(messages):
+        for tool in tools:
+            name = tool["function"]["name"]
+            arguments = _tool_arguments(tool, symbol)
+            call_id = "call_" + hashlib.md5(f"{name}|{symbol}".encode()).hexdigest()[:12]
+            tool_calls.append({"name": name, "args": arguments, "id": call_id})
+            raw_calls.append({"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}})
+    return AIMessage(content="", tool_calls=tool_calls, additional_kwargs={"tool_calls": raw_calls})
+
+
+def _agent_answer(node: str, messages: Sequence[BaseMessage]) -> str:
+    symbols = ", ".join(_symbols(messages))
+    rows, urls = [], []
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            observation = _parse_observation(_text(message))
+            tool_name = getattr(message, "name", None) or "tool"
+            rows.extend(f"| {tool_name} | {key} | {value:,} |" for key, value in _numeric_leaves(observation))
+            urls.extend(_urls(observation))
+    summary = _AGENT_SUMMARIES.get(node, "Analysis for {symbols}.").format(symbols=symbols)
+    lines = [summary, "", "| Source | Metric | Value |", "|---|---|---|"] + (rows or ["| n/a | no data | 0 |"])
+    if urls:
+        lines += ["", "Sources:"] + [f"- {url}" for url in list(dict.fromkeys(urls))[:5]]
+    return "\n".join(lines)
+
+
+# ____________________________________ text responses ______________________________________ #
+def _last_select(messages: Sequence[BaseMessage]) -> Optional[str]:
+    for message in reversed(messages):
+        match = re.search(r"SELECT[\s\S]*?(;|$)", _text(message), re.IGNORECASE)
+        if match:
+            return match.group(0).strip()
+    return None
+
+
+def text_response(node: str, messages: Sequence[BaseMessage], rng: random.Random) -> str:
+    """Templated plain-text answer of a node."""
+    symbols = _symbols(messages)
+    if node == "sql_generate":
+        return f"SELECT * FROM Price WHERE ticker = '{symbols[0]}' ORDER BY date DESC LIMIT 5;"
+    if node == "sql_validate":
+        return _last_select(messages) or f"SELECT * FROM Price WHERE ticker = '{symbols[0]}' ORDER BY date DESC LIMIT 5;"
+    if node == "sql_format":
+        question = _question(messages)
+        query, _, results = question.partition("\nResults: ")
+        return f"SQL Query:\n{query.replace('Query: ', '', 1)}\n\nResults:\n{results}"
+    if node in ("synthesizer", "synthesizer_small"):
+        recommendation = rng.choice(["Buy", "Hold", "Sell"])
+        rows = "\n".join(
+            f"| {symbol} | {rng.uniform(5, 60):.1f} | {rng.uniform(-0.5, 0.8):+.2f} | {recommendation} |" for symbol in symbols
+        )
+        return (
+            f"## Investment Analysis: {', '.join(symbols)}\n\n"
+            "| Ticker | P/E | Sentiment | Recommendation |\n|---|---|---|---|\n"
+            f"{rows}\n\n"
+            "**Fundamentals.** Revenue and earnings trends, margins and balance-sheet strength were weighed "
+            "against the current valuation multiple and the sector average.\n\n"
+            "**Market and sentiment.** Price trend, volume and insider activity were read together with the "
+            "tone of recent news coverage to gauge near-term momentum.\n\n"
+            f"**Recommendation.** {recommendation}, aligned with the investment profile. Confidence is moderate; "
+            "revisit after the next earnings report."
+        )
+    if node == "finish":
+        return "I'm FinSage, a financial analysis assistant. Ask me about a stock, a company's financials, market trends or news sentiment."
+    return f"Scripted response for {node}: {_question(messages)[:200]}"
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers locally and deterministically, with simulated latency and token usage."""
+
+    node: str = "default"
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    latency_jitter_ms: float = FAKE_LLM_LATENCY_JITTER_MS
+    ms_per_output_token: float = FAKE_LLM_MS_PER_OUTPUT_TOKEN
+    seed: int = FAKE_LLM_SEED
+    script: List[Any] = Field(default_factory=list)
+
+    _script_cycle: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "finsage-fake"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"node": self.node, "seed": self.seed}
+
+    # ---------------------------------------------------------------- binding
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def with_structured_output(self, schema: Any, *, include_raw: bool = False, **kwargs: Any):
+        schema_name = getattr(schema, "__name__", str(schema))
+        _STRUCTURED_SCHEMAS[schema_name] = schema
+
+        def _parse(message: AIMessage):
+            values = json.loads(message.content)
+            parsed = schema(**values) if isinstance(schema, type) else values
+            return {"raw": message, "parsed": parsed, "parsing_error": None} if include_raw else parsed
+
+        return self.bind(structured_output=schema_name) | RunnableLambda(_parse)
+
+    # ---------------------------------------------------------------- responses
+    def _next_scripted(self) -> Optional[Any]:
+        if not self.script:
+            return None
+        with self._lock:
+            if self._script_cycle is None:
+                self._script_cycle = itertools.cycle(self.script)
+            return next(self._script_cycle)
+
+    def _respond(self, messages: List[BaseMessage], rng: random.Random, **kwargs: Any) -> AIMessage:
+        scripted = self._next_scripted()
+        if scripted is not None:
+            return AIMessage(content=scripted if isinstance(scripted, str) else json.dumps(scripted))
+        if kwargs.get("structured_output"):
+            return AIMessage(content=json.dumps(structured_response(kwargs["structured_output"], messages)))
+        tools = kwargs.get("tools")
+        if tools:
+            if any(isinstance(m, ToolMessage) for m in messages):
+                return AIMessage(content=_agent_answer(self.node, messages))
+            return _tool_calls_message(messages, tools)
+        return AIMessage(content=text_response(self.node, messages, rng))
+
+    def _rng(self, messages: List[BaseMessage]) -> random.Random:
+        last = _text(messages[-1]) if messages else ""
+        digest = hashlib.md5(f"{self.seed}|{self.node}|{len(messages)}|{last}".encode()).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def _simulate(self, messages: List[BaseMessage], **kwargs: Any) -> Tuple[ChatResult, float]:
+        rng = self._rng(messages)
+        message = self._respond(messages, rng, **kwargs)
+
+        prompt_text = "".join(_text(m) for m in messages) + json.dumps(kwargs.get("tools") or [], default=str)
+        completion_text = _text(message) + json.dumps(message.additional_kwargs.get("tool_calls", []))
+        input_tokens, output_tokens = _estimate_tokens(prompt_text), _estimate_tokens(completion_text)
+        token_usage = {"prompt_tokens": input_tokens, "completion_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+        message.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+        message.response_metadata = {"model_name": f"fake:{self.node}", "token_usage": token_usage}
+
+        jitter = rng.uniform(-self.latency_jitter_ms, self.latency_jitter_ms)
+        delay = max(0.0, self.latency_ms + jitter + self.ms_per_output_token * output_tokens) / 1000
+        result = ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": token_usage, "model_name": f"fake:{self.node}"},
+        )
+        return result, delay
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result, delay = self._simulate(messages, **kwargs)
+        time.sleep(delay)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result, delay = self._simulate(messages, **kwargs)
+        await asyncio.sleep(delay)
+        return result
+
+
+def build_fake_model(node: str) -> FakeChatModel:
+    """Fake model of a graph node, with the node's scripted responses if any."""
+    return FakeChatModel(node=node, script=_load_script(node))
@@ -1,12 +1,61 @@
+from functools import lru_cache
+from typing import Optional
+
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.language_models.chat_models import BaseChatModel
 
 from FinSage.config.settings import setup_environment
+from FinSage.config.runtime import LLM_BACKEND, MODEL_ROUTING
+from FinSage.utils.admission import CappedChatModelMixin
 
 setup_environment()
 
-llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.2)
-llm_syn = ChatOpenAI(model_name="gpt-4o", temperature=0.3)
+
+# Chat models holding an LLM_MAX_CONCURRENT_CALLS slot for each call
+class CappedChatOpenAI(CappedChatModelMixin, ChatOpenAI):
+    pass
+
+
+class CappedChatGoogleGenerativeAI(CappedChatModelMixin, ChatGoogleGenerativeAI):
+    pass
+
+
+@lru_cache(maxsize=None)
+def _build_chat_model(model: str, temperature: float, max_tokens: Optional[int]) -> BaseChatModel:
+    """One client per (model, temperature, max_tokens), shared by every node routed to it"""
+    if model.startswith("gemini"):
+        return CappedChatGoogleGenerativeAI(model=model, temperature=temperature, max_output_tokens=max_tokens)
+    return CappedChatOpenAI(model_name=model, temperature=temperature, max_tokens=max_tokens)
+
+
+@lru_cache(maxsize=None)
+def _build_fake_model(node: str) -> BaseChatModel:
+    # Imported lazily: only offline runs need it
+    from FinSage.utils.llm.fake import build_fake_model
+    return build_fake_model(node)
+
+
+def get_model_config(node: str) -> dict:
+    """Model, temperature and max tokens routed to a graph node (see MODEL_ROUTING)"""
+    return {**MODEL_ROUTING["default"], **MODEL_ROUTING.get(node, {})}
+
+
+def get_llm(node: str = "default") -> BaseChatModel:
+    """
+    Model factory: returns the chat model configured for a graph node
+    (e.g. "supervisor", "financial_metrics_agent", "sql_generate", "synthesizer").
+    Unknown nodes get the "default" route. With LLM_BACKEND=fake every node gets
+    a deterministic offline model instead (see fake.py).
+    """
+    if LLM_BACKEND == "fake":
+        return _build_fake_model(node)
+    config = get_model_config(node)
+    return _build_chat_model(config["model"], config.get("temperature", 0.2), config.get("max_tokens"))
+
+
+llm = get_llm("default")
+llm_syn = get_llm("synthesizer")
 
 # llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp",temperature=0.0,max_output_tokens=8192)
 #llm_syn = ChatGoogleGenerativeAI(model="gemini-exp-1206",temperature=0.0,max_output_tokens=8192)
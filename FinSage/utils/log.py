@@ -0,0 +1,115 @@
+"""
+Structured, non-blocking logging.
+
+A log call only builds a record and puts it on a bounded queue; a background
+thread formats and writes it. Messages take %-style arguments, so a record
+below LOG_LEVEL costs nothing and the payload of one above it is rendered on
+the writer thread, where messages longer than LOG_MAX_CHARS are cut. When the
+queue is full records are dropped and counted instead of blocking the request.
+LOG_FORMAT=json writes one JSON object per line, with the `extra` fields of
+the record.
+
+    logger = get_logger(__name__)
+    logger.debug("Query result: %s", result)
+"""
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from FinSage.config.runtime import LOG_FILE, LOG_FORMAT, LOG_LEVEL, LOG_MAX_CHARS, LOG_QUEUE_SIZE
+
+ROOT_LOGGER = "finsage"
+# Attributes every LogRecord has; the others come from `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+log_stats = {"dropped": 0}
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Enqueues records unformatted, dropping them when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler formats here, on the caller's thread; the writer thread does it instead
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_stats["dropped"] += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Waits for room: the queue can be full at exit
+        try:
+            self.queue.put(self._sentinel, timeout=5)
+        except queue.Full:
+            pass
+
+
+class TruncatingFormatter(logging.Formatter):
+    """Text or JSON lines, with the message cut to `max_chars`"""
+
+    def __init__(self, max_chars: int = LOG_MAX_CHARS, json_lines: bool = False):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.max_chars = max_chars
+        self.json_lines = json_lines
+
+    def _message(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]} … [{len(message) - self.max_chars} more characters]"
+        return message
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.message = self._message(record)
+        if not self.json_lines:
+            record.asctime = self.formatTime(record)
+            text = self.formatMessage(record)
+            return f"{text}\n{self.formatException(record.exc_info)}" if record.exc_info else text
+        entry: Dict[str, Any] = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.message,
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, path: str = LOG_FILE, max_chars: int = LOG_MAX_CHARS, queue_size: int = LOG_QUEUE_SIZE):
+    """Route the "finsage" loggers through the queue to the writer thread (once per process)"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        output = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(sys.stderr)
+        output.setFormatter(TruncatingFormatter(max_chars, json_lines=fmt == "json"))
+        records = queue.Queue(maxsize=queue_size)
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.setLevel(level)
+        logger.addHandler(NonBlockingQueueHandler(records))
+        logger.propagate = False
+        _listener = _Listener(records, output, respect_handler_level=True)
+        _listener.start()
+        # Writes what is still queued at exit
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger of a FinSage module: get_logger(__name__)"""
+    setup_logging()
+    if name.startswith("FinSage."):
+        name = name[len("FinSage."):]
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
@@ -0,0 +1,116 @@
+"""
+Cheap, local analysis of user questions (no LLM calls).
+
+Used wherever we need a fast read of a query before the graph runs: resolving
+the tickers a question is about and classifying its intent.
+"""
+import re
+from typing import List
+
+# Common company names -> ticker symbols (mirrors the mapping hints in the SQL prompts)
+COMPANY_TICKERS = {
+    "apple": "AAPL",
+    "microsoft": "MSFT",
+    "google": "GOOGL",
+    "alphabet": "GOOGL",
+    "amazon": "AMZN",
+    "tesla": "TSLA",
+    "nvidia": "NVDA",
+    "meta": "META",
+    "facebook": "META",
+    "netflix": "NFLX",
+    "amd": "AMD",
+    "intel": "INTC",
+    "ibm": "IBM",
+    "oracle": "ORCL",
+    "salesforce": "CRM",
+    "adobe": "ADBE",
+    "paypal": "PYPL",
+    "disney": "DIS",
+    "walmart": "WMT",
+    "coca-cola": "KO",
+    "coca cola": "KO",
+    "pepsi": "PEP",
+    "pepsico": "PEP",
+    "jpmorgan": "JPM",
+    "jp morgan": "JPM",
+    "goldman sachs": "GS",
+    "berkshire": "BRK.B",
+    "boeing": "BA",
+    "pfizer": "PFE",
+    "johnson & johnson": "JNJ",
+    "exxon": "XOM",
+    "visa": "V",
+    "mastercard": "MA",
+    "uber": "UBER",
+    "palantir": "PLTR",
+}
+
+# Upper-case words that look like tickers but are not
+_NON_TICKERS = {
+    "I", "A", "AN", "THE", "AND", "OR", "IS", "IT", "TO", "OF", "IN", "ON", "AT", "BY",
+    "CEO", "CFO", "CTO", "EPS", "PE", "P", "E", "ROE", "ROA", "EBITDA", "GDP", "CPI",
+    "USA", "US", "USD", "ETF", "IPO", "AI", "SEC", "FED", "Q1", "Q2", "Q3", "Q4",
+    "YOY", "QOQ", "TTM", "RSI", "MACD", "SMA", "EMA", "OK", "FAQ", "NYSE", "NASDAQ",
+    "ATH", "DCF", "FCF", "SQL", "API",
+}
+
+# Words that carry no meaning for matching questions against each other or against answers
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "i", "me", "my", "we", "you", "it", "its",
+    "should", "would", "could", "can", "do", "does", "did", "now", "right", "today", "currently",
+    "of", "on", "in", "for", "to", "at", "and", "or", "what", "whats", "how", "about", "stock",
+    "stocks", "shares", "share", "company", "please", "tell", "think", "good", "time", "this",
+}
+
+_TICKER_PATTERN = re.compile(r"\$?\b([A-Z]{1,5}(?:\.[A-Z])?)\b")
+
+# Ordered: the first matching intent wins
+INTENT_KEYWORDS = [
+    ("comparison", ("compare", "comparison", " vs ", " vs. ", "versus", "better than", "or should i")),
+    ("investment_decision", ("buy", "sell", "hold", "invest", "worth it", "good investment", "should i", "position")),
+    ("historical", ("in 2018", "in 2019", "in 2020", "in 2021", "in 2022", "historical", "history", "back in", "last decade")),
+    ("technical", ("technical", "support", "resistance", "trend", "moving average", "volume", "insider", "chart", "momentum")),
+    ("sentiment", ("news", "sentiment", "headline", "perception", "opinion", "buzz")),
+    ("fundamentals", ("revenue", "earnings", "eps", "p/e", "pe ratio", "balance sheet", "cash flow", "income", "margin", "fundamental", "valuation", "debt", "profit")),
+]
+
+
+def extract_symbols(text: str) -> List[str]:
+    """Resolve the ticker symbols a question refers to, from explicit tickers and company names."""
+    symbols = []
+    for match in _TICKER_PATTERN.finditer(text or ""):
+        candidate = match.group(1)
+        if candidate not in _NON_TICKERS and (len(candidate) > 1 or match.group(0).startswith("$")):
+            symbols.append(candidate)
+
+    lowered = (text or "").lower()
+    for name, ticker in COMPANY_TICKERS.items():
+        if re.search(rf"\b{re.escape(name)}\b", lowered):
+            symbols.append(ticker)
+
+    # Keep first-seen order, drop duplicates
+    return list(dict.fromkeys(symbols))
+
+
+def classify_intent(text: str) -> str:
+    """Classify the question into a coarse intent using keyword rules."""
+    lowered = f" {(text or '').lower()} "
+    for intent, keywords in INTENT_KEYWORDS:
+        if any(keyword in lowered for keyword in keywords):
+            return intent
+    return "general"
+
+
+def normalize_question(text: str) -> str:
+    """Lower-case the question, map company names onto tickers and strip punctuation."""
+    normalized = (text or "").lower()
+    for name, ticker in sorted(COMPANY_TICKERS.items(), key=lambda item: -len(item[0])):
+        normalized = re.sub(rf"\b{re.escape(name)}\b", ticker.lower(), normalized)
+    normalized = re.sub(r"[^a-z0-9./ ]+", " ", normalized)
+    return re.sub(r"\s+", " ", normalized).strip()
+
+
+def content_tokens(text: str) -> List[str]:
+    """Normalized question tokens without stopwords."""
+    return [t for t in normalize_question(text).split() if t not in STOPWORDS]
@@ -0,0 +1,160 @@
+"""
+Process-wide resources.
+
+Each resource is built once per process, on first use, and then shared by
+every Streamlit session and rerun, API request and job: the compiled graphs,
+the HTTP session (connection pool) of the data providers, the SQL database
+(connection pool) of the SQL agent, the EventRegistry client and the
+executor of the background analyses of the Streamlit app. The schema and
+query result caches of the SQL database are registered by
+FinSage.utils.sql_cache. The getters are thread-safe: concurrent first calls
+build the resource once.
+
+`resource_health()` checks the resources built so far, and `warm_up()` builds
+them all, for servers and the Streamlit app to pay the cost at startup.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Any, Callable, Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from FinSage.config.runtime import HTTP_POOL_SIZE, HTTP_TIMEOUT, SQL_DB_PATH, SQL_POOL_SIZE, UI_BACKGROUND_WORKERS
+from FinSage.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+_built: Dict[str, Any] = {}
+
+
+def shared_resource(name: str) -> Callable:
+    """Decorator: the factory runs once per process, under a lock; later calls return its result"""
+    def decorator(factory: Callable[[], Any]) -> Callable[[], Any]:
+        lock = threading.Lock()
+
+        @wraps(factory)
+        def get():
+            if name in _built:
+                return _built[name]
+            with lock:
+                if name not in _built:
+                    started = time.perf_counter()
+                    _built[name] = factory()
+                    logger.info("Built %s in %.2fs", name, time.perf_counter() - started)
+            return _built[name]
+        return get
+    return decorator
+
+
+class PooledSession(requests.Session):
+    """requests.Session with a larger connection pool and a default timeout"""
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, timeout: float = HTTP_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+@shared_resource("http_session")
+def get_http_session() -> PooledSession:
+    """HTTP session of the data provider tools; keeps connections to FMP, Alpha Vantage and Polygon open"""
+    return PooledSession()
+
+
+@shared_resource("sql_database")
+def get_sql_database():
+    """SQLDatabase of the SQL agent over a pooled SQLAlchemy engine"""
+    from langchain_community.utilities import SQLDatabase
+    # SQLAlchemy 2 pools file SQLite databases with a QueuePool (1.x used a NullPool, rejecting pool_size)
+    return SQLDatabase.from_uri(
+        f"sqlite:///{SQL_DB_PATH}",
+        engine_args={"pool_size": SQL_POOL_SIZE, "pool_pre_ping": True},
+    )
+
+
+@shared_resource("event_registry")
+def get_event_registry():
+    from eventregistry import EventRegistry
+    from FinSage.config.settings import news_client_id
+    return EventRegistry(apiKey=news_client_id, allowUseOfArchive=False)
+
+
+@shared_resource("background_executor")
+def get_background_executor() -> ThreadPoolExecutor:
+    """Threads running the Streamlit analyses, shared by every session"""
+    return ThreadPoolExecutor(max_workers=UI_BACKGROUND_WORKERS, thread_name_prefix="finsage-run")
+
+
+@shared_resource("graphs")
+def get_graphs() -> Dict[str, Any]:
+    """The compiled FinSage graphs: {"sync": ..., "async": ...}"""
+    from FinSage.agents.finsage import FinSage_agent, FinSage_agent_async
+    return {"sync": FinSage_agent, "async": FinSage_agent_async}
+
+
+def warm_up() -> Dict[str, Any]:
+    """Build every resource now rather than on first use; returns the graphs"""
+    get_http_session()
+    get_sql_database()
+    return get_graphs()
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Health checks __________________________________________ #
+# __________________________________________________________________________________________ #
+def _check_sql(database) -> Dict[str, Any]:
+    from sqlalchemy import text
+    with database._engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    return {"pool": database._engine.pool.status()}
+
+
+def _check_http(session: PooledSession) -> Dict[str, Any]:
+    adapter = session.get_adapter("https://")
+    return {"hosts": len(adapter.poolmanager.pools), "pool_size": adapter._pool_maxsize}
+
+
+def _check_graphs(graphs: Dict[str, Any]) -> Dict[str, Any]:
+    return {"graphs": sorted(graphs)}
+
+
+def _check_sql_cache(cache) -> Dict[str, Any]:
+    return dict(cache.stats)
+
+
+_HEALTH_CHECKS: Dict[str, Callable[[Any], Dict[str, Any]]] = {
+    "http_session": _check_http,
+    "sql_database": _check_sql,
+    "graphs": _check_graphs,
+    "sql_schema_cache": _check_sql_cache,
+    "sql_result_cache": _check_sql_cache,
+}
+
+
+def resource_health() -> Dict[str, Any]:
+    """Status of the resources built so far and of the in-process caches"""
+    from FinSage.tools.tool_cache import tool_result_cache
+    from FinSage.utils.deadline import deadline_stats
+    from FinSage.utils.response_cache import response_cache
+
+    health: Dict[str, Any] = {}
+    for name, resource in list(_built.items()):
+        check = _HEALTH_CHECKS.get(name)
+        try:
+            health[name] = {"ok": True, **(check(resource) if check else {})}
+        except Exception as e:
+            logger.warning("Health check of %s failed: %s", name, e)
+            health[name] = {"ok": False, "error": f"{type(e).__name__}: {str(e)}"}
+    health["tool_result_cache"] = dict(tool_result_cache.stats)
+    health["response_cache"] = dict(response_cache.stats)
+    health["abandoned_agent_calls"] = dict(deadline_stats)
+    return health
@@ -0,0 +1,301 @@
+"""
+Semantic whole-answer cache in front of the FinSage graph.
+
+Questions are normalized (tickers resolved, intent classified) and bucketed on
+(intent, symbols, personality, date bucket). Inside a bucket, cached questions
+are matched by cosine similarity of local embeddings, so "should I buy AAPL?"
+and "is Apple a buy now?" share the same final synthesis while it is fresh.
+
+An answer is fresh until its intent's TTL runs out or, earlier, until a data
+tool returns new data for one of its symbols (a tool cache refresh, see
+FinSage/tools/tool_cache.py).
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage
+
+from FinSage.config.runtime import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_INVALIDATE_ON_REFRESH,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    RESPONSE_CACHE_TTL,
+)
+from FinSage.tools.tool_cache import tool_result_cache
+from FinSage.utils.checkpoint import acheckpointed_invoke, checkpointed_invoke
+from FinSage.utils.log import get_logger
+from FinSage.utils.query_analysis import classify_intent, content_tokens, extract_symbols, normalize_question
+
+logger = get_logger(__name__)
+
+_EMBEDDING_DIM = 256
+
+
+def local_embedding(text: str) -> List[float]:
+    """
+    Hashed bag-of-words (unigrams + bigrams) embedding of a normalized question.
+    Runs locally in microseconds, which is what we need for a cache lookup.
+    """
+    tokens = content_tokens(text)
+    features = tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+    vector = [0.0] * _EMBEDDING_DIM
+    for feature in features:
+        digest = hashlib.md5(feature.encode()).digest()
+        index = int.from_bytes(digest[:4], "little") % _EMBEDDING_DIM
+        vector[index] += 1.0 if "_" not in feature else 0.5
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+def _personality_key(personality) -> str:
+    if personality is None:
+        return "default"
+    return "|".join([
+        personality.risk_tolerance.value,
+        personality.time_horizon.value,
+        personality.investment_style.value,
+    ])
+
+
+def _date_bucket(current_date: Optional[datetime], ttl_seconds: int) -> int:
+    """Bucket the analysis date into windows of the intent's freshness period."""
+    timestamp = (current_date or datetime.now()).timestamp()
+    return int(timestamp // max(1, ttl_seconds))
+
+
+class ResponseCache:
+    """
+    Thread-safe, in-memory LRU cache of final syntheses.
+
+    Args:
+        embed_fn: function mapping a question to a normalized vector. Defaults to
+                  `local_embedding`; any embedding model can be plugged in.
+        similarity_threshold: minimum cosine similarity to serve a cached answer.
+        max_entries: LRU capacity.
+        ttl: freshness window in seconds per intent.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], List[float]] = local_embedding,
+        similarity_threshold: float = RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        ttl: Optional[Dict[str, int]] = None,
+    ):
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl = dict(RESPONSE_CACHE_TTL if ttl is None else ttl)
+        self._entries: "OrderedDict[Tuple, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    # ---------------------------------------------------------------- keys
+    def describe(self, question: str, personality=None, current_date: Optional[datetime] = None) -> Dict[str, Any]:
+        """Normalize a question into its cache key components."""
+        intent = classify_intent(question)
+        symbols = tuple(sorted(extract_symbols(question)))
+        ttl_seconds = self.ttl.get(intent, self.ttl.get("general", 1800))
+        return {
+            "intent": intent,
+            "symbols": symbols,
+            "personality": _personality_key(personality),
+            "bucket": _date_bucket(current_date, ttl_seconds),
+            "ttl": ttl_seconds,
+            "normalized": normalize_question(question),
+        }
+
+    @staticmethod
+    def _key(description: Dict[str, Any]) -> Tuple:
+        return (description["intent"], description["symbols"], description["personality"], description["bucket"])
+
+    # ---------------------------------------------------------------- lookups
+    def lookup(self, question: str, personality=None, current_date: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """Return the best fresh cached entry for a question, or None."""
+        description = self.describe(question, personality, current_date)
+        if not description["symbols"]:
+            # Follow-ups such as "what about its debt?" depend on chat context; never serve them from cache
+            return None
+
+        key = self._key(description)
+        embedding = self.embed_fn(question)
+        now = time.time()
+        with self._lock:
+            candidates = self._entries.get(key, [])
+            fresh = [entry for entry in candidates if entry["expires_at"] > now]
+            if len(fresh) != len(candidates):
+                self._entries[key] = fresh
+            best, best_score = None, 0.0
+            for entry in fresh:
+                score = cosine_similarity(embedding, entry["embedding"])
+                if score > best_score:
+                    best, best_score = entry, score
+            if best is None or best_score < self.similarity_threshold:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return {**best, "similarity": best_score}
+
+    def store(self, question: str, final_synthesis: str, personality=None, current_date: Optional[datetime] = None, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """Cache a final synthesis for a question. Returns False when the question is not cacheable."""
+        description = self.describe(question, personality, current_date)
+        if not description["symbols"] or not final_synthesis:
+            return False
+
+        key = self._key(description)
+        entry = {
+            "question": question,
+            "normalized": description["normalized"],
+            "intent": description["intent"],
+            "symbols": description["symbols"],
+            "embedding": self.embed_fn(question),
+            "final_synthesis": final_synthesis,
+            "created_at": time.time(),
+            "expires_at": time.time() + description["ttl"],
+            "metadata": metadata or {},
+        }
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+            self._entries.move_to_end(key)
+            while sum(len(v) for v in self._entries.values()) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                bucket = self._entries[oldest_key]
+                bucket.pop(0)
+                if not bucket:
+                    del self._entries[oldest_key]
+            self.stats["stores"] += 1
+        return True
+
+    # ---------------------------------------------------------------- invalidation
+    def invalidate(self, symbols: Optional[List[str]] = None, intent: Optional[str] = None) -> int:
+        """
+        Drop cached answers that mention any of `symbols` and/or have the given `intent`.
+        With no arguments the whole cache is cleared. Returns the number of removed answers.
+        """
+        wanted = {s.upper() for s in symbols} if symbols else None
+        removed = 0
+        with self._lock:
+            for key in list(self._entries):
+                key_intent, key_symbols = key[0], set(key[1])
+                if intent is not None and key_intent != intent:
+                    continue
+                if wanted is not None and not (wanted & key_symbols):
+                    continue
+                removed += len(self._entries.pop(key))
+            self.stats["invalidations"] += 1
+        return removed
+
+    def on_data_refresh(self, symbol: str) -> int:
+        """New filings/prices/news for `symbol` make its answers stale."""
+        removed = self.invalidate(symbols=[symbol])
+        if removed:
+            logger.info("New data for %s: dropped %s cached answers", symbol, removed)
+        return removed
+
+    def clear(self) -> int:
+        return self.invalidate()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._entries.values())
+
+
+# Process-wide cache instance
+response_cache = ResponseCache()
+
+
+def _refreshed_symbols(tool_input: Dict[str, Any]) -> List[str]:
+    """Symbols a tool call is about: its symbol/ticker argument, else the tickers or company names in its arguments"""
+    for key in ("symbol", "ticker"):
+        if isinstance(tool_input.get(key), str):
+            return [tool_input[key].upper()]
+    return extract_symbols(" ".join(str(value) for value in tool_input.values()))
+
+
+def _on_tool_refresh(tool_name: str, tool_input: Dict[str, Any]):
+    for symbol in _refreshed_symbols(tool_input):
+        response_cache.on_data_refresh(symbol)
+
+
+if RESPONSE_CACHE_INVALIDATE_ON_REFRESH:
+    tool_result_cache.add_refresh_listener(_on_tool_refresh)
+
+
+def get_final_synthesis(output: Dict[str, Any]) -> Optional[str]:
+    """Return the FinalSynthesis content from a graph output, if any."""
+    message = next(
+        (msg for msg in output.get("messages", []) if getattr(msg, "name", None) == "FinalSynthesis"),
+        None,
+    )
+    return message.content if message else None
+
+
+def get_final_answer(output: Dict[str, Any]) -> Optional[str]:
+    """The answer of a graph output: the synthesis, or the reply of the conversational node."""
+    if output.get("next_step") == "FINISH" and output.get("messages"):
+        return output["messages"][-1].content
+    return get_final_synthesis(output)
+
+
+def _serve_cached(state: Dict[str, Any], hit: Dict[str, Any]) -> Dict[str, Any]:
+    callback = state.get("callback")
+    if callback is not None:
+        callback.write_agent_name("Investment Analysis Synthesis 🎯")
+        callback.on_tool_end(hit["final_synthesis"])
+    output = dict(state)
+    output["messages"] = list(state.get("messages", [])) + [
+        AIMessage(content=hit["final_synthesis"], name="FinalSynthesis")
+    ]
+    output["next_step"] = "Synthesizer"
+    output["cache_hit"] = True
+    return output
+
+
+def _store_output(cache: ResponseCache, state: Dict[str, Any], output: Dict[str, Any]) -> Dict[str, Any]:
+    # Syntheses forced by the response deadline miss sections; later questions must get a full answer
+    if output.get("next_step") != "FINISH" and not output.get("deadline_reached"):
+        cache.store(state["user_input"], get_final_synthesis(output), state.get("personality"), state.get("current_date"))
+    output["cache_hit"] = False
+    return output
+
+
+def cached_invoke(graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None, cache: Optional[ResponseCache] = None, invoke: Optional[Callable] = None) -> Dict[str, Any]:
+    """
+    Drop-in replacement for `graph.invoke(state, config)` that serves fresh cached
+    syntheses and stores new ones. Hits return the input state with the cached
+    FinalSynthesis appended and `cache_hit` set to True. Misses run
+    `invoke(graph, state, config)` (default: checkpointed_invoke).
+    """
+    cache = cache or response_cache
+    invoke = invoke or checkpointed_invoke
+    if not RESPONSE_CACHE_ENABLED:
+        return invoke(graph, state, config)
+
+    hit = cache.lookup(state["user_input"], state.get("personality"), state.get("current_date"))
+    if hit:
+        return _serve_cached(state, hit)
+    return _store_output(cache, state, invoke(graph, state, config))
+
+
+async def acached_invoke(graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None, cache: Optional[ResponseCache] = None, invoke: Optional[Callable] = None) -> Dict[str, Any]:
+    """Async variant of `cached_invoke` for the async graph (default: acheckpointed_invoke)."""
+    cache = cache or response_cache
+    invoke = invoke or acheckpointed_invoke
+    if not RESPONSE_CACHE_ENABLED:
+        return await invoke(graph, state, config)
+
+    hit = cache.lookup(state["user_input"], state.get("personality"), state.get("current_date"))
+    if hit:
+        return _serve_cached(state, hit)
+    return _store_output(cache, state, await invoke(graph, state, config))
@@ -0,0 +1,336 @@
+"""
+Speculative agent execution.
+
+While the supervisor LLM decides which agent runs first, a cheap local
+classifier predicts the agents it is likely to pick and starts their work in
+a thread pool:
+
+- "prefetch" mode warms the tool result cache with the data those agents fetch
+  for the symbols in the question. The agents themselves run unchanged and
+  find their data already fetched (or in flight).
+- "full" mode runs the predicted agent subgraphs end-to-end on a copy of the
+  state. The result is committed if the supervisor picks that agent and
+  discarded otherwise. The speculative run only sees a generic task, not the
+  supervisor's task description, so it trades some fidelity for latency.
+
+Hit/waste counters are kept in `speculative_executor.metrics`.
+"""
+import asyncio
+import copy
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+
+from FinSage.config.runtime import SPECULATION_MAX_WORKERS, SPECULATION_MODE, SPECULATION_RUN_TTL
+from FinSage.utils.callback_tools import PARENT_NODE_PATH, NullCallbackHandler
+from FinSage.utils.deadline import ensure_deadline
+from FinSage.utils.log import get_logger
+from FinSage.utils.query_analysis import classify_intent, extract_symbols
+
+logger = get_logger(__name__)
+
+# Agent -> internal state key it owns
+AGENT_INTERNAL_STATE = {
+    "FinancialMetricsAgent": "financial_metrics_agent_internal_state",
+    "NewsSentimentAgent": "news_sentiment_agent_internal_state",
+    "MarketIntelligenceAgent": "market_intelligence_agent_internal_state",
+    "SQLAgent": "sql_agent_internal_state",
+}
+
+# Agent -> name shown by the UI callback
+AGENT_LABELS = {
+    "FinancialMetricsAgent": "Financial Metrics Agent 📊",
+    "NewsSentimentAgent": "News & Sentiment Agent 📰",
+    "MarketIntelligenceAgent": "Market Intelligence Agent 📈",
+    "SQLAgent": "SQL Agent 🗄️",
+}
+
+# Intent -> agents the supervisor usually dispatches for it
+INTENT_AGENTS = {
+    "investment_decision": ["FinancialMetricsAgent", "NewsSentimentAgent", "MarketIntelligenceAgent"],
+    "comparison": ["FinancialMetricsAgent", "MarketIntelligenceAgent"],
+    "fundamentals": ["FinancialMetricsAgent"],
+    "technical": ["MarketIntelligenceAgent"],
+    "sentiment": ["NewsSentimentAgent"],
+    "historical": ["SQLAgent"],
+    "general": [],
+}
+
+# Agent -> per-symbol tools that can be fetched before the agent runs
+PREFETCH_TOOLS = {
+    "FinancialMetricsAgent": [
+        "get_stock_price",
+        "get_company_financials",
+        "get_income_statement",
+        "get_balance_sheet",
+        "get_cash_flow",
+        "get_earnings_history",
+    ],
+    "NewsSentimentAgent": ["get_news_sentiment"],
+    "MarketIntelligenceAgent": ["get_insider_transactions"],
+}
+
+
+def predict_agents(user_input: str) -> List[str]:
+    """Predict the agents the supervisor will dispatch, from the question alone."""
+    return list(INTENT_AGENTS.get(classify_intent(user_input), []))
+
+
+def _agent_graphs() -> Dict[str, Any]:
+    # Imported lazily: the agent modules import tools and LLM clients
+    from FinSage.agents.financial import financial_metrics_agent
+    from FinSage.agents.market import market_intelligence_agent
+    from FinSage.agents.sentiment import news_sentiment_agent
+    from FinSage.agents.sql import sql_agent
+    return {
+        "FinancialMetricsAgent": financial_metrics_agent,
+        "NewsSentimentAgent": news_sentiment_agent,
+        "MarketIntelligenceAgent": market_intelligence_agent,
+        "SQLAgent": sql_agent,
+    }
+
+
+def _tools_by_name() -> Dict[str, Any]:
+    from FinSage.tools.tools import financial_metrics_tools, market_intelligence_tools, news_sentiment_tools
+    return {t.name: t for t in financial_metrics_tools + news_sentiment_tools + market_intelligence_tools}
+
+
+def _speculative_state(state: Dict[str, Any], agent_name: str) -> Dict[str, Any]:
+    """Copy of the state an agent can mutate freely, with a generic task and a silent callback."""
+    spec_state = dict(state)
+    spec_state["messages"] = list(state.get("messages", [])) or [HumanMessage(state["user_input"])]
+    spec_state["callback"] = NullCallbackHandler()
+    spec_state["current_task"] = {
+        "description": f"Answer the user's question from the {agent_name} perspective: {state['user_input']}",
+        "expected_output": "A complete, data-backed analysis covering every relevant tool",
+        "validation_criteria": [],
+        "query_type": "financial_analysis",
+    }
+    internal_key = AGENT_INTERNAL_STATE[agent_name]
+    if internal_key in state:
+        spec_state[internal_key] = copy.deepcopy(state[internal_key])
+    return spec_state
+
+
+def _speculative_config(config: Optional[RunnableConfig], agent_name: str) -> RunnableConfig:
+    """
+    Config of a speculative agent run: the callbacks (usage meter, tracer) of the
+    graph run, and a parent node path so its nodes are attributed to the agent.
+    The graph's checkpointer and thread are left out.
+    """
+    config = config or {}
+    return {
+        "callbacks": config.get("callbacks"),
+        "tags": list(config.get("tags") or []) + ["speculative"],
+        "metadata": {**(config.get("metadata") or {}), "speculative": True, PARENT_NODE_PATH: agent_name},
+        "run_name": agent_name,
+    }
+
+
+class SpeculativeRun:
+    """Speculative work launched for one graph run"""
+
+    def __init__(self, run_id: str, predicted: List[str], symbols: List[str], base_message_count: int):
+        self.run_id = run_id
+        self.predicted = predicted
+        self.symbols = symbols
+        self.base_message_count = base_message_count
+        self.started_at = time.time()
+        self.futures: Dict[str, Future] = {}
+        self.claimed: set = set()
+
+
+class SpeculativeExecutor:
+    """Launches, commits and discards speculative work, and keeps hit/waste metrics."""
+
+    def __init__(self, mode: str = SPECULATION_MODE, max_workers: int = SPECULATION_MAX_WORKERS):
+        self.mode = mode
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="finsage-spec")
+        self._runs: Dict[str, SpeculativeRun] = {}
+        self._lock = threading.Lock()
+        self.metrics = {
+            "runs": 0,             # graph runs with speculative work
+            "launched": 0,         # agents speculated on
+            "hits": 0,             # speculated agents the supervisor picked
+            "wasted": 0,           # speculated agents never picked, or failed speculative runs
+            "hidden_seconds": 0.0, # agent time overlapped with supervisor deliberation (full mode)
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("prefetch", "full")
+
+    # ---------------------------------------------------------------- launch
+    def launch(self, state: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Optional[str]:
+        """Start speculative work for a run, once, reporting to the callbacks of `config`. Returns the run id."""
+        if not self.enabled:
+            return None
+        run_id = state.get("run_id") or str(uuid.uuid4())
+        state["run_id"] = run_id
+
+        self._expire_stale_runs()
+        with self._lock:
+            if run_id in self._runs:
+                return run_id
+            predicted = predict_agents(state["user_input"])
+            symbols = extract_symbols(state["user_input"])
+            run = SpeculativeRun(run_id, predicted, symbols, len(state.get("messages", [])))
+            self._runs[run_id] = run
+            if predicted:
+                self.metrics["runs"] += 1
+                self.metrics["launched"] += len(predicted)
+
+        for agent_name in run.predicted:
+            if self.mode == "full":
+                run.futures[agent_name] = self._pool.submit(self._run_agent, state, agent_name, config)
+            else:
+                self._prefetch(agent_name, run.symbols)
+        return run_id
+
+    def _run_agent(self, state: Dict[str, Any], agent_name: str, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        started = time.time()
+        result = _agent_graphs()[agent_name].invoke(_speculative_state(state, agent_name), _speculative_config(config, agent_name))
+        return {"state": result, "started": started, "finished": time.time()}
+
+    def _prefetch(self, agent_name: str, symbols: List[str]):
+        tools = _tools_by_name()
+        for symbol in symbols:
+            for tool_name in PREFETCH_TOOLS.get(agent_name, []):
+                if tool_name in tools:
+                    # The cached tool de-duplicates this call with the agent's own call
+                    self._pool.submit(tools[tool_name].invoke, {"symbol": symbol})
+
+    # ---------------------------------------------------------------- commit / discard
+    def commit(self, state: Dict[str, Any], agent_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Called when the supervisor dispatches `agent_name`. Returns the state update
+        of the speculative result, or None when the agent must run normally.
+        """
+        run_id = state.get("run_id")
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None or agent_name not in run.predicted or agent_name in run.claimed:
+                return None
+            run.claimed.add(agent_name)
+            future = run.futures.get(agent_name)
+            claimed_at = time.time()
+
+        if future is None:
+            # prefetch mode: the agent runs now on a warm tool cache
+            with self._lock:
+                self.metrics["hits"] += 1
+            return None
+
+        try:
+            outcome = future.result()
+        except Exception as e:
+            logger.warning("Speculative run of %s failed, running it normally: %s", agent_name, e)
+            with self._lock:
+                self.metrics["wasted"] += 1
+            return None
+
+        with self._lock:
+            self.metrics["hits"] += 1
+            self.metrics["hidden_seconds"] += max(0.0, min(claimed_at, outcome["finished"]) - outcome["started"])
+        return self._merge(state, outcome["state"], run.base_message_count, agent_name)
+
+    @staticmethod
+    def _merge(state: Dict[str, Any], spec_result: Dict[str, Any], base_message_count: int, agent_name: str) -> Dict[str, Any]:
+        new_messages = spec_result["messages"][base_message_count:]
+        # The speculative copy may have seeded the conversation with the question
+        if base_message_count == 0 and new_messages and isinstance(new_messages[0], HumanMessage):
+            new_messages = new_messages[1:]
+        internal_key = AGENT_INTERNAL_STATE[agent_name]
+        update = {
+            "messages": new_messages,
+            internal_key: spec_result[internal_key],
+            "agent_results": spec_result.get("agent_results") or {},
+        }
+        if spec_result.get("deadline_reached"):
+            update["deadline_reached"] = True
+
+        # Replay the agent's answer to the UI callback
+        if new_messages:
+            state["callback"].write_agent_name(AGENT_LABELS[agent_name])
+            state["callback"].on_tool_end(new_messages[-1].content)
+        return update
+
+    def finish(self, run_id: Optional[str]):
+        """Discard unclaimed speculative work of a completed run."""
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is None:
+                return
+            unclaimed = [a for a in run.predicted if a not in run.claimed]
+            self.metrics["wasted"] += len(unclaimed)
+        for agent_name in unclaimed:
+            future = run.futures.get(agent_name)
+            if future is not None:
+                future.cancel()
+
+    def _expire_stale_runs(self):
+        cutoff = time.time() - SPECULATION_RUN_TTL
+        with self._lock:
+            stale = [run_id for run_id, run in self._runs.items() if run.started_at < cutoff]
+        for run_id in stale:
+            self.finish(run_id)
+
+    def hit_rate(self) -> float:
+        return self.metrics["hits"] / self.metrics["launched"] if self.metrics["launched"] else 0.0
+
+
+# Process-wide executor
+speculative_executor = SpeculativeExecutor()
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Graph node wrappers ____________________________________ #
+# __________________________________________________________________________________________ #
+def _after_supervisor(state: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    if state.get("run_id"):
+        update = {**update, "run_id": state["run_id"]}
+    if update.get("next_step") in ("Synthesizer", "FINISH"):
+        speculative_executor.finish(state.get("run_id"))
+    return update
+
+
+def speculative_supervisor(node):
+    """
+    Wrap the supervisor node so speculative work starts before its LLM call. The
+    request deadline is started first, so speculative agents run within it.
+    """
+    if asyncio.iscoroutinefunction(node):
+        async def _anode(state, config: RunnableConfig):
+            ensure_deadline(state)
+            speculative_executor.launch(state, config)
+            return _after_supervisor(state, await node(state))
+        return _anode
+
+    def _node(state, config: RunnableConfig):
+        ensure_deadline(state)
+        speculative_executor.launch(state, config)
+        return _after_supervisor(state, node(state))
+    return _node
+
+
+def speculative_agent(agent_name: str, agent_graph, use_async: bool = False):
+    """Wrap an agent subgraph so a speculative result is committed instead of re-running it."""
+    if use_async:
+        async def _anode(state, config: RunnableConfig):
+            committed = await asyncio.to_thread(speculative_executor.commit, state, agent_name)
+            if committed is not None:
+                return committed
+            return await agent_graph.ainvoke(state, config)
+        return _anode
+
+    def _node(state, config: RunnableConfig):
+        committed = speculative_executor.commit(state, agent_name)
+        if committed is not None:
+            return committed
+        return agent_graph.invoke(state, config)
+    return _node
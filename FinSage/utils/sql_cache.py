@@ -0,0 +1,372 @@
+"""
+In-memory caches of the SQL agent database.
+
+LangChain's `SQLDatabase.get_table_info` reflects every table and runs a
+sample-row SELECT per table on each call. The SQL agent needs that text for
+every question, so `SchemaCache` computes the full schema text, the schema of
+each table, the table names, row counts and column stats once and serves them
+from memory.
+
+stock_db.db is a historical snapshot and the same queries recur ("AAPL revenue
+in 2020"), so `QueryResultCache` keeps the typed rows of read-only queries,
+keyed on their normalized SQL: with sqlglot installed the query is parsed and
+identifier case, table aliases, the order of IN lists and of AND-ed conditions
+and the side of `literal = column` comparisons are normalized; without it only
+whitespace, comments and keyword case are.
+
+Both caches are dropped when the SQLite file (mtime, size) or its
+`PRAGMA schema_version` changes; both are checked at most once every
+SQL_SCHEMA_CHECK_INTERVAL seconds.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from FinSage.config.runtime import (
+    SQL_DB_PATH,
+    SQL_RESULT_CACHE_ENABLED,
+    SQL_RESULT_CACHE_MAX_ENTRIES,
+    SQL_RESULT_CACHE_MAX_ROWS,
+    SQL_SCHEMA_CACHE_ENABLED,
+    SQL_SCHEMA_CHECK_INTERVAL,
+)
+from FinSage.utils.log import get_logger
+from FinSage.utils.resources import get_sql_database, shared_resource
+
+logger = get_logger(__name__)
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:
+    sqlglot = None
+
+
+class _VersionedCache:
+    """Entries valid for one version (file mtime and size, schema version) of the database"""
+
+    def __init__(self, database, path: Optional[str], check_interval: float, enabled: bool):
+        self.database = database
+        self.path = path
+        self.check_interval = check_interval
+        self.enabled = enabled
+        self._version: Optional[Tuple] = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _schema_version(self) -> Optional[int]:
+        if self.database.dialect != "sqlite":
+            return None
+        with self.database._engine.connect() as connection:
+            return connection.exec_driver_sql("PRAGMA schema_version").scalar()
+
+    def _current_version(self) -> Tuple:
+        try:
+            stat = os.stat(self.path) if self.path else None
+        except OSError:
+            stat = None
+        file_version = (stat.st_mtime_ns, stat.st_size) if stat else None
+        return file_version, self._schema_version()
+
+    def _check(self):
+        """Drop the entries if the database changed since they were computed (lock held)"""
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = self._current_version()
+        if version != self._version:
+            if self._version is not None:
+                logger.info("SQL database changed (%s -> %s), dropping the %s", self._version, version, type(self).__name__)
+                self.stats["invalidations"] += 1
+            self._clear()
+            self._version = version
+
+    def invalidate(self):
+        """Drop every entry; the next call reads the database again"""
+        with self._lock:
+            self._clear()
+            self._version = None
+            self.stats["invalidations"] += 1
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Schema metadata ________________________________________ #
+# __________________________________________________________________________________________ #
+class SchemaCache(_VersionedCache):
+    """Thread-safe cache of the schema text and table statistics of a SQLDatabase"""
+
+    def __init__(self, database, path: Optional[str] = SQL_DB_PATH, check_interval: float = SQL_SCHEMA_CHECK_INTERVAL, enabled: bool = SQL_SCHEMA_CACHE_ENABLED):
+        super().__init__(database, path, check_interval, enabled)
+        self._entries: Dict[Hashable, Any] = {}
+
+    def _clear(self):
+        self._entries.clear()
+
+    def _cached(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return compute()
+        # The lock is reentrant: the full schema text is built from the table names
+        with self._lock:
+            self._check()
+            if key in self._entries:
+                self.stats["hits"] += 1
+                return self._entries[key]
+            self.stats["misses"] += 1
+            # Computed under the lock: concurrent first calls reflect the schema once
+            self._entries[key] = compute()
+            return self._entries[key]
+
+    def table_names(self) -> List[str]:
+        return self._cached("table_names", lambda: list(self.database.get_usable_table_names()))
+
+    def list_tables(self) -> str:
+        """The table names as the sql_db_list_tables tool returns them"""
+        return ", ".join(self.table_names())
+
+    def table_info(self, tables: Optional[List[str]] = None) -> str:
+        """CREATE TABLE statements and sample rows, of every table or of `tables` (as SQLDatabase.get_table_info)"""
+        if tables is None:
+            return self._cached("table_info", self.database.get_table_info)
+        return "\n\n".join(
+            self._cached(("table_info", table), lambda table=table: self.database.get_table_info([table]))
+            for table in tables
+        )
+
+    def table_schema(self, table_names: str) -> str:
+        """Schema of a comma-separated list of tables, as the sql_db_schema tool returns it"""
+        tables = [table.strip() for table in table_names.split(",")]
+        known = set(self.table_names())
+        if any(table not in known for table in tables):
+            # Error text of the tool, e.g. "Error: table_names {'x'} not found in database"; never cached
+            return self.database.get_table_info_no_throw(tables)
+        return self.table_info(tables)
+
+    def _quote(self, name: str) -> str:
+        return self.database._engine.dialect.identifier_preparer.quote(name)
+
+    def _count_rows(self) -> Dict[str, int]:
+        with self.database._engine.connect() as connection:
+            return {
+                table: connection.exec_driver_sql(f"SELECT COUNT(*) FROM {self._quote(table)}").scalar()
+                for table in self.table_names()
+            }
+
+    def row_counts(self) -> Dict[str, int]:
+        """Rows per table"""
+        return self._cached("row_counts", self._count_rows)
+
+    def _column_stats(self, table: str) -> List[Dict[str, Any]]:
+        from sqlalchemy import inspect
+
+        columns = inspect(self.database._engine).get_columns(table)
+        selects = []
+        for column in columns:
+            name = self._quote(column["name"])
+            selects += [f"COUNT({name})", f"COUNT(DISTINCT {name})", f"MIN({name})", f"MAX({name})"]
+        with self.database._engine.connect() as connection:
+            row = connection.exec_driver_sql(f"SELECT COUNT(*), {', '.join(selects)} FROM {self._quote(table)}").one()
+        total, values = row[0], row[1:]
+        return [
+            {
+                "name": column["name"],
+                "type": str(column["type"]),
+                "nulls": total - values[4 * i],
+                "distinct": values[4 * i + 1],
+                "min": values[4 * i + 2],
+                "max": values[4 * i + 3],
+            }
+            for i, column in enumerate(columns)
+        ]
+
+    def column_stats(self, table: str) -> List[Dict[str, Any]]:
+        """Type, null count, distinct count, min and max of each column of `table` (one scan, then cached)"""
+        if table not in self.table_names():
+            raise ValueError(f"Unknown table: {table}")
+        return self._cached(("column_stats", table), lambda: self._column_stats(table))
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Query results __________________________________________ #
+# __________________________________________________________________________________________ #
+# String literals, quoted identifiers, comments, whitespace, words and numbers, then single characters
+_TOKENS = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?\*/|\s+|[\w$.]+|.""", re.DOTALL)
+_WRITES = {"INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER", "PRAGMA", "ATTACH", "DETACH", "VACUUM"}
+_KEYWORDS = {
+    "select", "distinct", "from", "where", "and", "or", "not", "in", "is", "null", "like", "between", "as", "on",
+    "join", "left", "right", "inner", "outer", "cross", "group", "by", "order", "asc", "desc", "limit", "offset",
+    "having", "union", "all", "with", "case", "when", "then", "else", "end", "exists",
+}
+
+
+def _normalize_tokens(query: str) -> Optional[str]:
+    """Whitespace, comments and keyword case normalized; literals and identifiers kept as written"""
+    tokens = []
+    for token in _TOKENS.findall(query):
+        if token.isspace() or token.startswith(("--", "/*")):
+            continue
+        tokens.append(token.upper() if token.lower() in _KEYWORDS or token.upper() in _WRITES else token)
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    if not tokens or tokens[0] not in ("SELECT", "WITH") or ";" in tokens or _WRITES.intersection(tokens):
+        return None
+    return " ".join(tokens)
+
+
+def _literal_key(node) -> Tuple:
+    return (not node.is_string, node.this)
+
+
+def _normalize_ast(tree) -> str:
+    from sqlglot.optimizer.normalize_identifiers import normalize_identifiers
+
+    tree = normalize_identifiers(tree, dialect="sqlite")
+    # Table and subquery aliases renamed in order of appearance: "FROM prices p" and "FROM prices AS x" match
+    aliases: Dict[str, str] = {}
+    for node in tree.find_all(exp.Table, exp.Subquery):
+        alias = node.args.get("alias")
+        if alias is not None and alias.name and alias.name not in aliases:
+            aliases[alias.name] = f"_t{len(aliases)}"
+    for node in tree.find_all(exp.TableAlias):
+        if node.name in aliases:
+            node.set("this", exp.to_identifier(aliases[node.name]))
+    for column in tree.find_all(exp.Column):
+        if column.table in aliases:
+            column.set("table", exp.to_identifier(aliases[column.table]))
+    # 'AAPL' = ticker  ->  ticker = 'AAPL'
+    for comparison in tree.find_all(exp.EQ, exp.NEQ):
+        left, right = comparison.this, comparison.expression
+        if isinstance(left, exp.Literal) and not isinstance(right, exp.Literal):
+            comparison.set("this", right)
+            comparison.set("expression", left)
+    for in_list in tree.find_all(exp.In):
+        values = in_list.expressions
+        if values and all(isinstance(value, exp.Literal) for value in values):
+            in_list.set("expressions", sorted(values, key=_literal_key))
+    for where in list(tree.find_all(exp.Where)):
+        if isinstance(where.this, exp.And):
+            conditions = sorted((condition.copy() for condition in where.this.flatten()), key=lambda condition: condition.sql(dialect="sqlite"))
+            where.set("this", exp.and_(*conditions, copy=False))
+    return tree.sql(dialect="sqlite", comments=False)
+
+
+def normalize_sql(query: str) -> Optional[str]:
+    """Cache key of a read-only query; None for anything else (writes, several statements, unparsable SQL)"""
+    if sqlglot is None:
+        return _normalize_tokens(query)
+    try:
+        statements = [statement for statement in sqlglot.parse(query, read="sqlite") if statement is not None]
+    except sqlglot.errors.SqlglotError:
+        return None
+    if len(statements) != 1 or not isinstance(statements[0], exp.Query):
+        return None
+    tree = statements[0]
+    if any(isinstance(node, (exp.Insert, exp.Update, exp.Delete, exp.Create, exp.Drop, exp.Alter)) for node in tree.walk()):
+        return None
+    return _normalize_ast(tree)
+
+
+class QueryResult(NamedTuple):
+    """Typed rows of a query and the names of its columns"""
+    columns: List[str]
+    rows: List[Tuple]
+
+    def to_text(self, max_string_length: int = 300) -> str:
+        """The rows as SQLDatabase.run returns them: str() of the tuples, long strings cut"""
+        if not self.rows:
+            return ""
+        return str([tuple(_truncate(value, max_string_length) for value in row) for row in self.rows])
+
+
+def _truncate(value: Any, length: int, suffix: str = "...") -> Any:
+    if not isinstance(value, str) or length <= 0 or len(value) <= length:
+        return value
+    return value[: length - len(suffix)].rsplit(" ", 1)[0] + suffix
+
+
+class QueryResultCache(_VersionedCache):
+    """Thread-safe LRU cache of query results, keyed on the normalized SQL, valid for one database version"""
+
+    def __init__(
+        self,
+        database,
+        path: Optional[str] = SQL_DB_PATH,
+        check_interval: float = SQL_SCHEMA_CHECK_INTERVAL,
+        enabled: bool = SQL_RESULT_CACHE_ENABLED,
+        max_entries: int = SQL_RESULT_CACHE_MAX_ENTRIES,
+        max_rows: int = SQL_RESULT_CACHE_MAX_ROWS,
+    ):
+        super().__init__(database, path, check_interval, enabled)
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._results: "OrderedDict[str, QueryResult]" = OrderedDict()
+        self.stats.update({"bypassed": 0, "evictions": 0})
+        self._local = threading.local()
+
+    def _clear(self):
+        self._results.clear()
+
+    def _run(self, query: str) -> QueryResult:
+        from sqlalchemy import text
+
+        # text() as SQLDatabase.run does, so queries behave the same with and without the cache
+        with self.database._engine.connect() as connection:
+            result = connection.execute(text(query))
+            if not result.returns_rows:
+                return QueryResult([], [])
+            return QueryResult(list(result.keys()), [tuple(row) for row in result.fetchall()])
+
+    def execute(self, query: str) -> QueryResult:
+        """Rows of `query`, from the cache when an equivalent read-only query ran on this database version"""
+        key = normalize_sql(query) if self.enabled else None
+        if key is None:
+            with self._lock:
+                self.stats["bypassed"] += 1
+            self._local.last_status = "bypass"
+            return self._run(query)
+        with self._lock:
+            self._check()
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                self.stats["hits"] += 1
+                self._local.last_status = "hit"
+                return cached
+            self.stats["misses"] += 1
+            version = self._version
+        self._local.last_status = "miss"
+        # Run outside the lock: a slow query does not hold back cache hits
+        result = self._run(query)
+        with self._lock:
+            if len(result.rows) <= self.max_rows and self._version == version:
+                self._results[key] = result
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+                    self.stats["evictions"] += 1
+        return result
+
+    def last_status(self) -> Optional[str]:
+        """Outcome of this thread's last query: "hit", "miss" or "bypass"."""
+        return getattr(self._local, "last_status", None)
+
+    def to_text(self, result: QueryResult) -> str:
+        return result.to_text(getattr(self.database, "_max_string_length", 300))
+
+
+@shared_resource("sql_schema_cache")
+def get_schema_cache() -> SchemaCache:
+    """Schema cache of the SQL agent database, shared by every run"""
+    return SchemaCache(get_sql_database(), SQL_DB_PATH)
+
+
+@shared_resource("sql_result_cache")
+def get_result_cache() -> QueryResultCache:
+    """Query result cache of the SQL agent database, shared by every run"""
+    return QueryResultCache(get_sql_database(), SQL_DB_PATH)
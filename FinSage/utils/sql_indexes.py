@@ -0,0 +1,375 @@
+"""
+Index advisor of the SQL agent database.
+
+The SQL agent queries stock_db.db ad hoc, mostly filtering on ticker and date
+columns. When SQL_WORKLOAD_LOG is set (e.g. to sql_workload.jsonl, for the
+time needed to collect a representative workload: the file is not rotated),
+`execute_query` appends every query it runs to it. The advisor groups that
+workload by normalized SQL, runs EXPLAIN QUERY PLAN on each query and, for the tables a plan scans in full (or indexes on the fly),
+proposes an index on the columns the query compares to a value (most selective
+first), joins on, compares to a range and sorts by. When every column the query
+reads from the table fits in SQL_INDEX_MAX_COLUMNS the index covers them, so
+SQLite answers from the index alone. The SQL_INDEX_KEY_COLUMNS of each table
+(ticker, then date) are indexed whatever the workload.
+
+    python -m FinSage.utils.sql_indexes advise    # proposed indexes and current plans
+    python -m FinSage.utils.sql_indexes apply     # create them, ANALYZE, before/after timings
+
+Creating indexes changes the database file, which drops the schema and query
+result caches of running processes.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from FinSage.config.runtime import (
+    SQL_DB_PATH,
+    SQL_INDEX_KEY_COLUMNS,
+    SQL_INDEX_MAX_COLUMNS,
+    SQL_INDEX_MIN_QUERIES,
+    SQL_WORKLOAD_LOG,
+)
+from FinSage.utils.log import get_logger
+from FinSage.utils.sql_cache import normalize_sql
+
+logger = get_logger(__name__)
+
+try:
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.optimizer.normalize_identifiers import normalize_identifiers
+except ImportError:
+    sqlglot = None
+
+# "SCAN p", "SCAN TABLE prices AS p", "SEARCH p USING AUTOMATIC COVERING INDEX (ticker=?)"
+_PLAN_STEP = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\S+)(?: AS (\S+))?(.*)$")
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Workload _______________________________________________ #
+# __________________________________________________________________________________________ #
+_workload_lock = threading.Lock()
+
+
+def record_query(query: str, seconds: float, cache_status: Optional[str] = None, path: str = SQL_WORKLOAD_LOG):
+    """Append a query run by the SQL agent to the workload log"""
+    if not path:
+        return
+    line = json.dumps({"ts": time.time(), "query": query, "seconds": round(seconds, 6), "cache": cache_status})
+    try:
+        with _workload_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        logger.warning("Cannot write the SQL workload log %s: %s", path, e)
+
+
+def load_workload(path: str = SQL_WORKLOAD_LOG) -> List[Dict[str, Any]]:
+    """Read-only queries of the workload log grouped by normalized SQL, most frequent first"""
+    queries: Dict[str, Dict[str, Any]] = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                key = normalize_sql(record.get("query", ""))
+                if key is None:
+                    continue
+                entry = queries.setdefault(key, {"query": record["query"], "count": 0, "seconds": 0.0})
+                entry["count"] += 1
+                entry["seconds"] += record.get("seconds") or 0.0
+    except FileNotFoundError:
+        logger.warning("No SQL workload log at %s", path)
+    return sorted(queries.values(), key=lambda entry: -entry["count"])
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Schema and plans _______________________________________ #
+# __________________________________________________________________________________________ #
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_columns(connection: sqlite3.Connection) -> Dict[str, List[str]]:
+    tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    return {table: [row[1] for row in connection.execute(f"PRAGMA table_info({_quote(table)})")] for table in tables}
+
+
+def existing_indexes(connection: sqlite3.Connection, table: str) -> List[Tuple[str, ...]]:
+    """Columns of each index of `table`, in index order"""
+    return [
+        tuple(row[2] for row in connection.execute(f"PRAGMA index_info({_quote(index[1])})"))
+        for index in connection.execute(f"PRAGMA index_list({_quote(table)})")
+    ]
+
+
+def query_plan(connection: sqlite3.Connection, query: str) -> List[str]:
+    return [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {query}")]
+
+
+def _scanned(plan: List[str], aliases: Dict[str, str]) -> set:
+    """Tables read in full, or through an index SQLite builds for the query"""
+    tables = set()
+    for step in plan:
+        match = _PLAN_STEP.match(step)
+        if match and (match.group(1) == "SCAN" or "AUTOMATIC" in match.group(4)):
+            name = match.group(2)
+            tables.add(aliases.get(name.lower(), name))
+    return tables
+
+
+def _distinct_counts(connection: sqlite3.Connection, table: str, columns: List[str]) -> Dict[str, int]:
+    selects = ", ".join(f"COUNT(DISTINCT {_quote(column)})" for column in columns)
+    return dict(zip(columns, connection.execute(f"SELECT {selects} FROM {_quote(table)}").fetchone()))
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Advisor ________________________________________________ #
+# __________________________________________________________________________________________ #
+class IndexCandidate(NamedTuple):
+    table: str
+    columns: Tuple[str, ...]
+    covering: bool
+    queries: int  # Workload queries it serves (0 for the key columns of the schema)
+    reason: str
+
+    @property
+    def name(self) -> str:
+        return "idx_" + re.sub(r"\W+", "_", f"{self.table}_{'_'.join(self.columns)}").lower()
+
+    def create_sql(self) -> str:
+        return f"CREATE INDEX IF NOT EXISTS {_quote(self.name)} ON {_quote(self.table)} ({', '.join(_quote(c) for c in self.columns)})"
+
+
+def _usage(tree, schema: Dict[str, List[str]]) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+    """Columns of each table compared to values, joined, compared to ranges, sorted by and read"""
+    tables = {table.lower(): table for table in schema}
+    aliases: Dict[str, str] = {}
+    for node in tree.find_all(exp.Table):
+        if node.name.lower() in tables:
+            aliases[node.alias_or_name.lower()] = tables[node.name.lower()]
+    in_query = set(aliases.values())
+    usage = {table: {"equality": [], "join": [], "range": [], "order": [], "read": set()} for table in in_query}
+
+    def resolve(column) -> Optional[Tuple[str, str]]:
+        if not isinstance(column, exp.Column):
+            return None
+        if column.table:
+            candidates = [aliases[column.table.lower()]] if column.table.lower() in aliases else []
+        else:
+            candidates = [table for table in in_query if any(c.lower() == column.name.lower() for c in schema[table])]
+        if len(candidates) != 1:
+            return None
+        table = candidates[0]
+        name = next((c for c in schema[table] if c.lower() == column.name.lower()), None)
+        return (table, name) if name else None
+
+    def add(kind: str, resolved: Optional[Tuple[str, str]]):
+        if resolved and resolved[1] not in usage[resolved[0]][kind]:
+            usage[resolved[0]][kind].append(resolved[1])
+
+    for column in tree.find_all(exp.Column):
+        resolved = resolve(column)
+        if resolved:
+            usage[resolved[0]]["read"].add(resolved[1])
+    # SELECT * reads every column of the queried tables, SELECT p.* every column of p
+    for select in tree.find_all(exp.Select):
+        for projection in select.expressions:
+            if isinstance(projection, exp.Star):
+                starred = in_query
+            elif isinstance(projection, exp.Column) and isinstance(projection.this, exp.Star):
+                starred = {aliases[projection.table.lower()]} if projection.table.lower() in aliases else set()
+            else:
+                continue
+            for table in starred:
+                usage[table]["read"].update(schema[table])
+    for comparison in tree.find_all(exp.EQ):
+        left, right = resolve(comparison.this), resolve(comparison.expression)
+        if left and right and left[0] != right[0]:
+            add("join", left)
+            add("join", right)
+        elif left and not isinstance(comparison.expression, exp.Column):
+            add("equality", left)
+        elif right and not isinstance(comparison.this, exp.Column):
+            add("equality", right)
+    for in_list in tree.find_all(exp.In):
+        add("equality", resolve(in_list.this))
+    for comparison in tree.find_all(exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Between, exp.Like):
+        add("range", resolve(comparison.this))
+    for ordered in tree.find_all(exp.Ordered):
+        add("order", resolve(ordered.this))
+    return usage, aliases
+
+
+def _candidate_columns(usage: Dict[str, Any], distinct: Dict[str, int], max_columns: int) -> Tuple[Tuple[str, ...], bool]:
+    equality = sorted(usage["equality"], key=lambda column: -distinct.get(column, 0))
+    key = equality + [column for column in usage["join"] if column not in equality]
+    ranges = [column for column in usage["range"] if column not in key]
+    if ranges:
+        # Only the first range column can narrow the search
+        key.append(ranges[0])
+    elif key:
+        key += [column for column in usage["order"] if column not in key]
+    rest = sorted(usage["read"] - set(key))
+    if key and len(key) + len(rest) <= max_columns:
+        return tuple(key + rest), True
+    return tuple(key[:max_columns]), False
+
+
+def _redundant(columns: Tuple[str, ...], indexes: List[Tuple[str, ...]]) -> bool:
+    """An index already starts with these columns"""
+    lowered = tuple(c.lower() for c in columns)
+    return any(tuple(c.lower() for c in index[: len(columns)]) == lowered for index in indexes)
+
+
+def advise(
+    connection: sqlite3.Connection,
+    workload: List[Dict[str, Any]],
+    min_queries: int = SQL_INDEX_MIN_QUERIES,
+    max_columns: int = SQL_INDEX_MAX_COLUMNS,
+    key_columns: List[str] = SQL_INDEX_KEY_COLUMNS,
+) -> List[IndexCandidate]:
+    """Indexes to create, the ones serving the most workload queries first"""
+    schema = table_columns(connection)
+    indexes = {table: existing_indexes(connection, table) for table in schema}
+    served: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = defaultdict(lambda: {"queries": 0, "covering": False})
+    if workload and sqlglot is None:
+        logger.warning("sqlglot is not installed, indexing the key columns only")
+    for entry in workload if sqlglot is not None else []:
+        try:
+            tree = normalize_identifiers(sqlglot.parse_one(entry["query"], read="sqlite"), dialect="sqlite")
+            usage, aliases = _usage(tree, schema)
+            scanned = _scanned(query_plan(connection, entry["query"]), aliases)
+        except (sqlglot.errors.SqlglotError, sqlite3.Error) as e:
+            logger.warning("Skipping workload query %r: %s", entry["query"][:200], e)
+            continue
+        for table in scanned & set(usage):
+            filtered = usage[table]["equality"] + usage[table]["join"] + usage[table]["range"]
+            if not filtered:
+                continue
+            columns, covering = _candidate_columns(usage[table], _distinct_counts(connection, table, filtered), max_columns)
+            served[(table, columns)]["queries"] += entry["count"]
+            served[(table, columns)]["covering"] = covering
+
+    candidates = []
+    for (table, columns), info in served.items():
+        same_table = {other: data for (other_table, other), data in served.items() if other_table == table}
+        # An index starting with these columns serves their queries too; only the longest one is created
+        if any(len(other) > len(columns) and other[: len(columns)] == columns for other in same_table):
+            continue
+        queries = sum(data["queries"] for other, data in same_table.items() if columns[: len(other)] == other)
+        if queries >= min_queries and not _redundant(columns, indexes[table]):
+            candidates.append(IndexCandidate(table, columns, info["covering"], queries, "workload"))
+    for table, columns in schema.items():
+        lowered = {column.lower(): column for column in columns}
+        key = tuple(lowered[name.lower()] for name in key_columns if name.lower() in lowered)
+        planned = [candidate.columns for candidate in candidates if candidate.table == table]
+        if key and not _redundant(key, indexes[table]) and not _redundant(key, planned):
+            candidates.append(IndexCandidate(table, key, False, 0, "key columns"))
+    return sorted(candidates, key=lambda candidate: -candidate.queries)
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Maintenance ____________________________________________ #
+# __________________________________________________________________________________________ #
+def time_query(connection: sqlite3.Connection, query: str, repeat: int = 3) -> float:
+    """Best of `repeat` runs, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.execute(query).fetchall()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def apply(connection: sqlite3.Connection, candidates: List[IndexCandidate], workload: List[Dict[str, Any]], repeat: int = 3) -> Dict[str, Any]:
+    """Create the indexes, ANALYZE, and time the workload queries before and after"""
+    before = {entry["query"]: (time_query(connection, entry["query"], repeat), query_plan(connection, entry["query"])) for entry in workload}
+    created = []
+    for candidate in candidates:
+        started = time.perf_counter()
+        connection.execute(candidate.create_sql())
+        created.append({"index": candidate.name, "sql": candidate.create_sql(), "seconds": round(time.perf_counter() - started, 3)})
+        logger.info("Created %s in %.2fs", candidate.name, created[-1]["seconds"])
+    started = time.perf_counter()
+    connection.execute("ANALYZE")
+    connection.commit()
+    analyze_seconds = time.perf_counter() - started
+    queries = []
+    for entry in workload:
+        seconds, plan = before[entry["query"]]
+        queries.append({
+            "query": entry["query"],
+            "count": entry["count"],
+            "before_ms": round(seconds * 1000, 3),
+            "after_ms": round(time_query(connection, entry["query"], repeat) * 1000, 3),
+            "plan_before": plan,
+            "plan_after": query_plan(connection, entry["query"]),
+        })
+    return {"created": created, "analyze_seconds": round(analyze_seconds, 3), "queries": queries}
+
+
+def _print_plans(connection: sqlite3.Connection, workload: List[Dict[str, Any]]):
+    for entry in workload:
+        print(f"{entry['count']:>5}x  {' '.join(entry['query'].split())[:100]}")
+        for step in query_plan(connection, entry["query"]):
+            print(f"         {step}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Index advisor of the SQL agent database")
+    parser.add_argument("command", choices=["advise", "apply"])
+    parser.add_argument("--db", default=SQL_DB_PATH)
+    parser.add_argument("--workload", default=SQL_WORKLOAD_LOG, help="JSONL workload log written by the SQL agent")
+    parser.add_argument("--min-queries", type=int, default=SQL_INDEX_MIN_QUERIES)
+    parser.add_argument("--max-columns", type=int, default=SQL_INDEX_MAX_COLUMNS)
+    parser.add_argument("--top", type=int, default=50, help="Most frequent workload queries considered")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each query when timing it")
+    parser.add_argument("--json", action="store_true", help="Print the apply report as JSON")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Database {args.db} not found")
+        return 1
+    if not args.workload:
+        logger.warning("No workload log (set SQL_WORKLOAD_LOG or pass --workload), only key columns are indexed")
+    workload = load_workload(args.workload)[: args.top] if args.workload else []
+    connection = sqlite3.connect(args.db)
+    try:
+        try:
+            candidates = advise(connection, workload, args.min_queries, args.max_columns)
+        except sqlite3.Error as e:
+            print(f"Cannot inspect {args.db}: {e}")
+            return 1
+        if args.command == "advise":
+            print(f"{len(workload)} distinct workload queries, {len(candidates)} indexes proposed")
+            for candidate in candidates:
+                print(f"  {candidate.create_sql()};  -- {candidate.reason}, {candidate.queries} queries{', covering' if candidate.covering else ''}")
+            _print_plans(connection, workload)
+            return 0
+        report = apply(connection, candidates, workload, args.repeat)
+    finally:
+        connection.close()
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    for created in report["created"]:
+        print(f"Created {created['index']} in {created['seconds']}s")
+    print(f"ANALYZE in {report['analyze_seconds']}s")
+    for query in report["queries"]:
+        print(f"{query['count']:>5}x  {query['before_ms']:>10.3f} ms -> {query['after_ms']:>10.3f} ms  {' '.join(query['query'].split())[:80]}")
+        if query["plan_before"] != query["plan_after"]:
+            print(f"         {'; '.join(query['plan_before'])}  ->  {'; '.join(query['plan_after'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Initial graph state and agent state updates.
+
+Every entry point (Streamlit app, benchmarks, batch runs) starts the FinSage
+graph from the same state shape; this builds it. Nodes return only the
+channels they change; `agent_update` builds that update for an agent answer.
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage
+
+from FinSage.models.personality import AgentPersonality
+
+
+def _agent_internal_state() -> Dict[str, Any]:
+    return {
+        "agent_executor_tools": {},
+        "full_response": {},
+        "all_tools_eval": {"passed": [], "stats": []},
+        "topic_adherence_eval": {"passed": [], "reason": []}
+    }
+
+
+def build_initial_state(
+    user_input: str,
+    callback: Any,
+    personality: Optional[AgentPersonality] = None,
+    messages: Optional[List[Any]] = None,
+    current_date: Optional[datetime] = None,
+    config: Optional[Dict[str, Any]] = None,
+    session_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Returns a fresh AgentState for one question.
+
+    Args:
+        user_input (str): The user's question.
+        callback: Handler the nodes report progress to (write_agent_name, tool events).
+        personality (AgentPersonality): Investment profile; defaults to AgentPersonality().
+        messages (list): Prior conversation; the question is appended to it.
+        current_date (datetime): Analysis date; defaults to now.
+        config (dict): Model settings kept in the state.
+        session_id (str): Chat session of the question, used to aggregate usage per session.
+        user_id (str): User asking, for the per-user admission limits; defaults to the session.
+    """
+    return {
+        "current_date": current_date or datetime.now(),
+        "messages": list(messages or []) + [user_input],
+        "user_input": user_input,
+        "config": config or {},
+        "callback": callback,
+        "session_id": session_id,
+        "user_id": user_id or session_id,
+        # None resets the reducer channels left by a previous question
+        "agent_results": None,
+        "deadline": None,
+        "deadline_reached": None,
+        "personality": personality or AgentPersonality(),
+        "news_sentiment_agent_internal_state": _agent_internal_state(),
+        "financial_metrics_agent_internal_state": _agent_internal_state(),
+        "market_intelligence_agent_internal_state": _agent_internal_state(),
+        "sql_agent_internal_state": {
+            "agent_tools": [],
+            "date_available": "",
+            "relevant_tables": {
+                "tables": [],
+                "explanation": ""
+            },
+            "response": "",
+            "wrong_generated_queries": [],
+            "wrong_formatted_results": [],
+            "budget_deadline": None
+        }
+    }
+
+
+def agent_update(message_name: str, internal_key: str, internal: Dict[str, Any], output: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    State update of an agent node: its answer message, its entry in the
+    `agent_results` channel and its new internal state.
+
+    Args:
+        message_name (str): Name of the answer message (e.g. "FinancialMetrics").
+        internal_key (str): Internal state channel of the agent.
+        internal (dict): The agent's updated internal state.
+        output (dict): The executor output (answer in "output").
+    """
+    update = {
+        "messages": [AIMessage(content=output.get("output"), name=message_name)],
+        internal_key: internal,
+        "agent_results": {
+            message_name: {
+                "output": output.get("output"),
+                "artifact_id": internal.get("full_response", {}).get("artifact_id"),
+                "deadline_exceeded": bool(output.get("deadline_exceeded")),
+                "completed_at": time.time(),
+            }
+        },
+    }
+    if output.get("deadline_exceeded"):
+        update["deadline_reached"] = True
+    return update
@@ -0,0 +1,159 @@
+"""
+Local topic-adherence scoring that runs before the LLM judge.
+
+Most agent answers are clearly on-topic (the right tickers, the metrics the
+agent exists to report, tables of numbers) or clearly broken (empty, refusals,
+iteration-limit stops). Those are graded here in microseconds; only answers
+with an ambiguous score are sent to the LLM topic-adherence evaluator.
+"""
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from FinSage.config.runtime import (
+    TOPIC_ADHERENCE_FAIL_SCORE,
+    TOPIC_ADHERENCE_PASS_SCORE,
+    TOPIC_ADHERENCE_PRECHECK_ENABLED,
+)
+from FinSage.models.schemas import LLM_TopicAdherenceEval
+from FinSage.utils.query_analysis import content_tokens, extract_symbols, normalize_question
+
+# Agent -> metric groups its answers are expected to cover (any synonym counts)
+AGENT_REQUIRED_METRICS = {
+    "FinancialMetricsAgent": [
+        ("revenue", "sales"),
+        ("net income", "earnings", "profit"),
+        ("eps", "earnings per share"),
+        ("p/e", "pe ratio", "price to earnings", "price-to-earnings", "valuation"),
+        ("margin",),
+        ("cash flow", "free cash flow"),
+        ("debt", "liabilities", "balance sheet", "assets"),
+        ("market cap", "market capitalization"),
+    ],
+    "MarketIntelligenceAgent": [
+        ("price", "close", "closing"),
+        ("volume",),
+        ("insider",),
+        ("trend", "momentum"),
+        ("support", "resistance"),
+        ("moving average", "sma", "ema", "rsi", "macd"),
+        ("volatility", "range", "high", "low"),
+    ],
+    "NewsSentimentAgent": [
+        ("sentiment",),
+        ("news", "headline", "article"),
+        ("positive", "negative", "neutral", "bullish", "bearish"),
+        ("http://", "https://", "source"),
+        ("narrative", "theme", "perception", "investor"),
+    ],
+}
+
+# Number of covered metric groups that counts as full coverage
+_REQUIRED_METRIC_GROUPS = 3
+
+# Question words that are not expected to appear in an answer
+_QUESTION_FILLER = {
+    "analyze", "analyse", "analysis", "give", "show", "provide", "get", "find", "me", "us",
+    "much", "many", "which", "when", "why", "there", "their", "any", "some", "with", "vs",
+    "versus", "compare", "buy", "sell", "hold", "invest", "worth", "s",
+}
+
+# Answers that are broken regardless of their content
+_BROKEN_ANSWER_PATTERNS = [
+    r"agent stopped due to (max )?iteration",
+    r"agent stopped due to .*time limit",
+    r"^\s*(i'?m sorry|i apologi[sz]e|i cannot|i can'?t|i am unable|i'?m unable)",
+    r"^\s*error\b",
+]
+
+_TABLE_ROW = re.compile(r"^\s*\|.*\d.*\|\s*$", re.MULTILINE)
+_NUMBER = re.compile(r"[$€£]?\d[\d,]*(?:\.\d+)?\s*(?:%|[kmbt]\b|billion|million)?", re.IGNORECASE)
+
+# Component -> weight in the final score
+_WEIGHTS = {"tickers": 0.3, "keywords": 0.2, "metrics": 0.3, "numbers": 0.2}
+
+precheck_stats = {"passed": 0, "failed": 0, "ambiguous": 0}
+_stats_lock = threading.Lock()
+
+
+def _ticker_coverage(question: str, answer: str) -> Optional[float]:
+    wanted = set(extract_symbols(question))
+    if not wanted:
+        return None
+    found = set(extract_symbols(answer))
+    return len(wanted & found) / len(wanted)
+
+
+def _keyword_overlap(question: str, normalized_answer: str) -> Optional[float]:
+    keywords = {t for t in content_tokens(question) if t not in _QUESTION_FILLER and len(t) > 1}
+    if not keywords:
+        return None
+    answer_tokens = set(normalized_answer.split())
+    return sum(1 for k in keywords if k in answer_tokens) / len(keywords)
+
+
+def _metric_coverage(agent_name: str, lowered_answer: str) -> Tuple[Optional[float], List[str]]:
+    groups = AGENT_REQUIRED_METRICS.get(agent_name)
+    if not groups:
+        return None, []
+    covered = [group[0] for group in groups if any(re.search(rf"\b{re.escape(term)}", lowered_answer) for term in group)]
+    return min(1.0, len(covered) / min(_REQUIRED_METRIC_GROUPS, len(groups))), covered
+
+
+def _numeric_evidence(answer: str) -> float:
+    if len(_TABLE_ROW.findall(answer)) >= 2:
+        return 1.0
+    numbers = len(_NUMBER.findall(answer))
+    return min(1.0, numbers / 10) * 0.8
+
+
+def score_topic_adherence(agent_name: str, question: str, answer: str) -> Dict[str, Any]:
+    """
+    Score an agent answer between 0 and 1 from ticker coverage, keyword overlap
+    with the question, coverage of the agent's core metrics and numeric
+    evidence. Components that do not apply (e.g. a question without tickers)
+    are left out and the remaining weights are renormalized.
+    """
+    answer = answer or ""
+    lowered = answer.lower()
+    if not answer.strip() or any(re.search(p, lowered) for p in _BROKEN_ANSWER_PATTERNS):
+        return {"score": 0.0, "components": {}, "covered_metrics": [], "broken": True}
+
+    metrics, covered = _metric_coverage(agent_name, lowered)
+    components = {
+        "tickers": _ticker_coverage(question, answer),
+        "keywords": _keyword_overlap(question, normalize_question(answer)),
+        "metrics": metrics,
+        "numbers": _numeric_evidence(answer),
+    }
+    applicable = {name: value for name, value in components.items() if value is not None}
+    total_weight = sum(_WEIGHTS[name] for name in applicable)
+    score = sum(_WEIGHTS[name] * value for name, value in applicable.items()) / total_weight
+    return {"score": round(score, 3), "components": applicable, "covered_metrics": covered, "broken": False}
+
+
+def precheck_topic_adherence(agent_name: str, question: str, answer: str) -> Optional[LLM_TopicAdherenceEval]:
+    """
+    Grade an answer locally. Returns the evaluation when the score is conclusive,
+    or None when the LLM judge has to decide.
+    """
+    if not TOPIC_ADHERENCE_PRECHECK_ENABLED:
+        return None
+
+    result = score_topic_adherence(agent_name, question, answer)
+    score = result["score"]
+    if TOPIC_ADHERENCE_FAIL_SCORE < score < TOPIC_ADHERENCE_PASS_SCORE:
+        verdict = "ambiguous"
+    else:
+        verdict = "passed" if score >= TOPIC_ADHERENCE_PASS_SCORE else "failed"
+    with _stats_lock:
+        precheck_stats[verdict] += 1
+    if verdict == "ambiguous":
+        return None
+
+    if result["broken"]:
+        reason = "Heuristic pre-check: the answer is empty, a refusal or an early-stopped agent run"
+    else:
+        details = ", ".join(f"{name} {value:.2f}" for name, value in result["components"].items())
+        reason = f"Heuristic pre-check score {score:.2f} ({details}); metrics covered: {', '.join(result['covered_metrics']) or 'none'}"
+    return LLM_TopicAdherenceEval(passed="true" if verdict == "passed" else "false", reason=reason)
@@ -0,0 +1,131 @@
+"""
+Local stand-in for an OpenTelemetry collector.
+
+Accepts OTLP/JSON trace exports on POST /v1/traces, appends every span as one
+flat JSON line to a file and keeps the latest spans in memory (GET /v1/traces).
+Point FinSage at it with:
+
+    python -m FinSage.utils.trace_collector --port 4318
+    TRACING_ENABLED=true TRACING_OTLP_ENDPOINT=http://localhost:4318/v1/traces
+"""
+import argparse
+import json
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+TRACES_PATH = "/v1/traces"
+
+
+def _attribute_value(value: Dict[str, Any]) -> Any:
+    if "intValue" in value:
+        return int(value["intValue"])
+    for key in ("boolValue", "doubleValue", "stringValue"):
+        if key in value:
+            return value[key]
+    return None
+
+
+def flatten_otlp(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flat span dicts from an OTLP/JSON ExportTraceServiceRequest"""
+    spans = []
+    for resource_spans in payload.get("resourceSpans", []):
+        resource = {a["key"]: _attribute_value(a["value"]) for a in resource_spans.get("resource", {}).get("attributes", [])}
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                start, end = int(span["startTimeUnixNano"]), int(span["endTimeUnixNano"])
+                spans.append({
+                    "service": resource.get("service.name"),
+                    "trace_id": span["traceId"],
+                    "span_id": span["spanId"],
+                    "parent_span_id": span.get("parentSpanId"),
+                    "name": span["name"],
+                    "duration_ms": round((end - start) / 1e6, 3),
+                    "status": {1: "ok", 2: "error"}.get(span.get("status", {}).get("code"), "unset"),
+                    "error": span.get("status", {}).get("message") or None,
+                    "attributes": {a["key"]: _attribute_value(a["value"]) for a in span.get("attributes", [])},
+                })
+    return spans
+
+
+class TraceCollector:
+    """Span sink shared by the HTTP handler threads"""
+
+    def __init__(self, path: Optional[str] = "collected_traces.jsonl", keep: int = 5000):
+        self.path = path
+        self.spans = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def add(self, payload: Dict[str, Any]) -> int:
+        spans = flatten_otlp(payload)
+        with self._lock:
+            self.spans.extend(spans)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for span in spans:
+                        f.write(json.dumps(span) + "\n")
+        return len(spans)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.spans)
+
+
+def _handler_for(collector: TraceCollector):
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body: Any):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path != TRACES_PATH:
+                return self._reply(404, {"error": "not found"})
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                received = collector.add(payload)
+            except (ValueError, KeyError) as e:
+                return self._reply(400, {"error": str(e)})
+            self._reply(200, {"partialSuccess": {}, "received": received})
+
+        def do_GET(self):
+            if self.path != TRACES_PATH:
+                return self._reply(404, {"error": "not found"})
+            self._reply(200, collector.snapshot())
+
+        def log_message(self, format, *args):
+            pass
+
+    return CollectorHandler
+
+
+def start_collector(host: str = "127.0.0.1", port: int = 4318, path: Optional[str] = "collected_traces.jsonl"):
+    """Start the collector on a daemon thread; returns (server, collector)"""
+    collector = TraceCollector(path)
+    server = ThreadingHTTPServer((host, port), _handler_for(collector))
+    threading.Thread(target=server.serve_forever, name="finsage-trace-collector", daemon=True).start()
+    return server, collector
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Local OTLP/JSON trace collector for FinSage")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--output", default="collected_traces.jsonl", help="JSONL file receiving the spans")
+    args = parser.parse_args(argv)
+
+    collector = TraceCollector(args.output)
+    server = ThreadingHTTPServer((args.host, args.port), _handler_for(collector))
+    print(f"Collecting traces on http://{args.host}:{args.port}{TRACES_PATH} -> {args.output}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""
+Structured tracing of FinSage runs.
+
+A traced run produces one trace of nested spans:
+
+    request
+    └── Supervisor / FinancialMetricsAgent / Synthesizer ...   (graph nodes)
+        ├── FinancialMetricsAgent/EvaluateTopicAdherence ...    (subgraph nodes)
+        ├── llm:<model>                                         (LLM calls)
+        └── tool:<name>                                         (tool calls)
+
+Every span carries start/end times, status and error, and kind-specific
+attributes: model and token usage for LLM calls, provider and cache status for
+tool calls, cache hit for the request. Finished traces are exported in the
+background to a local JSONL file and/or an OTLP/HTTP (OpenTelemetry) endpoint;
+`FinSage.utils.trace_collector` is a local stand-in for that endpoint.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from FinSage.config.runtime import TRACING_ENABLED, TRACING_JSONL_PATH, TRACING_OTLP_ENDPOINT, TRACING_SERVICE_NAME
+from FinSage.tools.providers import tool_provider
+from FinSage.tools.tool_cache import tool_result_cache
+from FinSage.utils.callback_tools import CallbackFanout, model_name, node_path, token_usage
+from FinSage.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class Span:
+    """One timed operation of a trace"""
+
+    def __init__(self, trace_id: str, name: str, kind: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent else None
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.status = "unset"
+        self.error: Optional[str] = None
+
+    def end(self, error: Optional[BaseException] = None, error_message: Optional[str] = None):
+        if self.end_time is not None:
+            return
+        self.end_time = time.time()
+        if error is not None or error_message:
+            self.status = "error"
+            self.error = error_message or f"{type(error).__name__}: {str(error)}"
+        else:
+            self.status = "ok"
+
+    def to_dict(self) -> Dict[str, Any]:
+        end_time = self.end_time or time.time()
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time": self.start_time,
+            "end_time": end_time,
+            "duration_ms": round((end_time - self.start_time) * 1000, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Turns LangChain/LangGraph callback events of one request into spans.
+
+    Parents are resolved from parent_run_id when the event has one. The agent
+    executors run with their own callbacks and start new root runs, so they are
+    attached to the open span of their LangGraph node instead (from the
+    `langgraph_checkpoint_ns` metadata they inherit).
+    """
+
+    def __init__(self, root: Span):
+        super().__init__()
+        self.root = root
+        self.spans: List[Span] = [root]
+        self.current_agent_name = None
+        self._by_run: Dict[UUID, Span] = {}
+        self._run_parent: Dict[UUID, Optional[UUID]] = {}
+        self._open_nodes: Dict[str, List[Span]] = {}
+        self._lock = threading.Lock()
+
+    def write_agent_name(self, name: str):
+        self.current_agent_name = name
+
+    # ---------------------------------------------------------------- span bookkeeping
+    def _parent_span(self, parent_run_id: Optional[UUID], metadata: Optional[Dict[str, Any]]) -> Span:
+        run_id = parent_run_id
+        while run_id is not None:
+            if run_id in self._by_run:
+                return self._by_run[run_id]
+            run_id = self._run_parent.get(run_id)
+        path = node_path(metadata)
+        while path and path != "graph":
+            if self._open_nodes.get(path):
+                return self._open_nodes[path][-1]
+            path = path.rsplit("/", 1)[0] if "/" in path else ""
+        return self.root
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], metadata, name: str, kind: str, attributes: Dict[str, Any]) -> Span:
+        with self._lock:
+            self._run_parent[run_id] = parent_run_id
+            span = Span(self.root.trace_id, name, kind, self._parent_span(parent_run_id, metadata), attributes)
+            self._by_run[run_id] = span
+            self.spans.append(span)
+            if kind == "node":
+                self._open_nodes.setdefault(attributes["node_path"], []).append(span)
+            return span
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, error_message: Optional[str] = None) -> Optional[Span]:
+        with self._lock:
+            span = self._by_run.pop(run_id, None)
+            if span is None:
+                return None
+            if span.kind == "node":
+                stack = self._open_nodes.get(span.attributes["node_path"], [])
+                if span in stack:
+                    stack.remove(span)
+            span.end(error, error_message)
+            return span
+
+    # ---------------------------------------------------------------- graph nodes
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None, metadata=None, name=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and name == node:
+            self._start(run_id, parent_run_id, metadata, node, "node", {"node_path": node_path(metadata)})
+        else:
+            with self._lock:
+                self._run_parent[run_id] = parent_run_id
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs):
+        self._end(run_id, error)
+
+    # ---------------------------------------------------------------- LLM calls
+    def _start_llm(self, run_id, parent_run_id, metadata, kwargs):
+        model = model_name(metadata=metadata, invocation_params=kwargs.get("invocation_params"))
+        self._start(run_id, parent_run_id, metadata, f"llm:{model or 'unknown'}", "llm", {
+            "node_path": node_path(metadata),
+            "model": model,
+            "agent": self.current_agent_name,
+        })
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None, metadata=None, **kwargs):
+        self._start_llm(run_id, parent_run_id, metadata, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, parent_run_id: Optional[UUID] = None, metadata=None, **kwargs):
+        self._start_llm(run_id, parent_run_id, metadata, kwargs)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        span = self._by_run.get(run_id)
+        if span is not None:
+            span.attributes.update(token_usage(response))
+            span.attributes["model"] = model_name(response) or span.attributes.get("model")
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        self._end(run_id, error)
+
+    # ---------------------------------------------------------------- tool calls
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, metadata=None, name=None, **kwargs):
+        tool_name = name or (serialized or {}).get("name", "unknown")
+        self._start(run_id, parent_run_id, metadata, f"tool:{tool_name}", "tool", {
+            "node_path": node_path(metadata),
+            "tool": tool_name,
+            "provider": tool_provider(tool_name),
+            "input": str(input_str)[:200],
+        })
+
+    def on_tool_end(self, output, *, run_id: UUID = None, **kwargs):
+        # FinSage nodes also call on_tool_end(text) to display results; those carry no run id
+        if run_id is None:
+            return
+        span = self._by_run.get(run_id)
+        if span is None:
+            return
+        # Best effort: the cache status is tracked per thread, exact for synchronous tool runs
+        status = tool_result_cache.last_status()
+        span.attributes["cache_status"] = status
+        span.attributes["cache_hit"] = status == "hit" if status else None
+        content = getattr(output, "content", output)
+        error_message = None
+        if isinstance(content, dict) and "error" in content:
+            error_message = str(content["error"])[:500]
+        self._end(run_id, error_message=error_message)
+
+    def on_tool_error(self, error, *, run_id: UUID = None, **kwargs):
+        if run_id is not None:
+            self._end(run_id, error)
+
+    def finish(self):
+        """Close spans left open (e.g. abandoned by a deadline) and return them all."""
+        with self._lock:
+            for span in self.spans:
+                if span.end_time is None and span is not self.root:
+                    span.end(error_message="span not closed before the request finished")
+            return list(self.spans)
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Exporters ______________________________________________ #
+# __________________________________________________________________________________________ #
+class JsonlSpanExporter:
+    """Appends spans, one JSON object per line, to a local file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Dict[str, Any]]):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span, default=str) + "\n")
+
+
+_OTLP_KIND = {"request": 2, "node": 1, "llm": 3, "tool": 3}  # SERVER, INTERNAL, CLIENT
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Dict[str, Any]], service_name: str = TRACING_SERVICE_NAME) -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest for a list of spans"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "FinSage.utils.tracing"},
+                "spans": [{
+                    "traceId": span["trace_id"],
+                    "spanId": span["span_id"],
+                    **({"parentSpanId": span["parent_span_id"]} if span["parent_span_id"] else {}),
+                    "name": span["name"],
+                    "kind": _OTLP_KIND.get(span["kind"], 1),
+                    "startTimeUnixNano": str(int(span["start_time"] * 1e9)),
+                    "endTimeUnixNano": str(int(span["end_time"] * 1e9)),
+                    "attributes": [
+                        {"key": f"finsage.{key}", "value": _otlp_value(value)}
+                        for key, value in {"kind": span["kind"], **span["attributes"]}.items() if value is not None
+                    ],
+                    "status": {"code": 2, "message": span["error"] or ""} if span["status"] == "error" else {"code": 1},
+                } for span in spans],
+            }],
+        }]
+    }
+
+
+class OTLPHttpSpanExporter:
+    """Posts spans as OTLP/JSON to an OpenTelemetry collector (`/v1/traces`)"""
+
+    def __init__(self, endpoint: str, service_name: str = TRACING_SERVICE_NAME, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans: List[Dict[str, Any]]):
+        body = json.dumps(to_otlp(spans, self.service_name)).encode()
+        request = urllib.request.Request(self.endpoint, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class SpanExportWorker:
+    """Exports finished traces on a daemon thread so the request never waits on I/O"""
+
+    def __init__(self, exporters: List[Any]):
+        self.exporters = exporters
+        self._queue: "queue.Queue" = queue.Queue(maxsize=1000)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, spans: List[Dict[str, Any]]):
+        if not self.exporters:
+            return
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            logger.warning("Trace export queue full, dropping a trace")
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="finsage-trace-export", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            for exporter in self.exporters:
+                try:
+                    exporter.export(spans)
+                except Exception as e:
+                    logger.error("Error exporting trace with %s: %s", type(exporter).__name__, e)
+            self._queue.task_done()
+
+    def flush(self):
+        self._queue.join()
+
+
+def _default_exporters() -> List[Any]:
+    exporters = []
+    if TRACING_JSONL_PATH:
+        exporters.append(JsonlSpanExporter(TRACING_JSONL_PATH))
+    if TRACING_OTLP_ENDPOINT:
+        exporters.append(OTLPHttpSpanExporter(TRACING_OTLP_ENDPOINT))
+    return exporters
+
+
+# Process-wide export worker
+span_export_worker = SpanExportWorker(_default_exporters())
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Traced invocation ______________________________________ #
+# __________________________________________________________________________________________ #
+class RequestTrace:
+    """Tracing of one graph request: instruments the state/config and exports the spans at the end"""
+
+    def __init__(self, state: Dict[str, Any], exporter: Optional[SpanExportWorker] = None):
+        self.exporter = exporter or span_export_worker
+        self.root = Span(uuid.uuid4().hex, "request", "request", attributes={
+            "user_input": str(state.get("user_input", ""))[:200],
+            "run_id": state.get("run_id"),
+        })
+        self.handler = TracingCallbackHandler(self.root)
+        self._original_callback = state.get("callback")
+
+    def instrument(self, state: Dict[str, Any], config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        state["callback"] = CallbackFanout(self._original_callback, self.handler)
+        config = dict(config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [self.handler]
+        return config
+
+    def finish(self, state: Dict[str, Any], output: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None):
+        state["callback"] = self._original_callback
+        if output is not None:
+            output["callback"] = self._original_callback
+            self.root.attributes["cache_hit"] = output.get("cache_hit")
+            self.root.attributes["next_step"] = output.get("next_step")
+            self.root.attributes["run_id"] = output.get("run_id") or self.root.attributes.get("run_id")
+        self.root.end(error)
+        self.exporter.submit([span.to_dict() for span in self.handler.finish()])
+
+
+def _invoke(graph, state, config):
+    return graph.invoke(state, config)
+
+
+async def _ainvoke(graph, state, config):
+    return await graph.ainvoke(state, config)
+
+
+def traced_invoke(graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None, invoke: Optional[Callable] = None) -> Dict[str, Any]:
+    """
+    Run `invoke(graph, state, config)` (default: graph.invoke) inside a request
+    trace when TRACING_ENABLED. Pass `invoke=cached_invoke` to trace the cached path.
+    """
+    invoke = invoke or _invoke
+    if not TRACING_ENABLED:
+        return invoke(graph, state, config)
+    trace = RequestTrace(state)
+    traced_config = trace.instrument(state, config)
+    try:
+        output = invoke(graph, state, traced_config)
+    except BaseException as e:
+        trace.finish(state, error=e)
+        raise
+    trace.finish(state, output)
+    return output
+
+
+async def atraced_invoke(graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None, invoke: Optional[Callable] = None) -> Dict[str, Any]:
+    """Async variant of traced_invoke (default: graph.ainvoke)"""
+    invoke = invoke or _ainvoke
+    if not TRACING_ENABLED:
+        return await invoke(graph, state, config)
+    trace = RequestTrace(state)
+    traced_config = trace.instrument(state, config)
+    try:
+        output = await invoke(graph, state, traced_config)
+    except BaseException as e:
+        trace.finish(state, error=e)
+        raise
+    trace.finish(state, output)
+    return output
@@ -0,0 +1,250 @@
+"""
+Token and cost accounting.
+
+`UsageCallbackHandler` records the prompt, completion and cached tokens of every
+LLM call of one request (supervisor, agent executors, evaluators, SQL steps,
+synthesizer) and prices them with MODEL_PRICING. `metered_invoke` runs a graph
+request with it and writes the request totals, broken down per agent, node and
+model, to `output["usage"]`. The process-wide `usage_meter` aggregates requests
+per session and overall, and renders them as Prometheus metrics.
+"""
+import heapq
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from FinSage.config.runtime import MODEL_PRICING, USAGE_ACCOUNTING_ENABLED, USAGE_MAX_SESSIONS, USAGE_TOP_PROMPTS
+from FinSage.utils.callback_tools import CallbackFanout, model_name, node_path, token_usage
+
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+def new_usage() -> Dict[str, Any]:
+    return {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0}
+
+
+def add_usage(totals: Dict[str, Any], usage: Dict[str, Any]) -> Dict[str, Any]:
+    totals["llm_calls"] += usage.get("llm_calls", 1)
+    for field in TOKEN_FIELDS:
+        totals[field] += usage.get(field, 0)
+    totals["cost_usd"] += usage.get("cost_usd", 0.0)
+    return totals
+
+
+def model_price(model: Optional[str]) -> Optional[Dict[str, float]]:
+    """Price entry of a model (longest matching prefix of MODEL_PRICING), None when unknown"""
+    if not model:
+        return None
+    matches = [name for name in MODEL_PRICING if model.startswith(name)]
+    return MODEL_PRICING[max(matches, key=len)] if matches else None
+
+
+def llm_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """USD cost of one call; cached prompt tokens are billed at the cached input price"""
+    price = model_price(model)
+    if price is None:
+        return 0.0
+    cached = min(cached_tokens, prompt_tokens)
+    return (
+        (prompt_tokens - cached) * price["input"]
+        + cached * price.get("cached_input", price["input"])
+        + completion_tokens * price["output"]
+    ) / 1_000_000
+
+
+def agent_of(path: str) -> str:
+    """Top-level graph node owning a node path ("FinancialMetricsAgent/EvaluateTopicAdherence" -> "FinancialMetricsAgent")"""
+    return path.split("/", 1)[0]
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Collects the token usage and cost of every LLM call of one request"""
+
+    def __init__(self):
+        super().__init__()
+        self.current_agent_name = None
+        self.calls: List[Dict[str, Any]] = []
+        self._open: Dict[UUID, Tuple[str, Optional[str], float]] = {}
+        self._lock = threading.Lock()
+
+    def write_agent_name(self, name: str):
+        self.current_agent_name = name
+
+    def _open_llm(self, run_id: UUID, metadata, invocation_params):
+        with self._lock:
+            self._open[run_id] = (node_path(metadata), model_name(metadata=metadata, invocation_params=invocation_params), time.perf_counter())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs):
+        self._open_llm(run_id, metadata, kwargs.get("invocation_params"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata=None, **kwargs):
+        self._open_llm(run_id, metadata, kwargs.get("invocation_params"))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        usage = token_usage(response)
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+            if opened is None:
+                return
+            path, model, started = opened
+            model = model_name(response) or model or "unknown"
+            self.calls.append({
+                "node": path,
+                "agent": agent_of(path),
+                "model": model,
+                **usage,
+                "cost_usd": llm_cost(model, usage["prompt_tokens"], usage["completion_tokens"], usage["cached_tokens"]),
+                "seconds": round(time.perf_counter() - started, 4),
+            })
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        with self._lock:
+            self._open.pop(run_id, None)
+
+    def summary(self) -> Dict[str, Any]:
+        """Request totals, per agent, node and model, and the largest prompts"""
+        with self._lock:
+            calls = list(self.calls)
+        total = new_usage()
+        breakdown = {"by_agent": defaultdict(new_usage), "by_node": defaultdict(new_usage), "by_model": defaultdict(new_usage)}
+        for call in calls:
+            add_usage(total, call)
+            add_usage(breakdown["by_agent"][call["agent"]], call)
+            add_usage(breakdown["by_node"][call["node"]], call)
+            add_usage(breakdown["by_model"][call["model"]], call)
+        return {
+            **total,
+            **{key: dict(value) for key, value in breakdown.items()},
+            "largest_prompts": heapq.nlargest(USAGE_TOP_PROMPTS, calls, key=lambda call: call["prompt_tokens"]),
+        }
+
+
+class UsageMeter:
+    """Process-wide usage totals, per session, agent and model"""
+
+    def __init__(self, top_prompts: int = USAGE_TOP_PROMPTS, max_sessions: int = USAGE_MAX_SESSIONS):
+        self.top_prompts = top_prompts
+        self.max_sessions = max_sessions
+        self.requests = 0
+        self.total = new_usage()
+        self.by_agent: Dict[str, Dict[str, Any]] = defaultdict(new_usage)
+        self.by_model: Dict[str, Dict[str, Any]] = defaultdict(new_usage)
+        # Least recently active sessions are dropped past max_sessions
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.largest_prompts: List[Tuple[int, float, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+
+    def record_request(self, usage: Dict[str, Any], session_id: Optional[str] = None, run_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Add one request summary; returns the updated session totals (None without a session)"""
+        with self._lock:
+            self.requests += 1
+            add_usage(self.total, usage)
+            for agent, totals in usage["by_agent"].items():
+                add_usage(self.by_agent[agent], totals)
+            for model, totals in usage["by_model"].items():
+                add_usage(self.by_model[model], totals)
+            for call in usage["largest_prompts"]:
+                entry = (call["prompt_tokens"], time.time(), {**call, "run_id": run_id, "session_id": session_id})
+                if len(self.largest_prompts) < self.top_prompts:
+                    heapq.heappush(self.largest_prompts, entry)
+                elif entry[0] > self.largest_prompts[0][0]:
+                    heapq.heapreplace(self.largest_prompts, entry)
+            if session_id is None:
+                return None
+            session = self.sessions.pop(session_id, None) or {"requests": 0, **new_usage()}
+            self.sessions[session_id] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+            session["requests"] += 1
+            add_usage(session, usage)
+            return dict(session)
+
+    def session(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.sessions.get(session_id) or {"requests": 0, **new_usage()})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "sessions": len(self.sessions),
+                **self.total,
+                "by_agent": {agent: dict(totals) for agent, totals in self.by_agent.items()},
+                "by_model": {model: dict(totals) for model, totals in self.by_model.items()},
+                "largest_prompts": [entry[2] for entry in sorted(self.largest_prompts, key=lambda entry: entry[0], reverse=True)],
+            }
+
+    def prometheus(self) -> str:
+        """Totals in the Prometheus text exposition format"""
+        stats = self.stats()
+        lines = ["# TYPE finsage_requests_total counter", f"finsage_requests_total {stats['requests']}"]
+        # One metric family per dimension, so summing a family never double counts
+        for dimension, breakdown in (("agent", stats["by_agent"]), ("model", stats["by_model"])):
+            family = f"finsage_{dimension}_llm"
+            lines += [f"# TYPE {family}_{metric}_total counter" for metric in ("calls", "tokens", "cost_usd")]
+            for name, totals in sorted(breakdown.items()):
+                label = f'{dimension}="{name}"'
+                lines.append(f"{family}_calls_total{{{label}}} {totals['llm_calls']}")
+                for field in TOKEN_FIELDS:
+                    lines.append(f'{family}_tokens_total{{{label},type="{field[:-len("_tokens")]}"}} {totals[field]}')
+                lines.append(f"{family}_cost_usd_total{{{label}}} {totals['cost_usd']:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide usage totals
+usage_meter = UsageMeter()
+
+
+# __________________________________________________________________________________________ #
+# _________________________________ Metered invocation _____________________________________ #
+# __________________________________________________________________________________________ #
+def _instrument(state: Dict[str, Any], config: Optional[Dict[str, Any]], handler: UsageCallbackHandler) -> Dict[str, Any]:
+    # Agent executors run with state["callback"] only, the other nodes inherit the config callbacks
+    state["callback"] = CallbackFanout(state.get("callback"), handler)
+    config = dict(config or {})
+    config["callbacks"] = list(config.get("callbacks") or []) + [handler]
+    return config
+
+
+def _finish(state: Dict[str, Any], output: Dict[str, Any], callback: Any, handler: UsageCallbackHandler, meter: "UsageMeter") -> Dict[str, Any]:
+    state["callback"] = callback
+    output["callback"] = callback
+    usage = handler.summary()
+    session = meter.record_request(usage, state.get("session_id"), output.get("run_id"))
+    output["usage"] = {**usage, "session": session}
+    return output
+
+
+def metered_invoke(graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None, invoke: Optional[Callable] = None, meter: Optional[UsageMeter] = None) -> Dict[str, Any]:
+    """
+    Run `invoke(graph, state, config)` (default: graph.invoke) and attach the
+    request's token usage and cost to `output["usage"]`.
+    """
+    invoke = invoke or (lambda graph, state, config: graph.invoke(state, config))
+    if not USAGE_ACCOUNTING_ENABLED:
+        return invoke(graph, state, config)
+    handler, callback = UsageCallbackHandler(), state.get("callback")
+    try:
+        output = invoke(graph, state, _instrument(state, config, handler))
+    finally:
+        state["callback"] = callback
+    return _finish(state, output, callback, handler, meter or usage_meter)
+
+
+async def ametered_invoke(graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None, invoke: Optional[Callable] = None, meter: Optional[UsageMeter] = None) -> Dict[str, Any]:
+    """Async variant of metered_invoke (default: graph.ainvoke)"""
+    if invoke is None:
+        async def invoke(graph, state, config):
+            return await graph.ainvoke(state, config)
+    if not USAGE_ACCOUNTING_ENABLED:
+        return await invoke(graph, state, config)
+    handler, callback = UsageCallbackHandler(), state.get("callback")
+    try:
+        output = await invoke(graph, state, _instrument(state, config, handler))
+    finally:
+        state["callback"] = callback
+    return _finish(state, output, callback, handler, meter or usage_meter)
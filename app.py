@@ -6,29 +6,39 @@ import streamlit as st
 from langchain_community.chat_message_histories import StreamlitChatMessageHistory
 from langchain_core.messages import HumanMessage, AIMessage
 from datetime import datetime
+import time
+from functools import partial
+import uuid
 from FinSage.config.settings import setup_environment
 
 from FinSage.models.personality import AgentPersonality, RiskTolerance, TimeHorizon, InvestmentStyle
 
 # Local Imports
 from FinSage.utils.callback_tools import CustomStreamlitCallbackHandler
-from FinSage.agents.finsage import FinSage_agent
+from FinSage.config.runtime import UI_BACKGROUND_RUNS, UI_POLL_INTERVAL, UI_PREVIEW_CHARS
+from FinSage.utils.admission import admitted_invoke
+from FinSage.utils.background import start_background_run
+from FinSage.utils.response_cache import cached_invoke, get_final_answer
+from FinSage.utils.tracing import traced_invoke
+from FinSage.utils.usage import metered_invoke
+from FinSage.utils.state import build_initial_state
+from FinSage.utils.log import get_logger
+from FinSage.utils.resources import warm_up
 from FinSage.tools.plotting_tools import *
 
-setup_environment()
+logger = get_logger("app")
 
 # Debug helper function
 def debug_state(state):
     """Debug helper to print state contents"""
-    print("\n=== DEBUG: State Contents ===")
+    logger.debug("=== DEBUG: State Contents ===")
     for key, value in state.items():
         if key == "messages":
-            print(f"messages: {len(value)} messages")
+            logger.debug("messages: %s messages", len(value))
         elif key == "personality":
-            print(f"personality: {value.get_prompt_context()}")
+            logger.debug("personality: %s", value.get_prompt_context())
         else:
-            print(f"{key}: {value}")
-    print("===========================\n")
+            logger.debug("%s: %s", key, value)
 
 # Page configuration        
 st.set_page_config(
@@ -38,17 +48,31 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource(show_spinner="Loading FinSage agents...")
+def load_resources():
+    """Graphs, connection pools and caches, built by the first session and shared by every session and rerun"""
+    setup_environment()
+    return warm_up()
+
+FinSage_agent = load_resources()["sync"]
+
 # Initialize states
 if "chat_started" not in st.session_state:
     st.session_state.chat_started = False
     st.session_state.messages = []
 
-# Initialize chat history
-message_history = StreamlitChatMessageHistory()
+# One id per browser session, used to aggregate token usage and cost
+if "session_id" not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
+
+# Initialize chat history (once per browser session)
+if "message_history" not in st.session_state:
+    st.session_state.message_history = StreamlitChatMessageHistory()
+message_history = st.session_state.message_history
 
 def process_agent_output(output, response_container):
     """Process and display the agent output in a structured way"""
-    print("\n=== DEBUG: Processing Agent Output ===")
+    logger.debug("Processing agent output")
     try:
         messages = output.get("messages", [])
         final_synthesis = None
@@ -56,17 +80,125 @@ def process_agent_output(output, response_container):
         for message in messages:
             if hasattr(message, 'name') and message.name == "FinalSynthesis":
                 final_synthesis = message.content
-                print("Found final synthesis")
+                logger.debug("Found final synthesis")
                 break
         
         if final_synthesis:
-            print("Displaying final synthesis in UI")
+            logger.debug("Displaying final synthesis in UI")
             st.markdown(final_synthesis)
                 
     except Exception as e:
-        print(f"Error in process_agent_output: {str(e)}")
+        logger.error("Error in process_agent_output: %s", e)
         st.error(f"Error processing output: {str(e)}")
 
+def build_chat_state(prompt, callback):
+    """Initial graph state of a chat question"""
+    settings = {
+        "model": "gpt-4o-mini",
+        "temperature": 0.3,
+    }
+    return build_initial_state(
+        prompt,
+        callback,
+        personality=st.session_state.personality,
+        messages=message_history.messages,
+        config=settings,
+        session_id=st.session_state.session_id,
+    )
+
+def render_run_details(output):
+    """Evaluation expanders of a finished analysis"""
+    with st.expander("🔍 Tool Usage Evaluation"):
+        st.markdown("### News Sentiment Agent Tool Usage:")
+        st.dataframe(get_all_tools_called_eval_df(output, "news_sentiment_agent_internal_state")) 
+        st.markdown("### Financial Metrics Agent Tool Usage:")
+        st.dataframe(get_all_tools_called_eval_df(output, "financial_metrics_agent_internal_state"))
+        st.markdown("### Market Intelligence Agent Tool Usage:")
+        st.dataframe(get_all_tools_called_eval_df(output, "market_intelligence_agent_internal_state"))
+
+    with st.expander("📝 Topic Adherence Evaluation"):
+        st.markdown("### News Sentiment Agent Topic Adherence:")
+        st.dataframe(get_topic_adherence_eval_df(output, "news_sentiment_agent_internal_state"))
+        st.markdown("### Financial Metrics Agent Topic Adherence:")
+        st.dataframe(get_topic_adherence_eval_df(output, "financial_metrics_agent_internal_state"))
+        st.markdown("### Market Intelligence Agent Topic Adherence:")
+        st.dataframe(get_topic_adherence_eval_df(output, "market_intelligence_agent_internal_state"))
+    
+    with st.expander("SQL Agent Evaluation"):
+        wrong_generated_queries = output["sql_agent_internal_state"]['wrong_generated_queries']
+        wrong_formatted_results = output['sql_agent_internal_state']['wrong_formatted_results']
+        data = visualize_sql_agent_performance(
+            query_errors={"data": wrong_generated_queries, "title": "Query Generation Issues"},
+            format_errors={"data": wrong_formatted_results, "title": "Formatting Problems"}
+        )
+        st.table(data)
+
+    with st.expander("🛠️ Raw Response Data"):
+        st.json({key: output.get(key) for key in ("run_id", "next_step", "cache_hit", "usage")})
+
+# Labels of the graph nodes in the progress view
+NODE_LABELS = {
+    "Supervisor": "🧭 Planning the analysis",
+    "FinancialMetricsAgent": "📊 Financial Metrics Agent",
+    "NewsSentimentAgent": "📰 News & Sentiment Agent",
+    "MarketIntelligenceAgent": "🌐 Market Intelligence Agent",
+    "SQLAgent": "🗄️ SQL Agent",
+    "Synthesizer": "🎯 Writing the investment synthesis",
+    "FINISH": "💬 Writing the answer",
+}
+
+def render_progress(run):
+    """Finished agents with their answers, then the nodes still running and the latest tool call"""
+    finished, running, last_tool = {}, {}, None
+    for event in run.events_since(0):
+        data = event["data"]
+        if event["event"] == "node_start":
+            running[data["node"]] = event["time"]
+        elif event["event"] in ("node_end", "node_error"):
+            started = running.pop(data["node"], event["time"])
+            for name, result in (data.get("results") or {}).items():
+                finished[name] = {"node": data["node"], "output": result.get("output") or "", "seconds": event["time"] - started}
+        elif event["event"] == "tool_start":
+            last_tool = data
+
+    for result in finished.values():
+        with st.expander(f"✅ {NODE_LABELS.get(result['node'], result['node'])} ({result['seconds']:.0f}s)"):
+            output = result["output"]
+            st.markdown(output if len(output) <= UI_PREVIEW_CHARS else f"{output[:UI_PREVIEW_CHARS]} …")
+    for node in running:
+        st.markdown(f"⏳ {NODE_LABELS.get(node, node)}...")
+    if running and last_tool:
+        st.caption(f"🔧 {last_tool.get('tool')} ({last_tool.get('agent')})")
+    st.caption(f"⏱️ {time.time() - run.started_at:.0f}s elapsed")
+
+def finish_run(run):
+    """Move the answer of a finished background run into the chat"""
+    st.session_state.active_run = None
+    try:
+        output = run.result()
+    except Exception as e:
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": f"I apologize, but I encountered an error: {str(e)}"
+        })
+        return
+    logger.info("Background analysis %s completed in %.1fs", run.id, run.finished_at - run.started_at)
+    final_response = get_final_answer(output)
+    if final_response:
+        st.session_state.messages.append({"role": "assistant", "content": final_response})
+    st.session_state.last_output = output
+
+@st.fragment(run_every=UI_POLL_INTERVAL)
+def show_run_progress():
+    """Refreshes on its own; reruns the page once the analysis is over"""
+    run = st.session_state.get("active_run")
+    if run is None:
+        return
+    render_progress(run)
+    if run.done:
+        finish_run(run)
+        st.rerun()
+
 # Common header for both landing and chat pages
 def render_header():
     col1, col2 = st.columns([0.2, 4])
@@ -155,7 +287,7 @@ else:
         st.markdown("## 📈 Investment Profile")
         st.markdown("---")
         
-        print("\n=== DEBUG: Setting up Investment Profile ===")
+        logger.debug("Setting up investment profile")
         
         # Risk Tolerance with visual indicator
         risk_tolerance = st.selectbox(
@@ -218,133 +350,74 @@ else:
         with st.chat_message(message["role"], avatar="🧑‍💼" if message["role"] == "user" else "🤖"):
             st.write(message["content"])
 
-    # Chat input and processing
-    if prompt := st.chat_input("Ask me about financial analysis, market trends, or investment strategies..."):
-        print("\n=== DEBUG: New Chat Input ===")
-        print(f"Prompt: {prompt}")
+    # Evaluation of the last finished background analysis
+    if st.session_state.get("active_run") is None and st.session_state.get("last_output") is not None:
+        render_run_details(st.session_state.last_output)
+
+    # Chat input and processing (one analysis at a time per session)
+    if prompt := st.chat_input("Ask me about financial analysis, market trends, or investment strategies...", disabled=st.session_state.get("active_run") is not None):
+        logger.info("New chat input: %s", prompt)
         
         # Display user message
         with st.chat_message("user", avatar="🧑‍💼"):
             st.write(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
+        st.session_state.last_output = None
 
-        # Process with assistant
-        with st.chat_message("assistant", avatar="🤖"):
-            response_container = st.container()
-            callback_handler = CustomStreamlitCallbackHandler(parent_container=response_container)
-            
-            try:
-                print("\n=== DEBUG: Processing User Input ===")
-                settings = {
-                    "model": "gpt-4o-mini",
-                    "temperature": 0.3,
-                }
-                
-                state = {   
-                    "current_date": datetime.now(),
-                    "messages": list(message_history.messages) + [prompt],
-                    "user_input": prompt,
-                    "config": settings,
-                    "callback": callback_handler,
-                    "personality": st.session_state.personality,
-                    "news_sentiment_agent_internal_state": {
-                        "agent_executor_tools": {},
-                        "full_response": {},
-                        "all_tools_eval": {"passed": [], "stats": []},
-                        "topic_adherence_eval": {"passed": [], "reason": []}
-                    },
-                    "financial_metrics_agent_internal_state": {
-                        "agent_executor_tools": {},
-                        "full_response": {},
-                        "all_tools_eval": {"passed": [], "stats": []},
-                        "topic_adherence_eval": {"passed": [], "reason": []}
-                    },
-                    "market_intelligence_agent_internal_state": {
-                        "agent_executor_tools": {},
-                        "full_response": {},
-                        "all_tools_eval": {"passed": [], "stats": []},
-                        "topic_adherence_eval": {"passed": [], "reason": []}
-                    },
-                    "sql_agent_internal_state": {
-                        "agent_tools": [],  
-                        "date_available": "",
-                        "relevant_tables": {
-                            "tables": [],
-                            "explanation": ""
-                        },
-                        "response": "",  
-                        "wrong_generated_queries": [],
-                        "wrong_formatted_results": []
-                    }
-                }
-                
-                #debug_state(state)
-                
-                #print("\n=== DEBUG: Invoking Flow Graph ===")
-                output = FinSage_agent.invoke(
-                    state,
-                    {"recursion_limit": 30},
-                )
-                print("Flow graph execution completed")
+        if UI_BACKGROUND_RUNS:
+            st.session_state.active_run = start_background_run(
+                FinSage_agent,
+                build_chat_state(prompt, None),
+                {"recursion_limit": 30},
+                invoke=partial(traced_invoke, invoke=partial(metered_invoke, invoke=partial(cached_invoke, invoke=admitted_invoke))),
+            )
+            logger.info("Started background analysis %s", st.session_state.active_run.id)
+        else:
+            # Process with assistant
+            with st.chat_message("assistant", avatar="🤖"):
+                response_container = st.container()
+                callback_handler = CustomStreamlitCallbackHandler(parent_container=response_container)
                 
-                print("\n=== DEBUG: Processing Output ===")
-                if output.get("next_step") == "FINISH":
-                    final_response = output.get("messages", [])[-1].content
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": final_response
-                    })
-                    #st.write(final_response)  # Display directly in chat
-                else:
-                    # For regular financial analysis, process output normally
-                    process_agent_output(output, response_container)
+                try:
+                    logger.debug("Processing user input")
+                    state = build_chat_state(prompt, callback_handler)
+                    
+                    #debug_state(state)
                     
-                    # Store the final synthesis in chat history
-                    final_message = next(
-                        (msg for msg in output.get("messages", []) 
-                         if hasattr(msg, 'name') and msg.name == "FinalSynthesis"),
-                        None
-                    )
-                    if final_message:
+                    try:
+                        output = traced_invoke(
+                            FinSage_agent,
+                            state,
+                            {"recursion_limit": 30},
+                            invoke=partial(metered_invoke, invoke=partial(cached_invoke, invoke=admitted_invoke)),
+                        )
+                    finally:
+                        # Draw the agent steps still buffered by the handler
+                        callback_handler.flush()
+                    logger.info("Flow graph execution completed")
+                    
+                    logger.debug("Processing output")
+                    if output.get("next_step") != "FINISH":
+                        # For regular financial analysis, process output normally
+                        process_agent_output(output, response_container)
+                    final_response = get_final_answer(output)
+                    if final_response:
                         st.session_state.messages.append({
-                            "role": "assistant", 
-                            "content": final_message.content
+                            "role": "assistant",
+                            "content": final_response
                         })
 
-                # Evaluation expanders
-                with st.expander("🔍 Tool Usage Evaluation"):
-                    st.markdown("### News Sentiment Agent Tool Usage:")
-                    st.dataframe(get_all_tools_called_eval_df(output, "news_sentiment_agent_internal_state")) 
-                    st.markdown("### Financial Metrics Agent Tool Usage:")
-                    st.dataframe(get_all_tools_called_eval_df(output, "financial_metrics_agent_internal_state"))
-                    st.markdown("### Market Intelligence Agent Tool Usage:")
-                    st.dataframe(get_all_tools_called_eval_df(output, "market_intelligence_agent_internal_state"))
-
-                with st.expander("📝 Topic Adherence Evaluation"):
-                    st.markdown("### News Sentiment Agent Topic Adherence:")
-                    st.dataframe(get_topic_adherence_eval_df(output, "news_sentiment_agent_internal_state"))
-                    st.markdown("### Financial Metrics Agent Topic Adherence:")
-                    st.dataframe(get_topic_adherence_eval_df(output, "financial_metrics_agent_internal_state"))
-                    st.markdown("### Market Intelligence Agent Topic Adherence:")
-                    st.dataframe(get_topic_adherence_eval_df(output, "market_intelligence_agent_internal_state"))
-                
-                with st.expander("SQL Agent Evaluation"):
-                    wrong_generated_queries = output["sql_agent_internal_state"]['wrong_generated_queries']
-                    wrong_formatted_results = output['sql_agent_internal_state']['wrong_formatted_results']
-                    data = visualize_sql_agent_performance(
-                        query_errors={"data": wrong_generated_queries, "title": "Query Generation Issues"},
-                        format_errors={"data": wrong_formatted_results, "title": "Formatting Problems"}
-                    )
-                    st.table(data)
-
-                with st.expander("🛠️ Raw Response Data"):
-                    st.json(response_container)
-                
-            except Exception as e:
-                print(f"\n=== DEBUG: Error Occurred ===\n{str(e)}")
-                st.error("🚨 An error occurred. Please try again or rephrase your question.")
-                print(f"Detailed error: {str(e)}")
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": f"I apologize, but I encountered an error: {str(e)}"
-                })
\ No newline at end of file
+                    render_run_details(output)
+                    
+                except Exception as e:
+                    logger.exception("Error processing the question")
+                    st.error("🚨 An error occurred. Ask the same question again to resume from the completed steps, or rephrase it.")
+                    st.session_state.messages.append({
+                        "role": "assistant", 
+                        "content": f"I apologize, but I encountered an error: {str(e)}"
+                    })
+
+    # Progress of the running analysis, refreshed every UI_POLL_INTERVAL without rerunning the page
+    if st.session_state.get("active_run") is not None:
+        with st.chat_message("assistant", avatar="🤖"):
+            show_run_progress()
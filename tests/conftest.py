@@ -0,0 +1,28 @@
+"""
+Test configuration. The suite runs offline and without simulated latency:
+fake LLM backend, tool fixtures, in-memory checkpoints, and every file the
+runtime writes kept in a temporary directory. Runtime settings are read from
+the environment when FinSage.config.runtime is first imported, so they are
+set here, before any test module imports FinSage.
+
+    python -m pytest -q
+"""
+import os
+import tempfile
+
+_WORK_DIR = tempfile.mkdtemp(prefix="finsage-tests-")
+
+for _name, _value in {
+    "LLM_BACKEND": "fake",
+    "TOOL_BACKEND": "fixtures",
+    "FAKE_LLM_LATENCY_MS": "0",
+    "FAKE_LLM_LATENCY_JITTER_MS": "0",
+    "FAKE_LLM_MS_PER_OUTPUT_TOKEN": "0",
+    "TOOL_FIXTURE_LATENCY_MS": "0",
+    "CHECKPOINT_BACKEND": "memory",
+    "SQL_DB_PATH": os.path.join(_WORK_DIR, "stock_db.db"),
+    "JOB_DB_PATH": os.path.join(_WORK_DIR, "finsage_jobs.sqlite"),
+    "EVALUATION_RESULTS_PATH": os.path.join(_WORK_DIR, "evaluation_results.jsonl"),
+    "TRACING_JSONL_PATH": os.path.join(_WORK_DIR, "finsage_traces.jsonl"),
+}.items():
+    os.environ.setdefault(_name, _value)
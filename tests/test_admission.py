@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from FinSage.utils.admission import AdmissionRejected, ConcurrencyCap, FairScheduler
+
+
+def _wait_queued(slots, count):
+    deadline = time.time() + 5
+    while slots.snapshot()["queued"] < count:
+        assert time.time() < deadline, "waiters never queued"
+        time.sleep(0.001)
+
+
+def _queue_in_order(scheduler, users, served):
+    # Threads are started one by one so they enqueue in the given order
+    threads = []
+    for i, user in enumerate(users):
+        def run(user=user, name=f"{user}{users[:i + 1].count(user)}"):
+            with scheduler.slot(user, timeout=5):
+                served.append(name)
+        thread = threading.Thread(target=run)
+        thread.start()
+        _wait_queued(scheduler, i + 1)
+        threads.append(thread)
+    return threads
+
+
+def test_scheduler_interleaves_users():
+    scheduler = FairScheduler(max_concurrent=1, per_user_inflight=1, per_user_queued=10, max_queued=10, weights={})
+    holder = scheduler.acquire("c")
+    served = []
+    threads = _queue_in_order(scheduler, ["a", "a", "a", "b"], served)
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join()
+    # b arrived last but is not stuck behind a's backlog
+    assert served == ["a1", "b1", "a2", "a3"]
+    assert scheduler.snapshot()["running"] == 0
+
+
+def test_scheduler_weights_favour_heavier_users():
+    scheduler = FairScheduler(max_concurrent=1, per_user_inflight=1, per_user_queued=10, max_queued=10, weights={"a": 2})
+    holder = scheduler.acquire("c")
+    served = []
+    threads = _queue_in_order(scheduler, ["b", "b", "a", "a", "a", "a"], served)
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join()
+    assert served == ["b1", "a1", "a2", "b2", "a3", "a4"]
+
+
+def test_scheduler_caps_in_flight_per_user():
+    scheduler = FairScheduler(max_concurrent=2, per_user_inflight=1, per_user_queued=10, max_queued=10, weights={})
+    first = scheduler.acquire("a")
+    # A free slot remains, but not for a second analysis of the same user
+    with pytest.raises(AdmissionRejected):
+        scheduler.acquire("a", timeout=0.05)
+    other = scheduler.acquire("b", timeout=0.05)
+    snapshot = scheduler.snapshot()
+    assert snapshot["running_by_user"] == {"a": 1, "b": 1}
+    assert snapshot["queued"] == 0 and snapshot["timeouts"] == 1
+    scheduler.release(first)
+    scheduler.release(other)
+    assert scheduler.snapshot()["running"] == 0
+
+
+def test_scheduler_rejects_past_queue_limits():
+    scheduler = FairScheduler(max_concurrent=1, per_user_inflight=1, per_user_queued=1, max_queued=2, weights={})
+    holder = scheduler.acquire("a")
+    served = []
+    threads = _queue_in_order(scheduler, ["a", "b"], served)
+    with pytest.raises(AdmissionRejected, match="already has 1"):
+        scheduler.acquire("a")
+    with pytest.raises(AdmissionRejected, match="2 analyses are already waiting"):
+        scheduler.acquire("c")
+    assert scheduler.snapshot()["rejected"] == 2
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join()
+    assert sorted(served) == ["a1", "b1"]
+
+
+def test_cap_limits_holders():
+    cap = ConcurrencyCap("test", 2)
+    first, second = cap.acquire(), cap.acquire()
+    with pytest.raises(AdmissionRejected, match="No test slot within"):
+        cap.acquire(timeout=0.05)
+    # The timed out waiter left the queue
+    assert cap.snapshot()["queued"] == 0
+    cap.release(first)
+    third = cap.acquire(timeout=0.05)
+    assert cap.snapshot()["in_use"] == 2
+    cap.release(second)
+    cap.release(third)
+    snapshot = cap.snapshot()
+    assert snapshot["in_use"] == 0 and snapshot["admitted"] == 3 and snapshot["timeouts"] == 1
+
+
+def test_cap_without_limit_never_waits():
+    cap = ConcurrencyCap("test", 0)
+    holders = [cap.acquire(timeout=0) for _ in range(20)]
+    assert cap.snapshot()["in_use"] == 20
+    for holder in holders:
+        cap.release(holder)
+
+
+def test_cap_async_slots():
+    cap = ConcurrencyCap("test", 1)
+    peak = []
+
+    async def work():
+        async with cap.aslot(timeout=5):
+            peak.append(cap.snapshot()["in_use"])
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(work() for _ in range(5)))
+        async with cap.aslot():
+            with pytest.raises(AdmissionRejected):
+                await cap.aacquire(timeout=0.05)
+
+    asyncio.run(main())
+    assert peak == [1] * 5
+    assert cap.snapshot()["in_use"] == 0 and cap.snapshot()["queued"] == 0
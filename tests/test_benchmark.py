@@ -0,0 +1,17 @@
+from FinSage.benchmark.runner import load_corpus, run_benchmark
+
+
+def test_corpus_completes_on_the_fake_backend():
+    corpus = load_corpus()
+    report = run_benchmark(corpus)
+
+    errors = {r["id"]: r["error"] for r in report["results"] if r["error"]}
+    assert errors == {}
+    summary = report["summary"]
+    assert summary["queries"] == len(corpus)
+    assert summary["llm_calls_mean"] > 0 and summary["tokens_mean"] > 0
+    assert set(summary["per_category"]) == {q["category"] for q in corpus}
+    # Chitchat is answered without any data agent
+    for result in report["results"]:
+        if result["category"] == "chitchat":
+            assert result["tool_calls"] == 0
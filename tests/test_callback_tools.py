@@ -0,0 +1,9 @@
+from FinSage.utils.callback_tools import NullCallbackHandler
+
+
+def test_null_handler_accepts_node_reports():
+    callback = NullCallbackHandler()
+    callback.write_agent_name("Portfolio Synthesis")
+    # Nodes report their output without the run id LangChain passes to tool callbacks
+    callback.on_tool_end("synthesis text")
+    assert callback.current_agent_name == "Portfolio Synthesis"
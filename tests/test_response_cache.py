@@ -0,0 +1,85 @@
+from datetime import datetime
+
+from FinSage.tools.tool_cache import tool_result_cache
+from FinSage.utils import response_cache as response_cache_module
+from FinSage.utils.response_cache import ResponseCache
+
+TODAY = datetime(2024, 6, 3, 10, 0)
+TTL = {"investment_decision": 900, "fundamentals": 21600, "comparison": 1800, "general": 1800}
+
+
+def _cache(**kwargs):
+    return ResponseCache(**{"similarity_threshold": 0.72, "max_entries": 10, "ttl": TTL, **kwargs})
+
+
+def test_similar_questions_share_an_answer():
+    cache = _cache()
+    assert cache.store("Should I buy AAPL?", "Hold AAPL.", current_date=TODAY)
+    hit = cache.lookup("Is Apple a buy now?", current_date=TODAY)
+    assert hit["final_synthesis"] == "Hold AAPL." and hit["similarity"] >= 0.72
+    assert cache.stats == {"hits": 1, "misses": 0, "stores": 1, "invalidations": 0}
+
+
+def test_other_symbols_intents_and_dissimilar_questions_miss():
+    cache = _cache(similarity_threshold=0.95)
+    cache.store("Should I buy AAPL?", "Hold AAPL.", current_date=TODAY)
+    assert cache.lookup("Should I buy MSFT?", current_date=TODAY) is None
+    assert cache.lookup("What is the AAPL revenue growth?", current_date=TODAY) is None
+    assert cache.lookup("Is Apple a buy now?", current_date=TODAY) is None
+    assert cache.lookup("Should I buy AAPL?", current_date=TODAY) is not None
+
+
+def test_questions_without_symbols_are_never_cached():
+    cache = _cache()
+    assert not cache.store("What about its debt?", "It is low.", current_date=TODAY)
+    assert not cache.store("Should I buy AAPL?", "", current_date=TODAY)
+    assert len(cache) == 0
+    assert cache.lookup("What about its debt?", current_date=TODAY) is None
+
+
+def test_answers_expire_with_their_intent_ttl():
+    cache = _cache(ttl={**TTL, "investment_decision": 0})
+    cache.store("Should I buy AAPL?", "Hold AAPL.", current_date=TODAY)
+    cache.store("What is the AAPL revenue growth?", "8% a year.", current_date=TODAY)
+    assert cache.lookup("Should I buy AAPL?", current_date=TODAY) is None
+    assert cache.lookup("What is the AAPL revenue growth?", current_date=TODAY)["final_synthesis"] == "8% a year."
+
+
+def test_least_recently_used_answers_are_dropped():
+    cache = _cache(max_entries=2)
+    for symbol in ("AAPL", "MSFT", "NVDA"):
+        cache.store(f"Should I buy {symbol}?", f"Buy {symbol}.", current_date=TODAY)
+    assert len(cache) == 2
+    assert cache.lookup("Should I buy AAPL?", current_date=TODAY) is None
+    assert cache.lookup("Should I buy NVDA?", current_date=TODAY) is not None
+
+
+def test_invalidate_by_symbol_intent_or_all():
+    cache = _cache()
+    cache.store("Should I buy AAPL?", "Hold AAPL.", current_date=TODAY)
+    cache.store("What is the AAPL revenue growth?", "8% a year.", current_date=TODAY)
+    cache.store("Compare AAPL and MSFT revenue", "MSFT grows faster.", current_date=TODAY)
+    cache.store("Should I buy NVDA?", "Buy NVDA.", current_date=TODAY)
+
+    assert cache.invalidate(symbols=["msft"]) == 1
+    assert cache.invalidate(symbols=["AAPL"], intent="fundamentals") == 1
+    assert cache.lookup("Should I buy AAPL?", current_date=TODAY) is not None
+    assert cache.invalidate(intent="investment_decision") == 2
+    assert len(cache) == 0
+    cache.store("Should I buy AAPL?", "Hold AAPL.", current_date=TODAY)
+    assert cache.clear() == 1
+
+
+def test_new_tool_data_drops_the_answers_of_its_symbol(monkeypatch):
+    cache = _cache()
+    monkeypatch.setattr(response_cache_module, "response_cache", cache)
+    cache.store("Should I buy AAPL?", "Hold AAPL.", current_date=TODAY)
+    cache.store("Should I buy NVDA?", "Buy NVDA.", current_date=TODAY)
+
+    tool_input = {"ticker": "aapl", "period": "test-refresh"}
+    tool_result_cache.put("get_stock_quote", tool_input, {"price": 190.0})
+    assert len(cache) == 2
+    tool_result_cache.put("get_stock_quote", tool_input, {"price": 191.5})
+    assert cache.lookup("Should I buy AAPL?", current_date=TODAY) is None
+    assert cache.lookup("Should I buy NVDA?", current_date=TODAY) is not None
+    tool_result_cache.invalidate("get_stock_quote")
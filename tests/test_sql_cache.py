@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+from langchain_community.utilities import SQLDatabase
+
+from FinSage.utils import sql_cache
+from FinSage.utils.sql_cache import QueryResultCache, normalize_sql
+
+EQUIVALENT = [
+    (
+        "SELECT Close FROM Stock_Prices WHERE Ticker = 'AAPL'",
+        "select close\n  from stock_prices -- latest\n where ticker='AAPL';",
+    ),
+    (
+        "SELECT p.Close FROM Stock_Prices p WHERE p.Ticker = 'AAPL'",
+        "SELECT x.Close FROM Stock_Prices AS x WHERE x.Ticker = 'AAPL'",
+    ),
+    (
+        "SELECT Close FROM Stock_Prices WHERE Ticker = 'AAPL' AND Date > '2020-01-01'",
+        "SELECT Close FROM Stock_Prices WHERE Date > '2020-01-01' AND 'AAPL' = Ticker",
+    ),
+    (
+        "SELECT Close FROM Stock_Prices WHERE Ticker IN ('MSFT', 'AAPL')",
+        "SELECT Close FROM Stock_Prices WHERE Ticker IN ('AAPL', 'MSFT')",
+    ),
+]
+
+WRITES = [
+    "INSERT INTO Stock_Prices VALUES ('AAPL', '2020-01-01', 1)",
+    "UPDATE Stock_Prices SET Close = 0",
+    "DELETE FROM Stock_Prices",
+    "DROP TABLE Stock_Prices",
+    "CREATE TABLE t AS SELECT * FROM Stock_Prices",
+    "SELECT 1; DELETE FROM Stock_Prices",
+    "PRAGMA schema_version",
+    "not sql at all (",
+]
+
+
+@pytest.mark.parametrize("query, other", EQUIVALENT)
+def test_equivalent_queries_share_a_key(query, other):
+    assert normalize_sql(query) is not None
+    assert normalize_sql(query) == normalize_sql(other)
+
+
+def test_different_queries_keep_different_keys():
+    keys = {
+        normalize_sql("SELECT Close FROM Stock_Prices WHERE Ticker = 'AAPL'"),
+        normalize_sql("SELECT Close FROM Stock_Prices WHERE Ticker = 'aapl'"),
+        normalize_sql("SELECT Close FROM Stock_Prices WHERE Ticker = 'MSFT'"),
+        normalize_sql("SELECT Open FROM Stock_Prices WHERE Ticker = 'AAPL'"),
+    }
+    assert len(keys) == 4
+
+
+@pytest.mark.parametrize("query", WRITES)
+def test_anything_but_one_read_is_rejected(query):
+    assert normalize_sql(query) is None
+
+
+def test_fallback_without_sqlglot(monkeypatch):
+    monkeypatch.setattr(sql_cache, "sqlglot", None)
+    # Only whitespace, comments and keyword case are normalized
+    assert normalize_sql("SELECT Close FROM Stock_Prices WHERE Ticker = 'AAPL'") == normalize_sql(
+        "select Close\n  from Stock_Prices /* latest */ where Ticker = 'AAPL';"
+    )
+    assert normalize_sql("SELECT 'AAPL'") != normalize_sql("SELECT 'aapl'")
+    assert normalize_sql("SELECT 'AAPL'") != normalize_sql("SELECT 'aapl'")
+    for query in WRITES[:-1]:
+        assert normalize_sql(query) is None
+
+
+def test_result_cache_serves_equivalent_queries(tmp_path):
+    path = tmp_path / "prices.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE Stock_Prices (Ticker TEXT, Date TEXT, Close REAL)")
+        connection.execute("INSERT INTO Stock_Prices VALUES ('AAPL', '2020-01-02', 75.1)")
+    cache = QueryResultCache(SQLDatabase.from_uri(f"sqlite:///{path}"), str(path), check_interval=0, enabled=True, max_entries=10, max_rows=100)
+
+    result = cache.execute(EQUIVALENT[0][0])
+    assert result.columns == ["Close"] and result.rows == [(75.1,)]
+    assert cache.last_status() == "miss"
+    assert cache.execute(EQUIVALENT[0][1]) == result
+    assert cache.last_status() == "hit"
+    cache.execute("PRAGMA schema_version")
+    assert cache.last_status() == "bypass"
+    # A change of the database file drops the cached rows
+    with sqlite3.connect(path) as connection:
+        connection.execute("INSERT INTO Stock_Prices VALUES ('AAPL', '2020-01-03', 74.4)")
+    assert cache.execute(EQUIVALENT[0][0]).rows == [(75.1,), (74.4,)]
+    assert cache.last_status() == "miss" and cache.stats["invalidations"] == 1
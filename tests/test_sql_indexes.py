@@ -0,0 +1,78 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from FinSage.utils.sql_indexes import advise, apply, load_workload, query_plan, record_query
+
+RANGE_QUERY = "SELECT Date, Close FROM Stock_Prices WHERE Ticker = 'AAPL' AND Date >= '2020-03-01'"
+STAR_QUERY = "SELECT * FROM Stock_Prices WHERE Ticker = 'MSFT' ORDER BY Date"
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = sqlite3.connect(tmp_path / "stock_db.db")
+    connection.execute("CREATE TABLE Stock_Prices (Ticker TEXT, Date TEXT, Open REAL, Close REAL, Volume INTEGER)")
+    connection.execute("CREATE TABLE company_info (Ticker TEXT, Name TEXT, Sector TEXT)")
+    days = [(date(2020, 1, 1) + timedelta(days=i)).isoformat() for i in range(200)]
+    tickers = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOG"]
+    connection.executemany(
+        "INSERT INTO Stock_Prices VALUES (?, ?, ?, ?, ?)",
+        [(ticker, day, 100.0 + i, 101.0 + i, 1000 * i) for ticker in tickers for i, day in enumerate(days)],
+    )
+    connection.executemany("INSERT INTO company_info VALUES (?, ?, 'Tech')", [(ticker, ticker.title()) for ticker in tickers])
+    connection.commit()
+    yield connection
+    connection.close()
+
+
+def _workload(*entries):
+    return [{"query": query, "count": count, "seconds": 0.0} for query, count in entries]
+
+
+def test_advisor_proposes_a_covering_ticker_date_index(connection):
+    candidates = advise(connection, _workload((RANGE_QUERY, 3)), min_queries=2, max_columns=4, key_columns=[])
+    assert [(c.table, c.columns, c.covering, c.queries) for c in candidates] == [("Stock_Prices", ("Ticker", "Date", "Close"), True, 3)]
+    assert candidates[0].create_sql() == 'CREATE INDEX IF NOT EXISTS "idx_stock_prices_ticker_date_close" ON "Stock_Prices" ("Ticker", "Date", "Close")'
+
+
+def test_select_star_is_not_covering(connection):
+    candidates = advise(connection, _workload((STAR_QUERY, 3)), min_queries=2, max_columns=4, key_columns=[])
+    assert [(c.columns, c.covering) for c in candidates] == [(("Ticker", "Date"), False)]
+
+
+def test_rare_queries_and_indexed_tables_get_no_workload_index(connection):
+    assert advise(connection, _workload((RANGE_QUERY, 1)), min_queries=2, key_columns=[]) == []
+    connection.execute('CREATE INDEX "idx_existing" ON Stock_Prices (Ticker, Date, Close)')
+    assert advise(connection, _workload((RANGE_QUERY, 3)), min_queries=2, max_columns=4, key_columns=[]) == []
+
+
+def test_prefix_indexes_merge_into_the_longest(connection):
+    candidates = advise(connection, _workload((RANGE_QUERY, 3), (STAR_QUERY, 2)), min_queries=2, max_columns=4, key_columns=[])
+    assert [(c.columns, c.queries) for c in candidates] == [(("Ticker", "Date", "Close"), 5)]
+
+
+def test_key_columns_are_indexed_without_workload(connection):
+    candidates = advise(connection, [], key_columns=["ticker", "symbol", "date"])
+    assert {(c.table, c.columns, c.reason) for c in candidates} == {
+        ("Stock_Prices", ("Ticker", "Date"), "key columns"),
+        ("company_info", ("Ticker",), "key columns"),
+    }
+
+
+def test_apply_creates_the_indexes_used_by_the_plans(connection):
+    workload = _workload((RANGE_QUERY, 3))
+    assert any(step.startswith("SCAN") for step in query_plan(connection, RANGE_QUERY))
+    report = apply(connection, advise(connection, workload, min_queries=2, max_columns=4, key_columns=[]), workload, repeat=1)
+    assert [created["index"] for created in report["created"]] == ["idx_stock_prices_ticker_date_close"]
+    assert any("COVERING INDEX idx_stock_prices_ticker_date_close" in step for step in report["queries"][0]["plan_after"])
+
+
+def test_workload_log_groups_equivalent_reads(tmp_path):
+    path = str(tmp_path / "workload.jsonl")
+    record_query(RANGE_QUERY, 0.5, "miss", path=path)
+    record_query(RANGE_QUERY.replace("SELECT", "select\n ").replace(" WHERE", " where"), 0.25, "miss", path=path)
+    record_query(STAR_QUERY, 0.1, "miss", path=path)
+    record_query("DELETE FROM Stock_Prices", 0.1, "bypass", path=path)
+    workload = load_workload(path)
+    assert [(entry["query"], entry["count"], entry["seconds"]) for entry in workload] == [(RANGE_QUERY, 2, 0.75), (STAR_QUERY, 1, 0.1)]
@@ -0,0 +1,51 @@
+from typing import Annotated, Any, Dict, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from FinSage.models.schemas import any_flag, merge_results
+
+
+def test_merge_results_replaces_entries_by_key():
+    left = {"SQLAgent": {"output": "old"}, "NewsSentimentAgent": {"output": "news"}}
+    merged = merge_results(left, {"SQLAgent": {"output": "new"}})
+    assert merged == {"SQLAgent": {"output": "new"}, "NewsSentimentAgent": {"output": "news"}}
+    # The previous value is not modified
+    assert left["SQLAgent"] == {"output": "old"}
+    assert merge_results(None, {"SQLAgent": {}}) == {"SQLAgent": {}}
+    assert merge_results(left, {}) == left
+
+
+def test_merge_results_none_clears_the_channel():
+    assert merge_results({"SQLAgent": {"output": "old"}}, None) == {}
+
+
+def test_any_flag_stays_set():
+    assert any_flag(None, False) is False
+    assert any_flag(False, True) is True
+    assert any_flag(True, False) is True
+    assert any_flag(True, None) is False
+
+
+class _State(TypedDict):
+    results: Annotated[Dict[str, Dict[str, Any]], merge_results]
+    stopped: Annotated[bool, any_flag]
+
+
+def _writer(name: str, stopped: bool):
+    return lambda state: {"results": {name: {"output": name.lower()}}, "stopped": stopped}
+
+
+def test_parallel_writers_do_not_conflict():
+    builder = StateGraph(_State)
+    builder.add_node("reset", lambda state: {"results": None, "stopped": None})
+    builder.add_node("A", _writer("A", False))
+    builder.add_node("B", _writer("B", True))
+    builder.add_edge(START, "reset")
+    builder.add_edge("reset", "A")
+    builder.add_edge("reset", "B")
+    builder.add_edge(["A", "B"], END)
+    graph = builder.compile()
+
+    output = graph.invoke({"results": {"Stale": {"output": "previous question"}}, "stopped": True})
+    assert output["results"] == {"A": {"output": "a"}, "B": {"output": "b"}}
+    assert output["stopped"] is True
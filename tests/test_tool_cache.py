@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+
+from FinSage.tools.tool_cache import ToolResultCache
+
+
+def _counting(result):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return result
+
+    return fetch, calls
+
+
+def test_results_are_reused_within_ttl():
+    cache = ToolResultCache(ttl={}, default_ttl=60, max_entries=10)
+    fetch, calls = _counting({"price": 1})
+    assert cache.get_or_call("quote", {"symbol": "AAPL", "limit": 5}, fetch) == {"price": 1}
+    assert cache.last_status() == "miss"
+    # Argument order does not change the key
+    assert cache.get_or_call("quote", {"limit": 5, "symbol": "AAPL"}, fetch) == {"price": 1}
+    assert cache.last_status() == "hit"
+    assert len(calls) == 1
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_results_expire_after_the_tool_ttl():
+    cache = ToolResultCache(ttl={"quote": 0}, default_ttl=60, max_entries=10)
+    fetch, calls = _counting({"price": 1})
+    cache.get_or_call("quote", {"symbol": "AAPL"}, fetch)
+    cache.get_or_call("quote", {"symbol": "AAPL"}, fetch)
+    assert len(calls) == 2
+    assert cache.get("quote", {"symbol": "AAPL"}) is None
+    # Other tools keep the default window
+    cache.get_or_call("news", {"symbol": "AAPL"}, fetch)
+    assert cache.get("news", {"symbol": "AAPL"}) == {"price": 1}
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = ToolResultCache(ttl={}, default_ttl=60, max_entries=2)
+    for symbol in ("AAPL", "MSFT"):
+        cache.put("quote", {"symbol": symbol}, {"symbol": symbol})
+    # Touch AAPL so MSFT is the least recently used
+    fetch, calls = _counting(None)
+    cache.get_or_call("quote", {"symbol": "AAPL"}, fetch)
+    cache.put("quote", {"symbol": "NVDA"}, {"symbol": "NVDA"})
+    assert cache.get("quote", {"symbol": "MSFT"}) is None
+    assert cache.get("quote", {"symbol": "AAPL"}) == {"symbol": "AAPL"}
+    assert cache.get("quote", {"symbol": "NVDA"}) == {"symbol": "NVDA"}
+    assert cache.stats["evictions"] == 1 and calls == []
+
+
+def test_concurrent_callers_share_one_call():
+    cache = ToolResultCache(ttl={}, default_ttl=60, max_entries=10)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"price": 1}
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get_or_call("quote", {"symbol": "AAPL"}, fetch)))
+    owner.start()
+    started.wait(5)
+    joiners = [threading.Thread(target=lambda: results.append(cache.get_or_call("quote", {"symbol": "AAPL"}, fetch))) for _ in range(3)]
+    for thread in joiners:
+        thread.start()
+    while cache.stats["shared_inflight"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [owner, *joiners]:
+        thread.join()
+    assert results == [{"price": 1}] * 4
+    assert len(calls) == 1
+
+
+def test_errors_are_not_cached():
+    cache = ToolResultCache(ttl={}, default_ttl=60, max_entries=10)
+    fetch, calls = _counting({"error": "rate limited"})
+    cache.get_or_call("quote", {"symbol": "AAPL"}, fetch)
+    cache.get_or_call("quote", {"symbol": "AAPL"}, fetch)
+    assert len(calls) == 2
+
+    def failing():
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_call("quote", {"symbol": "MSFT"}, failing)
+    fetch, calls = _counting({"price": 2})
+    assert cache.get_or_call("quote", {"symbol": "MSFT"}, fetch) == {"price": 2}
+
+
+def test_invalidate_drops_one_tool_or_all():
+    cache = ToolResultCache(ttl={}, default_ttl=60, max_entries=10)
+    cache.put("quote", {"symbol": "AAPL"}, 1)
+    cache.put("news", {"symbol": "AAPL"}, 2)
+    cache.invalidate("quote")
+    assert cache.get("quote", {"symbol": "AAPL"}) is None
+    assert cache.get("news", {"symbol": "AAPL"}) == 2
+    cache.invalidate()
+    assert cache.get("news", {"symbol": "AAPL"}) is None
+
+
+def test_listeners_hear_about_new_data_only():
+    cache = ToolResultCache(ttl={"quote": 0}, default_ttl=60, max_entries=10)
+    refreshed = []
+    cache.add_refresh_listener(lambda tool_name, tool_input: refreshed.append((tool_name, tool_input)))
+    cache.add_refresh_listener(lambda tool_name, tool_input: 1 / 0)
+    cache.get_or_call("quote", {"symbol": "AAPL"}, lambda: {"price": 1})
+    cache.get_or_call("quote", {"symbol": "AAPL"}, lambda: {"price": 1})
+    assert refreshed == []
+    # A failing listener does not stop the others nor the call
+    assert cache.get_or_call("quote", {"symbol": "AAPL"}, lambda: {"price": 2}) == {"price": 2}
+    cache.put("quote", {"symbol": "AAPL"}, {"price": 3})
+    assert refreshed == [("quote", {"symbol": "AAPL"})] * 2
+    assert cache.stats["refreshes"] == 2